@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: comandos/segundo del GameManager con threading.RLock frente
+al modo actor (una tarea asyncio por sala, sin lock).
+
+Cada "comando" imita lo que hace un handler de server.py con una tirada:
+es_turno_de, puede_hacer_alguna_accion, lanzar_dados_safe, un await (el
+broadcast), obtener_estado_tablero y forzar_avance_turno. Varias salas con
+4 jugadores cada una reciben comandos concurrentes desde el mismo loop.
+
+Uso:
+    python bench/bench_actor.py [--salas 50] [--comandos 200] [--repeticiones 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from salas import RegistroSalas
+import protocol as proto
+
+
+class SocketFalso:
+    def __init__(self, puerto):
+        self.remote_address = ("127.0.0.1", puerto)
+
+
+async def comando(sala, websocket):
+    gm = sala.game_manager
+    gm.es_turno_de(websocket)
+    gm.puede_hacer_alguna_accion(websocket)
+    gm.lanzar_dados_safe()
+    await asyncio.sleep(0)  # punto de espera, como el broadcast de DADOS
+    gm.obtener_estado_tablero()
+    gm.forzar_avance_turno()
+
+
+def preparar(modo_actor, num_salas):
+    registro = RegistroSalas(modo_actor=modo_actor)
+    mesas = []
+    for s in range(num_salas):
+        sala = registro.obtener_o_crear(f"S{s}")
+        sockets = []
+        for i, color in enumerate(proto.COLORES):
+            ws = SocketFalso(10000 + s * 4 + i)
+            sala.game_manager.agregar_jugador(ws, f"J{i}", color)
+            sockets.append(ws)
+        sala.game_manager.iniciar_juego()
+        mesas.append((sala, sockets))
+    return mesas
+
+
+async def medir(modo_actor, num_salas, comandos_por_jugador):
+    mesas = preparar(modo_actor, num_salas)
+
+    async def jugador(sala, websocket):
+        for _ in range(comandos_por_jugador):
+            await sala.ejecutar(comando, sala, websocket)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(jugador(sala, ws) for sala, sockets in mesas for ws in sockets))
+    duracion = time.perf_counter() - inicio
+
+    for sala, _ in mesas:
+        sala.cerrar()
+    total = num_salas * len(proto.COLORES) * comandos_por_jugador
+    return total / duracion
+
+
+def medir_lock_puro(modo_actor, iteraciones):
+    """Solo el coste de las entradas a `with self.lock` (sin asyncio)"""
+    sala, sockets = preparar(modo_actor, 1)[0]
+    gm = sala.game_manager
+    inicio = time.perf_counter()
+    for i in range(iteraciones):
+        ws = sockets[i % 4]
+        gm.es_turno_de(ws)
+        gm.puede_hacer_alguna_accion(ws)
+        gm.lanzar_dados_safe()
+        gm.obtener_estado_tablero()
+        gm.forzar_avance_turno()
+    return iteraciones / (time.perf_counter() - inicio)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salas", type=int, default=50)
+    parser.add_argument("--comandos", type=int, default=200, help="comandos por jugador")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"\n{args.salas} salas x 4 jugadores x {args.comandos} comandos (mejor de {args.repeticiones})\n")
+    for titulo, modo_actor in (("RLock (actual)", False), ("Actor por sala", True)):
+        mejor = max([await medir(modo_actor, args.salas, args.comandos) for _ in range(args.repeticiones)])
+        sin_loop = max(medir_lock_puro(modo_actor, 20000) for _ in range(args.repeticiones))
+        print(f"{titulo:16s} {mejor:10.0f} comandos/s en el loop | {sin_loop:10.0f} comandos/s llamando directo")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
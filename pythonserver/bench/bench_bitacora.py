@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: bitácora de partidas (bitacora.py).
+
+Juega partidas del simulador con y sin bitácora para medir lo que cuesta
+anotar cada comando, vuelca las bitácoras con fsync y luego restaura cada
+partida en un GameManager nuevo, midiendo los milisegundos por partida y
+comprobando que fichas y estado del turno quedan idénticos.
+
+--turnos corta las partidas a mitad (como una caída del servidor) en vez
+de jugarlas hasta el final.
+
+Uso:
+    python bench/bench_bitacora.py [--partidas 200] [--jugadores 4] [--turnos 0] [--semilla 1]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import bitacora
+from game_manager import GameManager
+from simulador import Partida
+
+logging.disable(logging.CRITICAL)
+
+
+def _estado(gm):
+    """Lo que la restauración debe reproducir: fichas, turno y fin de partida"""
+    return (gm.instantanea_fichas(), tuple(getattr(gm, campo) for campo in GameManager.CAMPOS_TURNO),
+            gm.juego_iniciado, gm.juego_terminado, sorted(info["id"] for info in gm.clientes.values()))
+
+
+def jugar(partidas, jugadores, turnos, semilla, registro=None):
+    """Juega las partidas (anotándolas si hay registro); retorna (segundos, comandos, estados finales)"""
+    duracion = 0.0
+    comandos = 0
+    estados = {}
+    for i in range(partidas):
+        anotador = registro.abrir(f"B{i}") if registro is not None else None
+        partida = Partida(jugadores, semilla=semilla + i, bitacora=anotador)
+        if turnos:
+            partida.max_turnos = turnos
+        inicio = time.perf_counter()
+        estadisticas = partida.jugar()
+        duracion += time.perf_counter() - inicio
+        comandos += estadisticas.get("tiradas", 0) + estadisticas.get("movimientos", 0)
+        estados[f"B{i}"] = _estado(partida.gm)
+    return duracion, comandos, estados
+
+
+async def volcar(registro):
+    inicio = time.perf_counter()
+    futuro = registro.volcar()
+    if futuro is not None:
+        await asyncio.wrap_future(futuro)
+    duracion = time.perf_counter() - inicio
+    await registro.cerrar()
+    return duracion
+
+
+def restaurar(directorio, estados):
+    """Reproduce cada bitácora en un GameManager nuevo; retorna (ms por partida, distintas, discrepancias)"""
+    registro = bitacora.RegistroBitacoras(directorio)
+    tiempos = []
+    distintas = 0
+    discrepancias = 0
+    for ruta in registro.existentes():
+        inicio = time.perf_counter()
+        registros, _ = bitacora.cargar(ruta)
+        gm = GameManager()
+        codigo, fallidas = bitacora.reproducir(gm, registros)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        discrepancias += fallidas
+        distintas += _estado(gm) != estados[codigo]
+    registro.escritor.shutdown()
+    tiempos.sort()
+    return tiempos, distintas, discrepancias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partidas", type=int, default=200)
+    parser.add_argument("--jugadores", type=int, default=4)
+    parser.add_argument("--turnos", type=int, default=0, help="cortar cada partida tras N turnos (0 = hasta el final)")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    sin, comandos, _ = jugar(args.partidas, args.jugadores, args.turnos, args.semilla)
+    with tempfile.TemporaryDirectory(prefix="parques-wal-") as directorio:
+        registro = bitacora.RegistroBitacoras(directorio)
+        con, _, estados = jugar(args.partidas, args.jugadores, args.turnos, args.semilla, registro)
+        sincronizar = asyncio.run(volcar(registro))
+        tamano = sum(os.path.getsize(ruta) for ruta in registro.existentes())
+        tiempos, distintas, discrepancias = restaurar(directorio, estados)
+
+    print(f"{args.partidas} partidas, {comandos} comandos (tiradas + movimientos)")
+    print(f"  jugar sin bitácora    {sin * 1e6 / comandos:8.2f} µs/comando")
+    print(f"  jugar con bitácora    {con * 1e6 / comandos:8.2f} µs/comando")
+    print(f"  bitácoras             {tamano / args.partidas:8.0f} B/partida ({tamano / comandos:.1f} B/comando)")
+    print(f"  volcado + fsync       {sincronizar * 1000:8.1f} ms ({sincronizar * 1000 / args.partidas:.3f} ms/partida)")
+    print(f"  restauración          {sum(tiempos) / len(tiempos):8.3f} ms/partida "
+          f"(p50 {tiempos[len(tiempos) // 2]:.3f}, p99 {tiempos[int(len(tiempos) * 0.99)]:.3f}, máx {tiempos[-1]:.3f})")
+    print(f"  estado distinto       {distintas:8d} partidas ({discrepancias} operaciones no reproducidas igual)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ParchisServer.broadcast con un cliente lento en la mesa.
+
+Mide cuánto tardan los clientes "rápidos" en recibir cada mensaje cuando
+uno de los cuatro jugadores tarda artificialmente en consumir. Compara el
+broadcast secuencial original (un await por cliente) con el actual
+(serialización única + cola de salida por conexión con su escritora).
+Al final muestra las métricas de la cola del cliente lento tras una ráfaga
+de TABLERO (snapshots sustituidos en cola) y la expulsión de uno atascado.
+
+Uso:
+    python bench/bench_broadcast.py [--rondas 200] [--retardo 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from server import ParchisServer
+import protocol as proto
+
+
+class SocketFalso:
+    """Imita lo que ParchisServer usa de un websocket: send() y remote_address"""
+
+    def __init__(self, puerto, retardo=0.0):
+        self.remote_address = ("127.0.0.1", puerto)
+        self.retardo = retardo
+        self.recibidos = []  # instantes (perf_counter) de cada recepción
+
+    async def send(self, datos):
+        if self.retardo:
+            await asyncio.sleep(self.retardo)
+        self.recibidos.append(time.perf_counter())
+
+    async def close(self, *args, **kwargs):
+        pass
+
+
+async def broadcast_secuencial(servidor, sala, mensaje):
+    """Algoritmo original: json.dumps y await por cada cliente, uno tras otro"""
+    for websocket in list(sala.game_manager.clientes.keys()):
+        if websocket in servidor.clientes_activos:
+            await websocket.send(json.dumps(mensaje, ensure_ascii=False))
+
+
+def preparar_sala(servidor, codigo, retardo_lento):
+    sala = servidor.salas.obtener_o_crear(codigo)
+    sockets = []
+    for i, color in enumerate(proto.COLORES):
+        # El segundo jugador es el lento: así el secuencial retrasa a los que van detrás
+        ws = SocketFalso(50000 + i, retardo_lento if i == 1 else 0.0)
+        sala.game_manager.agregar_jugador(ws, f"J{i}", color)
+        servidor.salas.asignar(ws, sala)
+        servidor.clientes_activos.add(ws)
+        sockets.append(ws)
+    return sala, sockets
+
+
+async def medir(servidor, sala, sockets, rondas, funcion):
+    """Retorna latencias (ms) de los clientes rápidos y duración de cada broadcast"""
+    for ws in sockets:
+        ws.recibidos.clear()
+    rapidos = [ws for ws in sockets if not ws.retardo]
+    latencias = []
+    duraciones = []
+    mensaje = proto.mensaje_turno("J0", "rojo")
+    for ronda in range(rondas):
+        inicio = time.perf_counter()
+        await funcion(servidor, sala, mensaje)
+        duraciones.append((time.perf_counter() - inicio) * 1000)
+        # Con cola de salida el broadcast vuelve antes de la entrega: esperar a los rápidos
+        while any(len(ws.recibidos) <= ronda for ws in rapidos):
+            await asyncio.sleep(0)
+        for ws in rapidos:
+            latencias.append((ws.recibidos[ronda] - inicio) * 1000)
+    return latencias, duraciones
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def imprimir(titulo, latencias, duraciones):
+    print(f"{titulo:38s} rápidos p50={statistics.median(latencias):7.2f}ms "
+          f"p99={percentil(latencias, 0.99):7.2f}ms | broadcast p50={statistics.median(duraciones):7.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rondas", type=int, default=200)
+    parser.add_argument("--retardo", type=float, default=0.05,
+                        help="segundos que tarda el cliente lento en cada send")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    # timeout alto: el cliente lento sigue en la mesa durante toda la medición
+    servidor = ParchisServer("127.0.0.1", 0, timeout_envio=args.retardo * 10)
+    concurrente = lambda srv, sala, msg: srv.broadcast(sala, msg)
+
+    print(f"\n{args.rondas} broadcasts, 4 jugadores, cliente lento con {args.retardo * 1000:.0f}ms por mensaje\n")
+
+    sala, sockets = preparar_sala(servidor, "SINLENTO", 0.0)
+    imprimir("Secuencial, sin cliente lento", *await medir(servidor, sala, sockets, args.rondas, broadcast_secuencial))
+    imprimir("Concurrente, sin cliente lento", *await medir(servidor, sala, sockets, args.rondas, concurrente))
+
+    sala, sockets = preparar_sala(servidor, "CONLENTO", args.retardo)
+    imprimir("Secuencial, con cliente lento", *await medir(servidor, sala, sockets, args.rondas, broadcast_secuencial))
+    imprimir("Concurrente, con cliente lento", *await medir(servidor, sala, sockets, args.rondas, concurrente))
+
+    # Ráfaga de snapshots hacia el cliente lento: en cola solo queda el último TABLERO
+    sala, sockets = preparar_sala(servidor, "RAFAGA", args.retardo)
+    tablero = proto.crear_mensaje(proto.MSG_TABLERO, **sala.game_manager.obtener_estado_tablero())
+    for _ in range(args.rondas):
+        await servidor.broadcast(sala, tablero)
+        await servidor.broadcast(sala, proto.mensaje_info("charla"))
+    print(f"\nCola del cliente lento tras {args.rondas} TABLERO + INFO: "
+          f"{servidor.colas_salida[sockets[1]].estadisticas()}")
+
+    # Cliente atascado: supera timeout_envio y se desvincula tras el primer mensaje
+    servidor.timeout_envio = args.retardo / 2
+    sala, sockets = preparar_sala(servidor, "ATASCADO", args.retardo)
+    imprimir("Concurrente, cliente atascado", *await medir(servidor, sala, sockets, args.rondas, concurrente))
+    await asyncio.sleep(args.retardo)
+    print(f"\nCliente atascado desvinculado: {sockets[1] not in servidor.clientes_activos}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
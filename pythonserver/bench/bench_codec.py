@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Codec JSON frente al codec binario (codec.py) sobre el tráfico de partidas
+reales del simulador.
+
+Cada partida registra los mensajes que el servidor enviaría a un cliente
+(DADOS, TURNO, MOVIMIENTO_OK, CAPTURA, MOVIMIENTOS_LEGALES, TABLERO y
+TABLERO_DELTA) y los que el cliente enviaría (LANZAR_DADOS, MOVER_FICHA).
+Informa bytes por partida con ambos codecs (con TABLERO completo y con
+TABLERO_DELTA) y el tiempo de codificar/decodificar por tipo de mensaje,
+con json.dumps como referencia de los codificadores precompilados de
+protocol.py. Antes de medir comprueba que decodificar(codificar(m)) == m
+y que el JSON precompilado es idéntico al de json.dumps.
+
+Uso:
+    python bench/bench_codec.py [--partidas 20] [--jugadores 4] [--semilla 1]
+Sale con código 1 si algún mensaje no sobrevive al viaje de ida y vuelta
+o si el JSON precompilado difiere del de json.dumps.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from simulador import Partida
+import codec
+import protocol as proto
+
+CODECS = (codec.CODEC_JSON, codec.CODEC_BINARIO)
+
+
+class PartidaRegistrada(Partida):
+    """Partida del simulador que guarda los mensajes que produciría server.py"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mensajes = []
+        self.gm.obtener_delta_tablero()  # versión inicial: los deltas parten de aquí
+        mover_ficha = self.gm.mover_ficha
+
+        def mover_registrado(jugador, ficha_id, dado):
+            exito, resultado = mover_ficha(jugador, ficha_id, dado)
+            self.mensajes.append(proto.mensaje_mover_ficha(ficha_id, dado))
+            if exito:
+                self._registrar_movimiento(jugador, ficha_id, resultado)
+            return exito, resultado
+
+        self.gm.mover_ficha = mover_registrado
+
+    def _registrar_movimiento(self, jugador, ficha_id, resultado):
+        info = self.gm.clientes[jugador]
+        self.mensajes.append(proto.crear_mensaje(
+            proto.MSG_MOVIMIENTO_OK, nombre=info["nombre"], color=info["color"], ficha_id=ficha_id,
+            desde=resultado["desde"], hasta=resultado["hasta"]))
+        for captura in resultado.get("capturas", []):
+            self.mensajes.append(proto.crear_mensaje(proto.MSG_CAPTURA, capturado={
+                "nombre": captura["nombre"], "color": captura["color"], "ficha_id": captura["ficha_id"]}))
+        self._registrar_tablero()
+
+    def _registrar_tablero(self):
+        # El TABLERO completo y el delta describen el mismo cambio: se cuentan por separado
+        estado = self.gm.obtener_estado_tablero()
+        self.mensajes.append(proto.crear_mensaje(proto.MSG_TABLERO, **estado))
+        delta = self.gm.obtener_delta_tablero()
+        if delta is not None and not delta.get("completo"):
+            self.mensajes.append(proto.mensaje_tablero_delta(delta))
+
+    def tirar_dados(self):
+        self.mensajes.append(proto.mensaje_lanzar_dados())
+        dados = super().tirar_dados()
+        self.mensajes.append(proto.mensaje_dados(*dados))
+        return dados
+
+    def jugar_tirada(self, jugador):
+        turno = self.gm.turno_actual
+        super().jugar_tirada(jugador)
+        if self.gm.turno_actual != turno:
+            info = self.gm.clientes[self._jugador_actual()]
+            self.mensajes.append(proto.mensaje_turno(info["nombre"], info["color"]))
+            self._registrar_tablero()
+
+    def mover(self, jugador):
+        self.mensajes.append(proto.mensaje_movimientos_legales(self.gm.generar_movimientos_legales(jugador)))
+        super().mover(jugador)
+
+
+def recoger_mensajes(partidas, jugadores, semilla):
+    """Lista de listas de mensajes, una por partida"""
+    resultado = []
+    for i in range(partidas):
+        partida = PartidaRegistrada(jugadores, semilla=semilla + i)
+        partida.jugar()
+        resultado.append(partida.mensajes)
+    return resultado
+
+
+def comprobar_ida_y_vuelta(mensajes):
+    errores = 0
+    for mensaje in mensajes:
+        for nombre in CODECS:
+            recuperado = codec.decodificar(codec.codificar(mensaje, nombre))
+            if recuperado != mensaje:
+                errores += 1
+                if errores <= 10:
+                    print(f"✗ {nombre}: {mensaje} → {recuperado}")
+        if proto.codificar_json(mensaje) != json.dumps(mensaje, ensure_ascii=False):
+            errores += 1
+            if errores <= 10:
+                print(f"✗ JSON precompilado distinto de json.dumps: {mensaje}")
+    return errores
+
+
+def medir(mensajes, nombre):
+    """Por tipo: (cantidad, bytes totales, µs codificar, µs decodificar)"""
+    por_tipo = defaultdict(list)
+    for mensaje in mensajes:
+        por_tipo[mensaje["tipo"]].append(mensaje)
+
+    resultado = {}
+    for tipo, lista in por_tipo.items():
+        inicio = time.perf_counter()
+        tramas = [codec.codificar(mensaje, nombre) for mensaje in lista]
+        codificar = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for trama in tramas:
+            codec.decodificar(trama)
+        decodificar = time.perf_counter() - inicio
+        tamano = sum(len(t.encode("utf-8")) if isinstance(t, str) else len(t) for t in tramas)
+        resultado[tipo] = (len(lista), tamano, codificar / len(lista) * 1e6, decodificar / len(lista) * 1e6)
+    return resultado
+
+
+def medir_json_dumps(mensajes):
+    """µs por mensaje de json.dumps, por tipo (lo que costaba antes de los codificadores precompilados)"""
+    por_tipo = defaultdict(list)
+    for mensaje in mensajes:
+        por_tipo[mensaje["tipo"]].append(mensaje)
+    resultado = {}
+    for tipo, lista in por_tipo.items():
+        inicio = time.perf_counter()
+        for mensaje in lista:
+            json.dumps(mensaje, ensure_ascii=False)
+        resultado[tipo] = (time.perf_counter() - inicio) / len(lista) * 1e6
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partidas", type=int, default=20)
+    parser.add_argument("--jugadores", type=int, default=4, choices=range(proto.MIN_JUGADORES, proto.MAX_JUGADORES + 1))
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    por_partida = recoger_mensajes(args.partidas, args.jugadores, args.semilla)
+    mensajes = [mensaje for partida in por_partida for mensaje in partida]
+    print(f"{len(mensajes)} mensajes en {args.partidas} partidas de {args.jugadores} jugadores")
+
+    errores = comprobar_ida_y_vuelta(mensajes)
+    print(f"Ida y vuelta y JSON precompilado: {errores} diferencias")
+
+    medidas = {nombre: medir(mensajes, nombre) for nombre in CODECS}
+    dumps = medir_json_dumps(mensajes)
+
+    print(f"\n{'tipo':22s} {'n':>7s} | {'bytes json':>10s} {'bin':>6s} | "
+          f"{'cod dumps µs':>12s} {'json':>6s} {'bin':>6s} | {'dec json µs':>11s} {'bin':>6s}")
+    for tipo in sorted(medidas[codec.CODEC_JSON], key=lambda t: -medidas[codec.CODEC_JSON][t][1]):
+        n, bytes_json, cod_json, dec_json = medidas[codec.CODEC_JSON][tipo]
+        _, bytes_bin, cod_bin, dec_bin = medidas[codec.CODEC_BINARIO][tipo]
+        print(f"{tipo:22s} {n:7d} | {bytes_json / n:10.1f} {bytes_bin / n:6.1f} | "
+              f"{dumps[tipo]:12.2f} {cod_json:6.2f} {cod_bin:6.2f} | {dec_json:11.2f} {dec_bin:6.2f}")
+
+    print("\nBytes por partida (lo que ve un cliente + lo que envía el jugador)")
+    for variante, excluido in (("con TABLERO completo", proto.MSG_TABLERO_DELTA),
+                               ("con TABLERO_DELTA", proto.MSG_TABLERO)):
+        linea = []
+        for nombre in CODECS:
+            total = sum(tamano for tipo, (_, tamano, _, _) in medidas[nombre].items() if tipo != excluido)
+            linea.append(f"{nombre}={total / args.partidas:10.0f}")
+        print(f"  {variante:22s} " + "  ".join(linea))
+
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Memoria y coste de copia del estado de fichas: representación anterior
+(User con lista de gameToken con atributos en __dict__) frente al
+EstadoTablero compacto (array de 16 enteros + vistas).
+
+Uso:
+    python bench/bench_estado_compacto.py [--salas 5000] [--copias 100000]
+"""
+
+import argparse
+import copy
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from estado_compacto import EstadoTablero, ranura_de
+from user import User
+import gameFile as tkn
+import protocol as proto
+
+
+class FichaAnterior:
+    """gameToken tal como era antes: cuatro atributos en un __dict__"""
+
+    def __init__(self, color, estado, ficha_id):
+        self.color = color
+        self.estado = estado
+        self.posicion = -1
+        self.posicion_meta = -1
+        self.id = ficha_id
+
+
+def sala_anterior():
+    jugadores = []
+    for color in proto.COLORES:
+        usuario = User(color, color)
+        for i in range(proto.FICHAS_POR_JUGADOR):
+            usuario.agregar_ficha(FichaAnterior(color, proto.ESTADO_BLOQUEADO, i))
+        jugadores.append(usuario)
+    return jugadores
+
+
+def sala_compacta():
+    estado = EstadoTablero()
+    jugadores = []
+    for color in proto.COLORES:
+        usuario = User(color, color)
+        for i in range(proto.FICHAS_POR_JUGADOR):
+            usuario.agregar_ficha(tkn.gameToken(color, proto.ESTADO_BLOQUEADO, estado, ranura_de(color, i)))
+        jugadores.append(usuario)
+    return estado, jugadores
+
+
+def memoria(fabrica, salas):
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    retenidas = [fabrica() for _ in range(salas)]
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del retenidas
+    return (despues - antes) / salas
+
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salas", type=int, default=5000)
+    parser.add_argument("--copias", type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"\nMemoria de las fichas por sala ({args.salas} salas)")
+    print(f"  Anterior (User + gameToken con __dict__): {memoria(sala_anterior, args.salas):8.0f} bytes")
+    print(f"  Compacta (array + vistas):                {memoria(sala_compacta, args.salas):8.0f} bytes")
+    print(f"  Solo el array (sin vistas):               {memoria(EstadoTablero, args.salas):8.0f} bytes")
+
+    jugadores = sala_anterior()
+    estado, _ = sala_compacta()
+    instantanea = estado.instantanea()
+
+    print(f"\nCopia de estado ({args.copias} repeticiones)")
+    print(f"  copy.deepcopy(jugadores):    {cronometrar(lambda: copy.deepcopy(jugadores), args.copias // 20):8.2f} µs")
+    print(f"  EstadoTablero.instantanea(): {cronometrar(estado.instantanea, args.copias):8.2f} µs "
+          f"({len(instantanea)} bytes)")
+    print(f"  EstadoTablero.restaurar():   {cronometrar(lambda: estado.restaurar(instantanea), args.copias):8.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
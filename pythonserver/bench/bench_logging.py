@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Coste del logging en partidas completas jugadas a través de los handlers
+de ParchisServer (LANZAR_DADOS, MOVER_FICHA, ELEGIR_FICHA_PREMIO) con
+sockets falsos, con varias salas en paralelo.
+
+Configuraciones:
+  antes           basicConfig(DEBUG) con un StreamHandler síncrono y sin
+                  muestreo (lo que hacía server.py al importarse)
+  cola INFO       logs.configurar(): QueueHandler + hilo escritor, nivel INFO
+  cola DEBUG      igual, con DEBUG y el muestreo de BROADCAST/SYNC/ENVIO
+  sin logging     logging.disable(CRITICAL), como referencia
+
+Las pausas de los handlers entre turnos (asyncio.sleep(0.1)) se reducen a
+ceder el control al bucle, para que una partida no dure minutos. Se mide
+tiempo de CPU del proceso, que incluye el hilo escritor del log.
+
+Uso:
+    python bench/bench_logging.py [--partidas 20] [--semilla 1]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from server import ParchisServer
+import logs
+import protocol as proto
+
+# Acciones máximas por partida antes de darla por atascada
+MAX_ACCIONES = 5000
+
+_dormir = asyncio.sleep
+
+
+async def ceder(segundos=0, resultado=None):
+    return await _dormir(0, resultado)
+
+
+class SocketFalso:
+    """Imita lo que ParchisServer usa de un websocket: send() y remote_address"""
+
+    def __init__(self, puerto):
+        self.remote_address = ("127.0.0.1", puerto)
+
+    async def send(self, datos):
+        pass
+
+    async def close(self, *args, **kwargs):
+        pass
+
+
+def preparar_sala(servidor, codigo, puerto_base):
+    sala = servidor.salas.obtener_o_crear(codigo)
+    sockets = []
+    for i, color in enumerate(proto.COLORES):
+        ws = SocketFalso(puerto_base + i)
+        sala.game_manager.agregar_jugador(ws, f"J{i}", color)
+        servidor.salas.asignar(ws, sala)
+        servidor.clientes_activos.add(ws)
+        sockets.append(ws)
+    return sala, sockets
+
+
+def jugador_actual(gm):
+    actual = gm.obtener_jugador_actual_safe()
+    for ws, info in gm.clientes.items():
+        if info["jugador"] is actual:
+            return ws
+    return None
+
+
+async def jugar_partida(servidor, codigo, puerto_base, rng):
+    """Una partida de 4 jugadores que eligen al azar entre los movimientos legales"""
+    sala, _ = preparar_sala(servidor, codigo, puerto_base)
+    gm = sala.game_manager
+    gm.iniciar_juego()
+    acciones = 0
+
+    while not gm.juego_terminado and acciones < MAX_ACCIONES:
+        ws = jugador_actual(gm)
+        acciones += 1
+        if not gm.dados_lanzados:
+            await servidor.procesar_mensaje(ws, proto.mensaje_lanzar_dados())
+            if gm.premio_tres_dobles:
+                elegibles = gm.obtener_fichas_elegibles_para_premio(ws)
+                ficha_id = rng.choice(elegibles)["id"] if elegibles else None
+                await servidor.procesar_mensaje(ws, proto.mensaje_elegir_ficha_premio(ficha_id))
+            continue
+
+        movimientos = gm.generar_movimientos_legales(ws)
+        if not movimientos:
+            # El servidor espera una acción que no existe: lo mismo que hace el simulador
+            gm.forzar_avance_turno()
+            continue
+        ficha_id, dado = rng.choice(movimientos)
+        await servidor.procesar_mensaje(ws, proto.mensaje_mover_ficha(ficha_id, dado))
+
+    for ws in list(gm.clientes):
+        servidor.clientes_activos.discard(ws)
+        servidor.salas.liberar(ws)
+    return acciones
+
+
+def configurar(modo, archivo):
+    logging.disable(logging.NOTSET)
+    logs.detener()
+    raiz = logging.getLogger()
+    for existente in list(raiz.handlers):
+        raiz.removeHandler(existente)
+
+    if modo == "antes":
+        manejador = logging.FileHandler(archivo, encoding="utf-8")
+        manejador.setFormatter(logging.Formatter(logs.FORMATO))
+        raiz.addHandler(manejador)
+        raiz.setLevel(logging.DEBUG)
+        logs.muestra.tasas = {}
+    elif modo == "cola INFO":
+        logs.muestra.tasas = dict(logs.MUESTREO_POR_DEFECTO)
+        logs.configurar(nivel="INFO", niveles={}, muestreo={}, archivo=archivo, consola=False)
+    elif modo == "cola DEBUG":
+        logs.muestra.tasas = dict(logs.MUESTREO_POR_DEFECTO)
+        logs.configurar(nivel="DEBUG", niveles={}, muestreo={}, archivo=archivo, consola=False)
+    else:
+        logging.disable(logging.CRITICAL)
+
+
+def terminar():
+    logs.detener()
+    for manejador in list(logging.getLogger().handlers):
+        manejador.close()
+        logging.getLogger().removeHandler(manejador)
+
+
+async def medir(servidor, partidas, semilla, ronda):
+    random.seed(semilla)
+    rngs = [random.Random(semilla + i) for i in range(partidas)]
+    inicio_cpu = time.process_time()
+    inicio = time.perf_counter()
+    acciones = await asyncio.gather(*(
+        jugar_partida(servidor, f"R{ronda}P{i}", 20000 + 10 * i, rngs[i]) for i in range(partidas)
+    ))
+    return sum(acciones), time.process_time() - inicio_cpu, time.perf_counter() - inicio
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partidas", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    asyncio.sleep = ceder
+    servidor = ParchisServer(intervalo_estadisticas=0)
+    modos = ("antes", "cola INFO", "cola DEBUG", "sin logging")
+    print(f"{args.partidas} partidas de 4 jugadores en paralelo por configuración\n")
+    print(f"{'configuración':14s} {'acciones':>9s} {'CPU s':>7s} {'pared s':>8s} "
+          f"{'partidas/s CPU':>15s} {'µs CPU/acción':>14s} {'KB de log':>10s}")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for ronda, modo in enumerate(modos):
+            archivo = os.path.join(directorio, f"{ronda}.log")
+            configurar(modo, archivo)
+            acciones, cpu, pared = await medir(servidor, args.partidas, args.semilla, ronda)
+            terminar()
+            tamano = os.path.getsize(archivo) / 1024 if os.path.exists(archivo) else 0.0
+            print(f"{modo:14s} {acciones:9d} {cpu:7.2f} {pared:8.2f} "
+                  f"{args.partidas / cpu:15.1f} {cpu / acciones * 1e6:14.1f} {tamano:10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
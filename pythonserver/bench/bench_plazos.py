@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: plazos de turno de muchas salas con la rueda de
+temporizadores frente a una tarea asyncio por sala.
+
+Cada sala rearma su plazo en cada TURNO: con tareas eso es cancelar la
+tarea anterior y crear otra que duerme hasta el vencimiento; con la rueda,
+cancelar y programar un Temporizador. Se mide el coste por rearme, el de
+un tic del bucle con todas las salas esperando y los vencimientos reales
+(con un plazo corto, cuánto tarda en dispararse cada uno).
+
+Uso:
+    python bench/bench_plazos.py [--salas 1000 10000] [--rearmes 5] [--plazo 60]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from temporizador import RuedaTemporizadores
+
+logging.disable(logging.CRITICAL)
+
+
+async def _dormir(segundos, al_vencer, sala):
+    await asyncio.sleep(segundos)
+    al_vencer(sala)
+
+
+class PorTareas:
+    """Una tarea por sala (sleep hasta el plazo)"""
+
+    def __init__(self):
+        self.tareas = {}
+
+    def armar(self, sala, segundos, al_vencer):
+        anterior = self.tareas.get(sala)
+        if anterior is not None:
+            anterior.cancel()
+        self.tareas[sala] = asyncio.get_running_loop().create_task(_dormir(segundos, al_vencer, sala))
+
+    def cerrar(self):
+        for tarea in self.tareas.values():
+            tarea.cancel()
+
+
+class PorRueda:
+    """Todas las salas en una RuedaTemporizadores"""
+
+    def __init__(self):
+        self.rueda = RuedaTemporizadores()
+        self.plazos = {}
+        self.conductor = asyncio.get_running_loop().create_task(self.rueda.ejecutar())
+
+    def armar(self, sala, segundos, al_vencer):
+        anterior = self.plazos.get(sala)
+        if anterior is not None:
+            anterior.cancelar()
+        self.plazos[sala] = self.rueda.programar(segundos, al_vencer, sala)
+
+    def cerrar(self):
+        self.conductor.cancel()
+
+
+async def medir(clase, salas, rearmes, plazo):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    modo = clase()
+    vencidas = []
+
+    inicio = time.perf_counter()
+    for _ in range(rearmes):
+        for sala in range(salas):
+            modo.armar(sala, plazo, vencidas.append)
+        await asyncio.sleep(0)  # deja correr las tareas recién creadas, como entre dos TURNO
+    rearme = (time.perf_counter() - inicio) / (salas * rearmes)
+    memoria = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    # Un tic del bucle con todo en espera
+    inicio = time.perf_counter()
+    for _ in range(100):
+        await asyncio.sleep(0)
+    tic = (time.perf_counter() - inicio) / 100
+
+    # Vencimientos: plazo corto para todas y retraso de la última en dispararse
+    corto = 0.3
+    armado = time.perf_counter()
+    for sala in range(salas):
+        modo.armar(sala, corto, vencidas.append)
+    while len(vencidas) < salas and time.perf_counter() - armado < corto + 5:
+        await asyncio.sleep(0.01)
+    retraso = time.perf_counter() - armado - corto
+    modo.cerrar()
+    return rearme, memoria, tic, retraso, len(vencidas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salas", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rearmes", type=int, default=5)
+    parser.add_argument("--plazo", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'salas':>7s} {'modo':>7s} {'µs/rearme':>10s} {'KiB':>8s} {'µs/tic':>8s} "
+          f"{'retraso vencimiento ms':>23s} {'vencidas':>9s}")
+    for salas in args.salas:
+        for nombre, clase in (("tareas", PorTareas), ("rueda", PorRueda)):
+            rearme, memoria, tic, retraso, vencidas = asyncio.run(medir(clase, salas, args.rearmes, args.plazo))
+            print(f"{salas:7d} {nombre:>7s} {rearme * 1e6:10.2f} {memoria / 1024:8.0f} {tic * 1e6:8.1f} "
+                  f"{retraso * 1000:23.1f} {vencidas:9d}")
+
+
+if __name__ == "__main__":
+    main()
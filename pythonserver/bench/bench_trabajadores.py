@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Escalado del modo supervisor con el número de trabajadores.
+
+Para cada número de trabajadores levanta un Supervisor real en un puerto
+local y lo carga desde varios procesos cliente con websockets de verdad:
+
+  conexiones/s  cada cliente repite SOLICITAR_COLORES (siguiendo el
+                REDIRIGIR si la sala es de otro trabajador) + CONECTAR a una
+                sala nueva + BIENVENIDA + cierre
+  movimientos/s parejas de bots juegan partidas completas (lote y
+                movimientos legales activados): lanzan al recibir su TURNO,
+                mueven la primera opción de MOVIMIENTOS_LEGALES y empiezan
+                otra sala al terminar o si la partida se queda sin acciones
+
+Los límites de frecuencia se relajan: toda la carga sale de 127.0.0.1 y el
+presupuesto por IP la frenaría. Con menos núcleos que trabajadores +
+procesos cliente el escalado queda limitado por la máquina.
+
+Uso:
+    python bench/bench_trabajadores.py [--trabajadores 1 2 4] [--duracion 5] [--clientes 2] [--salas 20]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import websockets
+
+PUERTO = 18400
+# Sin esperar a un atasco indefinido: si nadie recibe nada en este tiempo, otra sala
+SIN_PROGRESO = 2.0
+SIN_LIMITES = {presupuesto: {"conexion": (10 ** 6, 10 ** 6), "ip": (10 ** 6, 10 ** 6)}
+               for presupuesto in ("auth", "sync", "juego")}
+
+
+def supervisar(trabajadores, puerto):
+    """Proceso del supervisor (SIGTERM lo detiene junto con sus trabajadores)"""
+    os.environ["PARQUES_LOG_NIVEL"] = "ERROR"
+    import logs
+    from supervisor import Supervisor
+    logs.configurar()
+    Supervisor("127.0.0.1", puerto, trabajadores, opciones={
+        "intervalo_estadisticas": 0,
+        "limites_frecuencia": SIN_LIMITES,
+    }).ejecutar()
+
+
+def esperar_puerto(puerto, timeout=20.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(("127.0.0.1", puerto), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El supervisor no abrió el puerto {puerto}")
+
+
+async def unirse(puerto, sala, nombre, color, contadores):
+    """SOLICITAR_COLORES (+ redirección) y CONECTAR; retorna el socket tras la BIENVENIDA"""
+    contadores["uniones"] += 1
+    ws = await websockets.connect(f"ws://127.0.0.1:{puerto}", ping_interval=None)
+    await ws.send(json.dumps({"tipo": "SOLICITAR_COLORES", "sala": sala}))
+    respuesta = json.loads(await ws.recv())
+    if respuesta["tipo"] == "REDIRIGIR":
+        contadores["redirecciones"] += 1
+        await ws.close()
+        ws = await websockets.connect(f"ws://127.0.0.1:{respuesta['puerto']}", ping_interval=None)
+    await ws.send(json.dumps({"tipo": "CONECTAR", "nombre": nombre, "color": color, "sala": sala,
+                              "lote": True, "movimientos": True}))
+    while True:
+        mensaje = json.loads(await ws.recv())
+        if mensaje["tipo"] == "BIENVENIDA":
+            return ws
+        if mensaje["tipo"] == "ERROR":
+            await ws.close()
+            raise RuntimeError(mensaje["mensaje"])
+
+
+async def conexiones(puerto, fin, prefijo, contadores):
+    n = 0
+    while time.monotonic() < fin:
+        n += 1
+        ws = await unirse(puerto, f"{prefijo}C{n}", "x", "rojo", contadores)
+        await ws.close()
+        contadores["conexiones"] += 1
+
+
+class Bot:
+    """Jugador que siempre hace lo primero que puede"""
+
+    def __init__(self, ws, color, dados_determinacion):
+        self.ws = ws
+        self.color = color
+        self.dados_determinacion = dados_determinacion
+        # Tras dobles el servidor no repite el TURNO: si sigue siendo el nuestro, tras mover se vuelve a lanzar
+        self.mi_turno = False
+
+    async def jugar(self, contadores, progreso):
+        """Retorna cuando la partida termina o se cierra el socket"""
+        async for trama in self.ws:
+            progreso[0] = time.monotonic()
+            mensaje = json.loads(trama)
+            eventos = mensaje["eventos"] if mensaje["tipo"] == "LOTE" else [mensaje]
+            accion = None
+            relanzar = False
+            for evento in eventos:
+                tipo = evento["tipo"]
+                if tipo == "DETERMINACION_INICIO":
+                    dado1, dado2 = self.dados_determinacion
+                    accion = {"tipo": "DETERMINACION_TIRADA", "dado1": dado1, "dado2": dado2}
+                elif tipo == "TURNO":
+                    self.mi_turno = relanzar = evento["color"] == self.color
+                    accion = None
+                elif tipo == "MOVIMIENTOS_LEGALES":
+                    opciones = evento["movimientos"]
+                    accion = {"tipo": "MOVER_FICHA", **opciones[0]} if opciones else None
+                elif tipo == "PREMIO_TRES_DOBLES":
+                    elegibles = evento["fichas_elegibles"]
+                    accion = {"tipo": "ELEGIR_FICHA_PREMIO", "ficha_id": elegibles[0]["id"] if elegibles else None}
+                elif tipo == "MOVIMIENTO_OK" and evento["color"] == self.color:
+                    contadores["movimientos"] += 1
+                    relanzar = True
+                elif tipo == "VICTORIA":
+                    contadores["partidas"] += evento["color"] == self.color
+                    return
+            if accion is None and relanzar and self.mi_turno:
+                accion = {"tipo": "LANZAR_DADOS"}
+            if accion is not None:
+                await self.ws.send(json.dumps(accion))
+
+
+async def partidas(puerto, fin, prefijo, contadores):
+    n = 0
+    while time.monotonic() < fin:
+        n += 1
+        sala = f"{prefijo}P{n}"
+        rojo = await unirse(puerto, sala, "r", "rojo", contadores)
+        azul = await unirse(puerto, sala, "a", "azul", contadores)
+        progreso = [time.monotonic()]
+        bots = [Bot(rojo, "rojo", (6, 6)), Bot(azul, "azul", (1, 2))]
+        tareas = [asyncio.ensure_future(bot.jugar(contadores, progreso)) for bot in bots]
+        await rojo.send(json.dumps({"tipo": "LISTO"}))
+        while time.monotonic() < fin and not any(t.done() for t in tareas):
+            await asyncio.sleep(0.1)
+            if time.monotonic() - progreso[0] > SIN_PROGRESO:
+                contadores["atascadas"] += 1
+                break
+        for tarea in tareas:
+            tarea.cancel()
+        await rojo.close()
+        await azul.close()
+
+
+async def carga(modo, puerto, duracion, salas, indice):
+    contadores = dict.fromkeys(("conexiones", "uniones", "redirecciones", "movimientos", "partidas", "atascadas"), 0)
+    fin = time.monotonic() + duracion
+    prefijo = f"B{os.getpid()}X{indice}"
+    funcion = conexiones if modo == "conexiones" else partidas
+    resultados = await asyncio.gather(*(funcion(puerto, fin, f"{prefijo}S{i}", contadores) for i in range(salas)),
+                                      return_exceptions=True)
+    contadores["errores"] = sum(isinstance(r, Exception) for r in resultados)
+    return contadores
+
+
+def proceso_cliente(args):
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(carga(*args))
+
+
+def medir(modo, puerto, duracion, clientes, salas):
+    with multiprocessing.get_context("spawn").Pool(clientes) as pool:
+        parciales = pool.map(proceso_cliente, [(modo, puerto, duracion, salas, i) for i in range(clientes)])
+    total = {}
+    for parcial in parciales:
+        for clave, valor in parcial.items():
+            total[clave] = total.get(clave, 0) + valor
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duracion", type=float, default=5.0, help="segundos por fase")
+    parser.add_argument("--clientes", type=int, default=2, help="procesos que generan carga")
+    parser.add_argument("--salas", type=int, default=20, help="clientes concurrentes por proceso")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} núcleos, {args.clientes} procesos cliente x {args.salas} concurrentes, "
+          f"{args.duracion:.0f}s por fase\n")
+    print(f"{'trabajadores':>12s} {'conexiones/s':>13s} {'movimientos/s':>14s} {'partidas':>9s} "
+          f"{'redirigidas %':>14s} {'atascadas':>10s} {'errores':>8s}")
+    contexto = multiprocessing.get_context("spawn")
+    for ronda, trabajadores in enumerate(args.trabajadores):
+        # Puertos nuevos en cada ronda: los de la anterior pueden seguir en TIME_WAIT
+        puerto = PUERTO + ronda * 20 + random.randrange(10) * 1000
+        supervisor = contexto.Process(target=supervisar, args=(trabajadores, puerto))
+        supervisor.start()
+        try:
+            esperar_puerto(puerto)
+            for indice in range(trabajadores):
+                esperar_puerto(puerto + 1 + indice)
+            c = medir("conexiones", puerto, args.duracion, args.clientes, args.salas)
+            p = medir("partidas", puerto, args.duracion, args.clientes, args.salas)
+        finally:
+            supervisor.terminate()
+            supervisor.join()
+        redirigidas = 100 * (c["redirecciones"] + p["redirecciones"]) / max(1, c["uniones"] + p["uniones"])
+        print(f"{trabajadores:12d} {c['conexiones'] / args.duracion:13.0f} {p['movimientos'] / args.duracion:14.0f} "
+              f"{p['partidas']:9d} {redirigidas:14.0f} {p['atascadas']:10d} {c['errores'] + p['errores']:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: coste de las trazas por comando (trazas.py) según el muestreo.
+
+Un comando sintético abre los mismos tramos que un MOVER_FICHA típico:
+raíz, decodificar, despachar, el lock (espera + retención) con las reglas
+dentro, tres broadcasts de 4 destinatarios y una pausa. Se compara con el
+mismo comando sin instrumentar, trazando 1 de cada N y trazándolo todo.
+
+Uso:
+    python bench/bench_trazas.py [--comandos 200000] [--muestreos 0 1000 100 1]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import trazas
+
+
+def comando_sin_trazas(cerrojo):
+    with cerrojo:
+        pass
+    for _ in range(3):
+        for _ in range(4):
+            pass
+
+
+def comando_trazado(trazador, cerrojo):
+    with trazador.comando() as traza:
+        with trazas.tramo("decodificar"):
+            pass
+        traza.renombrar("MOVER_FICHA")
+        with trazas.tramo("despachar", "MOVER_FICHA"):
+            with cerrojo:
+                with trazas.tramo("reglas", "mover_ficha"):
+                    pass
+            for _ in range(3):
+                with trazas.tramo("broadcast", "TABLERO"):
+                    for _ in range(4):
+                        with trazas.tramo("encolar", "TABLERO"):
+                            pass
+            with trazas.tramo("pausa"):
+                pass
+
+
+def medir(funcion, comandos):
+    inicio = time.perf_counter()
+    for _ in range(comandos):
+        funcion()
+    return (time.perf_counter() - inicio) / comandos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comandos", type=int, default=200000)
+    parser.add_argument("--muestreos", type=int, nargs="+", default=[0, 1000, 100, 1])
+    args = parser.parse_args()
+
+    cerrojo = threading.RLock()
+    base = medir(lambda: comando_sin_trazas(cerrojo), args.comandos)
+    print(f"{'muestreo':>10s} {'µs/comando':>11s} {'extra µs':>9s} {'tramos/comando':>15s}")
+    print(f"{'sin trazas':>10s} {base * 1e6:11.3f} {0:9.3f} {0:15.1f}")
+    for cada in args.muestreos:
+        trazador = trazas.Trazador(capacidad=16384, cada=cada)
+        trazado = trazas.CerrojoTrazado(threading.RLock())
+        coste = medir(lambda: comando_trazado(trazador, trazado), args.comandos)
+        etiqueta = "nunca" if not cada else f"1/{cada}"
+        print(f"{etiqueta:>10s} {coste * 1e6:11.3f} {(coste - base) * 1e6:9.3f} "
+              f"{trazador.escritos / args.comandos:15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Generador de carga: un enjambre de bots websocket jugando partidas completas.
+
+Abre --mesas salas de --jugadores bots cada una, contra un servidor en
+marcha (--url) o uno propio que levanta en un subproceso (--local), y
+habla el protocolo real: CONECTAR, LISTO, DETERMINACION_TIRADA,
+LANZAR_DADOS, MOVER_FICHA y ELEGIR_FICHA_PREMIO. Cada bot lanza cuando
+le llega su TURNO y mueve una opción al azar de MOVIMIENTOS_LEGALES (se
+suscribe al conectar). Los bots piden LOTE: así saben dónde acaban los
+eventos de cada comando y deciden con todos ellos, como el cliente (sin
+LOTE llegan espaciados por las pausas y una reacción al primer evento
+se adelanta al resto del comando). Con menos de 4 jugadores la mesa
+envía LISTO; con 4 (sala llena) espera a que el servidor arranque la
+determinación por su cuenta, como haría el cliente. Al terminar una
+partida, la mesa empieza otra en una sala nueva; si en --sin-progreso
+segundos nadie recibe nada, se da por atascada y también.
+
+Informe:
+  conexión          de websocket.connect a la BIENVENIDA (REDIRIGIR incluido)
+  comando→TABLERO   de enviar LANZAR_DADOS / MOVER_FICHA / ELEGIR_FICHA_PREMIO
+                    al primer TABLERO (o TABLERO_DELTA) que recibe ese bot;
+                    si antes llega un TURNO o un ERROR, el comando no cuenta
+  rendimiento       comandos, movimientos, partidas y eventos recibidos por segundo
+
+Toda la carga sale de una IP: contra un servidor propio (--url), arráncalo
+con los límites de frecuencia relajados o el presupuesto por IP la frenará.
+--local ya lo hace. Con --procesos la carga se reparte entre varios
+procesos cliente, para que el generador no sea el cuello de botella.
+
+Uso:
+    python bench/enjambre.py --local [--mesas 100] [--jugadores 2] [--duracion 30]
+    python bench/enjambre.py --local --trabajadores 4 --procesos 2 --codec binario --delta
+    python bench/enjambre.py --url ws://127.0.0.1:8001 --mesas 200 --procesos 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import websockets
+
+import codec
+from protocol import COLORES, MAX_JUGADORES
+
+PUERTO_LOCAL = 18600
+SIN_LIMITES = {presupuesto: {"conexion": (10 ** 6, 10 ** 6), "ip": (10 ** 6, 10 ** 6)}
+               for presupuesto in ("auth", "sync", "juego")}
+# Comandos cuya respuesta es un nuevo tablero
+MEDIDOS = ("LANZAR_DADOS", "MOVER_FICHA", "ELEGIR_FICHA_PREMIO")
+TABLEROS = ("TABLERO", "TABLERO_DELTA")
+CONTADORES = ("comandos", "movimientos", "partidas", "atascadas", "tramas", "eventos", "sin_tablero",
+              "errores_protocolo", "redirecciones", "errores")
+
+
+# ============================================
+# SERVIDOR LOCAL
+# ============================================
+
+def servir(puerto, trabajadores, modo_actor):
+    """Proceso del servidor de --local (SIGTERM lo detiene)"""
+    os.environ["PARQUES_LOG_NIVEL"] = "ERROR"
+    import logs
+    logs.configurar()
+    opciones = {"intervalo_estadisticas": 0, "limites_frecuencia": SIN_LIMITES}
+    if trabajadores > 1:
+        from supervisor import Supervisor
+        Supervisor("127.0.0.1", puerto, trabajadores, modo_actor=modo_actor, opciones=opciones).ejecutar()
+    else:
+        from server import ParchisServer
+        asyncio.run(ParchisServer("127.0.0.1", puerto, modo_actor=modo_actor, **opciones).iniciar())
+
+
+def esperar_puerto(host, puerto, timeout=20.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection((host, puerto), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nadie escucha en {host}:{puerto}")
+
+
+# ============================================
+# BOTS
+# ============================================
+
+class Medidas:
+    """Lo que recoge un proceso cliente (se suma entre procesos al final)"""
+
+    def __init__(self):
+        self.contadores = dict.fromkeys(CONTADORES, 0)
+        self.conexion = []                             # s hasta la BIENVENIDA
+        self.latencias = {tipo: [] for tipo in MEDIDOS}  # s de comando a TABLERO
+
+    def como_dict(self):
+        return {"contadores": self.contadores, "conexion": self.conexion, "latencias": self.latencias}
+
+
+async def unirse(url, sala, nombre, color, opciones, medidas):
+    """CONECTAR (siguiendo un REDIRIGIR del modo supervisor); retorna el socket tras la BIENVENIDA"""
+    inicio = time.perf_counter()
+    destino = url
+    while True:
+        ws = await websockets.connect(destino, ping_interval=None, max_size=None)
+        await ws.send(json.dumps({"tipo": "CONECTAR", "nombre": nombre, "color": color, "sala": sala,
+                                  "movimientos": True, "lote": True, **opciones}))
+        while True:
+            mensaje = codec.decodificar(await ws.recv())
+            if mensaje["tipo"] in ("BIENVENIDA", "REDIRIGIR", "ERROR"):
+                break
+        if mensaje["tipo"] == "BIENVENIDA":
+            medidas.conexion.append(time.perf_counter() - inicio)
+            return ws
+        await ws.close()
+        if mensaje["tipo"] == "ERROR":
+            raise RuntimeError(mensaje.get("mensaje"))
+        medidas.contadores["redirecciones"] += 1
+        destino = f"ws://{urlsplit(url).hostname}:{mensaje['puerto']}"
+
+
+class Bot:
+    """Jugador con política simple: lanza en su turno, mueve una opción legal al azar"""
+
+    def __init__(self, ws, color, medidas, azar):
+        self.ws = ws
+        self.color = color
+        self.medidas = medidas
+        self.azar = azar
+        # Tras dobles el servidor no repite el TURNO: si sigue siendo el nuestro, tras mover se vuelve a lanzar
+        self.mi_turno = False
+        self.pendiente = None  # (tipo, instante de envío) del comando que espera su TABLERO
+
+    async def enviar(self, accion):
+        if accion["tipo"] in MEDIDOS:
+            self.pendiente = (accion["tipo"], time.perf_counter())
+        self.medidas.contadores["comandos"] += 1
+        await self.ws.send(json.dumps(accion))
+
+    def _cerrar_pendiente(self, instante=None):
+        if self.pendiente is None:
+            return
+        tipo, enviado = self.pendiente
+        self.pendiente = None
+        if instante is None:
+            self.medidas.contadores["sin_tablero"] += 1
+        else:
+            self.medidas.latencias[tipo].append(instante - enviado)
+
+    async def jugar(self, progreso):
+        """Retorna cuando la partida termina o se cierra el socket"""
+        contadores = self.medidas.contadores
+        async for trama in self.ws:
+            recibido = time.perf_counter()
+            progreso[0] = time.monotonic()
+            mensaje = codec.decodificar(trama)
+            eventos = mensaje["eventos"] if mensaje["tipo"] == "LOTE" else [mensaje]
+            contadores["tramas"] += 1
+            contadores["eventos"] += len(eventos)
+            accion = None
+            relanzar = False
+            for evento in eventos:
+                tipo = evento["tipo"]
+                if tipo in TABLEROS:
+                    self._cerrar_pendiente(recibido)
+                elif tipo == "DETERMINACION_INICIO":
+                    accion = self._tirada_determinacion()
+                elif tipo == "DETERMINACION_EMPATE":
+                    if any(j.get("color") == self.color for j in evento.get("jugadores", ())):
+                        accion = self._tirada_determinacion()
+                elif tipo == "TURNO":
+                    self._cerrar_pendiente()
+                    self.mi_turno = relanzar = evento["color"] == self.color
+                    accion = None
+                elif tipo == "MOVIMIENTOS_LEGALES":
+                    opciones = evento["movimientos"]
+                    accion = {"tipo": "MOVER_FICHA", **self.azar.choice(opciones)} if opciones else None
+                elif tipo == "PREMIO_TRES_DOBLES" and evento["nombre"] == self.color:
+                    elegibles = evento["fichas_elegibles"]
+                    accion = {"tipo": "ELEGIR_FICHA_PREMIO",
+                              "ficha_id": self.azar.choice(elegibles)["id"] if elegibles else None}
+                elif tipo == "MOVIMIENTO_OK" and evento["color"] == self.color:
+                    contadores["movimientos"] += 1
+                    relanzar = True
+                elif tipo == "ERROR":
+                    self._cerrar_pendiente()
+                    contadores["errores_protocolo"] += 1
+                elif tipo == "VICTORIA":
+                    contadores["partidas"] += evento["color"] == self.color
+                    return
+            if accion is None and relanzar and self.mi_turno:
+                accion = {"tipo": "LANZAR_DADOS"}
+            if accion is not None:
+                await self.enviar(accion)
+
+    def _tirada_determinacion(self):
+        return {"tipo": "DETERMINACION_TIRADA", "dado1": self.azar.randint(1, 6), "dado2": self.azar.randint(1, 6)}
+
+
+async def mesa(url, fin, prefijo, jugadores, opciones, sin_progreso, medidas, azar):
+    """Una mesa: partidas seguidas, cada una en una sala nueva, hasta `fin`"""
+    n = 0
+    while time.monotonic() < fin:
+        n += 1
+        sala = f"{prefijo}P{n}"
+        sockets = []
+        try:
+            for color in COLORES[:jugadores]:
+                sockets.append(await asyncio.wait_for(unirse(url, sala, color, color, opciones, medidas), 10.0))
+            progreso = [time.monotonic()]
+            bots = [Bot(ws, color, medidas, azar) for ws, color in zip(sockets, COLORES)]
+            tareas = [asyncio.ensure_future(bot.jugar(progreso)) for bot in bots]
+            if jugadores < MAX_JUGADORES:
+                # Con la sala llena el servidor arranca solo: un LISTO repetiría la determinación
+                await sockets[0].send(json.dumps({"tipo": "LISTO"}))
+            while time.monotonic() < fin and not any(t.done() for t in tareas):
+                await asyncio.sleep(0.1)
+                if time.monotonic() - progreso[0] > sin_progreso:
+                    medidas.contadores["atascadas"] += 1
+                    break
+            for tarea in tareas:
+                tarea.cancel()
+        except (OSError, asyncio.TimeoutError, RuntimeError, websockets.exceptions.WebSocketException):
+            medidas.contadores["errores"] += 1
+            await asyncio.sleep(0.5)
+        finally:
+            for ws in sockets:
+                await ws.close()
+
+
+async def carga(url, mesas, jugadores, opciones, duracion, rampa, sin_progreso, indice, semilla):
+    medidas = Medidas()
+    azar = random.Random(semilla + indice)
+    prefijo = f"E{os.getpid()}X{indice}"
+    inicio = time.monotonic()
+    fin = inicio + rampa + duracion
+
+    async def escalonada(i):
+        # Las mesas entran repartidas a lo largo de la rampa, no todas en el mismo instante
+        await asyncio.sleep(rampa * i / max(1, mesas))
+        await mesa(url, fin, f"{prefijo}M{i}", jugadores, opciones, sin_progreso, medidas, azar)
+
+    await asyncio.gather(*(escalonada(i) for i in range(mesas)))
+    return medidas.como_dict()
+
+
+def proceso_cliente(argumentos):
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(carga(*argumentos))
+
+
+# ============================================
+# INFORME
+# ============================================
+
+def percentiles(valores, cuantiles=(50, 95, 99)):
+    """Percentiles por rango más cercano, en ms"""
+    if not valores:
+        return [float("nan")] * len(cuantiles)
+    ordenados = sorted(valores)
+    return [ordenados[min(len(ordenados) - 1, max(0, round(q / 100 * len(ordenados)) - 1))] * 1000
+            for q in cuantiles]
+
+
+def combinar(parciales):
+    total = Medidas()
+    for parcial in parciales:
+        for clave, valor in parcial["contadores"].items():
+            total.contadores[clave] += valor
+        total.conexion.extend(parcial["conexion"])
+        for tipo, valores in parcial["latencias"].items():
+            total.latencias[tipo].extend(valores)
+    return total
+
+
+def informar(medidas, duracion, sesiones):
+    c = medidas.contadores
+    print(f"\n{sesiones} sesiones websocket, {duracion:.0f}s medidos\n")
+    print(f"{'':22s} {'n':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    print(f"{'conexión':22s} {len(medidas.conexion):8d} " + " ".join(f"{p:8.2f}" for p in percentiles(medidas.conexion)))
+    todas = [v for valores in medidas.latencias.values() for v in valores]
+    print(f"{'comando→TABLERO':22s} {len(todas):8d} " + " ".join(f"{p:8.2f}" for p in percentiles(todas)))
+    for tipo, valores in medidas.latencias.items():
+        if valores:
+            print(f"{'  ' + tipo:22s} {len(valores):8d} " + " ".join(f"{p:8.2f}" for p in percentiles(valores)))
+    print(f"\ncomandos/s {c['comandos'] / duracion:.0f}   movimientos/s {c['movimientos'] / duracion:.0f}   "
+          f"partidas/s {c['partidas'] / duracion:.2f}   eventos/s {c['eventos'] / duracion:.0f} "
+          f"({c['tramas'] / duracion:.0f} tramas/s)")
+    print(f"partidas {c['partidas']}   atascadas {c['atascadas']}   sin TABLERO {c['sin_tablero']}   "
+          f"ERROR recibidos {c['errores_protocolo']}   redirecciones {c['redirecciones']}   errores {c['errores']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--url", help="servidor ya en marcha, p. ej. ws://127.0.0.1:8001")
+    destino.add_argument("--local", action="store_true", help="levanta un servidor propio en 127.0.0.1")
+    parser.add_argument("--trabajadores", type=int, default=1, help="con --local: >1 usa el modo supervisor")
+    parser.add_argument("--modo-actor", action="store_true", help="con --local")
+    parser.add_argument("--mesas", type=int, default=100, help="salas jugando a la vez (en total)")
+    parser.add_argument("--jugadores", type=int, default=2, choices=range(2, len(COLORES) + 1))
+    parser.add_argument("--duracion", type=float, default=30.0, help="segundos de carga, además de la rampa")
+    parser.add_argument("--rampa", type=float, default=2.0, help="segundos para ir abriendo las mesas")
+    parser.add_argument("--procesos", type=int, default=1, help="procesos cliente que generan la carga")
+    parser.add_argument("--sin-progreso", type=float, default=5.0, help="segundos sin recibir nada = atascada")
+    parser.add_argument("--codec", choices=tuple(codec.CODECS), default=codec.CODEC_JSON)
+    parser.add_argument("--delta", action="store_true", help="aceptar TABLERO_DELTA")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    opciones = {"codec": args.codec, "delta": args.delta}
+    contexto = multiprocessing.get_context("spawn")
+    servidor = None
+    url = args.url
+    if args.local:
+        puerto = PUERTO_LOCAL + random.randrange(100) * 10
+        servidor = contexto.Process(target=servir, args=(puerto, args.trabajadores, args.modo_actor))
+        servidor.start()
+        esperar_puerto("127.0.0.1", puerto)
+        for indice in range(args.trabajadores if args.trabajadores > 1 else 0):
+            esperar_puerto("127.0.0.1", puerto + 1 + indice)
+        url = f"ws://127.0.0.1:{puerto}"
+
+    print(f"{url}: {args.mesas} mesas x {args.jugadores} jugadores en {args.procesos} procesos, "
+          f"codec {args.codec}{', delta' if args.delta else ''}")
+    reparto = [args.mesas // args.procesos + (i < args.mesas % args.procesos) for i in range(args.procesos)]
+    try:
+        with contexto.Pool(args.procesos) as pool:
+            parciales = pool.map(proceso_cliente, [
+                (url, mesas, args.jugadores, opciones, args.duracion, args.rampa, args.sin_progreso, i, args.semilla)
+                for i, mesas in enumerate(reparto) if mesas
+            ])
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.join()
+    informar(combinar(parciales), args.duracion + args.rampa, args.mesas * args.jugadores)
+
+
+if __name__ == "__main__":
+    main()
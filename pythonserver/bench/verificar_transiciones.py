@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Verificación exhaustiva de la tabla de transiciones de gameFile.
+
+Para cada color, estado, casilla (o posición en el camino a meta) y número
+de pasos compara gameToken.mover (tabla O(1)) con mover_paso_a_paso (la
+simulación casilla por casilla original): mismo retorno y mismo estado,
+posicion y posicion_meta final. Incluye pasos fuera de la tabla para
+comprobar el respaldo. Al final mide el tiempo de ambos.
+
+Uso:
+    python bench/verificar_transiciones.py
+Sale con código 1 si encuentra alguna diferencia.
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import gameFile as tkn
+from parchis import Table
+
+PASOS_A_PROBAR = range(0, tkn.PASOS_MAXIMOS + 9)
+
+
+def fichas_iniciales(color):
+    """Todas las situaciones posibles de una ficha de `color`"""
+    yield ("BLOQUEADO", -1, -1)
+    yield ("META", -1, tkn.POSICION_META)
+    for posicion in range(tkn.CASILLAS_TABLERO):
+        yield (tkn.ESTADO_EN_JUEGO, posicion, -1)
+    for posicion_meta in range(tkn.POSICION_META):
+        yield (tkn.ESTADO_CAMINO_META, -1, posicion_meta)
+
+
+def crear_ficha(color, estado, posicion, posicion_meta):
+    ficha = tkn.gameToken(color, estado)
+    ficha.posicion = posicion
+    ficha.posicion_meta = posicion_meta
+    return ficha
+
+
+def foto(ficha):
+    return (ficha.estado, ficha.posicion, ficha.posicion_meta)
+
+
+def casos(tablero):
+    for color in tablero.seguro_meta:
+        for inicial in fichas_iniciales(color):
+            for pasos in PASOS_A_PROBAR:
+                yield color, inicial, pasos
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    tablero = Table()
+
+    diferencias = 0
+    total = 0
+    for color, inicial, pasos in casos(tablero):
+        total += 1
+        con_tabla = crear_ficha(color, *inicial)
+        referencia = crear_ficha(color, *inicial)
+        ok_tabla = con_tabla.mover(pasos, tablero)
+        ok_ref = referencia.mover_paso_a_paso(pasos, tablero)
+        if ok_tabla != ok_ref or foto(con_tabla) != foto(referencia):
+            diferencias += 1
+            if diferencias <= 20:
+                print(f"✗ {color} {inicial} +{pasos}: tabla={ok_tabla} {foto(con_tabla)} "
+                      f"paso_a_paso={ok_ref} {foto(referencia)}")
+        # puede_mover debe coincidir con el resultado de la simulación
+        if 0 < pasos <= tkn.PASOS_MAXIMOS and inicial[0] in (tkn.ESTADO_EN_JUEGO, tkn.ESTADO_CAMINO_META):
+            if crear_ficha(color, *inicial).puede_mover(pasos, tablero) != ok_ref:
+                diferencias += 1
+                print(f"✗ puede_mover {color} {inicial} +{pasos} no coincide")
+
+    print(f"{total} movimientos comparados, {diferencias} diferencias")
+
+    # Tiempo de ambos caminos sobre los movimientos que cubre la tabla
+    en_tabla = [(c, i, p) for c, i, p in casos(tablero)
+                if 0 < p <= tkn.PASOS_MAXIMOS and i[0] in (tkn.ESTADO_EN_JUEGO, tkn.ESTADO_CAMINO_META)]
+    for metodo in ("mover_paso_a_paso", "mover"):
+        fichas = [(crear_ficha(c, *i), p) for c, i, p in en_tabla]
+        inicio = time.perf_counter()
+        for ficha, pasos in fichas:
+            getattr(ficha, metodo)(pasos, tablero)
+        duracion = time.perf_counter() - inicio
+        print(f"{metodo:18s} {len(en_tabla) / duracion:12.0f} movimientos/s")
+
+    return 1 if diferencias else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,24 @@
 import asyncio
 import websockets
-import json
 import time
 import protocol as proto
+import codec
+import sincronia
 import logging
 # Desactivar logs de websockets
 logging.getLogger('websockets').setLevel(logging.ERROR)  # o logging.WARNING
 
 class ParchisClient:
-    def __init__(self, servidor_ip, servidor_puerto):
+    def __init__(self, servidor_ip, servidor_puerto, sala=None, binario=False):
         self.servidor_ip = servidor_ip
         self.servidor_puerto = servidor_puerto
+        self.sala = sala  # Código de sala dentro del servidor (None = sala por defecto)
+        # ⭐ NUEVO: codec pedido en CONECTAR; se usa para enviar solo cuando BIENVENIDA lo confirma
+        self.codec_pedido = codec.CODEC_BINARIO if binario else None
+        self.codec = codec.CODEC_JSON
+        self.ultimo_lote = 0  # seq del último LOTE recibido
         self.websocket = None
+        self.tarea_recepcion = None
         self.conectado = False
         self.running = False
 
@@ -44,6 +51,7 @@ class ParchisClient:
         self.ultimo_es_doble = False
         self.dobles_consecutivos = 0
         self.dados_usados = []
+        self.movimientos_legales = []  # ⭐ NUEVO: [(ficha_id, dado_elegido)] enviados por el servidor
         
         # Control de flujo mejorado
         self.esperando_dados = False
@@ -70,115 +78,109 @@ class ParchisClient:
         self.rtt_promedio = 0.0
         self.sincronizado = False
         self.historial_offsets = []
+        # ⭐ Sondeos continuos: filtro de mínimo RTT + deriva; las respuestas llegan por futuros, no por la cola
+        self.reloj = sincronia.EstimadorReloj()
+        self._sync_pendientes = {}  # {t1: futuro con (t2, t3, t4)}
+        self.tarea_sincronizacion = None
+        self.intervalo_sincronizacion = 15.0
+        self.sondeos_por_rafaga = 4
 
     """
     sincronizar_reloj()
-_esperar_sync_response()
+sondear_reloj()
 _calcular_std()
 obtener_tiempo_sincronizado()
 mostrar_info_sincronizacion()
     """
 
     async def sincronizar_reloj(self, rondas=5):
+        """Ráfaga inicial de sondeos (con informe en pantalla) y arranque de los sondeos en segundo plano"""
 
         print("\n" + "="*60)
         print("⏱️  SINCRONIZACIÓN DE RELOJ".center(60))
         print("="*60)
         print(f"Realizando {rondas} rondas de sincronización...")
     
-        offsets = []
-        rtts = []
-    
+        exitosas = 0
         for ronda in range(rondas):
             try:
-                # T1: Timestamp del cliente al enviar
-                t1 = time.time()
-            
-                # Enviar solicitud de sincronización
-                await self.enviar(proto.mensaje_sync_request(t1))
-            
-                # Esperar respuesta (con timeout)
-                respuesta = await self._esperar_sync_response(timeout=2.0)
-            
-                if not respuesta:
-                    print(f"⚠️  Ronda {ronda + 1}/{rondas}: Timeout")
-                    continue
-            
-                # T4: Timestamp del cliente al recibir
-                t4 = time.time()
-            
-                # Extraer timestamps del servidor
-                t1_eco = respuesta.get("t1")
-                t2 = respuesta.get("t2")  # Servidor recibió
-                t3 = respuesta.get("t3")  # Servidor envió
-            
-                # Verificar que T1 coincida (validación)
-                if abs(t1 - t1_eco) > 0.001:  # Tolerancia de 1ms
-                    print(f"⚠️  Ronda {ronda + 1}/{rondas}: T1 no coincide")
-                    continue
-            
-                # Calcular RTT (Round Trip Time)
-                rtt = (t4 - t1) - (t3 - t2)
-            
-                # Calcular offset del reloj
-                # offset = ((T2 - T1) + (T3 - T4)) / 2
-                offset = ((t2 - t1) + (t3 - t4)) / 2
-            
-                offsets.append(offset)
-                rtts.append(rtt)
-            
-                print(f"✓ Ronda {ronda + 1}/{rondas}: "
-                    f"offset={offset*1000:.2f}ms, RTT={rtt*1000:.2f}ms")
-            
+                muestra = await self.sondear_reloj(timeout=2.0)
             except Exception as e:
                 print(f"❌ Error en ronda {ronda + 1}: {e}")
                 continue
+            if muestra is None:
+                print(f"⚠️  Ronda {ronda + 1}/{rondas}: Timeout o muestra descartada")
+                continue
+            exitosas += 1
+            print(f"✓ Ronda {ronda + 1}/{rondas}: "
+                  f"offset={muestra.offset*1000:.2f}ms, RTT={muestra.rtt*1000:.2f}ms")
+        self._cerrar_rafaga()
     
-        if not offsets:
+        if not exitosas:
             print("\n❌ Sincronización FALLIDA: No se completó ninguna ronda")
             return False
     
-        # Calcular promedios
-        self.clock_offset = sum(offsets) / len(offsets)
-        self.rtt_promedio = sum(rtts) / len(rtts)
-        self.historial_offsets = offsets
-        self.sincronizado = True
-    
         # Mostrar resultados
         print("\n" + "-"*60)
         print("📊 RESULTADOS DE SINCRONIZACIÓN:")
-        print(f"   • Offset del reloj: {self.clock_offset*1000:.2f} ms")
-        print(f"   • RTT promedio: {self.rtt_promedio*1000:.2f} ms")
-        print(f"   • Desviación estándar: {self._calcular_std(offsets)*1000:.2f} ms")
-        print(f"   • Rondas exitosas: {len(offsets)}/{rondas}")
+        print(f"   • Offset del reloj (muestra de menor RTT): {self.clock_offset*1000:.2f} ms")
+        print(f"   • RTT mínimo: {self.rtt_promedio*1000:.2f} ms")
+        print(f"   • Desviación estándar: {self._calcular_std(self.historial_offsets)*1000:.2f} ms")
+        print(f"   • Rondas exitosas: {exitosas}/{rondas}")
         print("="*60 + "\n")
-    
+
+        if self.tarea_sincronizacion is None or self.tarea_sincronizacion.done():
+            self.tarea_sincronizacion = asyncio.create_task(self._bucle_sincronizacion())
         return True
-    
-    async def _esperar_sync_response(self, timeout=2.0):
 
-        tiempo_inicio = time.time()
-    
-        while (time.time() - tiempo_inicio) < timeout:
-            # Procesar mensajes de la cola
-            if not self.cola_mensajes.empty():
-                try:
-                    mensaje = self.cola_mensajes.get_nowait()
-                
-                    # Si es SYNC_RESPONSE, devolverlo
-                    if mensaje.get("tipo") == proto.MSG_SYNC_RESPONSE:
-                        return mensaje
-                    else:
-                        # Si es otro mensaje, volver a ponerlo en la cola
-                        await self.cola_mensajes.put(mensaje)
-                    
-                except asyncio.QueueEmpty:
-                    pass
-        
-            await asyncio.sleep(0.01)  # 10ms
+    async def sondear_reloj(self, timeout=2.0):
+        """Un intercambio SYNC_REQUEST/SYNC_RESPONSE. Retorna la muestra o None (timeout / descartada)"""
+        futuro = asyncio.get_running_loop().create_future()
+        t1 = sincronia.ahora()
+        self._sync_pendientes[t1] = futuro
+        try:
+            # El servidor guarda la estimación actual de cada jugador (latencia por jugador)
+            if self.reloj.sincronizado:
+                await self.enviar(proto.mensaje_sync_request(t1, self.reloj.offset_en(t1), self.reloj.rtt))
+            else:
+                await self.enviar(proto.mensaje_sync_request(t1))
+            t2, t3, t4 = await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._sync_pendientes.pop(t1, None)
+        return self.reloj.agregar(t1, t2, t3, t4)
+
+    def _resolver_sync(self, mensaje, t4):
+        """SYNC_RESPONSE recibido: completa el sondeo pendiente con su t1 (t4 sellado al leer la trama)"""
+        futuro = self._sync_pendientes.get(mensaje.get("t1"))
+        if futuro is not None and not futuro.done():
+            futuro.set_result((mensaje.get("t2"), mensaje.get("t3"), t4))
+
+    def _cerrar_rafaga(self):
+        self.reloj.cerrar_rafaga()
+        if self.reloj.sincronizado:
+            self.clock_offset = self.reloj.offset_en()
+            self.rtt_promedio = self.reloj.rtt
+            self.historial_offsets = self.reloj.historial()
+            self.sincronizado = True
+
+    async def _bucle_sincronizacion(self):
+        """Ráfagas periódicas de sondeos mientras dure la sesión"""
+        try:
+            while self.running:
+                await asyncio.sleep(self.intervalo_sincronizacion)
+                if not self.conectado:
+                    continue
+                for _ in range(self.sondeos_por_rafaga):
+                    await self.sondear_reloj()
+                    await asyncio.sleep(0.05)
+                self._cerrar_rafaga()
+                self.log_debug(f"Reloj: offset={self.clock_offset*1000:.2f}ms RTT={self.rtt_promedio*1000:.2f}ms "
+                               f"deriva={self.reloj.deriva*1e6:.1f}ppm")
+        except asyncio.CancelledError:
+            pass
     
-        return None
-
     def _calcular_std(self, valores):
         """Calcula la desviación estándar de una lista de valores"""
         if len(valores) < 2:
@@ -194,7 +196,8 @@ mostrar_info_sincronizacion()
             print("⚠️  Advertencia: Reloj no sincronizado, usando tiempo local")
             return time.time()
     
-        return time.time() + self.clock_offset
+        instante = sincronia.ahora()
+        return instante + self.reloj.offset_en(instante)
 
     def mostrar_info_sincronizacion(self):
         """Muestra información sobre la sincronización actual"""
@@ -207,7 +210,8 @@ mostrar_info_sincronizacion()
         print("="*60)
         print(f"Estado: {'✅ SINCRONIZADO' if self.sincronizado else '❌ NO SINCRONIZADO'}")
         print(f"Offset del reloj: {self.clock_offset*1000:.2f} ms")
-        print(f"RTT promedio: {self.rtt_promedio*1000:.2f} ms")
+        print(f"RTT mínimo: {self.rtt_promedio*1000:.2f} ms")
+        print(f"Deriva estimada: {self.reloj.deriva*1e6:.1f} ppm")
     
         if self.historial_offsets:
             print(f"Mejor offset: {min(self.historial_offsets)*1000:.2f} ms")
@@ -253,7 +257,7 @@ mostrar_info_sincronizacion()
             print(f"✅ Conectado al servidor {uri}")
 
             print(f"🔍 DEBUG: Iniciando tarea de recepción")
-            asyncio.create_task(self.recibir_mensajes())
+            self.tarea_recepcion = asyncio.create_task(self.recibir_mensajes())
 
             await asyncio.sleep(0.1)
 
@@ -283,7 +287,8 @@ mostrar_info_sincronizacion()
             print(f"✅ Color seleccionado: {color_elegido}")
             
             # Enviar mensaje de conexión CON el color elegido
-            mensaje = proto.mensaje_conectar(nombre, color_elegido)  # 🆕 Agregar color
+            mensaje = proto.mensaje_conectar(nombre, color_elegido, self.sala, delta=True, movimientos=True,
+                                             codec=self.codec_pedido, lote=True)  # 🆕 Agregar color, sala, TABLERO_DELTA, MOVIMIENTOS_LEGALES, codec y LOTE
             print(f"🔍 DEBUG: Enviando mensaje CONECTAR: {mensaje}")
             
             await self.enviar(mensaje)
@@ -302,7 +307,7 @@ mostrar_info_sincronizacion()
         """Solicita al servidor la lista de colores disponibles"""
         try:
             # Enviar solicitud
-            mensaje = proto.mensaje_solicitar_colores()
+            mensaje = proto.mensaje_solicitar_colores(self.sala)
             await self.enviar(mensaje)
             
             # Esperar respuesta (con timeout)
@@ -320,6 +325,11 @@ mostrar_info_sincronizacion()
                     if mensaje.get("tipo") == proto.MSG_COLORES_DISPONIBLES:
                         colores = mensaje.get("colores", [])
                         return colores
+                    elif mensaje.get("tipo") == proto.MSG_REDIRIGIR:
+                        # ⭐ Servidor con varios trabajadores: la sala vive en otro puerto
+                        await self.seguir_redireccion(mensaje.get("puerto"))
+                        await self.enviar(proto.mensaje_solicitar_colores(self.sala))
+                        tiempo_inicio = asyncio.get_event_loop().time()
                     else:
                         # Si no es el mensaje esperado, volver a poner en cola
                         await self.cola_mensajes.put(mensaje)
@@ -334,6 +344,21 @@ mostrar_info_sincronizacion()
             print(f"❌ Error solicitando colores: {e}")
             return None
 
+    async def seguir_redireccion(self, puerto):
+        """Cierra la conexión actual y reconecta al puerto del trabajador que aloja la sala"""
+        print(f"↪️  La sala {self.sala or 'por defecto'} está en el puerto {puerto}, reconectando...")
+        await self.websocket.close()
+        if self.tarea_recepcion is not None:
+            await self.tarea_recepcion
+        self.servidor_puerto = puerto
+        self.websocket = await websockets.connect(
+            f"ws://{self.servidor_ip}:{self.servidor_puerto}",
+            ping_interval=20,
+            ping_timeout=10
+        )
+        self.conectado = True
+        self.tarea_recepcion = asyncio.create_task(self.recibir_mensajes())
+
     async def elegir_color(self, colores_disponibles):
         """
         Permite al usuario elegir un color de los disponibles.
@@ -382,21 +407,39 @@ mostrar_info_sincronizacion()
         print(f"🔍 DEBUG: recibir_mensajes() iniciado")
         try:
             async for mensaje_raw in self.websocket:
+                # ⭐ t4 del sync: al leer la trama, antes de decodificar e imprimir
+                recibido = sincronia.ahora()
                 print(f"🔍 DEBUG: Mensaje recibido del servidor: {mensaje_raw[:100]}")
                 try:
                     if not mensaje_raw or not mensaje_raw.strip():
                         self.log_debug("Mensaje vacío recibido")
                         continue
                     
-                    mensaje = json.loads(mensaje_raw)
+                    # Texto = JSON, binario = codec binario
+                    mensaje = codec.decodificar(mensaje_raw)
                     print(f"🔍 DEBUG: Mensaje parseado: {mensaje}")
                     
+                    # ⭐ LOTE: los eventos de un comando llegan juntos y en orden
+                    if mensaje.get("tipo") == proto.MSG_LOTE:
+                        self.ultimo_lote = mensaje.get("seq", self.ultimo_lote)
+                        for evento in mensaje.get("eventos", []):
+                            if evento.get("tipo") == proto.MSG_SYNC_RESPONSE:
+                                self._resolver_sync(evento, recibido)
+                            else:
+                                await self.cola_mensajes.put(evento)
+                        continue
+                    
+                    # ⭐ Las respuestas de sync van a su sondeo, no a la cola del juego
+                    if mensaje.get("tipo") == proto.MSG_SYNC_RESPONSE:
+                        self._resolver_sync(mensaje, recibido)
+                        continue
+                    
                     # Agregar a la cola
                     await self.cola_mensajes.put(mensaje)
                     print(f"🔍 DEBUG: Mensaje agregado a cola")
                     
-                except json.JSONDecodeError as e:
-                    print(f"🔍 DEBUG: Error parseando JSON: {e}")
+                except codec.TramaInvalida as e:
+                    print(f"🔍 DEBUG: Error decodificando mensaje: {e}")
                 except Exception as e:
                     print(f"🔍 DEBUG: Error procesando mensaje: {e}")
                     
@@ -436,6 +479,7 @@ mostrar_info_sincronizacion()
         self.esperando_dados = False
         self.esperando_movimiento = False
         self.dados_usados = []
+        self.movimientos_legales = []
         self.log_debug("🔄 Estado de dados reseteado para nuevo turno")
     
     async def manejar_mensaje(self, mensaje):
@@ -446,6 +490,8 @@ mostrar_info_sincronizacion()
         if tipo == proto.MSG_BIENVENIDA:
             self.mi_color = mensaje["color"]
             self.mi_id = mensaje["jugador_id"]
+            self.sala = mensaje.get("sala", self.sala)
+            self.codec = mensaje.get("codec", codec.CODEC_JSON)
             print(f"\n🎨 Te asignaron el color: {self.mi_color.upper()}")
             print(f"👤 Tu ID: {self.mi_id}")
 
@@ -495,6 +541,11 @@ mostrar_info_sincronizacion()
                 print(f"🎯 ES TU TURNO 🎯".center(60))
             else:
                 print(f"⏳ Turno de {nombre} ({color.upper()})".center(60))
+            # ⭐ Plazo del turno en el reloj del servidor: se convierte con el offset estimado
+            plazo = mensaje.get("plazo")
+            if plazo is not None:
+                restante = plazo - (sincronia.ahora() + self.reloj.offset_en())
+                print(f"⏰ Tiempo para jugar: {max(0.0, restante):.0f}s".center(60))
             print("─"*60)
 
         elif tipo == proto.MSG_DADOS:
@@ -505,6 +556,7 @@ mostrar_info_sincronizacion()
             self.dados_lanzados = True
             self.esperando_dados = False
             self.dados_usados = []
+            self.movimientos_legales = []
 
             if self.es_mi_turno:
                 dobles_msg = "¡DOBLES! 🎉" if self.ultimo_es_doble else ""
@@ -531,6 +583,13 @@ mostrar_info_sincronizacion()
             if "jugadores" in mensaje:
                 self.jugadores = mensaje["jugadores"]
 
+        elif tipo == proto.MSG_TABLERO_DELTA:
+            await self.aplicar_delta_tablero(mensaje)
+
+        elif tipo == proto.MSG_MOVIMIENTOS_LEGALES:
+            self.movimientos_legales = [(m["ficha_id"], m["dado_elegido"]) for m in mensaje.get("movimientos", [])]
+            self.log_debug(f"Movimientos legales: {self.movimientos_legales}")
+
         elif tipo == proto.MSG_MOVIMIENTO_OK:
             nombre = mensaje["nombre"]
             color = mensaje["color"]
@@ -771,7 +830,7 @@ mostrar_info_sincronizacion()
     async def enviar(self, mensaje):
         """Envía un mensaje al servidor"""
         try:
-            data = json.dumps(mensaje, ensure_ascii=False)
+            data = codec.codificar(mensaje, self.codec)
             await self.websocket.send(data)
             self.log_debug(f"Mensaje enviado: {mensaje}")
         except Exception as e:
@@ -816,6 +875,37 @@ mostrar_info_sincronizacion()
         
         return self.ultimo_movimiento_exitoso
     
+    async def aplicar_delta_tablero(self, delta):
+        """
+        Aplica un TABLERO_DELTA sobre el último tablero conocido.
+        Si la versión base no coincide (se perdió una actualización) se
+        descarta y se pide el TABLERO completo.
+        """
+        if not self.estado_tablero or self.estado_tablero.get("version") != delta.get("base"):
+            await self.enviar(proto.mensaje_solicitar_tablero())
+            return
+
+        self.estado_tablero.update(delta.get("turno", {}))
+        jugadores_por_color = {j["color"]: j for j in self.estado_tablero.get("jugadores", [])}
+
+        for ficha in delta.get("fichas", []):
+            jugador = jugadores_por_color.get(ficha["color"])
+            if jugador is None or ficha["id"] >= len(jugador["fichas"]):
+                await self.enviar(proto.mensaje_solicitar_tablero())
+                return
+            jugador["fichas"][ficha["id"]] = ficha
+
+        # Recalcular contadores de los jugadores afectados
+        for color in {ficha["color"] for ficha in delta.get("fichas", [])}:
+            jugador = jugadores_por_color[color]
+            estados = [f["estado"] for f in jugador["fichas"]]
+            jugador["bloqueadas"] = estados.count(proto.ESTADO_BLOQUEADO)
+            jugador["en_juego"] = estados.count(proto.ESTADO_EN_JUEGO)
+            jugador["en_meta"] = estados.count(proto.ESTADO_META)
+
+        self.estado_tablero["version"] = delta["version"]
+        self.jugadores = self.estado_tablero["jugadores"]
+
     def mostrar_estado_dados(self):
         """Muestra el estado actual de los dados"""
         if self.dados_lanzados and self.es_mi_turno:
@@ -824,6 +914,15 @@ mostrar_info_sincronizacion()
         else:
             print("🎲 No se han lanzado dados en este turno")
     
+    def mostrar_movimientos_legales(self):
+        """Muestra los movimientos que el servidor acepta con los dados actuales"""
+        if not self.movimientos_legales:
+            return
+        nombres = {1: f"dado 1 ({self.ultimo_dado1})", 2: f"dado 2 ({self.ultimo_dado2})", 3: f"suma ({self.ultima_suma})"}
+        print("💡 Movimientos válidos:")
+        for ficha_id, dado in self.movimientos_legales:
+            print(f"   Ficha {ficha_id + 1} con {nombres[dado]}")
+    
     def mostrar_mis_fichas(self):
         """Muestra las fichas del jugador actual"""
         if not self.estado_tablero or "jugadores" not in self.estado_tablero:
@@ -1372,6 +1471,7 @@ mostrar_info_sincronizacion()
         print("─"*50)
         
         self.mostrar_mis_fichas()
+        self.mostrar_movimientos_legales()
         
         try:
             loop = asyncio.get_event_loop()
@@ -1440,6 +1540,8 @@ mostrar_info_sincronizacion()
         """Desconecta del servidor"""
         self.running = False
         self.conectado = False
+        if self.tarea_sincronizacion is not None:
+            self.tarea_sincronizacion.cancel()
         if self.websocket:
             try:
                 await self.websocket.close()
@@ -1460,7 +1562,10 @@ async def main():
     except:
         SERVIDOR_PUERTO = 8001
     
-    cliente = ParchisClient(SERVIDOR_IP, SERVIDOR_PUERTO)
+    SALA = input("Código de sala (Enter para la sala por defecto): ").strip() or None
+    BINARIO = input("¿Usar codec binario? (s/N): ").strip().lower() == "s"
+    
+    cliente = ParchisClient(SERVIDOR_IP, SERVIDOR_PUERTO, SALA, BINARIO)
     
     try:
         await cliente.ejecutar()
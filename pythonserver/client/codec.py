@@ -0,0 +1,503 @@
+"""
+Codec binario opcional del protocolo, negociado en CONECTAR con
+"codec": "binario". JSON sigue siendo el formato por defecto.
+
+Cada trama binaria es:
+
+    byte 0      etiqueta: índice del tipo en TIPOS (bit 7 = carga JSON)
+    bytes 1..   carga empaquetada con struct para los mensajes frecuentes
+                (TABLERO, TABLERO_DELTA, DADOS, TURNO, MOVIMIENTO_OK...);
+                para el resto, el dict sin "tipo" en JSON compacto
+
+Colores y estados viajan como índices, y cada ficha en 16 bits con la
+misma disposición que estado_compacto (bit 15 = lleva posicion_meta).
+Si un mensaje frecuente trae campos o valores que el empaquetado no
+cubre, se envía con carga JSON: decodificar(codificar(m)) == m siempre.
+
+El tipo de trama websocket distingue el formato: str = JSON, bytes = binario.
+"""
+
+import json
+import struct
+
+import protocol as proto
+
+CODEC_JSON = "json"
+CODEC_BINARIO = "binario"
+CODECS = (CODEC_JSON, CODEC_BINARIO)
+
+# ⚠️ Solo se añaden tipos al final: el índice es la etiqueta en la trama.
+# La etiqueta 0 lleva el mensaje completo (con "tipo") en JSON.
+TIPOS = (
+    None,
+    "CONECTAR", "LANZAR_DADOS", "SACAR_CARCEL", "MOVER_FICHA", "DESCONECTAR", "LISTO",
+    "SACAR_TODAS", "SOLICITAR_COLORES", "SOLICITAR_TABLERO", "SOLICITAR_MOVIMIENTOS",
+    "REGISTRAR_USUARIO", "LOGIN_USUARIO", "OBTENER_ESTADISTICAS",
+    "BIENVENIDA", "ESPERANDO", "INICIO_JUEGO", "TURNO", "DADOS", "TABLERO", "TABLERO_DELTA",
+    "MOVIMIENTOS_LEGALES", "MOVIMIENTO_OK", "ERROR", "VICTORIA", "JUGADOR_DESCONECTADO",
+    "CAPTURA", "INFO", "COLORES_DISPONIBLES",
+    "REGISTRO_EXITOSO", "LOGIN_EXITOSO", "ESTADISTICAS",
+    "DETERMINACION_INICIO", "DETERMINACION_TIRADA", "DETERMINACION_RESULTADO",
+    "DETERMINACION_EMPATE", "DETERMINACION_GANADOR",
+    "SYNC_REQUEST", "SYNC_RESPONSE",
+    "PREMIO_TRES_DOBLES", "ELEGIR_FICHA_PREMIO", "FICHA_A_META", "DEBUG_FORZAR_TRES_DOBLES",
+    "LOTE",
+)
+ETIQUETAS = {tipo: etiqueta for etiqueta, tipo in enumerate(TIPOS) if tipo}
+BIT_JSON = 0x80
+
+ESTADOS = ("BLOQUEADO", "EN_JUEGO", "CAMINO_META", "META")
+CODIGO_ESTADO = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+CODIGO_COLOR = {color: codigo for codigo, color in enumerate(proto.COLORES)}
+
+# Mismos campos y orden que GameManager.CAMPOS_TURNO, con su tipo
+CAMPOS_TURNO = (
+    ("turno_actual", int), ("dados_lanzados", bool), ("ultimo_dado1", int),
+    ("ultimo_dado2", int), ("ultima_suma", int), ("ultimo_es_doble", bool),
+    ("dobles_consecutivos", int), ("accion_realizada", bool), ("debe_avanzar_turno", bool),
+)
+_NOMBRES_TURNO = frozenset(campo for campo, _ in CAMPOS_TURNO)
+
+ACCIONES_MOVIMIENTO = (None, "liberar_ficha")
+
+TIENE_POSICION_META = 0x8000
+# Bit 7 del byte de color de un TURNO: le sigue el plazo (f64)
+TURNO_CON_PLAZO = 0x80
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_I8 = struct.Struct("<b")
+_F64 = struct.Struct("<d")
+_TURNO = struct.Struct("<" + "b" * len(CAMPOS_TURNO))
+_DADOS = struct.Struct("<BBBB")
+_MOVIMIENTO = struct.Struct("<BBBhh")
+_CAPTURA = struct.Struct("<BB")
+_MOVER = struct.Struct("<BB")
+_VERSIONES = struct.Struct("<II")
+_JUGADOR = struct.Struct("<BHBBBB")
+_FICHA_DELTA = struct.Struct("<BH")
+_SYNC_REQUEST = struct.Struct("<d")
+_SYNC_RESPONSE = struct.Struct("<ddd")
+
+
+class TramaInvalida(ValueError):
+    """La trama recibida no se puede decodificar"""
+
+
+class _NoEmpaquetable(Exception):
+    """El mensaje no encaja en el empaquetado fijo de su tipo: va como JSON"""
+
+
+def _exigir(condicion):
+    if not condicion:
+        raise _NoEmpaquetable
+
+
+def _claves(mensaje, *claves):
+    _exigir(len(mensaje) == len(claves) + 1 and all(clave in mensaje for clave in claves))
+
+
+def _entero(valor):
+    _exigir(type(valor) is int)
+    return valor
+
+
+def _booleano(valor):
+    _exigir(type(valor) is bool)
+    return valor
+
+
+def _texto(valor):
+    """Cadena con su longitud en un byte"""
+    _exigir(type(valor) is str)
+    datos = valor.encode("utf-8")
+    _exigir(len(datos) < 256)
+    return _U8.pack(len(datos)) + datos
+
+
+def _leer_texto(datos, inicio):
+    fin = inicio + 1 + datos[inicio]
+    if fin > len(datos):
+        raise IndexError("cadena truncada")
+    return datos[inicio + 1:fin].decode("utf-8"), fin
+
+
+def _color(valor):
+    _exigir(valor in CODIGO_COLOR)
+    return CODIGO_COLOR[valor]
+
+
+# ============================================
+# FICHAS Y CAMPOS DE TURNO
+# ============================================
+
+def _empaquetar_ficha(ficha, color):
+    """Ficha de _datos_ficha → 16 bits (el id va aparte)"""
+    _exigir(ficha["color"] == color and len(ficha) == 4 + ("posicion_meta" in ficha))
+    estado = ficha["estado"]
+    _exigir(estado in CODIGO_ESTADO)
+    posicion = _entero(ficha["posicion"])
+    posicion_meta = _entero(ficha.get("posicion_meta", -1))
+    _exigir(-1 <= posicion <= 126 and -1 <= posicion_meta <= 14)
+    valor = (CODIGO_COLOR[color] | CODIGO_ESTADO[estado] << 2
+             | (posicion + 1) << 4 | (posicion_meta + 1) << 11)
+    if "posicion_meta" in ficha:
+        valor |= TIENE_POSICION_META
+    return valor
+
+
+def _desempaquetar_ficha(ficha_id, valor):
+    ficha = {
+        "id": ficha_id,
+        "color": proto.COLORES[valor & 0x3],
+        "estado": ESTADOS[(valor >> 2) & 0x3],
+        "posicion": ((valor >> 4) & 0x7F) - 1,
+    }
+    if valor & TIENE_POSICION_META:
+        ficha["posicion_meta"] = ((valor >> 11) & 0xF) - 1
+    return ficha
+
+
+def _valor_turno(valor, tipo):
+    _exigir(type(valor) is tipo)
+    return int(valor)
+
+
+# ============================================
+# EMPAQUETADORES POR TIPO
+# ============================================
+# Cada tipo frecuente tiene (empaquetar(mensaje) -> bytes,
+# desempaquetar(datos, inicio) -> dict sin "tipo").
+
+def _sin_campos(mensaje):
+    _claves(mensaje)
+    return b""
+
+
+def _leer_sin_campos(datos, inicio):
+    return {}
+
+
+def _dados(mensaje):
+    _claves(mensaje, "dado1", "dado2", "suma", "es_doble")
+    return _DADOS.pack(_entero(mensaje["dado1"]), _entero(mensaje["dado2"]),
+                       _entero(mensaje["suma"]), _booleano(mensaje["es_doble"]))
+
+
+def _leer_dados(datos, inicio):
+    dado1, dado2, suma, es_doble = _DADOS.unpack_from(datos, inicio)
+    return {"dado1": dado1, "dado2": dado2, "suma": suma, "es_doble": bool(es_doble)}
+
+
+def _turno(mensaje):
+    """Color, nombre y, si lo trae, el plazo del turno"""
+    if "plazo" not in mensaje:
+        _claves(mensaje, "nombre", "color")
+        return _U8.pack(_color(mensaje["color"])) + _texto(mensaje["nombre"])
+    _claves(mensaje, "nombre", "color", "plazo")
+    _exigir(type(mensaje["plazo"]) is float)
+    return (_U8.pack(_color(mensaje["color"]) | TURNO_CON_PLAZO) + _texto(mensaje["nombre"])
+            + _F64.pack(mensaje["plazo"]))
+
+
+def _leer_turno(datos, inicio):
+    codigo = datos[inicio]
+    color = proto.COLORES[codigo & ~TURNO_CON_PLAZO]
+    nombre, fin = _leer_texto(datos, inicio + 1)
+    mensaje = {"nombre": nombre, "color": color}
+    if codigo & TURNO_CON_PLAZO:
+        mensaje["plazo"] = _F64.unpack_from(datos, fin)[0]
+    return mensaje
+
+
+def _movimiento_ok(mensaje):
+    accion = mensaje.get("accion")
+    _exigir(accion in ACCIONES_MOVIMIENTO)
+    if "accion" in mensaje:
+        _exigir(accion is not None)
+        _claves(mensaje, "nombre", "color", "ficha_id", "desde", "hasta", "accion")
+    else:
+        _claves(mensaje, "nombre", "color", "ficha_id", "desde", "hasta")
+    return _MOVIMIENTO.pack(
+        _color(mensaje["color"]), ACCIONES_MOVIMIENTO.index(accion), _entero(mensaje["ficha_id"]),
+        _entero(mensaje["desde"]), _entero(mensaje["hasta"]),
+    ) + _texto(mensaje["nombre"])
+
+
+def _leer_movimiento_ok(datos, inicio):
+    color, accion, ficha_id, desde, hasta = _MOVIMIENTO.unpack_from(datos, inicio)
+    nombre, _ = _leer_texto(datos, inicio + _MOVIMIENTO.size)
+    mensaje = {"nombre": nombre, "color": proto.COLORES[color], "ficha_id": ficha_id,
+               "desde": desde, "hasta": hasta}
+    if accion:
+        mensaje["accion"] = ACCIONES_MOVIMIENTO[accion]
+    return mensaje
+
+
+def _captura(mensaje):
+    _claves(mensaje, "capturado")
+    capturado = mensaje["capturado"]
+    _exigir(type(capturado) is dict and len(capturado) == 3)
+    return (_CAPTURA.pack(_color(capturado["color"]), _entero(capturado["ficha_id"]))
+            + _texto(capturado["nombre"]))
+
+
+def _leer_captura(datos, inicio):
+    color, ficha_id = _CAPTURA.unpack_from(datos, inicio)
+    nombre, _ = _leer_texto(datos, inicio + _CAPTURA.size)
+    return {"capturado": {"nombre": nombre, "color": proto.COLORES[color], "ficha_id": ficha_id}}
+
+
+def _movimientos_legales(mensaje):
+    """Un byte por acción: ficha_id << 2 | dado_elegido"""
+    _claves(mensaje, "movimientos")
+    salida = bytearray(_U8.pack(len(mensaje["movimientos"])))
+    for movimiento in mensaje["movimientos"]:
+        _exigir(len(movimiento) == 2)
+        ficha_id, dado = _entero(movimiento["ficha_id"]), _entero(movimiento["dado_elegido"])
+        _exigir(0 <= ficha_id < 64 and 0 <= dado < 4)
+        salida.append(ficha_id << 2 | dado)
+    return bytes(salida)
+
+
+def _leer_movimientos_legales(datos, inicio):
+    cantidad = datos[inicio]
+    return {"movimientos": [
+        {"ficha_id": valor >> 2, "dado_elegido": valor & 0x3}
+        for valor in datos[inicio + 1:inicio + 1 + cantidad]
+    ]}
+
+
+def _mover_ficha(mensaje):
+    _claves(mensaje, "ficha_id", "dado_elegido")
+    return _MOVER.pack(_entero(mensaje["ficha_id"]), _entero(mensaje["dado_elegido"]))
+
+
+def _leer_mover_ficha(datos, inicio):
+    ficha_id, dado = _MOVER.unpack_from(datos, inicio)
+    return {"ficha_id": ficha_id, "dado_elegido": dado}
+
+
+def _tablero(mensaje):
+    """Campos de turno, versión y, por jugador, nombre, color, id, conteos y 4 fichas de 16 bits"""
+    _claves(mensaje, "version", "jugadores", *(campo for campo, _ in CAMPOS_TURNO))
+    salida = bytearray(_TURNO.pack(*(_valor_turno(mensaje[campo], tipo) for campo, tipo in CAMPOS_TURNO)))
+    salida += _U32.pack(_entero(mensaje["version"]))
+    salida += _U8.pack(len(mensaje["jugadores"]))
+    for jugador in mensaje["jugadores"]:
+        _exigir(len(jugador) == 7)
+        color = jugador["color"]
+        fichas = jugador["fichas"]
+        _exigir(all(ficha["id"] == idx for idx, ficha in enumerate(fichas)))
+        salida += _JUGADOR.pack(_color(color), _entero(jugador["id"]), _entero(jugador["bloqueadas"]),
+                                _entero(jugador["en_juego"]), _entero(jugador["en_meta"]), len(fichas))
+        for ficha in fichas:
+            salida += _U16.pack(_empaquetar_ficha(ficha, color))
+        salida += _texto(jugador["nombre"])
+    return bytes(salida)
+
+
+def _leer_tablero(datos, inicio):
+    mensaje = {campo: tipo(valor) for (campo, tipo), valor in zip(CAMPOS_TURNO, _TURNO.unpack_from(datos, inicio))}
+    inicio += _TURNO.size
+    mensaje["version"] = _U32.unpack_from(datos, inicio)[0]
+    inicio += _U32.size
+    cantidad = datos[inicio]
+    inicio += 1
+    jugadores = []
+    for _ in range(cantidad):
+        color, jugador_id, bloqueadas, en_juego, en_meta, num_fichas = _JUGADOR.unpack_from(datos, inicio)
+        inicio += _JUGADOR.size
+        fichas = [_desempaquetar_ficha(idx, valor)
+                  for idx, (valor,) in enumerate(_U16.iter_unpack(datos[inicio:inicio + 2 * num_fichas]))]
+        inicio += 2 * num_fichas
+        nombre, inicio = _leer_texto(datos, inicio)
+        jugadores.append({"nombre": nombre, "color": proto.COLORES[color], "id": jugador_id,
+                          "fichas": fichas, "bloqueadas": bloqueadas, "en_juego": en_juego,
+                          "en_meta": en_meta})
+    mensaje["jugadores"] = jugadores
+    return mensaje
+
+
+def _tablero_delta(mensaje):
+    """Versiones, fichas cambiadas (id + 16 bits) y máscara de campos de turno cambiados"""
+    _claves(mensaje, "version", "base", "fichas", "turno")
+    salida = bytearray(_VERSIONES.pack(_entero(mensaje["version"]), _entero(mensaje["base"])))
+    salida += _U8.pack(len(mensaje["fichas"]))
+    for ficha in mensaje["fichas"]:
+        salida += _FICHA_DELTA.pack(_entero(ficha["id"]), _empaquetar_ficha(ficha, ficha.get("color")))
+    turno = mensaje["turno"]
+    _exigir(type(turno) is dict and turno.keys() <= _NOMBRES_TURNO)
+    mascara = 0
+    valores = bytearray()
+    for bit, (campo, tipo) in enumerate(CAMPOS_TURNO):
+        if campo in turno:
+            mascara |= 1 << bit
+            valores += _I8.pack(_valor_turno(turno[campo], tipo))
+    return bytes(salida + _U16.pack(mascara) + valores)
+
+
+def _leer_tablero_delta(datos, inicio):
+    version, base = _VERSIONES.unpack_from(datos, inicio)
+    inicio += _VERSIONES.size
+    cantidad = datos[inicio]
+    inicio += 1
+    fichas = []
+    for _ in range(cantidad):
+        ficha_id, valor = _FICHA_DELTA.unpack_from(datos, inicio)
+        fichas.append(_desempaquetar_ficha(ficha_id, valor))
+        inicio += _FICHA_DELTA.size
+    mascara = _U16.unpack_from(datos, inicio)[0]
+    inicio += 2
+    turno = {}
+    for bit, (campo, tipo) in enumerate(CAMPOS_TURNO):
+        if mascara & (1 << bit):
+            turno[campo] = tipo(_I8.unpack_from(datos, inicio)[0])
+            inicio += 1
+    return {"version": version, "base": base, "fichas": fichas, "turno": turno}
+
+
+def _sync_request(mensaje):
+    _claves(mensaje, "t1")
+    _exigir(type(mensaje["t1"]) is float)
+    return _SYNC_REQUEST.pack(mensaje["t1"])
+
+
+def _leer_sync_request(datos, inicio):
+    return {"t1": _SYNC_REQUEST.unpack_from(datos, inicio)[0]}
+
+
+def _sync_response(mensaje):
+    _claves(mensaje, "t1", "t2", "t3")
+    _exigir(all(type(mensaje[t]) is float for t in ("t1", "t2", "t3")))
+    return _SYNC_RESPONSE.pack(mensaje["t1"], mensaje["t2"], mensaje["t3"])
+
+
+def _leer_sync_response(datos, inicio):
+    t1, t2, t3 = _SYNC_RESPONSE.unpack_from(datos, inicio)
+    return {"t1": t1, "t2": t2, "t3": t3}
+
+
+def _lote(mensaje):
+    """seq (32 bits), número de eventos y cada evento como trama binaria con su longitud delante"""
+    _claves(mensaje, "seq", "eventos")
+    _exigir(type(mensaje["eventos"]) is list and all(type(e) is dict for e in mensaje["eventos"]))
+    return _cuerpo_lote(_entero(mensaje["seq"]), [codificar_binario(e) for e in mensaje["eventos"]])
+
+
+def _cuerpo_lote(seq, tramas):
+    salida = bytearray(_U32.pack(seq))
+    salida += _U16.pack(len(tramas))
+    for trama in tramas:
+        salida += _U32.pack(len(trama))
+        salida += trama
+    return bytes(salida)
+
+
+def _leer_lote(datos, inicio):
+    (seq,) = _U32.unpack_from(datos, inicio)
+    (cantidad,) = _U16.unpack_from(datos, inicio + 4)
+    posicion = inicio + 6
+    eventos = []
+    for _ in range(cantidad):
+        (longitud,) = _U32.unpack_from(datos, posicion)
+        posicion += 4
+        _exigir_trama(posicion + longitud <= len(datos))
+        eventos.append(decodificar_binario(datos[posicion:posicion + longitud]))
+        posicion += longitud
+    return {"seq": seq, "eventos": eventos}
+
+
+def _exigir_trama(condicion):
+    if not condicion:
+        raise TramaInvalida("evento de LOTE truncado")
+
+
+EMPAQUETADORES = {
+    "TABLERO": (_tablero, _leer_tablero),
+    "TABLERO_DELTA": (_tablero_delta, _leer_tablero_delta),
+    "DADOS": (_dados, _leer_dados),
+    "TURNO": (_turno, _leer_turno),
+    "MOVIMIENTO_OK": (_movimiento_ok, _leer_movimiento_ok),
+    "CAPTURA": (_captura, _leer_captura),
+    "MOVIMIENTOS_LEGALES": (_movimientos_legales, _leer_movimientos_legales),
+    "MOVER_FICHA": (_mover_ficha, _leer_mover_ficha),
+    "SYNC_REQUEST": (_sync_request, _leer_sync_request),
+    "SYNC_RESPONSE": (_sync_response, _leer_sync_response),
+    "LANZAR_DADOS": (_sin_campos, _leer_sin_campos),
+    "SACAR_TODAS": (_sin_campos, _leer_sin_campos),
+    "LISTO": (_sin_campos, _leer_sin_campos),
+    "SOLICITAR_TABLERO": (_sin_campos, _leer_sin_campos),
+    "SOLICITAR_MOVIMIENTOS": (_sin_campos, _leer_sin_campos),
+    "LOTE": (_lote, _leer_lote),
+}
+_POR_ETIQUETA = {ETIQUETAS[tipo]: lectores[1] for tipo, lectores in EMPAQUETADORES.items()}
+
+
+# ============================================
+# API
+# ============================================
+
+def _json_compacto(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def codificar_binario(mensaje):
+    """dict del protocolo → bytes"""
+    tipo = mensaje.get("tipo")
+    etiqueta = ETIQUETAS.get(tipo) if isinstance(tipo, str) else None
+    if etiqueta is None:
+        return _U8.pack(BIT_JSON) + _json_compacto(mensaje)
+
+    empaquetador = EMPAQUETADORES.get(tipo)
+    if empaquetador is not None:
+        try:
+            return _U8.pack(etiqueta) + empaquetador[0](mensaje)
+        except (_NoEmpaquetable, KeyError, TypeError, struct.error):
+            pass
+    return _U8.pack(etiqueta | BIT_JSON) + _json_compacto({k: v for k, v in mensaje.items() if k != "tipo"})
+
+
+def decodificar_binario(datos):
+    """bytes → dict del protocolo. Lanza TramaInvalida si la trama está corrupta"""
+    try:
+        etiqueta = datos[0]
+        if etiqueta & BIT_JSON:
+            mensaje = json.loads(bytes(datos[1:]).decode("utf-8"))
+            if not isinstance(mensaje, dict):
+                raise TramaInvalida("la carga JSON no es un objeto")
+            etiqueta &= ~BIT_JSON
+            return {"tipo": TIPOS[etiqueta], **mensaje} if etiqueta else mensaje
+        return {"tipo": TIPOS[etiqueta], **_POR_ETIQUETA[etiqueta](datos, 1)}
+    except TramaInvalida:
+        raise
+    except (IndexError, KeyError, struct.error, UnicodeDecodeError, ValueError) as e:
+        raise TramaInvalida(f"trama binaria inválida: {e}") from e
+
+
+def codificar(mensaje, codec=CODEC_JSON):
+    """Serializa para websocket: str (trama de texto) con JSON, bytes (trama binaria) con el codec binario"""
+    if codec == CODEC_BINARIO:
+        return codificar_binario(mensaje)
+    return proto.codificar_json(mensaje)
+
+
+def codificar_lote(seq, eventos, codec=CODEC_JSON):
+    """
+    Trama LOTE a partir de eventos ya serializados con codificar(evento, codec):
+    quien envía el mismo evento a varios clientes lo codifica una vez.
+    """
+    if codec == CODEC_BINARIO:
+        return _U8.pack(ETIQUETAS["LOTE"]) + _cuerpo_lote(seq, eventos)
+    return proto.componer_lote_json(seq, eventos)
+
+
+def decodificar(trama):
+    """Trama recibida → dict. El tipo de trama (str/bytes) indica el formato"""
+    if isinstance(trama, str):
+        try:
+            return json.loads(trama)
+        except json.JSONDecodeError as e:
+            raise TramaInvalida(f"JSON inválido: {e}") from e
+    return decodificar_binario(trama)
@@ -1,3 +1,5 @@
+import json
+
 # ============================================
 # TIPOS DE MENSAJES: CLIENTE → SERVIDOR
 # ============================================
@@ -9,6 +11,8 @@ MSG_DESCONECTAR = "DESCONECTAR"
 MSG_LISTO = "LISTO"  # Cliente listo para empezar
 MSG_SACAR_TODAS = "SACAR_TODAS"  # Solicitar sacar todas las fichas de la cárcel   
 MSG_SOLICITAR_COLORES = "SOLICITAR_COLORES" 
+MSG_SOLICITAR_TABLERO = "SOLICITAR_TABLERO"  # Pedir snapshot completo tras un hueco de versión
+MSG_SOLICITAR_MOVIMIENTOS = "SOLICITAR_MOVIMIENTOS"  # Pedir los movimientos legales de la tirada actual
 MSG_DEBUG_FORZAR_TRES_DOBLES = "DEBUG_FORZAR_TRES_DOBLES"  # ⭐ NUEVO
 MSG_ELEGIR_FICHA_PREMIO = "ELEGIR_FICHA_PREMIO"  # ⭐ NUEVO
 
@@ -22,6 +26,9 @@ MSG_INICIO_JUEGO = "INICIO_JUEGO"
 MSG_TURNO = "TURNO"
 MSG_DADOS = "DADOS"
 MSG_TABLERO = "TABLERO"
+MSG_TABLERO_DELTA = "TABLERO_DELTA"  # Solo fichas/campos de turno que cambiaron
+MSG_MOVIMIENTOS_LEGALES = "MOVIMIENTOS_LEGALES"  # Acciones (ficha_id, dado_elegido) válidas ahora
+MSG_LOTE = "LOTE"  # Todos los eventos de un comando, en orden, con su número de secuencia
 MSG_MOVIMIENTO_OK = "MOVIMIENTO_OK"
 MSG_ERROR = "ERROR"
 MSG_VICTORIA = "VICTORIA"
@@ -29,6 +36,7 @@ MSG_JUGADOR_DESCONECTADO = "JUGADOR_DESCONECTADO"
 MSG_CAPTURA = "CAPTURA"
 MSG_INFO = "INFO"  # Mensajes informativos generales
 MSG_COLORES_DISPONIBLES = "COLORES_DISPONIBLES"
+MSG_REDIRIGIR = "REDIRIGIR"  # Modo supervisor: la sala vive en otro trabajador (reconectar a su puerto)
 
 # Mensajes para determinación de turnos
 MSG_DETERMINACION_INICIO = "DETERMINACION_INICIO"  # Servidor inicia fase de determinación
@@ -70,15 +78,36 @@ def crear_mensaje(tipo, **kwargs):
 def mensaje_listo():
     return crear_mensaje(MSG_LISTO)
 
-def mensaje_conectar(nombre, color=None):  
+def mensaje_conectar(nombre, color=None, sala=None, delta=False, movimientos=False, codec=None, lote=False):  
     msg = crear_mensaje(MSG_CONECTAR, nombre=nombre)
     if color:
         msg["color"] = color
+    if sala:
+        msg["sala"] = sala
+    if delta:
+        msg["delta"] = True
+    if movimientos:
+        msg["movimientos"] = True
+    if codec:
+        msg["codec"] = codec  # "binario": tramas binarias (codec.py) en lugar de JSON
+    if lote:
+        msg["lote"] = True  # eventos de cada comando agrupados en una trama LOTE
     return msg
 
-def mensaje_solicitar_colores():
-    """Solicita la lista de colores disponibles"""
-    return crear_mensaje(MSG_SOLICITAR_COLORES)
+def mensaje_solicitar_tablero():
+    """Pide al servidor el TABLERO completo (el cliente perdió una versión)"""
+    return crear_mensaje(MSG_SOLICITAR_TABLERO)
+
+def mensaje_solicitar_movimientos():
+    """Pide al servidor la lista de movimientos legales con los dados actuales"""
+    return crear_mensaje(MSG_SOLICITAR_MOVIMIENTOS)
+
+def mensaje_solicitar_colores(sala=None):
+    """Solicita la lista de colores disponibles (de una sala concreta si se indica)"""
+    msg = crear_mensaje(MSG_SOLICITAR_COLORES)
+    if sala:
+        msg["sala"] = sala
+    return msg
 
 
 def mensaje_colores_disponibles(colores):
@@ -98,14 +127,22 @@ def mensaje_mover_ficha(ficha_id, dado_elegido):
     """
     return crear_mensaje(MSG_MOVER_FICHA, ficha_id=ficha_id, dado_elegido=dado_elegido)
 
-def mensaje_bienvenida(color, jugador_id, nombre):
-    return crear_mensaje(MSG_BIENVENIDA, color=color, jugador_id=jugador_id, nombre=nombre)
+def mensaje_bienvenida(color, jugador_id, nombre, sala=None, codec=None):
+    msg = crear_mensaje(MSG_BIENVENIDA, color=color, jugador_id=jugador_id, nombre=nombre)
+    if sala:
+        msg["sala"] = sala
+    if codec and codec != "json":
+        msg["codec"] = codec  # Confirma el codec negociado en CONECTAR
+    return msg
 
 def mensaje_esperando(conectados, requeridos):
     return crear_mensaje(MSG_ESPERANDO, conectados=conectados, requeridos=requeridos)
 
-def mensaje_turno(nombre, color):
-    return crear_mensaje(MSG_TURNO, nombre=nombre, color=color)
+def mensaje_turno(nombre, color, plazo=None):
+    """plazo: instante (reloj del servidor, s epoch) en que vence el turno; se omite si no hay plazo"""
+    if plazo is None:
+        return crear_mensaje(MSG_TURNO, nombre=nombre, color=color)
+    return crear_mensaje(MSG_TURNO, nombre=nombre, color=color, plazo=plazo)
 
 def mensaje_dados(dado1, dado2, suma, es_doble):
     return crear_mensaje(MSG_DADOS, dado1=dado1, dado2=dado2, suma=suma, es_doble=es_doble)
@@ -142,8 +179,11 @@ def mensaje_sacar_todas():
 MSG_SYNC_REQUEST = "SYNC_REQUEST"
 MSG_SYNC_RESPONSE = "SYNC_RESPONSE"
 
-def mensaje_sync_request(t1):
-    return crear_mensaje(MSG_SYNC_REQUEST, t1=t1)
+def mensaje_sync_request(t1, offset=None, rtt=None):
+    """offset/rtt: estimación actual del cliente (opcional), para las métricas por jugador del servidor"""
+    if offset is None:
+        return crear_mensaje(MSG_SYNC_REQUEST, t1=t1)
+    return crear_mensaje(MSG_SYNC_REQUEST, t1=t1, offset=offset, rtt=rtt)
 
 def mensaje_sync_response(t1, t2, t3):
     return crear_mensaje(MSG_SYNC_RESPONSE, t1=t1, t2=t2, t3=t3)
@@ -219,4 +259,14 @@ def mensaje_ficha_a_meta(nombre, color, ficha_id, desde, estado_anterior):
     }
 
 def mensaje_debug_forzar_tres_dobles():
-    return {"tipo": MSG_DEBUG_FORZAR_TRES_DOBLES}
\ No newline at end of file
+    return {"tipo": MSG_DEBUG_FORZAR_TRES_DOBLES}
+
+
+def codificar_json(mensaje):
+    """Serializa un mensaje a JSON (el servidor usa codificadores precompilados; el cliente envía pocos mensajes)"""
+    return json.dumps(mensaje, ensure_ascii=False)
+
+
+def componer_lote_json(seq, eventos_json):
+    """Trama LOTE a partir de eventos ya serializados (misma salida que el servidor)"""
+    return '{"tipo": "LOTE", "seq": ' + int.__repr__(seq) + ', "eventos": [' + ", ".join(eventos_json) + "]}"
@@ -0,0 +1,107 @@
+"""
+Estimación continua del reloj del servidor (estilo NTP).
+
+Cada sondeo SYNC_REQUEST / SYNC_RESPONSE da cuatro sellos:
+
+    t1  cliente envía        t2  servidor recibe
+    t3  servidor responde    t4  cliente recibe
+
+    offset = ((t2 - t1) + (t3 - t4)) / 2     (reloj servidor - reloj cliente)
+    rtt    = (t4 - t1) - (t3 - t2)
+
+El error de una muestra está acotado por rtt/2: la de menor RTT es la que
+menos cola y retransmisión sufrió, así que de la ventana de muestras
+recientes se usa esa (no la media, que arrastra los picos).
+
+Los sondeos se hacen en ráfagas periódicas. La mejor muestra de cada
+ráfaga se guarda y, con varias separadas en el tiempo, la pendiente por
+mínimos cuadrados de offset frente a tiempo estima la deriva entre los
+dos relojes; offset_en(t) la aplica desde la muestra elegida.
+"""
+
+import time
+from collections import deque
+
+_ORIGEN = time.time() - time.perf_counter()
+
+# La deriva de un oscilador normal ronda las decenas de ppm: más es ruido de las muestras
+DERIVA_MAXIMA = 500e-6
+# Tiempo mínimo cubierto por las ráfagas para estimar la deriva (s)
+SEPARACION_MINIMA = 5.0
+
+
+def ahora():
+    """Tiempo de pared (segundos epoch) con la monotonía y resolución de perf_counter"""
+    return _ORIGEN + time.perf_counter()
+
+
+class Muestra:
+    __slots__ = ("instante", "offset", "rtt")
+
+    def __init__(self, instante, offset, rtt):
+        self.instante = instante  # punto medio local del sondeo, (t1 + t4) / 2
+        self.offset = offset
+        self.rtt = rtt
+
+
+class EstimadorReloj:
+    """Filtro de mínimo RTT sobre una ventana de muestras, con deriva entre ráfagas"""
+
+    def __init__(self, ventana=16, rafagas=16):
+        self.muestras = deque(maxlen=ventana)  # muestras recientes (varias ráfagas)
+        self.mejores = deque(maxlen=rafagas)   # mejor muestra de cada ráfaga cerrada
+        self._rafaga = []
+        self.mejor = None
+        self.deriva = 0.0                       # s de offset por s local
+        self.descartadas = 0
+
+    @property
+    def sincronizado(self):
+        return self.mejor is not None
+
+    def agregar(self, t1, t2, t3, t4):
+        """Añade un sondeo completo; retorna la Muestra o None si es incoherente"""
+        rtt = (t4 - t1) - (t3 - t2)
+        if rtt < 0 or t4 < t1:
+            self.descartadas += 1
+            return None
+        muestra = Muestra((t1 + t4) / 2, ((t2 - t1) + (t3 - t4)) / 2, rtt)
+        self.muestras.append(muestra)
+        self._rafaga.append(muestra)
+        # La ventana cubre varias ráfagas; offset_en() proyecta la elegida con la deriva
+        self.mejor = min(self.muestras, key=lambda m: m.rtt)
+        return muestra
+
+    def cerrar_rafaga(self):
+        """Fin de una ráfaga de sondeos: guarda su mejor muestra y actualiza la deriva"""
+        if not self._rafaga:
+            return
+        self.mejores.append(min(self._rafaga, key=lambda m: m.rtt))
+        self._rafaga = []
+        self.deriva = self._estimar_deriva()
+
+    def _estimar_deriva(self):
+        if len(self.mejores) < 3 or self.mejores[-1].instante - self.mejores[0].instante < SEPARACION_MINIMA:
+            return 0.0
+        n = len(self.mejores)
+        media_t = sum(m.instante for m in self.mejores) / n
+        media_o = sum(m.offset for m in self.mejores) / n
+        covarianza = sum((m.instante - media_t) * (m.offset - media_o) for m in self.mejores)
+        varianza = sum((m.instante - media_t) ** 2 for m in self.mejores)
+        if varianza <= 0:
+            return 0.0
+        return max(-DERIVA_MAXIMA, min(DERIVA_MAXIMA, covarianza / varianza))
+
+    def offset_en(self, instante=None):
+        """Offset estimado (servidor - cliente) en un instante local"""
+        if self.mejor is None:
+            return 0.0
+        instante = ahora() if instante is None else instante
+        return self.mejor.offset + self.deriva * (instante - self.mejor.instante)
+
+    @property
+    def rtt(self):
+        return self.mejor.rtt if self.mejor is not None else None
+
+    def historial(self):
+        return [m.offset for m in self.muestras]
@@ -3,10 +3,13 @@ Sistema de base de datos para usuarios y estadísticas del juego Parchís
 """
 import sqlite3
 import hashlib
+import logging
 import os
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'parques.db')
 
 class DatabaseManager:
@@ -68,7 +71,7 @@ class DatabaseManager:
         ''')
         
         conn.commit()
-        print("✅ Base de datos inicializada correctamente")
+        logger.info("✅ Base de datos inicializada correctamente")
     
     def hash_password(self, password: str) -> str:
         """Hashea una contraseña usando SHA-256"""
@@ -171,7 +174,7 @@ class DatabaseManager:
             conn.commit()
             return True
         except Exception as e:
-            print(f"❌ Error al registrar partida: {e}")
+            logger.error("❌ Error al registrar partida: %s", e)
             return False
     
     def obtener_estadisticas(self, usuario_id: int) -> Dict[str, Any]:
@@ -232,7 +235,7 @@ class DatabaseManager:
             usuario = cursor.fetchone()
             return dict(usuario) if usuario else None
         except Exception as e:
-            print(f"❌ Error al obtener usuario: {e}")
+            logger.error("❌ Error al obtener usuario: %s", e)
             return None
     
     def close(self):
@@ -0,0 +1,413 @@
+"""
+Bitácora por partida (write-ahead log) para recuperarse de una caída.
+
+Cada comando aceptado por el GameManager y cada tirada de dados se anota
+en un registro binario compacto; al reiniciar, el servidor reconstruye el
+GameManager de cada sala reproduciendo su bitácora (los dados salen del
+registro, no del azar) y los jugadores vuelven a su mesa con CONECTAR.
+
+Formato del archivo <directorio>/<codigo>.wal: una secuencia de registros
+
+    longitud (u16) | crc32 (u32) | operación (u8) | argumentos
+
+Los argumentos tienen formato fijo por operación (struct); solo ALTA y la
+CABECERA, una vez por jugador / por archivo, van en JSON. Un registro
+cortado o con CRC incorrecto marca el final útil del archivo (la caída
+ocurrió mientras se escribía): se ignora y se trunca en la siguiente
+escritura de la partida restaurada.
+
+Escritura: anotar() solo añade bytes al búfer de la sala (en el hilo del
+bucle). Cada `intervalo_fsync` segundos RegistroBitacoras entrega los
+búferes pendientes a un único hilo que escribe y hace fsync de cada
+archivo; el mismo hilo cierra y borra las bitácoras de las salas que se
+cierran, así que las operaciones sobre un archivo nunca se desordenan.
+Lo anotado en el último intervalo puede perderse en una caída.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import string
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+EXTENSION = ".wal"
+
+_CABECERA_REGISTRO = struct.Struct("<HI")
+_SEGUROS = frozenset(string.ascii_uppercase + string.digits + "-_")
+
+# ============================================
+# OPERACIONES
+# ============================================
+# Cada operación corresponde a un método del GameManager; "jugador" es el id
+# del jugador (clientes[ws]["id"]), estable entre la partida y su reproducción
+
+CABECERA = 0                # {"codigo", "version"} (JSON)
+ALTA = 1                    # agregar_jugador: {"id", "nombre", "color", "usuario_id"} (JSON)
+BAJA = 2                    # eliminar_jugador(jugador)
+DESCONEXION_EN_TURNO = 3    # manejar_desconexion_en_turno(jugador)
+INICIO_DETERMINACION = 4    # iniciar_determinacion_turnos()
+TIRADA_DETERMINACION = 5    # registrar_tirada_determinacion(jugador, dado1, dado2)
+INICIAR_JUEGO = 6           # iniciar_juego()
+DADOS = 7                   # lanzar_dados((dado1, dado2))
+SACAR_TODAS = 8             # sacar_todas_fichas_carcel(jugador)
+SACAR_CARCEL = 9            # sacar_de_carcel(jugador)
+MOVER = 10                  # mover_ficha(jugador, ficha_id, dado_elegido)
+AVANZAR_TURNO = 11          # avanzar_turno()
+FORZAR_AVANCE = 12          # forzar_avance_turno()
+VICTORIA = 13               # verificar_victoria(jugador)
+PREMIO = 14                 # aplicar_premio_tres_dobles(jugador, ficha_id)
+PREMIO_DEBUG = 15           # forzar_tres_dobles_debug(jugador)
+DESCARTAR_PREMIO = 16       # descartar_premio()
+TERMINAR = 17               # terminar_juego()
+
+# Operaciones cuyo primer argumento es el websocket del jugador
+POR_JUGADOR = frozenset((ALTA, BAJA, DESCONEXION_EN_TURNO, TIRADA_DETERMINACION, SACAR_TODAS,
+                         SACAR_CARCEL, MOVER, VICTORIA, PREMIO, PREMIO_DEBUG))
+
+# Operación → struct de sus argumentos (None = JSON)
+FORMATOS = {
+    CABECERA: None,
+    ALTA: None,
+    BAJA: struct.Struct("<H"),
+    DESCONEXION_EN_TURNO: struct.Struct("<H"),
+    INICIO_DETERMINACION: struct.Struct(""),
+    TIRADA_DETERMINACION: struct.Struct("<HBB"),
+    INICIAR_JUEGO: struct.Struct(""),
+    DADOS: struct.Struct("<BB"),
+    SACAR_TODAS: struct.Struct("<H"),
+    SACAR_CARCEL: struct.Struct("<H"),
+    MOVER: struct.Struct("<HBB"),
+    AVANZAR_TURNO: struct.Struct(""),
+    FORZAR_AVANCE: struct.Struct(""),
+    VICTORIA: struct.Struct("<H"),
+    PREMIO: struct.Struct("<HB"),
+    PREMIO_DEBUG: struct.Struct("<H"),
+    DESCARTAR_PREMIO: struct.Struct(""),
+    TERMINAR: struct.Struct(""),
+}
+
+
+def codificar(op, valores):
+    """Un registro completo (cabecera + operación + argumentos)"""
+    formato = FORMATOS[op]
+    if formato is None:
+        cuerpo = json.dumps(valores, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    else:
+        cuerpo = formato.pack(*valores)
+    carga = bytes((op,)) + cuerpo
+    return _CABECERA_REGISTRO.pack(len(carga), zlib.crc32(carga)) + carga
+
+
+def leer(datos):
+    """
+    Decodifica los registros de una bitácora.
+    Retorna (registros, valido): [(op, valores)] y los bytes íntegros hasta
+    el primer registro cortado o corrupto (o el final).
+    """
+    registros = []
+    posicion = 0
+    total = len(datos)
+    while posicion + _CABECERA_REGISTRO.size <= total:
+        longitud, crc = _CABECERA_REGISTRO.unpack_from(datos, posicion)
+        inicio = posicion + _CABECERA_REGISTRO.size
+        carga = datos[inicio:inicio + longitud]
+        if not longitud or len(carga) < longitud or zlib.crc32(carga) != crc:
+            break
+        op = carga[0]
+        formato = FORMATOS.get(op, False)
+        if formato is False:
+            break
+        try:
+            if formato is None:
+                valores = json.loads(bytes(carga[1:]).decode("utf-8"))
+            elif formato.size != longitud - 1:
+                break
+            else:
+                valores = formato.unpack(carga[1:])
+        except ValueError:
+            break
+        registros.append((op, valores))
+        posicion = inicio + longitud
+    return registros, posicion
+
+
+def nombre_archivo(codigo):
+    """Código de sala apto para un nombre de archivo (lo elige el cliente: si trae algo más que letras, cifras, - o _, va en hexadecimal)"""
+    if not codigo or any(c not in _SEGUROS for c in codigo):
+        return "x" + codigo.encode("utf-8").hex()
+    return codigo
+
+
+# ============================================
+# REPRODUCCIÓN
+# ============================================
+
+class Ausente:
+    """
+    Jugador restaurado de la bitácora que aún no ha reconectado.
+    Ocupa el lugar del websocket como clave en GameManager.clientes hasta
+    que GameManager.reasignar_jugador lo cambia por la nueva conexión.
+    """
+
+    __slots__ = ("id", "nombre", "color", "remote_address")
+
+    def __init__(self, id, nombre, color):
+        self.id = id
+        self.nombre = nombre
+        self.color = color
+        self.remote_address = ("bitacora", id)
+
+    def __repr__(self):
+        return f"Ausente({self.id}, {self.nombre}, {self.color})"
+
+
+def _aceptado(op, resultado):
+    """Si el GameManager aceptó la operación (mismo criterio que al anotarla)"""
+    if op == ALTA:
+        return resultado[1] is None
+    if op == TIRADA_DETERMINACION:
+        return "error" not in resultado[1]
+    if op in (SACAR_TODAS, SACAR_CARCEL, MOVER, PREMIO, PREMIO_DEBUG):
+        return resultado[0]
+    if op in (INICIO_DETERMINACION, FORZAR_AVANCE, VICTORIA):
+        return bool(resultado)
+    return True
+
+
+def reproducir(gm, registros):
+    """
+    Aplica los registros sobre un GameManager recién creado (sin anotarlos
+    de nuevo). Retorna (codigo de la cabecera o None, operaciones que no
+    dieron el mismo resultado que en la partida original).
+    """
+    bitacora, gm.bitacora = gm.bitacora, None
+    # Los mensajes de la partida ya se registraron cuando se jugó
+    registro_reglas = logging.getLogger(gm.__module__)
+    nivel = registro_reglas.level
+    registro_reglas.setLevel(logging.WARNING)
+    ausentes = {}
+    codigo = None
+    discrepancias = 0
+    try:
+        for op, valores in registros:
+            if op == CABECERA:
+                codigo = valores.get("codigo")
+                continue
+            if op == ALTA:
+                ausente = ausentes[valores["id"]] = Ausente(valores["id"], valores["nombre"], valores["color"])
+                resultado = gm.agregar_jugador(ausente, valores["nombre"], valores["color"], valores.get("usuario_id"))
+            elif op == DADOS:
+                resultado = gm.lanzar_dados(valores)
+            elif op in _SIN_ARGUMENTOS:
+                resultado = getattr(gm, _SIN_ARGUMENTOS[op])()
+            else:
+                ausente = ausentes.get(valores[0])
+                if ausente is None:
+                    discrepancias += 1
+                    continue
+                resultado = getattr(gm, _CON_JUGADOR[op])(ausente, *valores[1:])
+            if not _aceptado(op, resultado):
+                discrepancias += 1
+    finally:
+        registro_reglas.setLevel(nivel)
+        gm.bitacora = bitacora
+    return codigo, discrepancias
+
+
+_SIN_ARGUMENTOS = {
+    INICIO_DETERMINACION: "iniciar_determinacion_turnos",
+    INICIAR_JUEGO: "iniciar_juego",
+    AVANZAR_TURNO: "avanzar_turno",
+    FORZAR_AVANCE: "forzar_avance_turno",
+    DESCARTAR_PREMIO: "descartar_premio",
+    TERMINAR: "terminar_juego",
+}
+
+_CON_JUGADOR = {
+    BAJA: "eliminar_jugador",
+    DESCONEXION_EN_TURNO: "manejar_desconexion_en_turno",
+    TIRADA_DETERMINACION: "registrar_tirada_determinacion",
+    SACAR_TODAS: "sacar_todas_fichas_carcel",
+    SACAR_CARCEL: "sacar_de_carcel",
+    MOVER: "mover_ficha",
+    VICTORIA: "verificar_victoria",
+    PREMIO: "aplicar_premio_tres_dobles",
+    PREMIO_DEBUG: "forzar_tres_dobles_debug",
+}
+
+
+# ============================================
+# ESCRITURA
+# ============================================
+
+class Bitacora:
+    """
+    Búfer de registros de una sala (GameManager.bitacora). Solo se toca
+    desde el hilo del bucle; el archivo, solo desde el hilo escritor.
+    """
+
+    __slots__ = ("codigo", "ruta", "registro", "bufer", "archivo", "valido", "descartada")
+
+    def __init__(self, codigo, ruta, registro):
+        self.codigo = codigo
+        self.ruta = ruta
+        self.registro = registro
+        self.bufer = bytearray(codificar(CABECERA, {"codigo": codigo, "version": VERSION}))
+        self.archivo = None
+        self.valido = None          # bytes íntegros de un archivo que se reanuda (None = archivo nuevo)
+        self.descartada = False
+        registro.pendientes.add(self)
+
+    def anotar(self, op, jugador, args, resultado):
+        """Llamado por GameManager tras cada operación (ver game_manager._registrado); solo guarda las aceptadas"""
+        if (jugador is None and op in POR_JUGADOR) or not _aceptado(op, resultado):
+            return
+        if op == DADOS:
+            valores = resultado[:2]
+        elif op == ALTA:
+            valores = {"id": jugador, "nombre": args[1], "color": resultado[0], "usuario_id": args[3] if len(args) > 3 else None}
+        elif op == MOVER:
+            valores = (jugador, int(args[1]), int(args[2]))
+        elif op == PREMIO:
+            valores = (jugador, int(args[1]))
+        elif op == TIRADA_DETERMINACION:
+            valores = (jugador, int(args[1]), int(args[2]))
+        elif FORMATOS[op].size:
+            valores = (jugador,)
+        else:
+            valores = ()
+        if not self.bufer:
+            self.registro.pendientes.add(self)
+        self.bufer += codificar(op, valores)
+
+    def reanudar(self, valido):
+        """Continúa un archivo existente (partida restaurada) en vez de empezar uno nuevo"""
+        self.bufer.clear()
+        self.valido = valido
+
+    def descartar(self):
+        """La sala se cerró: se borra su bitácora (ya no hay partida que recuperar)"""
+        if not self.descartada:
+            self.descartada = True
+            self.registro.descartar(self)
+
+    # --- Hilo escritor ---
+
+    def _escribir(self, datos):
+        if self.archivo is None:
+            if self.valido is None:
+                self.archivo = open(self.ruta, "wb")
+            else:
+                self.archivo = open(self.ruta, "r+b")
+                self.archivo.truncate(self.valido)
+                self.archivo.seek(self.valido)
+        self.archivo.write(datos)
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+
+    def _borrar(self):
+        if self.archivo is not None:
+            self.archivo.close()
+            self.archivo = None
+        try:
+            os.unlink(self.ruta)
+        except FileNotFoundError:
+            pass
+
+    def _cerrar(self):
+        if self.archivo is not None:
+            self.archivo.close()
+            self.archivo = None
+
+
+class RegistroBitacoras:
+    """Bitácoras de las salas de un proceso y su volcado periódico con fsync"""
+
+    def __init__(self, directorio, intervalo_fsync=0.2):
+        self.directorio = directorio
+        self.intervalo_fsync = intervalo_fsync
+        self.pendientes = set()     # Bitácoras con bytes sin entregar al escritor
+        self.bitacoras = {}         # {codigo: Bitacora} abiertas
+        self.escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parques-wal")
+        self.escritos = 0
+        self.sincronizaciones = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, codigo):
+        return os.path.join(self.directorio, f"{nombre_archivo(codigo)}{EXTENSION}")
+
+    def abrir(self, codigo):
+        bitacora = self.bitacoras[codigo] = Bitacora(codigo, self.ruta(codigo), self)
+        return bitacora
+
+    def existentes(self):
+        """Rutas de las bitácoras que hay en el directorio (partidas de una ejecución anterior)"""
+        return sorted(os.path.join(self.directorio, nombre) for nombre in os.listdir(self.directorio)
+                      if nombre.endswith(EXTENSION))
+
+    def descartar(self, bitacora):
+        self.pendientes.discard(bitacora)
+        bitacora.bufer.clear()
+        if self.bitacoras.get(bitacora.codigo) is bitacora:
+            del self.bitacoras[bitacora.codigo]
+        self.escritor.submit(bitacora._borrar)
+
+    def volcar(self):
+        """Entrega los búferes pendientes al hilo escritor; retorna su futuro (None si no había nada)"""
+        if not self.pendientes:
+            return None
+        lote = []
+        for bitacora in self.pendientes:
+            if bitacora.bufer:
+                lote.append((bitacora, bytes(bitacora.bufer)))
+                bitacora.bufer.clear()
+        self.pendientes.clear()
+        if not lote:
+            return None
+        return self.escritor.submit(self._escribir_lote, lote)
+
+    def _escribir_lote(self, lote):
+        for bitacora, datos in lote:
+            if bitacora.descartada:
+                continue
+            try:
+                bitacora._escribir(datos)
+                self.escritos += len(datos)
+                self.sincronizaciones += 1
+            except OSError as e:
+                logger.error("❌ No se pudo escribir la bitácora %s: %s", bitacora.ruta, e)
+
+    async def ejecutar(self):
+        """Tarea de volcado: cada intervalo_fsync segundos"""
+        try:
+            while True:
+                await asyncio.sleep(self.intervalo_fsync)
+                futuro = self.volcar()
+                if futuro is not None:
+                    await asyncio.wrap_future(futuro)
+        except asyncio.CancelledError:
+            pass
+
+    async def cerrar(self):
+        """Último volcado y cierre de archivos (las bitácoras se conservan para la próxima ejecución)"""
+        self.volcar()
+        for bitacora in list(self.bitacoras.values()):
+            self.escritor.submit(bitacora._cerrar)
+        await asyncio.wrap_future(self.escritor.submit(lambda: None))
+        self.escritor.shutdown(wait=False)
+
+
+def cargar(ruta):
+    """Lee una bitácora del disco: (registros, bytes íntegros)"""
+    with open(ruta, "rb") as archivo:
+        datos = archivo.read()
+    registros, valido = leer(datos)
+    if valido < len(datos):
+        logger.warning("⚠️ Bitácora %s cortada: %s de %s bytes íntegros", ruta, valido, len(datos))
+    return registros, valido
@@ -0,0 +1,205 @@
+"""
+Despacho de mensajes por tabla: (fase de la conexión, tipo) → manejador.
+
+Cada manejador es una corutina manejador(websocket, mensaje) registrada
+para una o varias fases (FASE_HANDSHAKE antes del CONECTAR, FASE_SALA
+después) con su cadena de middleware. Un middleware es una corutina
+middleware(siguiente, websocket, mensaje) que decide si llama a
+siguiente(websocket, mensaje); así se componen autenticación, límites de
+frecuencia, etc. sin tocar los manejadores, que se pueden probar solos.
+
+El Despachador cuenta invocaciones y errores por tipo y guarda un
+histograma de latencias (cubos de potencias de 2 en µs) para ver qué
+tipos de mensaje se llevan el tiempo del bucle.
+"""
+
+import logging
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+FASE_HANDSHAKE = "handshake"
+FASE_SALA = "sala"
+FASES = (FASE_HANDSHAKE, FASE_SALA)
+
+# Cubo i: latencias en [2^(i-1), 2^i) µs; el último acumula lo que sobra (> ~33 s)
+CUBOS_HISTOGRAMA = 26
+
+
+class EstadisticasTipo:
+    """Invocaciones, errores y latencias de un tipo de mensaje"""
+
+    __slots__ = ("invocaciones", "errores", "total", "maximo", "cubos")
+
+    def __init__(self):
+        self.invocaciones = 0
+        self.errores = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.cubos = [0] * CUBOS_HISTOGRAMA
+
+    def registrar(self, segundos, error=False):
+        self.invocaciones += 1
+        self.errores += error
+        self.total += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+        cubo = int(segundos * 1e6).bit_length()
+        self.cubos[min(cubo, CUBOS_HISTOGRAMA - 1)] += 1
+
+    def percentil(self, p):
+        """Límite superior (s) del cubo donde cae el percentil p (0-100)"""
+        objetivo = self.invocaciones * p / 100
+        acumulado = 0
+        for cubo, cantidad in enumerate(self.cubos):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                return (1 << cubo) / 1e6
+        return 0.0
+
+    def como_dict(self):
+        return {
+            "invocaciones": self.invocaciones,
+            "errores": self.errores,
+            "total_s": self.total,
+            "media_ms": self.total / self.invocaciones * 1e3 if self.invocaciones else 0.0,
+            "p50_ms": self.percentil(50) * 1e3,
+            "p99_ms": self.percentil(99) * 1e3,
+            "max_ms": self.maximo * 1e3,
+            "histograma_us": {1 << cubo: cantidad for cubo, cantidad in enumerate(self.cubos) if cantidad},
+        }
+
+
+class Ruta:
+    """Manejador de un tipo con su middleware ya encadenado"""
+
+    __slots__ = ("tipo", "manejador", "llamar")
+
+    def __init__(self, tipo, manejador, middleware=()):
+        self.tipo = tipo
+        self.manejador = manejador
+        llamar = manejador
+        for capa in reversed(middleware):
+            llamar = _envolver(capa, llamar)
+        self.llamar = llamar
+
+
+def _envolver(capa, siguiente):
+    async def llamar(websocket, mensaje):
+        return await capa(siguiente, websocket, mensaje)
+    return llamar
+
+
+class Despachador:
+    """Tabla (fase, tipo) → Ruta, con estadísticas por tipo"""
+
+    def __init__(self):
+        self.rutas = {fase: {} for fase in FASES}
+        self.por_defecto = {}      # {fase: manejador para tipos sin ruta}
+        self.estadisticas = {}     # {tipo: EstadisticasTipo}
+
+    def registrar(self, tipo, manejador, fases=(FASE_SALA,), middleware=()):
+        """Registra manejador(websocket, mensaje) para `tipo` en `fases`"""
+        ruta = Ruta(tipo, manejador, middleware)
+        for fase in fases:
+            if tipo in self.rutas[fase]:
+                raise ValueError(f"{tipo} ya tiene manejador en la fase {fase}")
+            self.rutas[fase][tipo] = ruta
+        return ruta
+
+    def registrar_por_defecto(self, fase, manejador):
+        """Manejador para los tipos que no tienen ruta en `fase`"""
+        self.por_defecto[fase] = Ruta(None, manejador)
+
+    def ruta(self, fase, tipo):
+        return self.rutas[fase].get(tipo) or self.por_defecto.get(fase)
+
+    async def despachar(self, fase, websocket, mensaje):
+        """Ejecuta el manejador de (fase, tipo) y retorna su resultado (None si no hay ruta)"""
+        tipo = mensaje.get("tipo")
+        ruta = self.ruta(fase, tipo)
+        if ruta is None:
+            logger.warning("Sin manejador para %s en la fase %s", tipo, fase)
+            return None
+
+        clave = tipo if ruta.tipo is not None else "(desconocido)"
+        inicio = time.perf_counter()
+        error = False
+        try:
+            return await ruta.llamar(websocket, mensaje)
+        except Exception:
+            error = True
+            raise
+        finally:
+            estadisticas = self.estadisticas.get(clave)
+            if estadisticas is None:
+                estadisticas = self.estadisticas[clave] = EstadisticasTipo()
+            estadisticas.registrar(time.perf_counter() - inicio, error)
+
+    def reiniciar_estadisticas(self):
+        self.estadisticas.clear()
+
+    def resumen(self, limite=None):
+        """Texto con los tipos ordenados por tiempo total de bucle consumido"""
+        filas = sorted(self.estadisticas.items(), key=lambda item: item[1].total, reverse=True)
+        total = sum(e.total for _, e in filas) or 1.0
+        lineas = [f"{'tipo':24s} {'n':>8s} {'err':>5s} {'total s':>9s} {'%':>6s} "
+                  f"{'media ms':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}"]
+        for tipo, e in filas[:limite]:
+            d = e.como_dict()
+            lineas.append(f"{tipo:24s} {e.invocaciones:8d} {e.errores:5d} {e.total:9.3f} "
+                          f"{100 * e.total / total:6.1f} {d['media_ms']:9.3f} {d['p50_ms']:8.3f} "
+                          f"{d['p99_ms']:8.3f} {d['max_ms']:8.3f}")
+        return "\n".join(lineas)
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+def requiere(condicion, error, responder):
+    """
+    Autorización: solo llama al manejador si condicion(websocket) es cierta;
+    si no, responde con responder(websocket, error) (p. ej. un mensaje ERROR).
+    """
+    async def middleware(siguiente, websocket, mensaje):
+        if not condicion(websocket):
+            await responder(websocket, error)
+            return None
+        return await siguiente(websocket, mensaje)
+    return middleware
+
+
+def limitar_frecuencia(maximo, ventana, responder, error="Demasiadas solicitudes, espera un momento"):
+    """
+    Límite por conexión: como mucho `maximo` llamadas cada `ventana` segundos.
+    Las que sobran se responden con responder(websocket, error) y no se procesan.
+    """
+    ventanas = weakref.WeakKeyDictionary()  # {websocket: (inicio de la ventana, llamadas)}
+
+    async def middleware(siguiente, websocket, mensaje):
+        ahora = time.monotonic()
+        inicio, llamadas = ventanas.get(websocket, (ahora, 0))
+        if ahora - inicio >= ventana:
+            inicio, llamadas = ahora, 0
+        if llamadas >= maximo:
+            await responder(websocket, error)
+            return None
+        ventanas[websocket] = (inicio, llamadas + 1)
+        return await siguiente(websocket, mensaje)
+
+    return middleware
+
+
+def registrar_lentos(umbral, log=logger):
+    """Deja un warning cuando un manejador tarda más de `umbral` segundos"""
+    async def middleware(siguiente, websocket, mensaje):
+        inicio = time.perf_counter()
+        try:
+            return await siguiente(websocket, mensaje)
+        finally:
+            duracion = time.perf_counter() - inicio
+            if duracion > umbral:
+                log.warning("🐢 %s tardó %.1f ms", mensaje.get('tipo'), duracion * 1e3)
+    return middleware
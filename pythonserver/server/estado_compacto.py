@@ -0,0 +1,105 @@
+"""
+Representación compacta del tablero de una sala.
+
+Las 16 fichas (4 colores x 4 fichas) viven en un array('H') de 16 enteros
+de 16 bits. Cada ranura codifica:
+
+    bits 0-1    color          (índice en proto.COLORES)
+    bits 2-3    estado         (BLOQUEADO, EN_JUEGO, CAMINO_META, META)
+    bits 4-10   posicion + 1   (0 = -1: cárcel / fuera del tablero)
+    bits 11-14  posicion_meta + 1 (0 = -1: no está en el camino a meta)
+
+gameToken y User son vistas sobre estas ranuras, así que copiar el estado
+de una partida (instantáneas, deshacer, simulación) es copiar 32 bytes.
+"""
+
+from array import array
+import protocol as proto
+
+ESTADOS = ("BLOQUEADO", "EN_JUEGO", "CAMINO_META", "META")
+CODIGO_ESTADO = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+CODIGO_COLOR = {color: codigo for codigo, color in enumerate(proto.COLORES)}
+
+RANURAS = len(proto.COLORES) * proto.FICHAS_POR_JUGADOR
+
+# Desplazamientos y máscaras de cada campo
+BITS_COLOR, MASCARA_COLOR = 0, 0x3
+BITS_ESTADO, MASCARA_ESTADO = 2, 0x3
+BITS_POSICION, MASCARA_POSICION = 4, 0x7F
+BITS_POSICION_META, MASCARA_POSICION_META = 11, 0xF
+
+POSICION_MAXIMA = MASCARA_POSICION - 1
+POSICION_META_MAXIMA = MASCARA_POSICION_META - 1
+
+
+def codificar(color, estado, posicion=-1, posicion_meta=-1):
+    """Empaqueta una ficha en un entero de 16 bits"""
+    if not -1 <= posicion <= POSICION_MAXIMA:
+        raise ValueError(f"posicion fuera de rango: {posicion}")
+    if not -1 <= posicion_meta <= POSICION_META_MAXIMA:
+        raise ValueError(f"posicion_meta fuera de rango: {posicion_meta}")
+    return (CODIGO_COLOR[color] << BITS_COLOR
+            | CODIGO_ESTADO[estado] << BITS_ESTADO
+            | (posicion + 1) << BITS_POSICION
+            | (posicion_meta + 1) << BITS_POSICION_META)
+
+
+def decodificar(valor):
+    """(color, estado, posicion, posicion_meta) de una ranura"""
+    return (
+        proto.COLORES[(valor >> BITS_COLOR) & MASCARA_COLOR],
+        ESTADOS[(valor >> BITS_ESTADO) & MASCARA_ESTADO],
+        ((valor >> BITS_POSICION) & MASCARA_POSICION) - 1,
+        ((valor >> BITS_POSICION_META) & MASCARA_POSICION_META) - 1,
+    )
+
+
+def ranura_de(color, ficha_id):
+    """Ranura fija de la ficha `ficha_id` de `color`"""
+    return CODIGO_COLOR[color] * proto.FICHAS_POR_JUGADOR + ficha_id
+
+
+class EstadoTablero:
+    """Las 16 ranuras de una sala (o menos, para fichas sueltas)"""
+
+    __slots__ = ("datos",)
+
+    def __init__(self, ranuras=RANURAS):
+        self.datos = array('H', bytes(2 * ranuras))
+        if ranuras == RANURAS:
+            for color in proto.COLORES:
+                self.reiniciar_color(color)
+
+    def reiniciar_color(self, color):
+        """Devuelve las 4 fichas de `color` a la cárcel"""
+        inicial = codificar(color, "BLOQUEADO")
+        inicio = ranura_de(color, 0)
+        for ranura in range(inicio, inicio + proto.FICHAS_POR_JUGADOR):
+            self.datos[ranura] = inicial
+
+    def instantanea(self):
+        """Copia inmutable del estado (bytes)"""
+        return self.datos.tobytes()
+
+    def restaurar(self, instantanea):
+        """Sobrescribe el estado con una instantánea (las vistas siguen válidas)"""
+        memoryview(self.datos).cast('B')[:] = instantanea
+
+    def copia(self):
+        otra = EstadoTablero.__new__(EstadoTablero)
+        otra.datos = array('H', self.datos)
+        return otra
+
+    def fichas(self):
+        """Itera (ranura, color, estado, posicion, posicion_meta)"""
+        for ranura, valor in enumerate(self.datos):
+            yield (ranura,) + decodificar(valor)
+
+    def __eq__(self, otro):
+        return isinstance(otro, EstadoTablero) and self.datos == otro.datos
+
+    def __len__(self):
+        return len(self.datos)
+
+    def __repr__(self):
+        return f"EstadoTablero({self.datos.tobytes().hex()})"
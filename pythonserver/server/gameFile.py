@@ -1,24 +1,270 @@
+import logging
+from estado_compacto import (
+    EstadoTablero, codificar, ESTADOS, CODIGO_ESTADO,
+    BITS_COLOR, MASCARA_COLOR, BITS_ESTADO, MASCARA_ESTADO,
+    BITS_POSICION, MASCARA_POSICION, POSICION_MAXIMA,
+    BITS_POSICION_META, MASCARA_POSICION_META, POSICION_META_MAXIMA,
+)
+from protocol import COLORES, FICHAS_POR_JUGADOR
+
+logger = logging.getLogger(__name__)
+
+ESTADO_EN_JUEGO = "EN_JUEGO"
+ESTADO_CAMINO_META = "CAMINO_META"
+ESTADO_META = "META"
+
+CASILLAS_TABLERO = 68
+POSICION_META = 7       # posicion_meta 7 = META (0-6 = camino a meta)
+PASOS_MAXIMOS = 12      # Suma máxima de dos dados; más allá se simula paso a paso
+MOVIMIENTO_ILEGAL = None
+
+# Tablas ya calculadas, una por configuración de seguro_meta
+_tablas_transicion = {}
+_tablas_compactas = {}
+
+
+def calcular_transicion(estado, posicion, posicion_meta, pasos, seguro_meta_color):
+    """
+    Resultado de un movimiento (misma regla que mover_paso_a_paso, en forma cerrada).
+    Retorna (estado, posicion, posicion_meta) o MOVIMIENTO_ILEGAL;
+    None en posicion/posicion_meta significa que ese campo no cambia.
+    """
+    if estado == ESTADO_CAMINO_META:
+        nueva_posicion_meta = posicion_meta + pasos
+        if nueva_posicion_meta > POSICION_META:
+            return MOVIMIENTO_ILEGAL
+        if nueva_posicion_meta == POSICION_META:
+            return (ESTADO_META, -1, POSICION_META)
+        return (ESTADO_CAMINO_META, None, nueva_posicion_meta)
+    
+    # Tablero principal: pasos hasta el seguro_meta (0 = ya está en él)
+    distancia = (seguro_meta_color - posicion) % CASILLAS_TABLERO
+    if distancia and pasos < distancia:
+        return (ESTADO_EN_JUEGO, (posicion + pasos) % CASILLAS_TABLERO, None)
+    if distancia and pasos == distancia:
+        return (ESTADO_EN_JUEGO, seguro_meta_color, None)
+    
+    restantes = pasos - distancia
+    if restantes > POSICION_META + 1:
+        return MOVIMIENTO_ILEGAL
+    if restantes == POSICION_META + 1:
+        return (ESTADO_META, -1, POSICION_META)
+    return (ESTADO_CAMINO_META, -1, restantes - 1)
+
+
+def tabla_transiciones(tablero):
+    """
+    {(color, estado, posicion|posicion_meta, pasos): resultado} para todos los
+    colores, casillas y pasos 1..PASOS_MAXIMOS. Se calcula una vez por
+    configuración de seguro_meta y se reutiliza.
+    """
+    tabla = getattr(tablero, "_tabla_transiciones", None)
+    if tabla is not None:
+        return tabla
+    
+    clave_tablero = tuple(sorted(tablero.seguro_meta.items()))
+    tabla = _tablas_transicion.get(clave_tablero)
+    if tabla is not None:
+        tablero._tabla_transiciones = tabla
+        return tabla
+    
+    tabla = {}
+    for color, seguro_meta_color in tablero.seguro_meta.items():
+        for pasos in range(1, PASOS_MAXIMOS + 1):
+            for posicion in range(CASILLAS_TABLERO):
+                tabla[(color, ESTADO_EN_JUEGO, posicion, pasos)] = calcular_transicion(
+                    ESTADO_EN_JUEGO, posicion, -1, pasos, seguro_meta_color)
+            for posicion_meta in range(POSICION_META):
+                tabla[(color, ESTADO_CAMINO_META, posicion_meta, pasos)] = calcular_transicion(
+                    ESTADO_CAMINO_META, -1, posicion_meta, pasos, seguro_meta_color)
+    
+    _tablas_transicion[clave_tablero] = tabla
+    tablero._tabla_transiciones = tabla
+    logger.debug("Tabla de transiciones calculada: %s entradas", len(tabla))
+    return tabla
+
+
+_CODIGO_EN_JUEGO = CODIGO_ESTADO[ESTADO_EN_JUEGO]
+_CODIGO_CAMINO_META = CODIGO_ESTADO[ESTADO_CAMINO_META]
+_CAMPO_POSICION = MASCARA_POSICION << BITS_POSICION
+_CAMPO_POSICION_META = MASCARA_POSICION_META << BITS_POSICION_META
+
+
+def _clave_compacta(valor, pasos):
+    """
+    Clave de la ranura empaquetada en la tabla compacta: se descarta el campo
+    que la regla no mira (posicion_meta en el tablero, posicion en el camino a meta).
+    """
+    codigo_estado = (valor >> BITS_ESTADO) & MASCARA_ESTADO
+    if codigo_estado == _CODIGO_EN_JUEGO:
+        return (valor & ~_CAMPO_POSICION_META) << 4 | pasos
+    if codigo_estado == _CODIGO_CAMINO_META:
+        return (valor & ~_CAMPO_POSICION) << 4 | pasos
+    return None
+
+
+def tabla_transiciones_compacta(tablero):
+    """
+    La misma tabla indexada por ranura empaquetada (estado_compacto):
+    {clave: (nuevo_valor, campos_que_se_conservan)} o MOVIMIENTO_ILEGAL.
+    """
+    tabla = getattr(tablero, "_tabla_transiciones_compacta", None)
+    if tabla is not None:
+        return tabla
+    
+    clave_tablero = tuple(sorted(tablero.seguro_meta.items()))
+    tabla = _tablas_compactas.get(clave_tablero)
+    if tabla is not None:
+        tablero._tabla_transiciones_compacta = tabla
+        return tabla
+    
+    tabla = {}
+    for (color, estado, lugar, pasos), resultado in tabla_transiciones(tablero).items():
+        if estado == ESTADO_EN_JUEGO:
+            valor = codificar(color, estado, lugar, -1)
+        else:
+            valor = codificar(color, estado, -1, lugar)
+        clave = _clave_compacta(valor, pasos)
+        if resultado is MOVIMIENTO_ILEGAL:
+            tabla[clave] = MOVIMIENTO_ILEGAL
+            continue
+        nuevo_estado, posicion, posicion_meta = resultado
+        conservar = (_CAMPO_POSICION if posicion is None else 0) | (_CAMPO_POSICION_META if posicion_meta is None else 0)
+        nuevo = codificar(color, nuevo_estado,
+                          -1 if posicion is None else posicion,
+                          -1 if posicion_meta is None else posicion_meta)
+        tabla[clave] = (nuevo, conservar)
+    
+    _tablas_compactas[clave_tablero] = tabla
+    tablero._tabla_transiciones_compacta = tabla
+    return tabla
+
+
 class gameToken:
-    def __init__(self, color, estado):
-        self.color = color
-        self.estado = estado  # BLOQUEADO, EN_JUEGO, CAMINO_META, META
-        self.posicion = -1    # -1 = en cárcel, 0-67 = en tablero
-        self.posicion_meta = -1  # -1 = no en meta, 0-7 = camino a meta
+    """
+    Vista sobre una ranura de un EstadoTablero (ver estado_compacto).
+    color, estado, posicion y posicion_meta se leen y escriben en el array
+    compartido de la sala; sin estado_tablero la ficha usa una ranura propia.
+    """
+    
+    __slots__ = ("_datos", "_ranura", "id")
+    
+    def __init__(self, color, estado, estado_tablero=None, ranura=0):
+        if estado_tablero is None:
+            estado_tablero = EstadoTablero(ranuras=1)
+        self._datos = estado_tablero.datos
+        self._ranura = ranura
+        self.id = ranura % FICHAS_POR_JUGADOR
+        # BLOQUEADO, EN_JUEGO, CAMINO_META, META; -1 = cárcel / fuera del camino a meta
+        self._datos[ranura] = codificar(color, estado)
+    
+    @property
+    def color(self):
+        return COLORES[(self._datos[self._ranura] >> BITS_COLOR) & MASCARA_COLOR]
+    
+    @property
+    def estado(self):
+        return ESTADOS[(self._datos[self._ranura] >> BITS_ESTADO) & MASCARA_ESTADO]
+    
+    @estado.setter
+    def estado(self, estado):
+        valor = self._datos[self._ranura] & ~(MASCARA_ESTADO << BITS_ESTADO)
+        self._datos[self._ranura] = valor | CODIGO_ESTADO[estado] << BITS_ESTADO
+    
+    @property
+    def posicion(self):
+        """-1 = en cárcel, 0-67 = en tablero"""
+        return ((self._datos[self._ranura] >> BITS_POSICION) & MASCARA_POSICION) - 1
+    
+    @posicion.setter
+    def posicion(self, posicion):
+        if not -1 <= posicion <= POSICION_MAXIMA:
+            raise ValueError(f"posicion fuera de rango: {posicion}")
+        valor = self._datos[self._ranura] & ~(MASCARA_POSICION << BITS_POSICION)
+        self._datos[self._ranura] = valor | (posicion + 1) << BITS_POSICION
+    
+    @property
+    def posicion_meta(self):
+        """-1 = no en meta, 0-7 = camino a meta"""
+        return ((self._datos[self._ranura] >> BITS_POSICION_META) & MASCARA_POSICION_META) - 1
+    
+    @posicion_meta.setter
+    def posicion_meta(self, posicion_meta):
+        if not -1 <= posicion_meta <= POSICION_META_MAXIMA:
+            raise ValueError(f"posicion_meta fuera de rango: {posicion_meta}")
+        valor = self._datos[self._ranura] & ~(MASCARA_POSICION_META << BITS_POSICION_META)
+        self._datos[self._ranura] = valor | (posicion_meta + 1) << BITS_POSICION_META
     
     def desbloquear(self, salida):
         """Saca la ficha de la cárcel a la casilla de salida"""
         self.estado = "EN_JUEGO"
         self.posicion = salida
-        print(f"✓ Ficha {self.color} desbloqueada en casilla {salida + 1}")
+        logger.debug("✓ Ficha %s desbloqueada en casilla %s", self.color, salida + 1)
     
     def mover(self, pasos, tablero):
-        """Mueve la ficha en el tablero"""
+        """Mueve la ficha en el tablero (consulta O(1) en la tabla de transiciones)"""
+        valor = self._datos[self._ranura]
+        clave = _clave_compacta(valor, pasos) if 0 < pasos <= PASOS_MAXIMOS else None
+        tabla = tabla_transiciones_compacta(tablero)
+        if clave not in tabla:
+            # Ficha bloqueada/en meta o pasos fuera de la tabla: algoritmo original
+            return self.mover_paso_a_paso(pasos, tablero)
+        
+        transicion = tabla[clave]
+        if transicion is MOVIMIENTO_ILEGAL:
+            logger.debug("✗ Ficha no puede avanzar %s pasos", pasos)
+            return False
+        
+        nuevo, conservar = transicion
+        self._datos[self._ranura] = nuevo | (valor & conservar)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("→ Ficha %s movida %s pasos: %s (posición %s, meta %s)", self.color, pasos, self.estado, self.posicion, self.posicion_meta)
+        return True
+    
+    def _clave_transicion(self, pasos):
+        if self.estado == ESTADO_CAMINO_META:
+            return (self.color, ESTADO_CAMINO_META, self.posicion_meta, pasos)
+        if self.estado == ESTADO_EN_JUEGO:
+            return (self.color, ESTADO_EN_JUEGO, self.posicion, pasos)
+        return None
+    
+    def resultado_movimiento(self, pasos, tablero):
+        """
+        (estado, posicion, posicion_meta) tras avanzar `pasos` sin modificar la
+        ficha, o MOVIMIENTO_ILEGAL. None en posicion/posicion_meta = no cambia.
+        """
+        return tabla_transiciones(tablero).get(self._clave_transicion(pasos), MOVIMIENTO_ILEGAL)
+    
+    def puede_mover(self, pasos, tablero):
+        """True si avanzar `pasos` es un movimiento legal para esta ficha"""
+        if not 0 < pasos <= PASOS_MAXIMOS:
+            return False
+        clave = _clave_compacta(self._datos[self._ranura], pasos)
+        return tabla_transiciones_compacta(tablero).get(clave, MOVIMIENTO_ILEGAL) is not MOVIMIENTO_ILEGAL
+    
+    def movimientos_posibles(self, valores, tablero):
+        """puede_mover para varios valores de pasos leyendo la ranura una sola vez"""
+        base = _clave_compacta(self._datos[self._ranura], 0)
+        if base is None:
+            return [False] * len(valores)
+        tabla = tabla_transiciones_compacta(tablero)
+        return [
+            0 < pasos <= PASOS_MAXIMOS and tabla.get(base | pasos, MOVIMIENTO_ILEGAL) is not MOVIMIENTO_ILEGAL
+            for pasos in valores
+        ]
+    
+    def mover_paso_a_paso(self, pasos, tablero):
+        """
+        Algoritmo original: simula el movimiento casilla por casilla.
+        Se conserva como referencia para verificar la tabla de transiciones
+        y para valores de pasos fuera de la tabla.
+        """
         if self.estado == "BLOQUEADO":
-            print("✗ La ficha está bloqueada en la cárcel")
+            logger.debug("✗ La ficha está bloqueada en la cárcel")
             return False
         
         if self.estado == "META":
-            print("✗ La ficha ya está en meta")
+            logger.debug("✗ La ficha ya está en meta")
             return False
             
         if self.estado == "CAMINO_META":
@@ -28,20 +274,20 @@ class gameToken:
             # Verificar límites del camino a meta (0-7, donde 7 = META)
             if nueva_posicion_meta > 7:
                 # No puede pasar de META
-                print(f"✗ Ficha {self.color} no puede avanzar: necesita exactamente {7 - self.posicion_meta} pasos (intentó {pasos})")
+                logger.debug("✗ Ficha %s no puede avanzar: necesita exactamente %s pasos (intentó %s)", self.color, 7 - self.posicion_meta, pasos)
                 return False
             elif nueva_posicion_meta == 7:
                 # Llegó exactamente a META
                 self.estado = "META"
                 self.posicion_meta = 7
                 self.posicion = -1  # Ya no está en el tablero
-                print(f"🏁 ¡Ficha {self.color} llegó a la META!")
+                logger.debug("🏁 ¡Ficha %s llegó a la META!", self.color)
                 return True
             else:
                 # Avanza en el camino a meta (0-6)
                 self.posicion_meta = nueva_posicion_meta
                 casilla_nombre = tablero.casillas_meta[self.color][nueva_posicion_meta]
-                print(f"→ Ficha {self.color} avanzó a {casilla_nombre} (posición {nueva_posicion_meta}/7)")
+                logger.debug("→ Ficha %s avanzó a %s (posición %s/7)", self.color, casilla_nombre, nueva_posicion_meta)
                 return True
         
         # Mover en el tablero principal
@@ -57,7 +303,7 @@ class gameToken:
                     self.estado = "META"
                     self.posicion_meta = 7
                     self.posicion = -1
-                    print(f"🏁 ¡Ficha {self.color} llegó a la META desde seguro_meta!")
+                    logger.debug("🏁 ¡Ficha %s llegó a la META desde seguro_meta!", self.color)
                     return True
                 else:
                     # Entra al camino a meta (pasos 1-7 = sr1 a sr7)
@@ -65,11 +311,11 @@ class gameToken:
                     self.posicion_meta = pasos - 1  # pasos=1 → sr1 (pos 0), pasos=2 → sr2 (pos 1)...
                     self.posicion = -1  # ⭐ CRÍTICO: Ya no está en el tablero principal
                     casilla_meta_nombre = tablero.casillas_meta[self.color][self.posicion_meta]
-                    print(f"🎯 Ficha {self.color} entró al camino a meta en {casilla_meta_nombre} (posición {self.posicion_meta}/7)")
+                    logger.debug("🎯 Ficha %s entró al camino a meta en %s (posición %s/7)", self.color, casilla_meta_nombre, self.posicion_meta)
                     return True
             else:
                 # Más de 8 pasos, no puede entrar
-                print(f"✗ No puede entrar a meta desde seguro_meta: necesita máximo 8 pasos (intentó {pasos})")
+                logger.debug("✗ No puede entrar a meta desde seguro_meta: necesita máximo 8 pasos (intentó %s)", pasos)
                 return False
         
         # ⭐ Verificar si PASA POR el seguro_meta durante este movimiento
@@ -104,7 +350,7 @@ class gameToken:
             if pasos_restantes == 0:
                 # La ficha se quedó en el seguro_meta (no entró al camino)
                 self.posicion = seguro_meta_color
-                print(f"→ Ficha {self.color} se movió a seguro_meta (C{seguro_meta_color + 1})")
+                logger.debug("→ Ficha %s se movió a seguro_meta (C%s)", self.color, seguro_meta_color + 1)
                 return True
             
             if pasos_restantes <= 8:  # Puede entrar al camino a meta
@@ -113,7 +359,7 @@ class gameToken:
                     self.estado = "META"
                     self.posicion_meta = 7
                     self.posicion = -1
-                    print(f"🏁 ¡Ficha {self.color} llegó a la META!")
+                    logger.debug("🏁 ¡Ficha %s llegó a la META!", self.color)
                     return True
                 else:
                     # Entra al camino a meta
@@ -121,11 +367,11 @@ class gameToken:
                     self.posicion = -1  # ⭐ CRÍTICO: Ya no está en el tablero principal
                     self.posicion_meta = pasos_restantes - 1  # ⭐ IMPORTANTE: Establecer DESPUÉS de cambiar posición
                     casilla_meta_nombre = tablero.casillas_meta[self.color][self.posicion_meta]
-                    print(f"🎯 Ficha {self.color} entró al camino a meta en {casilla_meta_nombre} (posición {self.posicion_meta}/7)")
+                    logger.debug("🎯 Ficha %s entró al camino a meta en %s (posición %s/7)", self.color, casilla_meta_nombre, self.posicion_meta)
                     return True
             else:
                 # Los pasos exceden el camino a meta, no puede entrar
-                print(f"✗ No puede entrar a meta: pasos restantes ({pasos_restantes}) > 8")
+                logger.debug("✗ No puede entrar a meta: pasos restantes (%s) > 8", pasos_restantes)
                 return False
         
         # No cruzó meta, mover normalmente en el tablero
@@ -134,7 +380,7 @@ class gameToken:
             nueva_posicion = nueva_posicion - 68
         
         self.posicion = nueva_posicion
-        print(f"→ Ficha {self.color} se movió de C{posicion_anterior + 1} a C{self.posicion + 1}")
+        logger.debug("→ Ficha %s se movió de C%s a C%s", self.color, posicion_anterior + 1, self.posicion + 1)
         return True
     
     def __str__(self):
@@ -1,15 +1,56 @@
 import random
 import threading
+import contextlib
+import functools
 import logging
+import os
 from parchis import Table
 from user import User
 import gameFile as tkn
+from estado_compacto import EstadoTablero, ranura_de
 import protocol as proto
+import bitacora
 
 logger = logging.getLogger(__name__)
 
+# Reconstruir y comparar el índice de ocupación tras cada cambio (solo pruebas/depuración)
+VERIFICAR_OCUPACION = os.environ.get("PARCHIS_VERIFICAR_OCUPACION") == "1"
+
+
+def _registrado(op):
+    """
+    Anota en la bitácora de la sala (ver bitacora.py) cada llamada externa al
+    método, con el id del jugador en lugar del socket. Las llamadas anidadas
+    (un método registrado que usa otro) ya quedan cubiertas por la externa.
+    """
+    def decorar(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            if self.bitacora is None or self._anotando:
+                return metodo(self, *args, **kwargs)
+            with self.lock:
+                info = self.clientes.get(args[0]) if args and op in bitacora.POR_JUGADOR else None
+                self._anotando = True
+                try:
+                    resultado = metodo(self, *args, **kwargs)
+                finally:
+                    self._anotando = False
+                if info is None and op == bitacora.ALTA:
+                    info = self.clientes.get(args[0])
+                self.bitacora.anotar(op, info["id"] if info else None, args, resultado)
+                return resultado
+        return envoltura
+    return decorar
+
+
 class GameManager:
-    def __init__(self):
+    # Campos de turno que viajan en TABLERO y, si cambian, en TABLERO_DELTA
+    CAMPOS_TURNO = (
+        "turno_actual", "dados_lanzados", "ultimo_dado1", "ultimo_dado2", "ultima_suma",
+        "ultimo_es_doble", "dobles_consecutivos", "accion_realizada", "debe_avanzar_turno"
+    )
+
+    def __init__(self, modo_actor=False):
         self.tablero = Table()
         self.jugadores = []
         self.clientes = {}
@@ -18,7 +59,10 @@ class GameManager:
         self.turno_actual = 0
         self.juego_iniciado = False
         self.juego_terminado = False
-        self.lock = threading.RLock()
+        # ⭐ En modo actor una sola tarea asyncio (salas.ActorSala) ejecuta los
+        # comandos de la sala de uno en uno: el RLock sobra y se usa un contexto nulo
+        self.modo_actor = modo_actor
+        self.lock = contextlib.nullcontext() if modo_actor else threading.RLock()
         
         # Nuevo: ID monotónico para jugadores
         self.next_player_id = 0
@@ -44,7 +88,26 @@ class GameManager:
         self.tiradas_determinacion = {}  # {websocket: {'nombre', 'color', 'dado1', 'dado2', 'suma'}}
         self.jugadores_en_desempate = set()  # Jugadores que deben tirar en desempate
         self.orden_turnos_determinado = []  # Lista ordenada de jugadores según determinación
+        
+        # ⭐ NUEVO: Versionado del tablero para TABLERO_DELTA
+        self.version_tablero = 0
+        self._huella_tablero = None  # (fichas, turno) de la última versión emitida
+        
+        # ⭐ NUEVO: Índice de ocupación {casilla: [(jugador, ficha_id), ...]} (solo fichas EN_JUEGO)
+        self.ocupacion = {}
+        self.verificar_ocupacion = VERIFICAR_OCUPACION
+        
+        # ⭐ NUEVO: Las 16 fichas de la sala en un array compacto; gameToken/User son vistas
+        self.estado_tablero = EstadoTablero()
+        
+        # ⭐ NUEVO: Caché de generar_movimientos_legales: (clave, (legales, fichas_movibles))
+        self._cache_movimientos = None
+        
+        # ⭐ NUEVO: Bitácora de la sala (bitacora.Bitacora) o None; ver _registrado
+        self.bitacora = None
+        self._anotando = False
     
+    @_registrado(bitacora.ALTA)
     def agregar_jugador(self, websocket, nombre, color_elegido=None, usuario_id=None):
         """
         Agrega un jugador al juego.
@@ -57,7 +120,7 @@ class GameManager:
         Retorna: (color, error, es_admin, es_host)
         """
         with self.lock:
-            logger.debug(f"🔒 Agregando jugador {nombre} con color preferido: {color_elegido} (usuario_id={usuario_id})")
+            logger.debug("🔒 Agregando jugador %s con color preferido: %s (usuario_id=%s)", nombre, color_elegido, usuario_id)
 
             # Validar límite de jugadores
             if len(self.jugadores) >= proto.MAX_JUGADORES:
@@ -90,8 +153,7 @@ class GameManager:
 
             # Crear fichas bloqueadas en la cárcel
             for i in range(proto.FICHAS_POR_JUGADOR):
-                ficha = tkn.gameToken(color, proto.ESTADO_BLOQUEADO)
-                ficha.id = i
+                ficha = tkn.gameToken(color, proto.ESTADO_BLOQUEADO, self.estado_tablero, ranura_de(color, i))
                 usuario.agregar_ficha(ficha)
 
             # Añadir a lista de jugadores y mapping de clientes
@@ -111,7 +173,7 @@ class GameManager:
                 self.admin_id = jugador_id
                 usuario.es_admin = True
                 es_admin = True
-                logger.info(f"🔑 {nombre} (ID {jugador_id}) designado como administrador del servidor")
+                logger.info("🔑 %s (ID %s) designado como administrador del servidor", nombre, jugador_id)
             else:
                 usuario.es_admin = False
 
@@ -121,9 +183,9 @@ class GameManager:
                 self.host_cliente = websocket
                 self.host_info = {"nombre": nombre, "color": color, "socket": websocket}
                 es_host = True
-                logger.info(f"🏠 {nombre} es ahora el HOST del juego")
+                logger.info("🏠 %s es ahora el HOST del juego", nombre)
 
-            logger.info(f"✅ Jugador {nombre} agregado como {color} (ID: {jugador_id}, Admin: {es_admin}, Host: {es_host})")
+            logger.info("✅ Jugador %s agregado como %s (ID: %s, Admin: %s, Host: %s)", nombre, color, jugador_id, es_admin, es_host)
             return color, None, es_admin, es_host
             
 
@@ -134,9 +196,10 @@ class GameManager:
         with self.lock:
             colores_usados = [j.color for j in self.jugadores]
             colores_disponibles = [c for c in proto.COLORES if c not in colores_usados]
-            logger.debug(f"🎨 Colores disponibles: {colores_disponibles}")
+            logger.debug("🎨 Colores disponibles: %s", colores_disponibles)
             return colores_disponibles
     
+    @_registrado(bitacora.BAJA)
     def eliminar_jugador(self, socket_cliente):
         """
         Elimina el jugador asociado al socket_cliente.
@@ -165,19 +228,22 @@ class GameManager:
                     self.turno_actual -= 1
                 self.jugadores.remove(jugador)
             except ValueError:
-                logger.warning(f"Jugador {nombre} no encontrado en lista de jugadores")
+                logger.warning("Jugador %s no encontrado en lista de jugadores", nombre)
+
+            self._quitar_de_ocupacion(jugador)
+            self.estado_tablero.reiniciar_color(color)
 
             # Eliminar del mapping de clientes
             try:
                 del self.clientes[socket_cliente]
             except KeyError:
-                logger.warning(f"Socket {socket_cliente} no encontrado en mapping de clientes al eliminar")
+                logger.warning("Socket %s no encontrado en mapping de clientes al eliminar", socket_cliente)
 
             admin_promoted = None
 
             # Gestionar cambio de admin si es necesario
             if self.admin_cliente == socket_cliente:
-                logger.info(f"El administrador {nombre} se ha desconectado")
+                logger.info("El administrador %s se ha desconectado", nombre)
                 self.admin_cliente = None
                 self.admin_id = None
 
@@ -207,7 +273,7 @@ class GameManager:
                                 "nombre": data.get("nombre"),
                                 "color": data.get("color")
                             }
-                            logger.info(f"🔑 Nuevo administrador: {data.get('nombre')} (ID: {data.get('id')})")
+                            logger.info("🔑 Nuevo administrador: %s (ID: %s)", data.get('nombre'), data.get('id'))
                             break
 
                     if not self.admin_cliente:
@@ -215,10 +281,36 @@ class GameManager:
                 else:
                     logger.info("No quedan jugadores, juego sin administrador")
 
-            logger.info(f"✅ Jugador {nombre} ({color}) eliminado")
+            logger.info("✅ Jugador %s (%s) eliminado", nombre, color)
             return nombre, color, admin_promoted
 
     
+    def reasignar_jugador(self, anterior, websocket):
+        """
+        Pasa el jugador de `anterior` (un bitacora.Ausente restaurado) a la
+        nueva conexión, conservando su id, fichas y lugar en el turno.
+        No se anota: la bitácora identifica a los jugadores por id.
+        """
+        with self.lock:
+            if anterior not in self.clientes:
+                return None
+            self.clientes = {websocket if ws is anterior else ws: info for ws, info in self.clientes.items()}
+            if anterior in self.tiradas_determinacion:
+                self.tiradas_determinacion = {websocket if ws is anterior else ws: tirada
+                                              for ws, tirada in self.tiradas_determinacion.items()}
+            if anterior in self.jugadores_en_desempate:
+                self.jugadores_en_desempate.discard(anterior)
+                self.jugadores_en_desempate.add(websocket)
+            self.orden_turnos_determinado = [websocket if ws is anterior else ws for ws in self.orden_turnos_determinado]
+            if self.admin_cliente is anterior:
+                self.admin_cliente = websocket
+            if getattr(self, "host_cliente", None) is anterior:
+                self.host_cliente = websocket
+                self.host_info["socket"] = websocket
+            logger.info("🔁 %s (ID %s) recupera su lugar en la mesa", self.clientes[websocket]["nombre"], self.clientes[websocket]["id"])
+            return self.clientes[websocket]
+
+    @_registrado(bitacora.DESCONEXION_EN_TURNO)
     def manejar_desconexion_en_turno(self, socket_cliente):
         """Maneja cuando se desconecta el jugador que tiene el turno"""
         with self.lock:
@@ -239,6 +331,7 @@ class GameManager:
     # MÉTODOS DE DETERMINACIÓN DE TURNOS
     # ============================================
     
+    @_registrado(bitacora.INICIO_DETERMINACION)
     def iniciar_determinacion_turnos(self):
         """
         Inicia la fase de determinación de turnos.
@@ -254,9 +347,10 @@ class GameManager:
             self.jugadores_en_desempate = set()
             
             logger.info("✨ Iniciando fase de determinación de turnos")
-            logger.info(f"Jugadores participantes: {[info['nombre'] for info in self.clientes.values()]}")
+            logger.info("Jugadores participantes: %s", [info['nombre'] for info in self.clientes.values()])
             return True
     
+    @_registrado(bitacora.TIRADA_DETERMINACION)
     def registrar_tirada_determinacion(self, websocket, dado1, dado2):
         """
         Registra la tirada de un jugador durante la determinación.
@@ -292,7 +386,7 @@ class GameManager:
                 'suma': suma
             }
             
-            logger.info(f"📝 Tirada registrada: {info['nombre']} ({info['color']}) = [{dado1}][{dado2}] = {suma}")
+            logger.info("📝 Tirada registrada: %s (%s) = [%s][%s] = %s", info['nombre'], info['color'], dado1, dado2, suma)
             
             # Verificar si todos los jugadores requeridos han tirado
             if self.jugadores_en_desempate:
@@ -351,8 +445,8 @@ class GameManager:
                 if datos['suma'] == max_suma
             ]
             
-            logger.info(f"🎯 Puntaje más alto: {max_suma}")
-            logger.info(f"🎯 Jugadores con puntaje máximo: {[d['nombre'] for _, d in jugadores_max]}")
+            logger.info("🎯 Puntaje más alto: %s", max_suma)
+            logger.info("🎯 Jugadores con puntaje máximo: %s", [d['nombre'] for _, d in jugadores_max])
             
             if len(jugadores_max) == 1:
                 # ¡Hay un ganador claro!
@@ -382,8 +476,8 @@ class GameManager:
                 for _, datos in jugadores_empatados
             ]
             
-            logger.info(f"🔄 Empate detectado con {valor_empate} puntos")
-            logger.info(f"🔄 Jugadores en desempate: {[j['nombre'] for j in jugadores_info]}")
+            logger.info("🔄 Empate detectado con %s puntos", valor_empate)
+            logger.info("🔄 Jugadores en desempate: %s", [j['nombre'] for j in jugadores_info])
             
             return False, {
                 "empate": True,
@@ -408,8 +502,8 @@ class GameManager:
             
             secuencia = SECUENCIAS_TURNOS.get(color_ganador, ['rojo', 'verde', 'amarillo', 'azul'])
             
-            logger.info(f"🏆 Ganador: {datos_ganador['nombre']} ({color_ganador})")
-            logger.info(f"📋 Secuencia de turnos: {' -> '.join(secuencia)}")
+            logger.info("🏆 Ganador: %s (%s)", datos_ganador['nombre'], color_ganador)
+            logger.info("📋 Secuencia de turnos: %s", ' -> '.join(secuencia))
             
             # Crear mapa de color -> websocket
             color_a_websocket = {
@@ -432,7 +526,7 @@ class GameManager:
             
             self.jugadores = jugadores_ordenados
             
-            logger.info(f"✅ Orden final establecido: {' -> '.join([self.clientes[ws]['nombre'] for ws in self.orden_turnos_determinado])}")
+            logger.info("✅ Orden final establecido: %s", ' -> '.join([self.clientes[ws]['nombre'] for ws in self.orden_turnos_determinado]))
             
             # Preparar información del orden para enviar al cliente
             orden_info = [
@@ -464,6 +558,7 @@ class GameManager:
         with self.lock:
             return len(self.jugadores) >= proto.MIN_JUGADORES
     
+    @_registrado(bitacora.INICIAR_JUEGO)
     def iniciar_juego(self):
         with self.lock:
             logger.debug("🔒 Iniciando juego")
@@ -472,6 +567,19 @@ class GameManager:
             self._resetear_estado_turno()
             logger.info("✅ Juego iniciado")
     
+    @_registrado(bitacora.DESCARTAR_PREMIO)
+    def descartar_premio(self):
+        """3 dobles sin fichas elegibles para el premio: se anula antes de pasar el turno"""
+        with self.lock:
+            self.premio_tres_dobles = False
+            self.dobles_consecutivos = 0
+            self.ultimo_es_doble = False
+    
+    @_registrado(bitacora.TERMINAR)
+    def terminar_juego(self):
+        with self.lock:
+            self.juego_terminado = True
+    
     def _resetear_estado_turno(self):
         """Resetea el estado del turno actual"""
         self.dados_lanzados = False
@@ -496,7 +604,7 @@ class GameManager:
     def es_turno_de(self, socket_cliente):
         """Verifica si es el turno del cliente"""
         with self.lock:
-            logger.debug(f"🔒 Verificando turno para cliente")
+            logger.debug("🔒 Verificando turno para cliente")
             
             if socket_cliente not in self.clientes:
                 logger.debug("Cliente no encontrado")
@@ -508,7 +616,7 @@ class GameManager:
                 return False
             
             es_turno = self.clientes[socket_cliente]["jugador"] == jugador_actual
-            logger.debug(f"¿Es su turno? {es_turno}")
+            logger.debug("¿Es su turno? %s", es_turno)
             return es_turno
     
     def puede_hacer_alguna_accion(self, socket_cliente):
@@ -526,41 +634,23 @@ class GameManager:
                     return True
                 # ⭐ CONTINUAR verificando fichas en juego aunque no haya en cárcel
             
-            # Revisar fichas EN_JUEGO (en tablero principal)
-            fichas_en_tablero = [f for f in jugador.fichas 
-                                if f.estado == proto.ESTADO_EN_JUEGO and
-                                not (hasattr(f, 'posicion_meta') and f.posicion_meta is not None and f.posicion_meta >= 0)]
-            
-            # Si hay fichas en el tablero principal, puede moverlas
-            if fichas_en_tablero:
-                return True
-            
-            # Revisar fichas en CAMINO_META
-            fichas_en_camino_meta = [f for f in jugador.fichas 
-                                     if f.estado in [proto.ESTADO_EN_JUEGO, "CAMINO_META"] and
-                                     hasattr(f, 'posicion_meta') and f.posicion_meta is not None and f.posicion_meta >= 0]
-            
-            # Verificar si alguna ficha en camino a meta puede moverse con los dados disponibles
-            for ficha in fichas_en_camino_meta:
-                pasos_restantes = 7 - ficha.posicion_meta
-                # ⭐ CRÍTICO: Verificar dados individuales Y suma
-                if self.ultimo_es_doble:
-                    # Con dobles, puede usar cualquiera de los dos dados individuales O la suma
-                    if self.ultimo_dado1 <= pasos_restantes or self.ultimo_dado2 <= pasos_restantes or self.ultima_suma <= pasos_restantes:
-                        return True
-                else:
-                    # Sin dobles, puede usar dados individuales o suma
-                    if self.ultimo_dado1 <= pasos_restantes or self.ultimo_dado2 <= pasos_restantes or self.ultima_suma <= pasos_restantes:
-                        return True
-            
-            return False
+            # Fichas en tablero o en camino a meta: basta con un movimiento legal
+            legales, _ = self._analizar_movimientos(jugador)
+            return bool(legales)
     
-    def lanzar_dados(self):
-        """Lanza los dados - DEBE LLAMARSE CON LOCK EXTERNO"""
+    @_registrado(bitacora.DADOS)
+    def lanzar_dados(self, dados=None):
+        """
+        Lanza los dados - DEBE LLAMARSE CON LOCK EXTERNO.
+        dados: (dado1, dado2) fijos en vez de aleatorios (reproducir partidas registradas)
+        """
         logger.debug("🎲 Generando dados...")
         
-        self.ultimo_dado1 = random.randint(3, 6)
-        self.ultimo_dado2 = random.randint(4, 6)
+        if dados is None:
+            self.ultimo_dado1 = random.randint(3, 6)
+            self.ultimo_dado2 = random.randint(4, 6)
+        else:
+            self.ultimo_dado1, self.ultimo_dado2 = dados
         self.ultima_suma = self.ultimo_dado1 + self.ultimo_dado2
         self.ultimo_es_doble = self.ultimo_dado1 == self.ultimo_dado2
         self.dados_lanzados = True
@@ -573,26 +663,26 @@ class GameManager:
             
             # ⭐ PREMIO: Si llegó a 3 dobles, puede sacar una ficha del juego
             if self.dobles_consecutivos >= self.max_dobles:
-                logger.info(f"🎉 ¡PREMIO! Jugador sacó {self.dobles_consecutivos} dobles consecutivos")
+                logger.info("🎉 ¡PREMIO! Jugador sacó %s dobles consecutivos", self.dobles_consecutivos)
                 logger.info("🏆 Puede elegir UNA ficha para enviarla a META (sacarla del juego)")
                 self.premio_tres_dobles = True  # Nueva bandera
                 self.debe_avanzar_turno = True  # Después de elegir, avanza turno
                 # ⚠️ NO resetear ultimo_es_doble aquí - se hace al aplicar el premio
             else:
                 self.debe_avanzar_turno = False
-                logger.debug(f"¡DOBLES! ({self.dobles_consecutivos}/{self.max_dobles}) - Mantiene turno")
+                logger.debug("¡DOBLES! (%s/%s) - Mantiene turno", self.dobles_consecutivos, self.max_dobles)
         else:
             self.dobles_consecutivos = 0
             # Ya no establecemos debe_avanzar_turno aquí, lo manejará el método mover_ficha
             logger.debug("Sin dobles - Verificar si puede hacer acciones")
         
-        logger.info(f"🎲 Dados: [{self.ultimo_dado1}] [{self.ultimo_dado2}] = {self.ultima_suma}")
+        logger.debug("🎲 Dados: [%s] [%s] = %s", self.ultimo_dado1, self.ultimo_dado2, self.ultima_suma)
         return self.ultimo_dado1, self.ultimo_dado2, self.ultima_suma, self.ultimo_es_doble
     
-    def lanzar_dados_safe(self):
+    def lanzar_dados_safe(self, dados=None):
         """Versión segura de lanzar dados con lock"""
         with self.lock:
-            return self.lanzar_dados()
+            return self.lanzar_dados(dados)
     
     def necesita_pasar_turno_automaticamente(self, socket_cliente):
         """⭐ NUEVO: Determina si debe pasar el turno automáticamente"""
@@ -609,11 +699,12 @@ class GameManager:
             
             # Si no puede hacer nada, pasar turno automáticamente
             if not puede_actuar:
-                logger.info("❗ Jugador no puede hacer ninguna acción - pasando turno automáticamente")
+                logger.debug("❗ Jugador no puede hacer ninguna acción - pasando turno automáticamente")
                 return True
             
             return False
     
+    @_registrado(bitacora.SACAR_TODAS)
     def sacar_todas_fichas_carcel(self, socket_cliente):
         """Saca TODAS las fichas de la cárcel automáticamente cuando sale doble"""
         with self.lock:
@@ -648,9 +739,10 @@ class GameManager:
             for ficha in fichas_bloqueadas:
                 ficha.estado = proto.ESTADO_EN_JUEGO
                 ficha.posicion = salida
+                self._reubicar_ficha(jugador, jugador.fichas.index(ficha), proto.ESTADO_BLOQUEADO, -1)
                 ficha_id = getattr(ficha, 'id', 0)
                 fichas_liberadas.append(ficha_id)
-                logger.info(f"🔓 Ficha {ficha_id} de {color} liberada automáticamente a posición {salida}")
+                logger.debug("🔓 Ficha %s de %s liberada automáticamente a posición %s", ficha_id, color, salida)
                 
                 # ⭐ NUEVO: Ejecutar capturas para cada ficha liberada
                 fichas_capturadas = self.ejecutar_capturas(salida, color, jugador)
@@ -667,6 +759,7 @@ class GameManager:
             
             return True, resultado
     
+    @_registrado(bitacora.SACAR_CARCEL)
     def sacar_de_carcel(self, socket_cliente):
         """Saca UNA ficha de la cárcel cuando sale doble"""
         with self.lock:
@@ -706,9 +799,10 @@ class GameManager:
             # Cambiar estado y posición
             ficha.estado = proto.ESTADO_EN_JUEGO
             ficha.posicion = salida
+            self._reubicar_ficha(jugador, jugador.fichas.index(ficha), proto.ESTADO_BLOQUEADO, -1)
             
             ficha_id = getattr(ficha, 'id', 0)
-            logger.info(f"🔓 Ficha {ficha_id} de {color} liberada a posición {salida}")
+            logger.debug("🔓 Ficha %s de %s liberada a posición %s", ficha_id, color, salida)
             
             # ⭐ NUEVO: Ejecutar capturas al salir de la cárcel
             fichas_capturadas = self.ejecutar_capturas(salida, color, jugador)
@@ -724,13 +818,14 @@ class GameManager:
             
             return True, resultado
     
+    @_registrado(bitacora.MOVER)
     def mover_ficha(self, socket_cliente, ficha_id, dado_elegido):
         """
         Mueve una ficha usando el dado elegido.
         dado_elegido: 1 = primer dado, 2 = segundo dado, 3 = suma de dados
         """
         with self.lock:
-            logger.debug(f"Procesando movimiento de ficha {ficha_id} con dado {dado_elegido}")
+            logger.debug("Procesando movimiento de ficha %s con dado %s", ficha_id, dado_elegido)
             
             # ⭐ NUEVO: Si hay premio activo, rechazar movimiento normal
             if self.premio_tres_dobles:
@@ -757,6 +852,9 @@ class GameManager:
             # Validar que el dado no haya sido usado ya
             if dado_elegido in [1, 2] and dado_elegido in self.dados_usados:
                 return False, f"El dado {dado_elegido} ya fue usado"
+            # ⭐ La suma consume los dos dados: no se puede usar después de uno suelto
+            if dado_elegido == 3 and self.dados_usados:
+                return False, "Ya usaste un dado: la suma no está disponible"
             
             # Validar que la ficha no esté en cárcel o meta
             if ficha.estado == "BLOQUEADO":
@@ -767,61 +865,38 @@ class GameManager:
             # Determinar el valor del movimiento según el dado elegido
             if dado_elegido == 1:
                 valor_movimiento = self.ultimo_dado1
-                logger.debug(f"Usando primer dado: {valor_movimiento}")
+                logger.debug("Usando primer dado: %s", valor_movimiento)
             elif dado_elegido == 2:
                 valor_movimiento = self.ultimo_dado2
-                logger.debug(f"Usando segundo dado: {valor_movimiento}")
+                logger.debug("Usando segundo dado: %s", valor_movimiento)
             elif dado_elegido == 3:
                 valor_movimiento = self.ultima_suma
-                logger.debug(f"Usando suma de dados: {valor_movimiento}")
+                logger.debug("Usando suma de dados: %s", valor_movimiento)
             else:
-                logger.warning(f"Dado elegido inválido: {dado_elegido}")
+                logger.warning("Dado elegido inválido: %s", dado_elegido)
                 return False, "Opción de dado inválida"
 
-            # ⭐ CRÍTICO: Contar fichas movibles REALES (que puedan usar AL MENOS un dado)
-            fichas_movibles = 0
-            
-            for f in jugador.fichas:
-                if f.estado == proto.ESTADO_BLOQUEADO or f.estado == proto.ESTADO_META:
-                    continue
-                
-                # Fichas en tablero principal SIEMPRE pueden moverse
-                if f.estado == proto.ESTADO_EN_JUEGO and not (hasattr(f, 'posicion_meta') and f.posicion_meta is not None and f.posicion_meta >= 0):
-                    fichas_movibles += 1
-                # Fichas en camino a meta: solo contar si pueden usar AL MENOS un dado
-                elif hasattr(f, 'posicion_meta') and f.posicion_meta is not None and f.posicion_meta >= 0:
-                    pasos_restantes_f = 7 - f.posicion_meta
-                    # Verificar si puede usar algún dado individual (no suma)
-                    if self.ultimo_dado1 <= pasos_restantes_f or self.ultimo_dado2 <= pasos_restantes_f:
-                        fichas_movibles += 1
-            
-            # Validaciones según si está en camino a meta
-            en_camino_meta = hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None and ficha.posicion_meta >= 0
+            # ⭐ Legalidad calculada una vez por tirada (ver generar_movimientos_legales)
+            legales, fichas_movibles = self._analizar_movimientos(jugador)
             
-            if en_camino_meta:
-                # ⭐ CORREGIDO: Permitir suma SI NO excede el límite
-                pasos_restantes = 7 - ficha.posicion_meta
-                if valor_movimiento > pasos_restantes:
+            if (ficha_id, dado_elegido) not in legales:
+                en_camino_meta = self._en_camino_meta(ficha)
+                if en_camino_meta:
+                    pasos_restantes = 7 - ficha.posicion_meta
                     return False, f"El movimiento excede la meta (necesitas máximo {pasos_restantes} pasos)"
-                # ⭐ CRÍTICO: NO forzar suma en fichas en camino a meta
-                # Las fichas en camino a meta pueden usar dados individuales libremente
-                
-            elif not en_camino_meta and fichas_movibles == 1 and not self.tablero.esta_cerca_meta(ficha) and len(self.dados_usados) == 0:
-                # ⭐ CRÍTICO: Solo forzar suma si:
-                # - NO está en camino a meta
-                # - Tiene solo 1 ficha movible
-                # - La ficha NO está cerca de meta
-                # - NO se ha usado ningún dado aún
-                if dado_elegido != 3:
+                if self._suma_obligatoria(ficha, fichas_movibles) and dado_elegido != 3:
                     return False, "Debes usar la suma de dados cuando tienes una sola ficha lejos de meta"
+                return False, "Movimiento inválido"
 
             # Intentar realizar el movimiento
             posicion_anterior = ficha.posicion
-            logger.debug(f"Intentando mover ficha desde {posicion_anterior} con valor {valor_movimiento}")
+            estado_anterior = ficha.estado
+            logger.debug("Intentando mover ficha desde %s con valor %s", posicion_anterior, valor_movimiento)
             
             if ficha.mover(valor_movimiento, self.tablero):
+                self._reubicar_ficha(jugador, ficha_id, estado_anterior, posicion_anterior)
                 self.accion_realizada = True
-                logger.info(f"Ficha {ficha_id} movida de {posicion_anterior} a {ficha.posicion}")
+                logger.debug("Ficha %s movida de %s a %s", ficha_id, posicion_anterior, ficha.posicion)
                 
                 # ⭐ NUEVO: Marcar dados como usados DESPUÉS del movimiento exitoso
                 if dado_elegido == 3:
@@ -832,38 +907,24 @@ class GameManager:
                 elif dado_elegido in [1, 2]:
                     # Registrar dado individual usado
                     self.dados_usados.append(dado_elegido)
-                    logger.debug(f"Dado {dado_elegido} registrado como usado. Dados usados: {self.dados_usados}")
+                    logger.debug("Dado %s registrado como usado. Dados usados: %s", dado_elegido, self.dados_usados)
                     
                     # ⭐ CRÍTICO: Verificar si el dado restante es utilizable (CON O SIN DOBLES)
                     if len(self.dados_usados) == 1:
                         # Determinar cuál dado queda
+                        dado_restante = 2 if dado_elegido == 1 else 1
                         dado_restante_valor = self.ultimo_dado2 if dado_elegido == 1 else self.ultimo_dado1
                         
-                        # Verificar si ALGUNA ficha puede usar el dado restante
-                        puede_usar_restante = False
-                        
-                        for f in jugador.fichas:
-                            if f.estado == proto.ESTADO_BLOQUEADO or f.estado == proto.ESTADO_META:
-                                continue
-                            
-                            # Verificar si está en camino a meta
-                            en_camino = hasattr(f, 'posicion_meta') and f.posicion_meta is not None and f.posicion_meta >= 0
-                            
-                            if en_camino:
-                                pasos_rest = 7 - f.posicion_meta
-                                if dado_restante_valor <= pasos_rest:
-                                    puede_usar_restante = True
-                                    break
-                            else:  # En tablero principal
-                                puede_usar_restante = True
-                                break
+                        # Verificar si ALGUNA ficha puede usar el dado restante (nuevo estado → nueva lista)
+                        legales, _ = self._analizar_movimientos(jugador)
+                        puede_usar_restante = any(dado == dado_restante for _, dado in legales)
                         
                         if not puede_usar_restante:
-                            logger.info(f"⚠️ El dado restante ({dado_restante_valor}) no puede ser usado. Forzando avance de turno.")
+                            logger.info("⚠️ El dado restante (%s) no puede ser usado. Forzando avance de turno.", dado_restante_valor)
                             # ⭐ Con dobles: mantiene turno pero resetea dados
                             if self.ultimo_es_doble:
                                 self.dados_usados = []  # Resetear para permitir nuevo lanzamiento
-                                logger.info("🔄 Dobles: mantiene turno, reseteando dados usados")
+                                logger.debug("🔄 Dobles: mantiene turno, reseteando dados usados")
                             else:
                                 # Sin dobles: avanza turno
                                 self.debe_avanzar_turno = True
@@ -918,6 +979,7 @@ class GameManager:
                 
             return False
     
+    @_registrado(bitacora.AVANZAR_TURNO)
     def avanzar_turno(self):
         """Avanzar al siguiente turno con lógica corregida"""
         with self.lock:
@@ -928,7 +990,7 @@ class GameManager:
             
             # Si salió doble y no excede el límite, mantener turno
             if self.ultimo_es_doble and self.dobles_consecutivos < self.max_dobles:
-                logger.info(f"🔄 Doble! El jugador mantiene su turno (dobles: {self.dobles_consecutivos})")
+                logger.debug("🔄 Doble! El jugador mantiene su turno (dobles: %s)", self.dobles_consecutivos)
                 # ⭐ CRÍTICO: Solo resetear si usó AMBOS dados
                 if len(self.dados_usados) == 2:
                     # Usó ambos dados → permitir lanzar de nuevo
@@ -937,7 +999,7 @@ class GameManager:
                     logger.debug("🔄 Usó ambos dados → puede lanzar de nuevo")
                 else:
                     # Aún tiene dados sin usar → NO resetear dados_lanzados
-                    logger.debug(f"🔄 Aún tiene {2 - len(self.dados_usados)} dado(s) sin usar → mantiene dados_lanzados=True")
+                    logger.debug("🔄 Aún tiene %s dado(s) sin usar → mantiene dados_lanzados=True", 2 - len(self.dados_usados))
                 
                 # Siempre resetear estas banderas
                 self.accion_realizada = False
@@ -951,9 +1013,10 @@ class GameManager:
             # Resetear TODO el estado del turno
             self._resetear_estado_turno()
             
-            logger.info(f"➡️ Turno avanzado del jugador {turno_anterior} al {self.turno_actual}")
+            logger.debug("➡️ Turno avanzado del jugador %s al %s", turno_anterior, self.turno_actual)
             return True  # SÍ avanzó turno
     
+    @_registrado(bitacora.FORZAR_AVANCE)
     def forzar_avance_turno(self):
         """⭐ NUEVO: Fuerza el avance de turno cuando no puede hacer acciones"""
         with self.lock:
@@ -961,10 +1024,11 @@ class GameManager:
                 turno_anterior = self.turno_actual
                 self.turno_actual = (self.turno_actual + 1) % len(self.jugadores)
                 self._resetear_estado_turno()
-                logger.info(f"🔄 Turno forzado: {turno_anterior} → {self.turno_actual}")
+                logger.debug("🔄 Turno forzado: %s → %s", turno_anterior, self.turno_actual)
                 return True
             return False
     
+    @_registrado(bitacora.VICTORIA)
     def verificar_victoria(self, socket_cliente):
         with self.lock:
             if socket_cliente not in self.clientes:
@@ -981,7 +1045,7 @@ class GameManager:
                     info["terminado"] = True
                     jugador.terminado = True  # También en el objeto User
                     
-                    logger.info(f"🏆 ¡Jugador {info['nombre']} ({info['color']}) completó todas sus fichas!")
+                    logger.info("🏆 ¡Jugador %s (%s) completó todas sus fichas!", info['nombre'], info['color'])
                     
                     # Contar jugadores activos (no terminados)
                     jugadores_activos = sum(
@@ -989,75 +1053,124 @@ class GameManager:
                         if not cli_info.get("terminado", False)
                     )
                     
-                    logger.info(f"📊 Jugadores activos restantes: {jugadores_activos}")
+                    logger.info("📊 Jugadores activos restantes: %s", jugadores_activos)
                     
                     # Si solo queda 1 jugador activo (o ninguno), terminar el juego
                     if jugadores_activos <= 1:
                         self.juego_terminado = True
-                        logger.info(f"🎊 ¡JUEGO TERMINADO! Solo queda {jugadores_activos} jugador(es) activo(s)")
+                        logger.info("🎊 ¡JUEGO TERMINADO! Solo queda %s jugador(es) activo(s)", jugadores_activos)
                 
                 return ha_ganado
             except Exception as e:
-                logger.error(f"Error verificando victoria: {e}", exc_info=True)
+                logger.error("Error verificando victoria: %s", e, exc_info=True)
                 return False
     
+    def _datos_ficha(self, idx, ficha):
+        """Representación de una ficha tal como viaja en TABLERO y TABLERO_DELTA"""
+        ficha_data = {
+            "id": idx,
+            "color": ficha.color,
+            "estado": ficha.estado,
+            "posicion": ficha.posicion
+        }
+        
+        # ⭐ CRÍTICO: SIEMPRE incluir posicion_meta si estado es CAMINO_META
+        if ficha.estado == "CAMINO_META":
+            # Si está en CAMINO_META, DEBE tener posicion_meta
+            if hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None:
+                ficha_data["posicion_meta"] = ficha.posicion_meta
+            else:
+                # Fallback: Si no tiene posicion_meta, usar 0
+                ficha_data["posicion_meta"] = 0
+                logger.warning("⚠️ Ficha en CAMINO_META sin posicion_meta, usando 0")
+        elif hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None and ficha.posicion_meta >= 0:
+            # Para otros estados, solo si existe y es válido
+            ficha_data["posicion_meta"] = ficha.posicion_meta
+        
+        return ficha_data
+    
     def obtener_estado_tablero(self):
-        """Obtiene el estado completo del tablero"""
+        """Obtiene el estado completo del tablero (incluye la versión actual)"""
         with self.lock:
             logger.debug("🔒 Obteniendo estado del tablero")
             
-            estado = {
-                "jugadores": [],
-                "turno_actual": self.turno_actual,
-                "dados_lanzados": self.dados_lanzados,
-                "ultimo_dado1": self.ultimo_dado1,
-                "ultimo_dado2": self.ultimo_dado2,
-                "ultima_suma": self.ultima_suma,
-                "ultimo_es_doble": self.ultimo_es_doble,
-                "dobles_consecutivos": self.dobles_consecutivos,
-                "accion_realizada": self.accion_realizada,
-                "debe_avanzar_turno": self.debe_avanzar_turno
-            }
+            estado = {campo: getattr(self, campo) for campo in self.CAMPOS_TURNO}
+            estado["version"] = self.version_tablero
+            estado["jugadores"] = []
             
             for cliente_sock, info in self.clientes.items():
                 jugador = info["jugador"]
                 fichas_info = []
+                conteo = {proto.ESTADO_BLOQUEADO: 0, proto.ESTADO_EN_JUEGO: 0, proto.ESTADO_META: 0}
                 
                 for idx, ficha in enumerate(jugador.fichas):
-                    ficha_data = {
-                        "id": idx,
-                        "color": ficha.color,
-                        "estado": ficha.estado,
-                        "posicion": ficha.posicion
-                    }
-                    
-                    # ⭐ CRÍTICO: SIEMPRE incluir posicion_meta si estado es CAMINO_META
-                    if ficha.estado == "CAMINO_META":
-                        # Si está en CAMINO_META, DEBE tener posicion_meta
-                        if hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None:
-                            ficha_data["posicion_meta"] = ficha.posicion_meta
-                        else:
-                            # Fallback: Si no tiene posicion_meta, usar 0
-                            ficha_data["posicion_meta"] = 0
-                            logger.warning(f"⚠️ Ficha en CAMINO_META sin posicion_meta, usando 0")
-                    elif hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None and ficha.posicion_meta >= 0:
-                        # Para otros estados, solo si existe y es válido
-                        ficha_data["posicion_meta"] = ficha.posicion_meta
-                    
-                    fichas_info.append(ficha_data)
+                    fichas_info.append(self._datos_ficha(idx, ficha))
+                    if ficha.estado in conteo:
+                        conteo[ficha.estado] += 1
                 
                 estado["jugadores"].append({
                     "nombre": info["nombre"],
                     "color": info["color"],
                     "id": info["id"],
                     "fichas": fichas_info,
-                    "bloqueadas": len([f for f in jugador.fichas if f.estado == proto.ESTADO_BLOQUEADO]),
-                    "en_juego": len([f for f in jugador.fichas if f.estado == proto.ESTADO_EN_JUEGO]),
-                    "en_meta": len([f for f in jugador.fichas if f.estado == proto.ESTADO_META])
+                    "bloqueadas": conteo[proto.ESTADO_BLOQUEADO],
+                    "en_juego": conteo[proto.ESTADO_EN_JUEGO],
+                    "en_meta": conteo[proto.ESTADO_META]
                 })
             
             return estado
     
+    def obtener_delta_tablero(self):
+        """
+        Compara el tablero con la última versión emitida y avanza la versión.
+        
+        Returns:
+            None si no cambió nada.
+            {"version", "completo": True} si cambió la lista de jugadores
+                (hay que enviar el TABLERO completo).
+            {"version", "base", "fichas", "turno"} con solo las fichas y
+                campos de turno que cambiaron.
+        """
+        with self.lock:
+            fichas = {}
+            objetos = {}
+            for info in self.clientes.values():
+                color = info["color"]
+                for idx, ficha in enumerate(info["jugador"].fichas):
+                    fichas[(color, idx)] = (ficha.estado, ficha.posicion, ficha.posicion_meta)
+                    objetos[(color, idx)] = ficha
+            turno = tuple(getattr(self, campo) for campo in self.CAMPOS_TURNO)
+            
+            anterior = self._huella_tablero
+            self._huella_tablero = (fichas, turno)
+            
+            if anterior is None or anterior[0].keys() != fichas.keys():
+                self.version_tablero += 1
+                return {"version": self.version_tablero, "completo": True}
+            
+            fichas_anteriores, turno_anterior = anterior
+            fichas_cambiadas = [
+                self._datos_ficha(clave[1], objetos[clave])
+                for clave, valor in fichas.items()
+                if fichas_anteriores[clave] != valor
+            ]
+            turno_cambiado = {
+                campo: valor
+                for campo, valor, valor_anterior in zip(self.CAMPOS_TURNO, turno, turno_anterior)
+                if valor != valor_anterior
+            }
+            
+            if not fichas_cambiadas and not turno_cambiado:
+                return None
+            
+            self.version_tablero += 1
+            return {
+                "version": self.version_tablero,
+                "base": self.version_tablero - 1,
+                "fichas": fichas_cambiadas,
+                "turno": turno_cambiado
+            }
+    
     def obtener_info_jugadores(self):
         """Obtiene información básica de todos los jugadores"""
         with self.lock:
@@ -1070,6 +1183,77 @@ class GameManager:
                 for info in self.clientes.values()
             ]
     
+    # ========== MOVIMIENTOS LEGALES ==========
+    
+    def generar_movimientos_legales(self, socket_cliente):
+        """
+        Acciones (ficha_id, dado_elegido) que mover_ficha aceptaría ahora de este
+        cliente, por ficha y con la suma primero; dado_elegido: 1 = primer dado,
+        2 = segundo dado, 3 = suma.
+        Lista vacía si no es su turno, no ha lanzado o tiene el premio pendiente.
+        """
+        with self.lock:
+            if self.premio_tres_dobles or not self.dados_lanzados or not self.es_turno_de(socket_cliente):
+                return []
+            legales, _ = self._analizar_movimientos(self.clientes[socket_cliente]["jugador"])
+            return list(legales)
+    
+    def _analizar_movimientos(self, jugador):
+        """
+        (legales, fichas_movibles) del jugador con los dados actuales. Se calcula
+        una vez y se reutiliza mientras no cambien el tablero, los dados ni los
+        dados usados.
+        """
+        dados_usados = getattr(self, 'dados_usados', [])
+        clave = (jugador, self.estado_tablero.instantanea(), self.ultimo_dado1, self.ultimo_dado2, tuple(dados_usados))
+        if self._cache_movimientos is not None and self._cache_movimientos[0] == clave:
+            return self._cache_movimientos[1]
+        
+        # Una lectura por ficha: ¿puede usar dado 1, dado 2, suma?
+        valores = (self.ultimo_dado1, self.ultimo_dado2, self.ultima_suma)
+        posibles = [
+            (idx, ficha, ficha.movimientos_posibles(valores, self.tablero))
+            for idx, ficha in enumerate(jugador.fichas)
+            if ficha.estado not in (proto.ESTADO_BLOQUEADO, proto.ESTADO_META)
+        ]
+        
+        # Fichas que pueden usar AL MENOS un dado individual (no suma)
+        fichas_movibles = sum(1 for _, _, (con_1, con_2, _) in posibles if con_1 or con_2)
+        
+        legales = []
+        for idx, ficha, (con_1, con_2, con_suma) in posibles:
+            if dados_usados:
+                # La suma ya no está disponible; solo el dado que queda
+                if con_1 and 1 not in dados_usados:
+                    legales.append((idx, 1))
+                if con_2 and 2 not in dados_usados:
+                    legales.append((idx, 2))
+                continue
+            if con_suma:
+                legales.append((idx, 3))
+            if (con_1 or con_2) and not self._suma_obligatoria(ficha, fichas_movibles):
+                if con_1:
+                    legales.append((idx, 1))
+                if con_2:
+                    legales.append((idx, 2))
+        
+        resultado = (tuple(legales), fichas_movibles)
+        self._cache_movimientos = (clave, resultado)
+        return resultado
+    
+    def _en_camino_meta(self, ficha):
+        return hasattr(ficha, 'posicion_meta') and ficha.posicion_meta is not None and ficha.posicion_meta >= 0
+    
+    def _suma_obligatoria(self, ficha, fichas_movibles):
+        """
+        ⭐ Solo se fuerza la suma si la ficha NO está en camino a meta, es la única
+        ficha movible, NO está cerca de meta y NO se ha usado ningún dado aún
+        """
+        return (fichas_movibles == 1
+                and len(getattr(self, 'dados_usados', [])) == 0
+                and not self._en_camino_meta(ficha)
+                and not self.tablero.esta_cerca_meta(ficha))
+    
     def esta_cerca_de_meta(self, ficha):
         """Verifica si una ficha está cerca de su meta"""
         return self.tablero.esta_cerca_meta(ficha)
@@ -1086,24 +1270,81 @@ class GameManager:
             Lista de diccionarios con información de las fichas encontradas:
             [{'jugador': User, 'ficha': gameToken, 'ficha_id': int}, ...]
         """
-        fichas_encontradas = []
+        # Lectura directa del índice de ocupación (sin recorrer jugadores y fichas)
+        return [
+            {'jugador': jugador, 'ficha': jugador.fichas[ficha_id], 'ficha_id': ficha_id}
+            for jugador, ficha_id in self.ocupacion.get(casilla, ())
+            if not (excluir_color and jugador.color == excluir_color)
+        ]
+    
+    # ========== ÍNDICE DE OCUPACIÓN ==========
+    
+    def _reubicar_ficha(self, jugador, ficha_id, estado_anterior, posicion_anterior):
+        """Actualiza el índice tras cambiar el estado/posición de una ficha"""
+        if estado_anterior == proto.ESTADO_EN_JUEGO and posicion_anterior >= 0:
+            ocupantes = self.ocupacion.get(posicion_anterior)
+            if ocupantes:
+                ocupantes[:] = [o for o in ocupantes if not (o[0] is jugador and o[1] == ficha_id)]
+                if not ocupantes:
+                    del self.ocupacion[posicion_anterior]
+        
+        ficha = jugador.fichas[ficha_id]
+        if ficha.estado == proto.ESTADO_EN_JUEGO and ficha.posicion >= 0:
+            self.ocupacion.setdefault(ficha.posicion, []).append((jugador, ficha_id))
+        
+        if self.verificar_ocupacion:
+            self.comprobar_ocupacion()
+    
+    def _quitar_de_ocupacion(self, jugador):
+        """Saca del índice todas las fichas de un jugador que abandona la partida"""
+        for casilla in list(self.ocupacion):
+            ocupantes = [o for o in self.ocupacion[casilla] if o[0] is not jugador]
+            if ocupantes:
+                self.ocupacion[casilla] = ocupantes
+            else:
+                del self.ocupacion[casilla]
         
+        if self.verificar_ocupacion:
+            self.comprobar_ocupacion()
+    
+    def _reconstruir_ocupacion(self):
+        """Recalcula el índice recorriendo todas las fichas"""
+        self.ocupacion = {}
         for jugador in self.jugadores:
-            # Si se especifica un color a excluir y este jugador es de ese color, saltar
-            if excluir_color and jugador.color == excluir_color:
-                continue
-            
-            # Buscar fichas de este jugador en la casilla
             for idx, ficha in enumerate(jugador.fichas):
-                # Solo considerar fichas en juego
-                if ficha.estado == proto.ESTADO_EN_JUEGO and ficha.posicion == casilla:
-                    fichas_encontradas.append({
-                        'jugador': jugador,
-                        'ficha': ficha,
-                        'ficha_id': idx
-                    })
-        
-        return fichas_encontradas
+                if ficha.estado == proto.ESTADO_EN_JUEGO and ficha.posicion >= 0:
+                    self.ocupacion.setdefault(ficha.posicion, []).append((jugador, idx))
+    
+    def instantanea_fichas(self):
+        """Copia de las 16 fichas de la sala (32 bytes) para deshacer o simular"""
+        with self.lock:
+            return self.estado_tablero.instantanea()
+    
+    def restaurar_fichas(self, instantanea):
+        """Vuelve las fichas a una instantánea tomada con instantanea_fichas()"""
+        with self.lock:
+            self.estado_tablero.restaurar(instantanea)
+            self._reconstruir_ocupacion()
+    
+    def comprobar_ocupacion(self):
+        """
+        Reconstruye la ocupación recorriendo todas las fichas y la compara con el
+        índice incremental. Lanza AssertionError si difieren.
+        """
+        with self.lock:
+            esperado = {}
+            for jugador in self.jugadores:
+                for idx, ficha in enumerate(jugador.fichas):
+                    if ficha.estado == proto.ESTADO_EN_JUEGO and ficha.posicion >= 0:
+                        esperado.setdefault(ficha.posicion, set()).add((id(jugador), idx))
+            
+            actual = {
+                casilla: {(id(jugador), idx) for jugador, idx in ocupantes}
+                for casilla, ocupantes in self.ocupacion.items()
+            }
+            
+            if actual != esperado:
+                raise AssertionError(f"Índice de ocupación inconsistente: índice={actual} fichas={esperado}")
     
     def ejecutar_capturas(self, casilla_destino, color_atacante, jugador_atacante):
         """
@@ -1122,14 +1363,14 @@ class GameManager:
         with self.lock:
             # Verificar si se puede capturar en esta casilla
             if not self.tablero.puede_capturar_en_casilla(casilla_destino, color_atacante):
-                logger.debug(f"No se puede capturar en casilla {casilla_destino} con color {color_atacante}")
+                logger.debug("No se puede capturar en casilla %s con color %s", casilla_destino, color_atacante)
                 return fichas_capturadas
             
             # Obtener fichas enemigas en la casilla
             fichas_en_casilla = self.obtener_fichas_en_casilla(casilla_destino, excluir_color=color_atacante)
             
             if not fichas_en_casilla:
-                logger.debug(f"No hay fichas enemigas en casilla {casilla_destino}")
+                logger.debug("No hay fichas enemigas en casilla %s", casilla_destino)
                 return fichas_capturadas
             
             # Capturar cada ficha enemiga
@@ -1141,6 +1382,7 @@ class GameManager:
                 # Enviar ficha a la cárcel
                 ficha_victima.estado = proto.ESTADO_BLOQUEADO
                 ficha_victima.posicion = -1
+                self._reubicar_ficha(jugador_victima, ficha_id, proto.ESTADO_EN_JUEGO, casilla_destino)
                 
                 # Registrar captura
                 fichas_capturadas.append({
@@ -1149,11 +1391,11 @@ class GameManager:
                     'ficha_id': ficha_id
                 })
                 
-                logger.info(f"🍽️ CAPTURA: {color_atacante} capturó ficha de {jugador_victima.color} "
-                           f"(ID: {ficha_id}) en casilla {casilla_destino}")
+                logger.info("🍽️ CAPTURA: %s capturó ficha de %s (ID: %s) en casilla %s", color_atacante, jugador_victima.color, ficha_id, casilla_destino)
             
             return fichas_capturadas
         
+    @_registrado(bitacora.PREMIO)
     def aplicar_premio_tres_dobles(self, socket_cliente, ficha_id):
         """
         Aplica el premio por sacar 3 dobles consecutivos:
@@ -1190,11 +1432,11 @@ class GameManager:
                 return False, {"error": "No tienes fichas elegibles (todas en cárcel o meta)"}
             
             # ⭐ CRÍTICO: Validar que ficha_id esté en la lista de elegibles
-            logger.info(f"🔍 Validando ficha_id={ficha_id}, elegibles={fichas_elegibles}")
+            logger.debug("🔍 Validando ficha_id=%s, elegibles=%s", ficha_id, fichas_elegibles)
             
             if ficha_id not in fichas_elegibles:
                 # Mantener premio activo para que pueda reintentar
-                logger.warning(f"❌ Ficha {ficha_id} no está en la lista de elegibles: {fichas_elegibles}")
+                logger.warning("❌ Ficha %s no está en la lista de elegibles: %s", ficha_id, fichas_elegibles)
                 nombres_fichas = ', '.join([f"#{f + 1}" for f in fichas_elegibles])
                 return False, {"error": f"Ficha #{ficha_id + 1} no es elegible. Fichas disponibles: {nombres_fichas}"}
             
@@ -1218,9 +1460,9 @@ class GameManager:
             ficha.posicion = -1  # Meta final
             if en_camino_meta:
                 ficha.posicion_meta = 8  # Posición final en meta
+            self._reubicar_ficha(jugador, ficha_id, estado_anterior, posicion_anterior)
             
-            logger.info(f"🏆 PREMIO: Ficha {ficha_id} de {nombre} ({color}) "
-                       f"enviada a META desde {'camino a meta' if en_camino_meta else f'casilla {posicion_anterior}'}")
+            logger.info("🏆 PREMIO: Ficha %s de %s (%s) enviada a META desde %s", ficha_id, nombre, color, 'camino a meta' if en_camino_meta else f'casilla {posicion_anterior}')
             
             # Resetear estado completamente (importante: también ultimo_es_doble)
             self.premio_tres_dobles = False
@@ -1232,7 +1474,7 @@ class GameManager:
             # Verificar si ganó con esta ficha
             if jugador.ha_ganado():
                 self.juego_terminado = True
-                logger.info(f"🎊 ¡{nombre} ha ganado el juego con el premio de 3 dobles!")
+                logger.info("🎊 ¡%s ha ganado el juego con el premio de 3 dobles!", nombre)
             
             return True, {
                 "ficha_id": ficha_id,
@@ -1259,10 +1501,10 @@ class GameManager:
                 jugador = self.clientes[socket_cliente]["jugador"]
                 fichas_elegibles = []
                 
-                logger.debug(f"Buscando fichas elegibles para {jugador.name}...")
+                logger.debug("Buscando fichas elegibles para %s...", jugador.name)
                 
                 for idx, ficha in enumerate(jugador.fichas):
-                    logger.debug(f"Ficha {idx}: estado={ficha.estado}, pos={ficha.posicion}")
+                    logger.debug("Ficha %s: estado=%s, pos=%s", idx, ficha.estado, ficha.posicion)
                     
                     # ⭐ CORRECCIÓN: Solo fichas EN_JUEGO son elegibles (CAMINO_META no existe en protocol.py)
                     if ficha.estado == proto.ESTADO_EN_JUEGO:
@@ -1282,15 +1524,16 @@ class GameManager:
                             ficha_info["en_camino_meta"] = False
                         
                         fichas_elegibles.append(ficha_info)
-                        logger.debug(f"✅ Ficha {idx} es elegible: {ficha_info}")
+                        logger.debug("✅ Ficha %s es elegible: %s", idx, ficha_info)
                 
-                logger.info(f"📊 Total fichas elegibles: {len(fichas_elegibles)}")
+                logger.debug("📊 Total fichas elegibles: %s", len(fichas_elegibles))
                 return fichas_elegibles
                 
             except Exception as e:
-                logger.error(f"Error en obtener_fichas_elegibles_para_premio: {e}", exc_info=True)
+                logger.error("Error en obtener_fichas_elegibles_para_premio: %s", e, exc_info=True)
                 return []
         
+    @_registrado(bitacora.PREMIO_DEBUG)
     def forzar_tres_dobles_debug(self, socket_cliente):
         """
         🔧 MÉTODO DE DEBUG: Simula que el jugador sacó 3 dobles consecutivos
@@ -0,0 +1,158 @@
+"""
+Límites de frecuencia por cubos de fichas (token buckets).
+
+Cada mensaje entrante gasta una ficha de dos cubos del mismo presupuesto:
+el de su conexión y el de su IP (que comparten todas las conexiones desde
+esa dirección, para que abrir más sockets no multiplique el límite). Los
+cubos se rellenan a `ritmo` fichas por segundo hasta `capacidad`, que es
+la ráfaga permitida.
+
+Presupuestos separados para autenticación (consulta la base de datos),
+sincronización de reloj / consultas del lobby y comandos de juego: un
+cliente que abusa del login no agota su cuota de juego y viceversa.
+
+El chequeo es O(1) y se hace antes de validar y despachar el mensaje.
+Un mensaje rechazado no llega al manejador; solo el primero de cada racha
+recibe un ERROR (ya serializado), los siguientes se descartan en silencio.
+"""
+
+import time
+import weakref
+
+PRESUPUESTO_AUTH = "auth"
+PRESUPUESTO_SYNC = "sync"
+PRESUPUESTO_JUEGO = "juego"
+
+# Tipo de mensaje → presupuesto (los que no aparecen gastan del de juego)
+PRESUPUESTO_POR_TIPO = {
+    "LOGIN_USUARIO": PRESUPUESTO_AUTH,
+    "REGISTRAR_USUARIO": PRESUPUESTO_AUTH,
+    "OBTENER_ESTADISTICAS": PRESUPUESTO_AUTH,
+    "SYNC_REQUEST": PRESUPUESTO_SYNC,
+    "SOLICITAR_COLORES": PRESUPUESTO_SYNC,
+}
+
+# {presupuesto: {"conexion": (capacidad, ritmo/s), "ip": (capacidad, ritmo/s)}}
+LIMITES_POR_DEFECTO = {
+    PRESUPUESTO_AUTH: {"conexion": (5, 0.5), "ip": (20, 2.0)},
+    PRESUPUESTO_SYNC: {"conexion": (20, 10.0), "ip": (100, 50.0)},
+    PRESUPUESTO_JUEGO: {"conexion": (30, 15.0), "ip": (200, 100.0)},
+}
+
+# Cada cuántos chequeos se purgan los cubos de IP llenos (inactivos)
+PURGA_CADA = 4096
+
+
+class CuboFichas:
+    """Token bucket: `capacidad` fichas, se rellena a `ritmo` fichas por segundo"""
+
+    __slots__ = ("capacidad", "ritmo", "fichas", "ultimo", "rechazos_seguidos")
+
+    def __init__(self, capacidad, ritmo, ahora=None):
+        self.capacidad = capacidad
+        self.ritmo = ritmo
+        self.fichas = float(capacidad)
+        self.ultimo = time.monotonic() if ahora is None else ahora
+        self.rechazos_seguidos = 0
+
+    def rellenar(self, ahora):
+        if ahora > self.ultimo:
+            self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.ritmo)
+            self.ultimo = ahora
+
+    def hay_ficha(self, ahora):
+        self.rellenar(ahora)
+        return self.fichas >= 1.0
+
+    def gastar(self):
+        self.fichas -= 1.0
+        self.rechazos_seguidos = 0
+
+    def lleno(self, ahora):
+        self.rellenar(ahora)
+        return self.fichas >= self.capacidad
+
+
+class Limitador:
+    """Cubos por (presupuesto, conexión) y (presupuesto, IP), con contadores de rechazos"""
+
+    def __init__(self, limites=None):
+        self.limites = {presupuesto: dict(ambitos) for presupuesto, ambitos in LIMITES_POR_DEFECTO.items()}
+        for presupuesto, ambitos in (limites or {}).items():
+            self.limites.setdefault(presupuesto, {}).update(ambitos)
+
+        self.por_conexion = weakref.WeakKeyDictionary()  # {websocket: {presupuesto: CuboFichas}}
+        self.por_ip = {}                                 # {(presupuesto, ip): CuboFichas}
+        self._chequeos = 0
+
+        # Métricas por presupuesto
+        self.permitidos = dict.fromkeys(self.limites, 0)
+        self.limitados_conexion = dict.fromkeys(self.limites, 0)
+        self.limitados_ip = dict.fromkeys(self.limites, 0)
+
+    @staticmethod
+    def presupuesto_de(tipo):
+        return PRESUPUESTO_POR_TIPO.get(tipo, PRESUPUESTO_JUEGO)
+
+    def _cubo_conexion(self, websocket, presupuesto, ahora):
+        cubos = self.por_conexion.get(websocket)
+        if cubos is None:
+            cubos = self.por_conexion[websocket] = {}
+        cubo = cubos.get(presupuesto)
+        if cubo is None:
+            cubo = cubos[presupuesto] = CuboFichas(*self.limites[presupuesto]["conexion"], ahora)
+        return cubo
+
+    def _cubo_ip(self, ip, presupuesto, ahora):
+        clave = (presupuesto, ip)
+        cubo = self.por_ip.get(clave)
+        if cubo is None:
+            cubo = self.por_ip[clave] = CuboFichas(*self.limites[presupuesto]["ip"], ahora)
+        return cubo
+
+    def permitir(self, websocket, ip, presupuesto):
+        """
+        Gasta una ficha de la conexión y de la IP. Retorna None si se permite,
+        o el ámbito que lo rechazó ("conexion" / "ip").
+        """
+        ahora = time.monotonic()
+        self._chequeos += 1
+        if self._chequeos % PURGA_CADA == 0:
+            self.purgar(ahora)
+
+        cubo = self._cubo_conexion(websocket, presupuesto, ahora)
+        if not cubo.hay_ficha(ahora):
+            cubo.rechazos_seguidos += 1
+            self.limitados_conexion[presupuesto] += 1
+            return "conexion"
+        cubo_ip = self._cubo_ip(ip, presupuesto, ahora)
+        if not cubo_ip.hay_ficha(ahora):
+            cubo.rechazos_seguidos += 1
+            self.limitados_ip[presupuesto] += 1
+            return "ip"
+
+        cubo.gastar()
+        cubo_ip.gastar()
+        self.permitidos[presupuesto] += 1
+        return None
+
+    def primer_rechazo(self, websocket, presupuesto):
+        """Cierto si el último rechazo de esta conexión es el primero de su racha"""
+        cubos = self.por_conexion.get(websocket)
+        return cubos is not None and cubos[presupuesto].rechazos_seguidos == 1
+
+    def purgar(self, ahora=None):
+        """Olvida los cubos de IP que ya están llenos: equivalen a uno nuevo"""
+        ahora = time.monotonic() if ahora is None else ahora
+        for clave in [clave for clave, cubo in self.por_ip.items() if cubo.lleno(ahora)]:
+            del self.por_ip[clave]
+
+    def estadisticas(self):
+        return {
+            presupuesto: {
+                "permitidos": self.permitidos[presupuesto],
+                "limitados_conexion": self.limitados_conexion[presupuesto],
+                "limitados_ip": self.limitados_ip[presupuesto],
+            }
+            for presupuesto in self.limites
+        }
@@ -0,0 +1,150 @@
+"""
+Logging del servidor sin bloquear el bucle de eventos.
+
+configurar() instala un único QueueHandler en el logger raíz: el hilo del
+bucle solo encola el LogRecord, sin formatear, y un QueueListener en un
+hilo aparte lo formatea y lo escribe en stderr (y en un archivo si se pide).
+
+Configuración por variables de entorno (o por argumentos de configurar()):
+
+    PARQUES_LOG_NIVEL     nivel global, INFO por defecto
+    PARQUES_LOG_NIVELES   niveles por módulo: "game_manager=DEBUG,gameFile=WARNING"
+    PARQUES_LOG_MUESTREO  1 de cada N para eventos frecuentes: "BROADCAST=100,SYNC=20"
+    PARQUES_LOG_ARCHIVO   ruta de un archivo de log adicional
+
+Los mensajes se escriben con formato perezoso, logger.debug("... %s", x):
+si el nivel está desactivado no se formatea nada. Como el formateo ocurre
+en el hilo del listener, los argumentos no deben modificarse después de
+llamar al logger (los mensajes del protocolo no se modifican tras enviarse).
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+FORMATO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 1 de cada N eventos de alta frecuencia se registra (1 = todos)
+MUESTREO_POR_DEFECTO = {
+    "BROADCAST": 50,
+    "SYNC": 20,
+    "ENVIO": 50,
+    "MENSAJE": 20,
+    "LIMITE": 20,
+}
+
+_listener = None
+_handler = None
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que registra: el mensaje se
+    arma en el listener. Solo el traceback se convierte a texto aquí,
+    porque los frames de la excepción no deben cruzar de hilo.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+
+class Muestreo:
+    """Contadores por evento: muestra(evento) es cierto una vez de cada N"""
+
+    def __init__(self, tasas=None):
+        self.tasas = dict(MUESTREO_POR_DEFECTO if tasas is None else tasas)
+        self.contadores = {}
+
+    def __call__(self, evento):
+        cada = self.tasas.get(evento, 1)
+        if cada <= 1:
+            return True
+        n = self.contadores.get(evento, 0)
+        self.contadores[evento] = n + 1
+        return n % cada == 0
+
+
+muestra = Muestreo()
+
+
+def _parsear_pares(texto):
+    """'a=1,b=2' → {'a': '1', 'b': '2'} (ignora entradas mal formadas)"""
+    pares = {}
+    for entrada in (texto or "").split(","):
+        clave, _, valor = entrada.partition("=")
+        if clave.strip() and valor.strip():
+            pares[clave.strip()] = valor.strip()
+    return pares
+
+
+def _nivel(valor):
+    if isinstance(valor, int):
+        return valor
+    nivel = logging.getLevelName(str(valor).upper())
+    if not isinstance(nivel, int):
+        raise ValueError(f"Nivel de log desconocido: {valor}")
+    return nivel
+
+
+def configurar(nivel=None, niveles=None, muestreo=None, archivo=None, formato=FORMATO, consola=True):
+    """
+    Instala (o reconfigura) el pipeline de logging. Los argumentos que
+    falten se toman del entorno. consola=False escribe solo en `archivo`.
+    Retorna el QueueListener en marcha.
+    """
+    global _listener, _handler
+
+    nivel = _nivel(nivel or os.environ.get("PARQUES_LOG_NIVEL", "INFO"))
+    if niveles is None:
+        niveles = _parsear_pares(os.environ.get("PARQUES_LOG_NIVELES"))
+    if muestreo is None:
+        muestreo = {evento: int(cada) for evento, cada in
+                    _parsear_pares(os.environ.get("PARQUES_LOG_MUESTREO")).items()}
+    archivo = archivo or os.environ.get("PARQUES_LOG_ARCHIVO")
+
+    detener()
+
+    formateador = logging.Formatter(formato)
+    salidas = [logging.StreamHandler()] if consola else []
+    if archivo:
+        salidas.append(logging.FileHandler(archivo, encoding="utf-8"))
+    for salida in salidas:
+        salida.setFormatter(formateador)
+
+    cola = queue.SimpleQueue()
+    _handler = ManejadorCola(cola)
+    _listener = logging.handlers.QueueListener(cola, *salidas, respect_handler_level=True)
+    _listener.start()
+
+    raiz = logging.getLogger()
+    for existente in list(raiz.handlers):
+        raiz.removeHandler(existente)
+    raiz.addHandler(_handler)
+    raiz.setLevel(nivel)
+    for modulo, nivel_modulo in niveles.items():
+        logging.getLogger(modulo).setLevel(_nivel(nivel_modulo))
+
+    muestra.tasas.update(muestreo)
+    return _listener
+
+
+def detener():
+    """Vacía la cola y detiene el hilo del listener (idempotente)"""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        for salida in _listener.handlers:
+            salida.close()
+        logging.getLogger().removeHandler(_handler)
+        _listener = _handler = None
+
+
+atexit.register(detener)
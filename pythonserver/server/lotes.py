@@ -0,0 +1,60 @@
+"""
+Lotes de eventos por comando.
+
+Todo lo que provoca un comando de un jugador (DADOS, MOVIMIENTO_OK,
+CAPTURA, TABLERO, TURNO, INFO...) se entrega a cada cliente que negoció
+"lote" en CONECTAR como una sola trama
+
+    {"tipo": "LOTE", "seq": n, "eventos": [evento, ...]}
+
+con los eventos en el orden en que se generaron y un número de secuencia
+por sala. Los clientes sin "lote" siguen recibiendo un mensaje por evento.
+
+El lote abierto vive en una ContextVar: cada tarea (la del actor de la
+sala, o la de la conexión sin modo actor) tiene el suyo, de modo que dos
+comandos que se intercalan no mezclan sus eventos. Las tareas creadas
+durante el comando heredan la variable, pero el lote ya estará cerrado
+cuando lleguen a enviar y sus mensajes salen sueltos.
+"""
+
+import contextvars
+
+_lote_actual = contextvars.ContextVar("lote_actual", default=None)
+
+
+class LoteEventos:
+    """Eventos pendientes por destinatario del comando en curso en una sala"""
+
+    __slots__ = ("sala", "pendientes", "cerrado")
+
+    def __init__(self, sala):
+        self.sala = sala
+        self.pendientes = {}  # {websocket: [mensajes en orden]}
+        self.cerrado = False
+
+    def agregar(self, websocket, mensaje):
+        eventos = self.pendientes.get(websocket)
+        if eventos is None:
+            eventos = self.pendientes[websocket] = []
+        eventos.append(mensaje)
+
+
+def abrir(sala):
+    """Abre un lote para el comando que empieza. Retorna (lote, token para cerrar)"""
+    lote = LoteEventos(sala)
+    return lote, _lote_actual.set(lote)
+
+
+def cerrar(lote, token):
+    """Cierra el lote y retorna sus eventos pendientes {websocket: [mensajes]}"""
+    lote.cerrado = True
+    _lote_actual.reset(token)
+    return lote.pendientes
+
+
+def actual(sala):
+    """Lote abierto en esta tarea para `sala`, o None"""
+    lote = _lote_actual.get()
+    if lote is None or lote.cerrado or lote.sala is not sala:
+        return None
+    return lote
@@ -0,0 +1,265 @@
+"""
+Métricas del servidor en formato de texto de Prometheus.
+
+ParchisServer(puerto_metricas=9100) sirve GET /metrics en un puerto aparte
+(por defecto solo en 127.0.0.1). Sin dependencias: contadores e histogramas
+propios y un servidor HTTP mínimo sobre asyncio.start_server.
+
+Pensado para dejarlo siempre activo:
+- Los contadores por tipo de mensaje son una lista preasignada con un hueco
+  por tipo del protocolo (el índice de codec.TIPOS): incrementar es una
+  búsqueda en un dict fijo y un += sobre la lista, sin crear claves.
+- Los histogramas tienen sus cubetas preasignadas; observar es un bisect.
+- Lo que ya existe en otro sitio (clientes, salas, colas, límites) no se
+  cuenta dos veces: se lee al exponer, con indicadores calculados.
+
+Los histogramas del cerrojo del GameManager y de SQLite se escriben desde
+un único hilo cada uno (el del bucle / el de la base de datos); exponerlos
+desde el bucle puede leer una observación a medias, nada más.
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+import time
+
+import codec
+
+logger = logging.getLogger(__name__)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Cubetas (s) para latencias de operaciones en memoria y de SQLite
+CUBETAS_RAPIDAS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+CUBETAS_LENTAS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Hueco de cada tipo en los contadores por tipo (0 = tipo desconocido)
+_HUECOS = dict(codec.ETIQUETAS)
+_NOMBRES_HUECO = ("OTRO",) + tuple(codec.TIPOS[1:])
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{clave}="{valor}"' for clave, valor in etiquetas.items()) + "}"
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(valor) if valor == valor and abs(valor) != float("inf") else ("+Inf" if valor > 0 else "NaN")
+    return str(valor)
+
+
+class ContadorPorTipo:
+    """Contador con un hueco preasignado por tipo de mensaje del protocolo"""
+
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valores = [0] * len(_NOMBRES_HUECO)
+
+    def incrementar(self, tipo, cantidad=1):
+        self.valores[_HUECOS.get(tipo, 0)] += cantidad
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for hueco, valor in enumerate(self.valores):
+            if valor:
+                lineas.append(f'{self.nombre}{{tipo="{_NOMBRES_HUECO[hueco]}"}} {valor}')
+        return lineas
+
+
+class Histograma:
+    """Histograma de cubetas fijas; `etiquetas` distingue series de una misma familia"""
+
+    __slots__ = ("limites", "cubetas", "suma", "cuenta", "etiquetas")
+
+    def __init__(self, limites, etiquetas=None):
+        self.limites = tuple(limites)
+        self.cubetas = [0] * (len(self.limites) + 1)  # la última es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+        self.etiquetas = etiquetas or {}
+
+    def observar(self, valor):
+        self.cubetas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+    def series(self, nombre):
+        acumulado = 0
+        lineas = []
+        for limite, cantidad in zip(self.limites + (float("inf"),), self.cubetas):
+            acumulado += cantidad
+            lineas.append(f"{nombre}_bucket{_etiquetas({**self.etiquetas, 'le': _numero(float(limite))})} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(self.etiquetas)} {_numero(self.suma)}")
+        lineas.append(f"{nombre}_count{_etiquetas(self.etiquetas)} {acumulado}")
+        return lineas
+
+
+class FamiliaHistogramas:
+    """Histogramas con el mismo nombre y una etiqueta variable (pocas series: se crean al primer uso)"""
+
+    def __init__(self, nombre, ayuda, etiqueta=None, limites=CUBETAS_RAPIDAS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiqueta = etiqueta
+        self.limites = limites
+        self.series = {}
+        self.unico = None if etiqueta else Histograma(limites)
+
+    def de(self, valor):
+        histograma = self.series.get(valor)
+        if histograma is None:
+            histograma = self.series[valor] = Histograma(self.limites, {self.etiqueta: valor})
+        return histograma
+
+    def observar(self, valor):
+        self.unico.observar(valor)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for histograma in ([self.unico] if self.unico is not None else list(self.series.values())):
+            lineas.extend(histograma.series(self.nombre))
+        return lineas
+
+
+class Indicador:
+    """
+    Valor calculado al exponer: funcion() retorna un número o una lista de
+    ({etiqueta: valor}, número). tipo: "gauge" o "counter".
+    """
+
+    def __init__(self, nombre, ayuda, funcion, tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        try:
+            valor = self.funcion()
+        except Exception as e:
+            logger.warning("No se pudo calcular la métrica %s: %s", self.nombre, e)
+            return lineas
+        if isinstance(valor, list):
+            lineas.extend(f"{self.nombre}{_etiquetas(etiquetas)} {_numero(v)}" for etiquetas, v in valor)
+        else:
+            lineas.append(f"{self.nombre} {_numero(valor)}")
+        return lineas
+
+
+class CerrojoMedido:
+    """
+    Envuelve el lock del GameManager (RLock o contexto nulo) y mide la espera
+    para adquirirlo y el tiempo que se retiene. Solo la adquisición externa
+    cuenta: las reentradas del mismo hilo no abren otra medición.
+    """
+
+    __slots__ = ("cerrojo", "espera", "retencion", "_profundidad", "_desde")
+
+    def __init__(self, cerrojo, espera, retencion):
+        self.cerrojo = cerrojo
+        self.espera = espera
+        self.retencion = retencion
+        self._profundidad = 0   # solo lo toca quien tiene el cerrojo
+        self._desde = 0.0
+
+    def __enter__(self):
+        inicio = time.perf_counter()
+        self.cerrojo.__enter__()
+        if not self._profundidad:
+            self._desde = time.perf_counter()
+            self.espera.observar(self._desde - inicio)
+        self._profundidad += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._profundidad -= 1
+        if not self._profundidad:
+            self.retencion.observar(time.perf_counter() - self._desde)
+        return self.cerrojo.__exit__(*exc)
+
+
+class RetrasoBucle:
+    """Duerme `intervalo` segundos en bucle y registra cuánto tarda de más en despertar"""
+
+    def __init__(self, histograma, intervalo=0.5):
+        self.histograma = histograma
+        self.intervalo = intervalo
+        self.ultimo = 0.0
+
+    async def ejecutar(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                inicio = loop.time()
+                await asyncio.sleep(self.intervalo)
+                self.ultimo = max(0.0, loop.time() - inicio - self.intervalo)
+                self.histograma.observar(self.ultimo)
+        except asyncio.CancelledError:
+            pass
+
+
+class Registro:
+    """Conjunto de métricas expuestas por /metrics"""
+
+    def __init__(self):
+        self.metricas = []
+
+    def agregar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador_por_tipo(self, nombre, ayuda):
+        return self.agregar(ContadorPorTipo(nombre, ayuda))
+
+    def histograma(self, nombre, ayuda, etiqueta=None, limites=CUBETAS_RAPIDAS):
+        return self.agregar(FamiliaHistogramas(nombre, ayuda, etiqueta, limites))
+
+    def indicador(self, nombre, ayuda, funcion, tipo="gauge"):
+        return self.agregar(Indicador(nombre, ayuda, funcion, tipo))
+
+    def exponer(self):
+        lineas = []
+        for metrica in self.metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+async def _atender_http(registro, rutas, reader, writer):
+    """HTTP/1.1 mínimo: GET /metrics (y las `rutas` extra); una petición por conexión"""
+    try:
+        peticion = await asyncio.wait_for(reader.readline(), 5.0)
+        while True:
+            cabecera = await asyncio.wait_for(reader.readline(), 5.0)
+            if cabecera in (b"\r\n", b"\n", b""):
+                break
+        partes = peticion.decode("latin-1").split()
+        ruta = partes[1].split("?")[0] if len(partes) >= 2 and partes[0] == "GET" else None
+        if ruta == "/metrics":
+            estado, tipo, cuerpo = "200 OK", TIPO_CONTENIDO, registro.exponer().encode("utf-8")
+        elif ruta in rutas:
+            tipo, cuerpo = rutas[ruta]()
+            estado = "200 OK"
+        else:
+            estado, tipo, cuerpo = "404 Not Found", "text/plain; charset=utf-8", b"Solo /metrics\n"
+        writer.write(f"HTTP/1.1 {estado}\r\nContent-Type: {tipo}\r\nContent-Length: {len(cuerpo)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + cuerpo)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.error("Error sirviendo métricas: %s", e, exc_info=True)
+    finally:
+        writer.close()
+
+
+async def servir(registro, host, puerto, rutas=None):
+    """
+    Arranca el endpoint HTTP; retorna el asyncio.Server (usable con async with).
+    rutas: {ruta: funcion() -> (content-type, bytes)} servidas además de /metrics
+    """
+    return await asyncio.start_server(functools.partial(_atender_http, registro, rutas or {}), host, puerto)
@@ -0,0 +1,612 @@
+"""
+Simulador Monte Carlo vectorizado: miles de partidas independientes avanzan
+a la vez como arrays de NumPy (posiciones, dados, turnos), con la geometría
+de parchis.Table (salidas, seguro_meta, save, camino a meta de 7 casillas)
+y las reglas de GameManager: dobles sacan todas las fichas de la cárcel,
+premio de `max_dobles` dobles, suma obligatoria con una sola ficha movible
+lejos de meta, capturas y paso automático de turno.
+
+Pensado para calibrar reglas de la casa con millones de partidas; informa
+victorias por color y por posición en el orden de turnos, duración media y
+frecuencia de capturas. Con --verificar N se registran N partidas y se
+repiten en GameManager (vía simulador.Partida) comparando el tablero antes
+de cada tirada y cada movimiento.
+
+NumPy es opcional para el resto del servidor: solo lo necesita este módulo.
+
+Uso:
+    python montecarlo.py [--partidas 100000] [--jugadores 4] [--politica aleatoria]
+                         [--lote 10000] [--max-dobles 3] [--sin-suma-forzada]
+                         [--dado1 3 6] [--dado2 4 6] [--verificar 50]
+"""
+
+import argparse
+import logging
+import time
+from collections import Counter, deque
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+import gameFile as tkn
+import protocol as proto
+from estado_compacto import decodificar, ranura_de
+from parchis import Table
+from simulador import Partida, MAX_TURNOS
+
+logger = logging.getLogger(__name__)
+
+# Orden de juego a partir del color que abre (mismo ciclo que SECUENCIAS_TURNOS de GameManager)
+ORDEN_TURNOS = ["rojo", "verde", "amarillo", "azul"]
+
+# Lugar de una ficha en un solo entero: 0-67 tablero, 68-74 camino a meta, 75 META, 76 cárcel
+LUGAR_CAMINO_META = tkn.CASILLAS_TABLERO
+LUGAR_META = LUGAR_CAMINO_META + tkn.POSICION_META
+LUGAR_CARCEL = LUGAR_META + 1
+NUM_LUGARES = LUGAR_CARCEL + 1
+
+# Fases de cada partida del lote
+TIRAR, MOVER, TERMINADA = 0, 1, 2
+
+# Columnas de la elección de dado, en el orden de simulador._acciones_posibles
+DADOS_ELEGIDOS = (3, 1, 2)
+
+POLITICAS = ("aleatoria", "primera", "adelantada")
+
+ESTADISTICAS = ("tiradas", "turnos", "movimientos", "capturas", "salidas_carcel",
+                "premios", "turnos_pasados", "atascos")
+
+
+def lugar_de(estado, posicion, posicion_meta):
+    """Lugar (0-76) de una ficha a partir de sus campos de gameToken"""
+    if estado == tkn.ESTADO_EN_JUEGO:
+        return posicion
+    if estado == tkn.ESTADO_CAMINO_META:
+        return LUGAR_CAMINO_META + posicion_meta
+    if estado == tkn.ESTADO_META:
+        return LUGAR_META
+    return LUGAR_CARCEL
+
+
+def colores_en_juego(num_jugadores):
+    """Colores de la partida (los primeros de proto.COLORES, como simulador.Partida) en orden de turno"""
+    presentes = proto.COLORES[:num_jugadores]
+    return [color for color in ORDEN_TURNOS if color in presentes]
+
+
+class MotorMontecarlo:
+    """Reglas y tablas precalculadas; juega lotes de partidas en paralelo"""
+
+    def __init__(self, num_jugadores=4, politica="aleatoria", max_dobles=3, suma_forzada=True,
+                 dado1=(3, 6), dado2=(4, 6), max_tiradas=MAX_TURNOS):
+        if np is None:
+            raise RuntimeError("montecarlo necesita NumPy (pip install numpy)")
+        if politica not in POLITICAS:
+            raise ValueError(f"Política desconocida: {politica}")
+        if not (1 <= dado1[0] <= dado1[1] <= 6 and 1 <= dado2[0] <= dado2[1] <= 6):
+            raise ValueError("Los dados deben estar entre 1 y 6")
+
+        self.num_jugadores = num_jugadores
+        self.politica = politica
+        self.max_dobles = max_dobles
+        self.suma_forzada = suma_forzada
+        self.dado1 = dado1
+        self.dado2 = dado2
+        self.max_tiradas = max_tiradas
+        self.colores = colores_en_juego(num_jugadores)
+        self._precalcular()
+
+    def _precalcular(self):
+        """Tablas por asiento (índice en self.colores) a partir de parchis.Table y gameFile"""
+        tablero = Table()
+        transiciones = tkn.tabla_transiciones(tablero)
+        n = self.num_jugadores
+
+        # destino[asiento, lugar, pasos] = nuevo lugar, o -1 si el movimiento es ilegal
+        self.destino = np.full((n, NUM_LUGARES, tkn.PASOS_MAXIMOS + 1), -1, dtype=np.int8)
+        self.cerca_meta = np.zeros((n, NUM_LUGARES), dtype=bool)
+        self.capturable = np.zeros((n, NUM_LUGARES), dtype=bool)
+        self.salida = np.zeros(n, dtype=np.int8)
+
+        for asiento, color in enumerate(self.colores):
+            self.salida[asiento] = tablero.salidas[color]
+            for pasos in range(1, tkn.PASOS_MAXIMOS + 1):
+                for posicion in range(tkn.CASILLAS_TABLERO):
+                    self.destino[asiento, posicion, pasos] = self._lugar_destino(
+                        transiciones[(color, tkn.ESTADO_EN_JUEGO, posicion, pasos)], posicion, -1)
+                for posicion_meta in range(tkn.POSICION_META):
+                    self.destino[asiento, LUGAR_CAMINO_META + posicion_meta, pasos] = self._lugar_destino(
+                        transiciones[(color, tkn.ESTADO_CAMINO_META, posicion_meta, pasos)], -1, posicion_meta)
+
+            for posicion in range(tkn.CASILLAS_TABLERO):
+                ficha = tkn.gameToken(color, tkn.ESTADO_EN_JUEGO)
+                ficha.posicion = posicion
+                self.cerca_meta[asiento, posicion] = tablero.esta_cerca_meta(ficha)
+                self.capturable[asiento, posicion] = tablero.puede_capturar_en_casilla(posicion, color)
+
+        # Progreso para la política "adelantada" (mismo criterio que simulador.politica_adelantada)
+        self.progreso = np.zeros((n, NUM_LUGARES), dtype=np.int32)
+        for asiento in range(n):
+            casillas = np.arange(tkn.CASILLAS_TABLERO)
+            self.progreso[asiento, :tkn.CASILLAS_TABLERO] = (casillas - self.salida[asiento]) % tkn.CASILLAS_TABLERO
+            self.progreso[asiento, LUGAR_CAMINO_META:LUGAR_META] = 100 + np.arange(tkn.POSICION_META)
+
+    @staticmethod
+    def _lugar_destino(resultado, posicion, posicion_meta):
+        if resultado is tkn.MOVIMIENTO_ILEGAL:
+            return -1
+        estado, nueva_posicion, nueva_posicion_meta = resultado
+        return lugar_de(
+            estado,
+            posicion if nueva_posicion is None else nueva_posicion,
+            posicion_meta if nueva_posicion_meta is None else nueva_posicion_meta,
+        )
+
+    def jugar_lote(self, num_partidas, rng, muestra=()):
+        """Juega `num_partidas` hasta el final. Retorna el LoteMontecarlo terminado"""
+        lote = LoteMontecarlo(self, num_partidas, rng, muestra)
+        lote.jugar()
+        return lote
+
+
+class LoteMontecarlo:
+    """Estado de un lote: cada array tiene una fila por partida"""
+
+    def __init__(self, motor, num_partidas, rng, muestra=()):
+        self.motor = motor
+        self.rng = rng
+        n = motor.num_jugadores
+
+        self.lugares = np.full((num_partidas, n, proto.FICHAS_POR_JUGADOR), LUGAR_CARCEL, dtype=np.int8)
+        self.inicio = rng.integers(0, n, num_partidas).astype(np.int8)
+        self.turno = self.inicio.copy()
+        self.dobles = np.zeros(num_partidas, dtype=np.int8)
+        self.dado1 = np.zeros(num_partidas, dtype=np.int8)
+        self.dado2 = np.zeros(num_partidas, dtype=np.int8)
+        self.es_doble = np.zeros(num_partidas, dtype=bool)
+        self.usados = np.zeros(num_partidas, dtype=np.int8)  # bit 1: dado 1, bit 2: dado 2
+        self.fase = np.full(num_partidas, TIRAR, dtype=np.int8)
+        self.ganador = np.full(num_partidas, -1, dtype=np.int8)
+        self.stats = {clave: np.zeros(num_partidas, dtype=np.int32) for clave in ESTADISTICAS}
+
+        # Partidas registradas para repetirlas en GameManager: {partida: [evento, ...]}
+        self.registros = {int(g): [] for g in muestra}
+        self.en_muestra = np.zeros(num_partidas, dtype=bool)
+        self.en_muestra[list(self.registros)] = True
+
+    def jugar(self):
+        while True:
+            tirar = np.flatnonzero(self.fase == TIRAR)
+            if tirar.size:
+                self.tirar(tirar)
+            mover = np.flatnonzero(self.fase == MOVER)
+            if mover.size:
+                self.mover(mover)
+            if not tirar.size and not mover.size:
+                return
+
+    # ---------- registro para la verificación ----------
+
+    def _registrar(self, idx, evento):
+        """evento(g) -> tupla; se añade con el asiento en turno y el tablero de la partida g"""
+        if not self.registros:
+            return
+        for g in idx[self.en_muestra[idx]]:
+            g = int(g)
+            self.registros[g].append(evento(g) + (int(self.turno[g]), self.lugares[g].tolist()))
+
+    # ---------- tirada ----------
+
+    def tirar(self, idx):
+        motor = self.motor
+        agotadas = self.stats["tiradas"][idx] >= motor.max_tiradas
+        self.fase[idx[agotadas]] = TERMINADA
+        idx = idx[~agotadas]
+        if not idx.size:
+            return
+
+        d1 = self.rng.integers(motor.dado1[0], motor.dado1[1] + 1, idx.size).astype(np.int8)
+        d2 = self.rng.integers(motor.dado2[0], motor.dado2[1] + 1, idx.size).astype(np.int8)
+        self.dado1[idx] = d1
+        self.dado2[idx] = d2
+        self._registrar(idx, lambda g: ("tirada", int(self.dado1[g]), int(self.dado2[g])))
+
+        es_doble = d1 == d2
+        self.es_doble[idx] = es_doble
+        self.usados[idx] = 0
+        self.stats["tiradas"][idx] += 1
+        dobles = np.where(es_doble, self.dobles[idx] + 1, 0).astype(np.int8)
+        self.dobles[idx] = dobles
+
+        premio = es_doble & (dobles >= motor.max_dobles)
+        if premio.any():
+            self.aplicar_premio(idx[premio])
+
+        con_dobles = idx[es_doble & ~premio]
+        if con_dobles.size:
+            self.sacar_todas(con_dobles)
+
+        resto = idx[~premio]
+        puede = self.puede_actuar(resto)
+        sin_accion = resto[~puede]
+        self.stats["turnos_pasados"][sin_accion[~self.es_doble[sin_accion]]] += 1
+        self.pasar_turno(sin_accion)
+        self.fase[resto[puede]] = MOVER
+
+    def aplicar_premio(self, idx):
+        """Premio de dobles: una ficha EN_JUEGO del jugador va a META y pasa el turno"""
+        asiento = self.turno[idx]
+        propias = self.lugares[idx, asiento]
+        elegibles = propias < tkn.CASILLAS_TABLERO
+        con_elegible = elegibles.any(axis=1)
+
+        g = idx[con_elegible]
+        if g.size:
+            ficha = self._elegir(elegibles[con_elegible], self._puntuar(asiento[con_elegible], propias[con_elegible]))
+            self._registrar(g, lambda p: ("premio", int(ficha[np.searchsorted(g, p)])))
+            self.lugares[g, asiento[con_elegible], ficha] = LUGAR_META
+            self.stats["premios"][g] += 1
+            ganan = self._comprobar_victoria(g)
+            idx = np.concatenate([g[~ganan], idx[~con_elegible]])
+
+        self.pasar_turno(idx)
+
+    def sacar_todas(self, idx):
+        """Dobles: todas las fichas en la cárcel del jugador salen a su casilla de salida"""
+        asiento = self.turno[idx]
+        propias = self.lugares[idx, asiento]
+        bloqueadas = propias == LUGAR_CARCEL
+        salida = self.motor.salida[asiento]
+        self.lugares[idx, asiento] = np.where(bloqueadas, salida[:, None], propias)
+
+        liberadas = bloqueadas.sum(axis=1)
+        self.stats["salidas_carcel"][idx] += liberadas
+        hay = liberadas > 0
+        self.capturar(idx[hay], salida[hay])
+
+    def puede_actuar(self, idx):
+        """Como GameManager.puede_hacer_alguna_accion (tras sacar las fichas con dobles)"""
+        valores = np.stack([self.dado1[idx], self.dado2[idx], self.dado1[idx] + self.dado2[idx]], axis=1)
+        destino = self.motor.destino[self.turno[idx][:, None, None],
+                                     self.lugares[idx, self.turno[idx]][:, :, None],
+                                     valores[:, None, :]]
+        return (destino >= 0).any(axis=(1, 2))
+
+    # ---------- movimiento ----------
+
+    def mover(self, idx):
+        motor = self.motor
+        asiento = self.turno[idx]
+        propias = self.lugares[idx, asiento]
+        d1, d2, usados = self.dado1[idx], self.dado2[idx], self.usados[idx]
+
+        valores = np.stack([d1 + d2, d1, d2], axis=1)
+        destino = motor.destino[asiento[:, None, None], propias[:, :, None], valores[:, None, :]]
+        legal = destino >= 0
+
+        disponibles = np.stack([usados == 0, (usados & 1) == 0, (usados & 2) == 0], axis=1)
+        if motor.suma_forzada:
+            # Una sola ficha puede usar un dado suelto y está lejos de meta: solo vale la suma
+            movibles = (legal[:, :, 1] | legal[:, :, 2]).sum(axis=1)
+            forzada = ((movibles == 1) & (usados == 0))[:, None] \
+                & (propias < tkn.CASILLAS_TABLERO) & ~motor.cerca_meta[asiento[:, None], propias]
+            legal[:, :, 1:] &= ~forzada[:, :, None]
+        legal &= disponibles[:, None, :]
+
+        puntuacion = self._puntuar(asiento, propias, acciones=True)
+        plano = legal.reshape(idx.size, -1)
+        hay = plano.any(axis=1)
+
+        sin_accion = idx[~hay]
+        if sin_accion.size:
+            self._registrar(sin_accion, lambda g: ("sin_movimiento",))
+            atascadas = sin_accion[~self.es_doble[sin_accion]]
+            self.stats["atascos"][atascadas] += 1
+            self.pasar_turno(atascadas)
+            self.fase[sin_accion[self.es_doble[sin_accion]]] = TIRAR
+
+        idx, asiento, usados = idx[hay], asiento[hay], usados[hay]
+        if not idx.size:
+            return
+        eleccion = self._elegir(plano[hay], puntuacion.reshape(plano.shape)[hay])
+        ficha, columna = np.divmod(eleccion, len(DADOS_ELEGIDOS))
+        nuevo = destino[hay][np.arange(idx.size), ficha, columna]
+
+        self._registrar(idx, lambda g: ("mover", int(ficha[np.searchsorted(idx, g)]),
+                                        DADOS_ELEGIDOS[columna[np.searchsorted(idx, g)]]))
+        self.lugares[idx, asiento, ficha] = nuevo
+        self.stats["movimientos"][idx] += 1
+        self.capturar(idx, nuevo)
+
+        ganan = self._comprobar_victoria(idx)
+        idx, asiento, usados, columna = idx[~ganan], asiento[~ganan], usados[~ganan], columna[~ganan]
+
+        # Dados usados: suma -> ambos (y avanza); dado suelto -> se mira si el otro sirve
+        usa_suma = columna == 0
+        usados = np.where(usa_suma, 3, usados | np.where(columna == 1, 1, 2)).astype(np.int8)
+        avanza = usa_suma.copy()
+        uno_usado = (usados == 1) | (usados == 2)
+        if uno_usado.any():
+            g = idx[uno_usado]
+            restante = np.where(usados[uno_usado] == 1, self.dado2[g], self.dado1[g])
+            sirve = (motor.destino[asiento[uno_usado][:, None], self.lugares[g, asiento[uno_usado]],
+                                   restante[:, None]] >= 0).any(axis=1)
+            es_doble = self.es_doble[g]
+            usados[np.flatnonzero(uno_usado)[~sirve & es_doble]] = 0
+            avanza[np.flatnonzero(uno_usado)[~sirve & ~es_doble]] = True
+        self.usados[idx] = usados
+
+        es_doble = self.es_doble[idx]
+        termina_turno = ~es_doble & (avanza | (usados == 3))
+        self.pasar_turno(idx[termina_turno])
+        # Dobles sin dados pendientes: vuelve a tirar el mismo jugador
+        vuelve_a_tirar = ~termina_turno & (usados != 1) & (usados != 2)
+        self.fase[idx[vuelve_a_tirar]] = TIRAR
+
+    def capturar(self, idx, casilla):
+        """Fichas rivales en `casilla` vuelven a la cárcel (si la casilla lo permite)"""
+        asiento = self.turno[idx]
+        en_tablero = casilla < tkn.CASILLAS_TABLERO
+        puede = np.zeros(idx.size, dtype=bool)
+        puede[en_tablero] = self.motor.capturable[asiento[en_tablero], casilla[en_tablero]]
+        idx, asiento, casilla = idx[puede], asiento[puede], casilla[puede]
+        if not idx.size:
+            return
+
+        tablero = self.lugares[idx]
+        rivales = np.arange(self.motor.num_jugadores)[None, :, None] != asiento[:, None, None]
+        capturadas = (tablero == casilla[:, None, None]) & rivales
+        tablero[capturadas] = LUGAR_CARCEL
+        self.lugares[idx] = tablero
+        self.stats["capturas"][idx] += capturadas.sum(axis=(1, 2))
+
+    # ---------- turnos y políticas ----------
+
+    def pasar_turno(self, idx):
+        self.turno[idx] = (self.turno[idx] + 1) % self.motor.num_jugadores
+        self.dobles[idx] = 0
+        self.usados[idx] = 0
+        self.fase[idx] = TIRAR
+        self.stats["turnos"][idx] += 1
+
+    def _comprobar_victoria(self, idx):
+        """Marca como terminadas las partidas cuyo jugador en turno tiene las 4 fichas en META"""
+        ganan = (self.lugares[idx, self.turno[idx]] == LUGAR_META).all(axis=1)
+        g = idx[ganan]
+        self.ganador[g] = self.turno[g]
+        self.fase[g] = TERMINADA
+        return ganan
+
+    def _puntuar(self, asiento, propias, acciones=False):
+        """
+        Puntuación de cada ficha (o de cada par ficha-dado si acciones) según la política;
+        a igual puntuación gana la primera en el orden de simulador._acciones_posibles.
+        """
+        fichas = proto.FICHAS_POR_JUGADOR
+        columnas = len(DADOS_ELEGIDOS) if acciones else 1
+        orden = (fichas * columnas - 1 - np.arange(fichas * columnas)).reshape(fichas, columnas)
+        politica = self.motor.politica
+
+        if politica == "aleatoria":
+            puntuacion = self.rng.random((asiento.size, fichas, columnas))
+        elif politica == "adelantada":
+            progreso = self.motor.progreso[asiento[:, None], propias]
+            puntuacion = progreso[:, :, None] * (fichas * columnas) + orden
+        else:
+            puntuacion = np.broadcast_to(orden, (asiento.size, fichas, columnas))
+        return puntuacion if acciones else puntuacion[:, :, 0]
+
+    @staticmethod
+    def _elegir(mascara, puntuacion):
+        """Índice de la opción legal con mayor puntuación en cada fila"""
+        return np.where(mascara, puntuacion, -1).argmax(axis=1)
+
+    # ---------- resultados ----------
+
+    def resultado(self):
+        """Estadísticas de una partida por fila"""
+        return {"inicio": self.inicio, "ganador": self.ganador, **self.stats}
+
+
+# ============================================
+# VERIFICACIÓN CONTRA GameManager
+# ============================================
+
+class Divergencia(Exception):
+    """GameManager y el motor vectorizado no coinciden"""
+
+
+class PartidaReproducida(Partida):
+    """Repite en GameManager una partida registrada por LoteMontecarlo"""
+
+    def __init__(self, motor, inicio, eventos):
+        super().__init__(motor.num_jugadores, semilla=0)
+        self.politicas = [self._politica_registrada] * motor.num_jugadores
+        self.gm.max_dobles = motor.max_dobles
+        self.max_turnos = motor.max_tiradas
+        self.colores = motor.colores
+        self.inicio = inicio
+        self.eventos = deque(eventos)
+
+    def determinar_turnos(self):
+        """El color que abre lo decidió el motor; GameManager fija el orden como en una partida real"""
+        color = self.colores[self.inicio]
+        jugador = next(j for j, info in self.gm.clientes.items() if info["color"] == color)
+        self.gm._finalizar_determinacion(jugador, {"nombre": f"Bot{jugador.asiento}", "color": color})
+
+    def _siguiente(self, *tipos):
+        if not self.eventos:
+            raise Divergencia(f"GameManager sigue jugando y el registro se acabó (esperaba {tipos})")
+        evento = self.eventos.popleft()
+        if evento[0] not in tipos:
+            raise Divergencia(f"Esperaba {tipos} y el registro tiene {evento[0]}")
+
+        *_, asiento, lugares = evento
+        color = self.gm.clientes[self._jugador_actual()]["color"]
+        if color != self.colores[asiento]:
+            raise Divergencia(f"Turno de {color} en GameManager y de {self.colores[asiento]} en el motor")
+        if self.lugares() != lugares:
+            raise Divergencia(f"Tablero distinto antes de {evento[0]}: "
+                              f"GameManager={self.lugares()} motor={lugares}")
+        return evento
+
+    def lugares(self):
+        """Tablero de GameManager en el formato del motor: [asiento][ficha] -> lugar"""
+        datos = self.gm.estado_tablero.datos
+        return [
+            [lugar_de(*decodificar(datos[ranura_de(color, i)])[1:]) for i in range(proto.FICHAS_POR_JUGADOR)]
+            for color in self.colores
+        ]
+
+    def tirar_dados(self):
+        evento = self._siguiente("tirada")
+        return self.gm.lanzar_dados_safe(evento[1:3])
+
+    def _politica_registrada(self, gm, jugador, rng):
+        evento = self._siguiente("mover", "sin_movimiento")
+        return [evento[1:3]] if evento[0] == "mover" else []
+
+    def elegir_ficha_premio(self, elegibles):
+        return self._siguiente("premio")[1]
+
+
+def verificar(motor, lote):
+    """Repite las partidas registradas del lote en GameManager. Retorna la lista de diferencias"""
+    resultado = lote.resultado()
+    diferencias = []
+    for g, eventos in lote.registros.items():
+        partida = PartidaReproducida(motor, int(lote.inicio[g]), eventos)
+        try:
+            stats = partida.jugar()
+            if partida.eventos:
+                raise Divergencia(f"GameManager terminó con {len(partida.eventos)} eventos sin usar")
+            if stats.get("intentos_fallidos"):
+                raise Divergencia("GameManager rechazó movimientos que el motor dio por legales")
+            ganador = int(resultado["ganador"][g])
+            esperado = motor.colores[ganador] if ganador >= 0 else None
+            if stats.get("color_ganador") != esperado:
+                raise Divergencia(f"Ganador {stats.get('color_ganador')} en GameManager, {esperado} en el motor")
+            for clave in ("tiradas", "movimientos", "capturas", "salidas_carcel", "premios",
+                          "turnos_pasados", "atascos"):
+                if stats.get(clave, 0) != int(resultado[clave][g]):
+                    raise Divergencia(f"{clave}: GameManager={stats.get(clave, 0)} motor={int(resultado[clave][g])}")
+        except Divergencia as e:
+            diferencias.append((g, str(e)))
+    return diferencias
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def simular(motor, num_partidas, tam_lote=10000, semilla=1, verificar_partidas=0):
+    """
+    Juega `num_partidas` en lotes. Retorna (totales, duración, diferencias):
+    totales acumula las estadísticas y las victorias por color y por posición en el orden.
+    """
+    rng = np.random.default_rng(semilla)
+    totales = Counter()
+    victorias_color = Counter()
+    victorias_orden = Counter()
+    diferencias = []
+    duracion = 0.0
+
+    jugadas = 0
+    while jugadas < num_partidas:
+        tam = min(tam_lote, num_partidas - jugadas)
+        muestra = ()
+        if verificar_partidas and not jugadas:
+            muestra = np.sort(rng.choice(tam, size=min(verificar_partidas, tam), replace=False))
+
+        inicio = time.perf_counter()
+        lote = motor.jugar_lote(tam, rng, muestra)
+        duracion += time.perf_counter() - inicio
+
+        resultado = lote.resultado()
+        for clave in ESTADISTICAS:
+            totales[clave] += int(resultado[clave].sum())
+        completas = resultado["ganador"] >= 0
+        totales["partidas"] += tam
+        totales["completas"] += int(completas.sum())
+
+        ganador = resultado["ganador"][completas]
+        orden = (ganador - resultado["inicio"][completas]) % motor.num_jugadores
+        for asiento, cuenta in enumerate(np.bincount(ganador, minlength=motor.num_jugadores)):
+            victorias_color[motor.colores[asiento]] += int(cuenta)
+        for posicion, cuenta in enumerate(np.bincount(orden, minlength=motor.num_jugadores)):
+            victorias_orden[posicion] += int(cuenta)
+
+        if lote.registros:
+            diferencias.extend(verificar(motor, lote))
+        jugadas += tam
+        logger.debug(f"Lote de {tam} partidas terminado ({jugadas}/{num_partidas})")
+
+    totales["victorias_color"] = victorias_color
+    totales["victorias_orden"] = victorias_orden
+    return totales, duracion, diferencias
+
+
+def resumen(motor, totales, duracion):
+    """Texto con partidas/s, victorias por color y orden, duración y capturas"""
+    partidas = totales["partidas"]
+    completas = max(totales["completas"], 1)
+    lineas = [
+        f"Partidas: {partidas} ({totales['completas']} completas) en {duracion:.2f}s "
+        f"— {partidas / duracion:.0f} partidas/s",
+        f"Reglas: {motor.num_jugadores} jugadores, política {motor.politica}, max_dobles={motor.max_dobles}, "
+        f"suma forzada={'sí' if motor.suma_forzada else 'no'}, dados {motor.dado1}/{motor.dado2}",
+        "Promedio por partida:",
+    ]
+    for clave in ESTADISTICAS:
+        lineas.append(f"  {clave:16s} {totales[clave] / partidas:10.2f}")
+    lineas.append(f"  capturas cada 100 movimientos: {100 * totales['capturas'] / max(totales['movimientos'], 1):.2f}")
+    lineas.append("Victorias por color (sobre partidas completas):")
+    for color in motor.colores:
+        lineas.append(f"  {color:9s} {100 * totales['victorias_color'][color] / completas:6.2f}%")
+    lineas.append("Victorias por posición en el orden de turnos (0 = abre):")
+    for posicion in range(motor.num_jugadores):
+        lineas.append(f"  {posicion:9d} {100 * totales['victorias_orden'][posicion] / completas:6.2f}%")
+    return "\n".join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partidas", type=int, default=100000)
+    parser.add_argument("--jugadores", type=int, default=4, choices=range(proto.MIN_JUGADORES, proto.MAX_JUGADORES + 1))
+    parser.add_argument("--politica", choices=POLITICAS, default="aleatoria")
+    parser.add_argument("--lote", type=int, default=10000, help="partidas que avanzan a la vez")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--max-dobles", type=int, default=3, help="dobles seguidos para el premio")
+    parser.add_argument("--sin-suma-forzada", action="store_true",
+                        help="desactiva la suma obligatoria con una sola ficha movible")
+    parser.add_argument("--dado1", type=int, nargs=2, default=(3, 6), metavar=("MIN", "MAX"))
+    parser.add_argument("--dado2", type=int, nargs=2, default=(4, 6), metavar=("MIN", "MAX"))
+    parser.add_argument("--max-tiradas", type=int, default=MAX_TURNOS)
+    parser.add_argument("--verificar", type=int, default=0, metavar="N",
+                        help="repite N partidas del primer lote en GameManager y compara")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("montecarlo.py necesita NumPy: pip install numpy")
+    if args.verificar and args.sin_suma_forzada:
+        parser.error("--verificar compara con GameManager, que siempre aplica la suma forzada")
+
+    logging.disable(logging.CRITICAL)
+    motor = MotorMontecarlo(args.jugadores, args.politica, args.max_dobles, not args.sin_suma_forzada,
+                            tuple(args.dado1), tuple(args.dado2), args.max_tiradas)
+    totales, duracion, diferencias = simular(motor, args.partidas, args.lote, args.semilla, args.verificar)
+    print(resumen(motor, totales, duracion))
+
+    if args.verificar:
+        print(f"\nVerificación contra GameManager: {min(args.verificar, args.partidas)} partidas, "
+              f"{len(diferencias)} diferencias")
+        for g, mensaje in diferencias[:10]:
+            print(f"  ✗ partida {g}: {mensaje}")
+        return 1 if diferencias else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
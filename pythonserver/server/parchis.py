@@ -48,8 +48,12 @@ class Table:
         for color, seguro in self.seguro_meta.items():
             self.boxes[seguro] = f"SEGURO_META_{color.upper()}"
     
-    def mostrar_tablero(self, jugadores):
-        """Muestra el tablero con las fichas de todos los jugadores"""
+    def mostrar_tablero(self, jugadores, ocupacion=None):
+        """
+        Muestra el tablero con las fichas de todos los jugadores.
+        ocupacion: índice {casilla: [(jugador, ficha_id), ...]} del GameManager;
+        si se pasa, las casillas principales se leen de ahí en vez de recorrer fichas.
+        """
         print("\n" + "="*80)
         print("🎲 TABLERO DE PARCHÍS 🎲".center(80))
         print("="*80)
@@ -58,11 +62,15 @@ class Table:
         posiciones_fichas = {}
         posiciones_meta = {color: {} for color in self.casillas_meta.keys()}
         
+        if ocupacion is not None:
+            for casilla, ocupantes in ocupacion.items():
+                posiciones_fichas[casilla] = [f"{j.color[0].upper()}{idx+1}" for j, idx in ocupantes]
+        
         for jugador in jugadores:
             color = jugador.color
             for idx, ficha in enumerate(jugador.fichas):
                 if ficha.estado == "EN_JUEGO":
-                    if ficha.posicion >= 0:
+                    if ocupacion is None and ficha.posicion >= 0:
                         if ficha.posicion not in posiciones_fichas:
                             posiciones_fichas[ficha.posicion] = []
                         posiciones_fichas[ficha.posicion].append(f"{color[0].upper()}{idx+1}")
@@ -1,3 +1,7 @@
+import json
+import math
+from json.encoder import encode_basestring as _codificar_str
+
 # ============================================
 # TIPOS DE MENSAJES: CLIENTE → SERVIDOR
 # ============================================
@@ -9,6 +13,8 @@ MSG_DESCONECTAR = "DESCONECTAR"
 MSG_LISTO = "LISTO"  # Cliente listo para empezar
 MSG_SACAR_TODAS = "SACAR_TODAS"  # Solicitar sacar todas las fichas de la cárcel   
 MSG_SOLICITAR_COLORES = "SOLICITAR_COLORES"
+MSG_SOLICITAR_TABLERO = "SOLICITAR_TABLERO"  # Pedir snapshot completo tras un hueco de versión
+MSG_SOLICITAR_MOVIMIENTOS = "SOLICITAR_MOVIMIENTOS"  # Pedir los movimientos legales de la tirada actual
 
 # Mensajes de autenticación
 MSG_REGISTRAR_USUARIO = "REGISTRAR_USUARIO"
@@ -24,6 +30,9 @@ MSG_INICIO_JUEGO = "INICIO_JUEGO"
 MSG_TURNO = "TURNO"
 MSG_DADOS = "DADOS"
 MSG_TABLERO = "TABLERO"
+MSG_TABLERO_DELTA = "TABLERO_DELTA"  # Solo fichas/campos de turno que cambiaron
+MSG_MOVIMIENTOS_LEGALES = "MOVIMIENTOS_LEGALES"  # Acciones (ficha_id, dado_elegido) válidas ahora
+MSG_LOTE = "LOTE"  # Todos los eventos de un comando, en orden, con su número de secuencia
 MSG_MOVIMIENTO_OK = "MOVIMIENTO_OK"
 MSG_ERROR = "ERROR"
 MSG_VICTORIA = "VICTORIA"
@@ -31,6 +40,7 @@ MSG_JUGADOR_DESCONECTADO = "JUGADOR_DESCONECTADO"
 MSG_CAPTURA = "CAPTURA"
 MSG_INFO = "INFO"  # Mensajes informativos generales
 MSG_COLORES_DISPONIBLES = "COLORES_DISPONIBLES"
+MSG_REDIRIGIR = "REDIRIGIR"  # Modo supervisor: la sala vive en otro trabajador (reconectar a su puerto)
 
 # Respuestas de autenticación
 MSG_REGISTRO_EXITOSO = "REGISTRO_EXITOSO"
@@ -76,15 +86,36 @@ def crear_mensaje(tipo, **kwargs):
 def mensaje_listo():
     return crear_mensaje(MSG_LISTO)
 
-def mensaje_conectar(nombre, color=None):  
+def mensaje_conectar(nombre, color=None, sala=None, delta=False, movimientos=False, codec=None, lote=False):  
     msg = crear_mensaje(MSG_CONECTAR, nombre=nombre)
     if color:
         msg["color"] = color
+    if sala:
+        msg["sala"] = sala
+    if delta:
+        msg["delta"] = True
+    if movimientos:
+        msg["movimientos"] = True
+    if codec:
+        msg["codec"] = codec  # "binario": tramas binarias (codec.py) en lugar de JSON
+    if lote:
+        msg["lote"] = True  # eventos de cada comando agrupados en una trama LOTE
     return msg
 
-def mensaje_solicitar_colores():
-    """Solicita la lista de colores disponibles"""
-    return crear_mensaje(MSG_SOLICITAR_COLORES)
+def mensaje_solicitar_tablero():
+    """Pide al servidor el TABLERO completo (el cliente perdió una versión)"""
+    return crear_mensaje(MSG_SOLICITAR_TABLERO)
+
+def mensaje_solicitar_movimientos():
+    """Pide al servidor la lista de movimientos legales con los dados actuales"""
+    return crear_mensaje(MSG_SOLICITAR_MOVIMIENTOS)
+
+def mensaje_solicitar_colores(sala=None):
+    """Solicita la lista de colores disponibles (de una sala concreta si se indica)"""
+    msg = crear_mensaje(MSG_SOLICITAR_COLORES)
+    if sala:
+        msg["sala"] = sala
+    return msg
 
 
 def mensaje_colores_disponibles(colores):
@@ -104,8 +135,13 @@ def mensaje_mover_ficha(ficha_id, dado_elegido):
     """
     return crear_mensaje(MSG_MOVER_FICHA, ficha_id=ficha_id, dado_elegido=dado_elegido)
 
-def mensaje_bienvenida(color, jugador_id, nombre):
-    return crear_mensaje(MSG_BIENVENIDA, color=color, jugador_id=jugador_id, nombre=nombre)
+def mensaje_bienvenida(color, jugador_id, nombre, sala=None, codec=None):
+    msg = crear_mensaje(MSG_BIENVENIDA, color=color, jugador_id=jugador_id, nombre=nombre)
+    if sala:
+        msg["sala"] = sala
+    if codec and codec != "json":
+        msg["codec"] = codec  # Confirma el codec negociado en CONECTAR
+    return msg
 
 def mensaje_esperando(conectados, requeridos, jugadores=None):
     """Crea mensaje de espera con lista de jugadores conectados"""
@@ -114,15 +150,45 @@ def mensaje_esperando(conectados, requeridos, jugadores=None):
         msg["jugadores"] = jugadores
     return msg
 
-def mensaje_turno(nombre, color):
-    return crear_mensaje(MSG_TURNO, nombre=nombre, color=color)
+def mensaje_turno(nombre, color, plazo=None):
+    """plazo: instante (reloj del servidor, s epoch) en que vence el turno; se omite si no hay plazo"""
+    if plazo is None:
+        return crear_mensaje(MSG_TURNO, nombre=nombre, color=color)
+    return crear_mensaje(MSG_TURNO, nombre=nombre, color=color, plazo=plazo)
+
+def mensaje_tablero_delta(delta):
+    """
+    Cambios del tablero respecto a la versión `base`:
+    fichas que cambiaron (por color + id) y campos de turno modificados.
+    """
+    return crear_mensaje(MSG_TABLERO_DELTA, **delta)
+
+def mensaje_movimientos_legales(movimientos):
+    """movimientos: [(ficha_id, dado_elegido), ...] de GameManager.generar_movimientos_legales"""
+    return crear_mensaje(MSG_MOVIMIENTOS_LEGALES, movimientos=[
+        {"ficha_id": ficha_id, "dado_elegido": dado_elegido} for ficha_id, dado_elegido in movimientos
+    ])
+
+def mensaje_lote(seq, eventos):
+    """Eventos (mensajes completos) que produjo un comando, en el orden en que ocurrieron"""
+    return crear_mensaje(MSG_LOTE, seq=seq, eventos=eventos)
 
 def mensaje_dados(dado1, dado2, suma, es_doble):
     return crear_mensaje(MSG_DADOS, dado1=dado1, dado2=dado2, suma=suma, es_doble=es_doble)
 
+def mensaje_movimiento_ok(nombre, color, ficha_id, desde, hasta, accion=None):
+    msg = crear_mensaje(MSG_MOVIMIENTO_OK, nombre=nombre, color=color, ficha_id=ficha_id, desde=desde, hasta=hasta)
+    if accion:
+        msg["accion"] = accion
+    return msg
+
 def mensaje_error(mensaje):
     return crear_mensaje(MSG_ERROR, mensaje=mensaje)
 
+def mensaje_redirigir(sala, puerto):
+    """La sala la aloja otro trabajador: el cliente debe reconectar a `puerto` en el mismo host"""
+    return crear_mensaje(MSG_REDIRIGIR, sala=sala, puerto=puerto)
+
 def mensaje_victoria(ganador, color):
     return crear_mensaje(MSG_VICTORIA, ganador=ganador, color=color)
 
@@ -152,8 +218,11 @@ def mensaje_sacar_todas():
 MSG_SYNC_REQUEST = "SYNC_REQUEST"
 MSG_SYNC_RESPONSE = "SYNC_RESPONSE"
 
-def mensaje_sync_request(t1):
-    return crear_mensaje(MSG_SYNC_REQUEST, t1=t1)
+def mensaje_sync_request(t1, offset=None, rtt=None):
+    """offset/rtt: estimación actual del cliente (opcional), para las métricas por jugador del servidor"""
+    if offset is None:
+        return crear_mensaje(MSG_SYNC_REQUEST, t1=t1)
+    return crear_mensaje(MSG_SYNC_REQUEST, t1=t1, offset=offset, rtt=rtt)
 
 def mensaje_sync_response(t1, t2, t3):
     return crear_mensaje(MSG_SYNC_RESPONSE, t1=t1, t2=t2, t3=t3)
@@ -285,4 +354,204 @@ def mensaje_estadisticas(exito, mensaje, estadisticas):
         "exito": exito,
         "mensaje": mensaje,
         "estadisticas": estadisticas
-    }
\ No newline at end of file
+    }
+
+
+# ============================================
+# CODIFICADORES PRECOMPILADOS Y VALIDACIÓN
+# ============================================
+# Los mensajes frecuentes se serializan con una función generada una sola
+# vez por forma de mensaje (campos en el orden en que los crean los helpers
+# de arriba) que concatena fragmentos JSON ya escritos, sin recorrer el dict
+# como hace json.dumps. La salida es idéntica a
+# json.dumps(mensaje, ensure_ascii=False); si el mensaje no encaja (otro
+# orden, campos extra, tipos inesperados) se usa json.dumps.
+
+
+class ListaDe:
+    """Campo que es una lista de objetos con alguna de las `variantes` de campos"""
+
+    def __init__(self, *variantes):
+        self.variantes = variantes
+
+
+class ObjetoDe(ListaDe):
+    """Campo que es un objeto con alguna de las `variantes` de campos"""
+
+
+CAMPOS_FICHA = (("id", int), ("color", str), ("estado", str), ("posicion", int))
+FICHA = (CAMPOS_FICHA, CAMPOS_FICHA + (("posicion_meta", int),))
+
+SALIENTES = {
+    MSG_DADOS: [(("dado1", int), ("dado2", int), ("suma", int), ("es_doble", bool))],
+    MSG_TURNO: [(("nombre", str), ("color", str)), (("nombre", str), ("color", str), ("plazo", float))],
+    MSG_MOVIMIENTO_OK: [
+        (("nombre", str), ("color", str), ("ficha_id", int), ("desde", int), ("hasta", int)),
+        (("nombre", str), ("color", str), ("ficha_id", int), ("desde", int), ("hasta", int), ("accion", str)),
+    ],
+    MSG_CAPTURA: [(("capturado", ObjetoDe((("nombre", str), ("color", str), ("ficha_id", int)))),)],
+    MSG_MOVIMIENTOS_LEGALES: [(("movimientos", ListaDe((("ficha_id", int), ("dado_elegido", int)))),)],
+    MSG_TABLERO: [(
+        ("turno_actual", int), ("dados_lanzados", bool), ("ultimo_dado1", int), ("ultimo_dado2", int),
+        ("ultima_suma", int), ("ultimo_es_doble", bool), ("dobles_consecutivos", int),
+        # jugadores es una lista anidada grande: el codificador C de json es más rápido ahí
+        ("accion_realizada", bool), ("debe_avanzar_turno", bool), ("version", int), ("jugadores", list),
+    )],
+    MSG_TABLERO_DELTA: [(("version", int), ("base", int), ("fichas", ListaDe(*FICHA)), ("turno", dict))],
+    MSG_ERROR: [(("mensaje", str),)],
+    MSG_INFO: [(("mensaje", str),), (("mensaje", str), ("es_admin", bool))],
+    MSG_VICTORIA: [(("ganador", str), ("color", str))],
+    MSG_JUGADOR_DESCONECTADO: [(("nombre", str), ("color", str))],
+    MSG_SYNC_RESPONSE: [(("t1", float), ("t2", float), ("t3", float))],
+}
+
+_dumps = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _codificar_float(valor):
+    # json.dumps escribe NaN/Infinity; el resto es float.__repr__
+    return float.__repr__(valor) if math.isfinite(valor) else None
+
+
+def _compilar_objeto(campos, nombre, prefijo=()):
+    """
+    Genera la función que serializa un dict con exactamente `campos`
+    (más los de `prefijo`, ya fijos) o devuelve None si no encaja.
+    """
+    entorno = {"_str": _codificar_str, "_int": int.__repr__, "_float": _codificar_float, "_dumps": _dumps}
+    claves = tuple(clave for clave, _ in prefijo) + tuple(clave for clave, _ in campos)
+    entorno["CLAVES"] = claves
+    lineas = [f"def {nombre}(m):",
+              "    if type(m) is not dict or tuple(m) != CLAVES:",
+              "        return None"]
+    fragmento = "{" + ", ".join(f"{json.dumps(clave)}: {json.dumps(valor)}" for clave, valor in prefijo)
+    partes = []
+    for i, (clave, tipo) in enumerate(campos):
+        separador = ", " if prefijo or i else ""
+        partes.append(repr(fragmento + separador + json.dumps(clave) + ": "))
+        fragmento = ""
+        lineas.append(f"    v{i} = m[{clave!r}]")
+        if tipo is str:
+            lineas += [f"    if type(v{i}) is not str:", "        return None", f"    v{i} = _str(v{i})"]
+        elif tipo is int:
+            lineas += [f"    if type(v{i}) is not int:", "        return None", f"    v{i} = _int(v{i})"]
+        elif tipo is bool:
+            lineas += [f"    if type(v{i}) is not bool:", "        return None",
+                       f"    v{i} = 'true' if v{i} else 'false'"]
+        elif tipo is float:
+            lineas += [f"    if type(v{i}) is not float:", "        return None", f"    v{i} = _float(v{i})",
+                       f"    if v{i} is None:", "        return None"]
+        elif isinstance(tipo, ListaDe):
+            entorno[f"_sub{i}"] = _compilar_variantes(tipo.variantes, f"{nombre}_{clave}")
+            envolver = "_objeto" if isinstance(tipo, ObjetoDe) else "_lista"
+            lineas += [f"    v{i} = {envolver}(v{i}, _sub{i})", f"    if v{i} is None:", "        return None"]
+        else:
+            lineas += [f"    if type(v{i}) is not {tipo.__name__}:", "        return None", f"    v{i} = _dumps(v{i})"]
+        partes.append(f"v{i}")
+    partes.append(repr(fragmento + "}"))
+    lineas.append("    return " + " + ".join(partes))
+    entorno["_lista"], entorno["_objeto"] = _codificar_lista, _codificar_objeto
+    exec("\n".join(lineas), entorno)
+    return entorno[nombre]
+
+
+def _compilar_variantes(variantes, nombre, prefijo=()):
+    codificadores = tuple(_compilar_objeto(campos, f"{nombre}_{i}", prefijo) for i, campos in enumerate(variantes))
+    if len(codificadores) == 1:
+        return codificadores[0]
+
+    def codificar(m):
+        for codificador in codificadores:
+            resultado = codificador(m)
+            if resultado is not None:
+                return resultado
+        return None
+    return codificar
+
+
+def _codificar_objeto(valor, codificador):
+    return codificador(valor)
+
+
+def _codificar_lista(valores, codificador):
+    if type(valores) is not list:
+        return None
+    partes = []
+    for valor in valores:
+        parte = codificador(valor)
+        if parte is None:
+            return None
+        partes.append(parte)
+    return "[" + ", ".join(partes) + "]"
+
+
+CODIFICADORES = {
+    tipo: _compilar_variantes(variantes, f"_codificar_{tipo.lower()}", (("tipo", tipo),))
+    for tipo, variantes in SALIENTES.items()
+}
+
+
+def componer_lote_json(seq, eventos_json):
+    """Trama LOTE a partir de eventos ya serializados (así cada evento se codifica una sola vez)"""
+    return '{"tipo": "LOTE", "seq": ' + int.__repr__(seq) + ', "eventos": [' + ", ".join(eventos_json) + "]}"
+
+
+def _codificar_lote(m):
+    if tuple(m) != ("tipo", "seq", "eventos") or type(m["seq"]) is not int or type(m["eventos"]) is not list:
+        return None
+    if any(type(evento) is not dict for evento in m["eventos"]):
+        return None
+    return componer_lote_json(m["seq"], [codificar_json(evento) for evento in m["eventos"]])
+
+
+CODIFICADORES[MSG_LOTE] = _codificar_lote
+
+
+def codificar_json(mensaje):
+    """Serializa un mensaje a JSON (str): codificador precompilado de su tipo o json.dumps"""
+    codificador = CODIFICADORES.get(mensaje.get("tipo"))
+    if codificador is not None:
+        resultado = codificador(mensaje)
+        if resultado is not None:
+            return resultado
+    return json.dumps(mensaje, ensure_ascii=False)
+
+
+# Forma de los mensajes que llegan del cliente: campo → (tipos aceptados, obligatorio).
+# Los campos no listados se ignoran; los tipos desconocidos los rechaza cada handler.
+_NUMERO = (int, float)
+_TEXTO_O_NULO = (str, type(None))
+ENTRANTES = {
+    MSG_CONECTAR: {"nombre": ((str,), False), "color": (_TEXTO_O_NULO, False), "sala": (_TEXTO_O_NULO, False),
+                   "usuario_id": ((int, type(None)), False), "delta": ((bool,), False),
+                   "movimientos": ((bool,), False), "codec": ((str,), False), "lote": ((bool,), False)},
+    MSG_SOLICITAR_COLORES: {"sala": (_TEXTO_O_NULO, False)},
+    MSG_MOVER_FICHA: {"ficha_id": ((int,), True), "dado_elegido": ((int,), True)},
+    MSG_ELEGIR_FICHA_PREMIO: {"ficha_id": ((int, type(None)), False)},
+    MSG_DETERMINACION_TIRADA: {"dado1": ((int, str), True), "dado2": ((int, str), True)},
+    MSG_SYNC_REQUEST: {"t1": (_NUMERO, True), "offset": (_NUMERO, False), "rtt": (_NUMERO, False)},
+    MSG_REGISTRAR_USUARIO: {"username": ((str,), True), "password": ((str,), True), "email": (_TEXTO_O_NULO, False)},
+    MSG_LOGIN_USUARIO: {"username": ((str,), True), "password": ((str,), True)},
+    MSG_OBTENER_ESTADISTICAS: {"usuario_id": ((int, type(None)), False)},
+}
+
+
+def validar_entrante(mensaje):
+    """
+    Comprueba en una pasada la forma de un mensaje recibido.
+    Retorna None si es válido o un texto con el primer problema encontrado.
+    """
+    if type(mensaje) is not dict:
+        return "se esperaba un objeto"
+    tipo = mensaje.get("tipo")
+    if type(tipo) is not str:
+        return "falta el campo tipo"
+    for campo, (tipos, obligatorio) in ENTRANTES.get(tipo, {}).items():
+        if campo not in mensaje:
+            if obligatorio:
+                return f"falta el campo {campo}"
+            continue
+        # type() exacto: bool es subclase de int y un true no vale como número de ficha
+        if type(mensaje[campo]) not in tipos:
+            return f"tipo inválido para {campo}"
+    return None
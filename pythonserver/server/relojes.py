@@ -0,0 +1,90 @@
+"""
+Sincronización de reloj vista desde el servidor.
+
+Los sellos del intercambio NTP (t2 = recepción, t3 = envío) salen de
+ahora(): tiempo de pared anclado una vez y que avanza con perf_counter,
+así es monótono y de alta resolución (time.time() puede saltar si el
+sistema ajusta la hora y en algunas plataformas tiene resolución de ms).
+
+t2 se sella al leer la trama del socket, antes de decodificar y de pasar
+por la cola de la sala; t3 lo sella la escritora de la conexión justo
+antes del send. Así el tiempo que el SYNC_REQUEST pasa en el servidor no
+se cuenta como latencia de red.
+
+Cada SYNC_REQUEST puede traer la estimación actual del cliente (offset y
+RTT de su mejor muestra); se guarda por conexión para medir la latencia
+de cada jugador.
+"""
+
+import time
+import weakref
+
+_ORIGEN = time.time() - time.perf_counter()
+
+
+def ahora():
+    """Tiempo de pared (segundos epoch) con la monotonía y resolución de perf_counter"""
+    return _ORIGEN + time.perf_counter()
+
+
+class EstadoReloj:
+    """Último offset/RTT informado por un cliente"""
+
+    __slots__ = ("offset", "rtt", "rtt_minimo", "sondeos", "ultimo")
+
+    def __init__(self):
+        self.offset = None      # reloj del servidor - reloj del cliente (s)
+        self.rtt = None         # RTT de la mejor muestra actual del cliente (s)
+        self.rtt_minimo = None  # el menor RTT informado en toda la conexión
+        self.sondeos = 0
+        self.ultimo = None      # instante (ahora()) del último SYNC_REQUEST
+
+    def estadisticas(self, instante=None):
+        instante = ahora() if instante is None else instante
+        return {
+            "offset_ms": None if self.offset is None else round(self.offset * 1000, 3),
+            "rtt_ms": None if self.rtt is None else round(self.rtt * 1000, 3),
+            "rtt_minimo_ms": None if self.rtt_minimo is None else round(self.rtt_minimo * 1000, 3),
+            "sondeos": self.sondeos,
+            "hace_s": None if self.ultimo is None else round(instante - self.ultimo, 1),
+        }
+
+
+class RegistroRelojes:
+    """Instante de recepción de los SYNC_REQUEST pendientes y estado del reloj de cada conexión"""
+
+    def __init__(self):
+        self.recepciones = weakref.WeakKeyDictionary()  # {websocket: t2 del SYNC_REQUEST en curso}
+        self.por_conexion = weakref.WeakKeyDictionary()  # {websocket: EstadoReloj}
+
+    def recibido(self, websocket, instante):
+        """Sella t2 de un SYNC_REQUEST recién leído del socket"""
+        self.recepciones[websocket] = instante
+
+    def sondeo(self, websocket, mensaje):
+        """Registra un SYNC_REQUEST y retorna su t2 (el sello de recepción)"""
+        t2 = self.recepciones.pop(websocket, None)
+        if t2 is None:
+            t2 = ahora()
+        estado = self.por_conexion.get(websocket)
+        if estado is None:
+            estado = self.por_conexion[websocket] = EstadoReloj()
+        estado.sondeos += 1
+        estado.ultimo = t2
+
+        offset = mensaje.get("offset")
+        rtt = mensaje.get("rtt")
+        if offset is not None:
+            estado.offset = offset
+        if rtt is not None and rtt >= 0:
+            estado.rtt = rtt
+            if estado.rtt_minimo is None or rtt < estado.rtt_minimo:
+                estado.rtt_minimo = rtt
+        return t2
+
+    def estado(self, websocket):
+        return self.por_conexion.get(websocket)
+
+    def olvidar(self, websocket):
+        self.recepciones.pop(websocket, None)
+        self.por_conexion.pop(websocket, None)
@@ -0,0 +1,414 @@
+"""
+Repeticiones de partidas: archivo con fotogramas clave del tablero,
+diferencias entre ellos y un índice para saltar a cualquier jugada.
+
+El servidor (ParchisServer(directorio_repeticiones=...)) graba cada sala
+mientras se juega: una jugada por cada estado del tablero que difunde
+(broadcast_tablero), con los mismos campos que obtener_estado_tablero.
+Cada `intervalo` jugadas, o cuando cambia la lista de jugadores, se
+escribe un fotograma clave completo; entre medias, solo las fichas que
+cambiaron.
+
+Formato (enteros little-endian):
+
+    cabecera   "PQRP" | versión (u8) | longitud (u16) | JSON {codigo, inicio, intervalo}
+    jugadas    tipo (u8) | turno (u32) | longitud (u16) | datos
+                 CLAVE: campos de turno | version (u32) | 16 ranuras de
+                        estado_compacto (32 bytes) | JSON [{nombre, color, id}]
+                 DELTA: campos de turno | version (u32) | n (u8) | n x (ranura u8, valor u16)
+                 FIN:   JSON {ganador, color}
+    índice     por fotograma clave: jugada (u32) | turno (u32) | posición (u64)
+    cola       posición del índice (u64) | entradas (u32) | jugadas (u32) | "PQIX"
+
+El índice y la cola se escriben al cerrar la grabación. Ir a la jugada N
+es una búsqueda binaria en el índice (leído del archivo mapeado en
+memoria, sin cargarlo) y aplicar como mucho `intervalo` diferencias. Un
+archivo sin cola (partida cortada por una caída) se sigue pudiendo leer:
+el índice se reconstruye recorriendo las jugadas.
+
+"Turno" cuenta los cambios de jugador con el turno (empieza en 1), así
+que una misma jugada de dobles sigue en el mismo turno.
+
+Uso:
+    python repeticion.py partida.rep [--jugada N | --turno T] [--json]
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+import protocol as proto
+from estado_compacto import EstadoTablero, RANURAS, ranura_de, decodificar
+from game_manager import GameManager
+import gameFile as tkn
+from parchis import Table
+from user import User
+
+logger = logging.getLogger(__name__)
+
+MAGIA = b"PQRP"
+MAGIA_INDICE = b"PQIX"
+VERSION = 1
+EXTENSION = ".rep"
+
+# Tipos de jugada
+CLAVE = 1
+DELTA = 2
+FIN = 3
+
+INTERVALO_CLAVES = 32
+
+_CABECERA = struct.Struct("<4sBH")
+_JUGADA = struct.Struct("<BIH")
+_TURNO = struct.Struct("<" + "B" * len(GameManager.CAMPOS_TURNO) + "I")  # campos de turno + version
+_CAMBIO = struct.Struct("<BH")
+_ENTRADA = struct.Struct("<IIQ")
+_COLA = struct.Struct("<QII4s")
+_BYTES_TABLERO = 2 * RANURAS
+
+
+class ArchivoInvalido(Exception):
+    """El archivo no es una repetición legible"""
+
+
+# ============================================
+# GRABACIÓN
+# ============================================
+
+class Grabador:
+    """
+    Escribe la repetición de una sala en streaming (búfer del archivo; sin
+    fsync: una repetición no es crítica). Solo desde el hilo del bucle.
+    """
+
+    def __init__(self, ruta, codigo, intervalo=INTERVALO_CLAVES):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.archivo = open(ruta, "wb")
+        self.indice = []            # [(jugada, turno, posición)] de cada fotograma clave
+        self.jugadas = 0
+        self.turno = 0
+        self.cerrado = False
+        self._tablero = None        # copia de las 16 ranuras en la última jugada
+        self._jugadores = None      # [(nombre, color, id)] del último fotograma clave
+        self._turno_actual = None
+        self._desde_clave = 0
+        cabecera = json.dumps({"codigo": codigo, "inicio": time.time(), "intervalo": intervalo},
+                              ensure_ascii=False).encode("utf-8")
+        self.archivo.write(_CABECERA.pack(MAGIA, VERSION, len(cabecera)) + cabecera)
+
+    def anotar(self, gm):
+        """Añade el estado actual del GameManager como una jugada (llamar con el tablero ya cambiado)"""
+        if self.cerrado:
+            return
+        jugadores = [(info["nombre"], info["color"], info["id"]) for info in gm.clientes.values()]
+        tablero = gm.estado_tablero.datos
+        if gm.turno_actual != self._turno_actual:
+            self._turno_actual = gm.turno_actual
+            self.turno += 1
+        turno = _TURNO.pack(*(int(getattr(gm, campo)) for campo in GameManager.CAMPOS_TURNO), gm.version_tablero)
+
+        if jugadores != self._jugadores or self._desde_clave >= self.intervalo:
+            lista = json.dumps([{"nombre": n, "color": c, "id": i} for n, c, i in jugadores],
+                               ensure_ascii=False).encode("utf-8")
+            self.indice.append((self.jugadas, self.turno, self.archivo.tell()))
+            self._escribir(CLAVE, turno + tablero.tobytes() + lista)
+            self._jugadores = jugadores
+            self._desde_clave = 0
+        else:
+            cambios = [_CAMBIO.pack(ranura, valor) for ranura, (valor, anterior) in enumerate(zip(tablero, self._tablero))
+                       if valor != anterior]
+            self._escribir(DELTA, turno + bytes((len(cambios),)) + b"".join(cambios))
+            self._desde_clave += 1
+        self._tablero = array("H", tablero)
+        self.jugadas += 1
+
+    def _escribir(self, tipo, datos):
+        self.archivo.write(_JUGADA.pack(tipo, self.turno, len(datos)) + datos)
+
+    def cerrar(self, ganador=None, color=None):
+        """Escribe el fin (con el ganador, si lo hay), el índice y la cola"""
+        if self.cerrado:
+            return
+        self.cerrado = True
+        try:
+            fin = json.dumps({"ganador": ganador, "color": color}, ensure_ascii=False).encode("utf-8")
+            self._escribir(FIN, fin)
+            posicion = self.archivo.tell()
+            self.archivo.write(b"".join(_ENTRADA.pack(*entrada) for entrada in self.indice))
+            self.archivo.write(_COLA.pack(posicion, len(self.indice), self.jugadas, MAGIA_INDICE))
+        finally:
+            self.archivo.close()
+        logger.info("🎞️ Repetición guardada en %s (%s jugadas, %s turnos)", self.ruta, self.jugadas, self.turno)
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+class _Indice:
+    """Vista de solo lectura sobre las entradas del índice en el archivo mapeado (para bisect)"""
+
+    def __init__(self, datos, posicion, entradas, campo):
+        self.datos = datos
+        self.posicion = posicion
+        self.entradas = entradas
+        self.campo = campo          # 0 = jugada, 1 = turno, 2 = posición
+
+    def __len__(self):
+        return self.entradas
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.entradas:
+            raise IndexError(i)
+        return _ENTRADA.unpack_from(self.datos, self.posicion + i * _ENTRADA.size)[self.campo]
+
+
+class Repeticion:
+    """
+    Lector de una repetición mapeada en memoria.
+    Las jugadas se numeran desde 0; estado(n) retorna el dict de
+    obtener_estado_tablero en esa jugada.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = open(ruta, "rb")
+        try:
+            self.datos = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._archivo.close()
+            raise ArchivoInvalido(f"{ruta}: archivo vacío")
+        try:
+            magia, version, longitud = _CABECERA.unpack_from(self.datos, 0)
+        except struct.error:
+            magia = version = longitud = None
+        if magia != MAGIA or version != VERSION:
+            self.cerrar()
+            raise ArchivoInvalido(f"{ruta}: no es una repetición (versión {VERSION})")
+        self.cabecera = json.loads(self.datos[_CABECERA.size:_CABECERA.size + longitud].decode("utf-8"))
+        self._primera = _CABECERA.size + longitud
+        self.fin = None
+        self._cargar_indice()
+
+    def _cargar_indice(self):
+        cola = len(self.datos) - _COLA.size
+        if cola >= self._primera:
+            posicion, entradas, jugadas, magia = _COLA.unpack_from(self.datos, cola)
+            if magia == MAGIA_INDICE and posicion + entradas * _ENTRADA.size == cola:
+                self.jugadas = jugadas
+                self._jugadas = _Indice(self.datos, posicion, entradas, 0)
+                self._turnos = _Indice(self.datos, posicion, entradas, 1)
+                self._posiciones = _Indice(self.datos, posicion, entradas, 2)
+                self._buscar_fin(posicion)
+                return
+        # Sin índice (grabación interrumpida): se reconstruye recorriendo las jugadas
+        logger.warning("⚠️ %s sin índice: recorriendo las jugadas", self.ruta)
+        jugadas, turnos, posiciones = [], [], []
+        posicion = self._primera
+        numero = 0
+        while posicion + _JUGADA.size <= len(self.datos):
+            tipo, turno, longitud = _JUGADA.unpack_from(self.datos, posicion)
+            if posicion + _JUGADA.size + longitud > len(self.datos) or tipo not in (CLAVE, DELTA, FIN):
+                break
+            if tipo == CLAVE:
+                jugadas.append(numero)
+                turnos.append(turno)
+                posiciones.append(posicion)
+            if tipo == FIN:
+                self.fin = self._fin(posicion)
+                break
+            numero += 1
+            posicion += _JUGADA.size + longitud
+        self.jugadas = numero
+        self._jugadas, self._turnos, self._posiciones = jugadas, turnos, posiciones
+
+    def _buscar_fin(self, hasta):
+        """La jugada FIN es la última antes del índice: a como mucho `intervalo` jugadas del último fotograma clave"""
+        posicion = self._posiciones[len(self._posiciones) - 1] if len(self._posiciones) else self._primera
+        while posicion + _JUGADA.size <= hasta:
+            tipo, _, longitud = _JUGADA.unpack_from(self.datos, posicion)
+            if tipo == FIN:
+                self.fin = self._fin(posicion)
+                return
+            posicion += _JUGADA.size + longitud
+
+    def _fin(self, posicion):
+        _, _, longitud = _JUGADA.unpack_from(self.datos, posicion)
+        inicio = posicion + _JUGADA.size
+        return json.loads(self.datos[inicio:inicio + longitud].decode("utf-8"))
+
+    @property
+    def turnos(self):
+        """Último turno grabado"""
+        if not self.jugadas:
+            return 0
+        return self._recorrer(self.jugadas - 1)[1]
+
+    def jugada_de_turno(self, turno):
+        """Primera jugada del turno `turno` (o la última jugada si el turno no llegó a grabarse)"""
+        clave = max(bisect.bisect_left(self._turnos, turno) - 1, 0)
+        if not len(self._posiciones):
+            return 0
+        numero = self._jugadas[clave]
+        posicion = self._posiciones[clave]
+        while numero < self.jugadas - 1:
+            _, turno_jugada, longitud = _JUGADA.unpack_from(self.datos, posicion)
+            if turno_jugada >= turno:
+                return numero
+            posicion += _JUGADA.size + longitud
+            numero += 1
+        return numero
+
+    def _recorrer(self, jugada):
+        """
+        Ranuras, turno, campos de turno y jugadores en la jugada `jugada`:
+        último fotograma clave anterior (búsqueda binaria) + sus diferencias.
+        """
+        if not 0 <= jugada < self.jugadas:
+            raise IndexError(f"jugada {jugada} fuera de rango (0-{self.jugadas - 1})")
+        clave = bisect.bisect_right(self._jugadas, jugada) - 1
+        numero = self._jugadas[clave]
+        posicion = self._posiciones[clave]
+        tablero = EstadoTablero()
+        jugadores = None
+        while True:
+            tipo, turno, longitud = _JUGADA.unpack_from(self.datos, posicion)
+            inicio = posicion + _JUGADA.size
+            campos = _TURNO.unpack_from(self.datos, inicio)
+            cuerpo = inicio + _TURNO.size
+            if tipo == CLAVE:
+                tablero.restaurar(self.datos[cuerpo:cuerpo + _BYTES_TABLERO])
+                jugadores = json.loads(self.datos[cuerpo + _BYTES_TABLERO:inicio + longitud].decode("utf-8"))
+            else:
+                for i in range(self.datos[cuerpo]):
+                    ranura, valor = _CAMBIO.unpack_from(self.datos, cuerpo + 1 + i * _CAMBIO.size)
+                    tablero.datos[ranura] = valor
+            if numero == jugada:
+                return tablero, turno, campos, jugadores
+            posicion = inicio + longitud
+            numero += 1
+
+    def estado(self, jugada):
+        """Estado del tablero en la jugada, con la forma de GameManager.obtener_estado_tablero"""
+        tablero, _, campos, jugadores = self._recorrer(jugada)
+        estado = {campo: valor for campo, valor in zip(GameManager.CAMPOS_TURNO, campos)}
+        for campo in ("dados_lanzados", "ultimo_es_doble", "accion_realizada", "debe_avanzar_turno"):
+            estado[campo] = bool(estado[campo])
+        estado["version"] = campos[-1]
+        estado["jugadores"] = []
+        for jugador in jugadores:
+            fichas = []
+            for i in range(proto.FICHAS_POR_JUGADOR):
+                color, estado_ficha, posicion, posicion_meta = decodificar(tablero.datos[ranura_de(jugador["color"], i)])
+                ficha = {"id": i, "color": color, "estado": estado_ficha, "posicion": posicion}
+                if estado_ficha == "CAMINO_META" or posicion_meta >= 0:
+                    ficha["posicion_meta"] = max(posicion_meta, 0)
+                fichas.append(ficha)
+            estado["jugadores"].append({
+                **jugador,
+                "fichas": fichas,
+                "bloqueadas": sum(f["estado"] == proto.ESTADO_BLOQUEADO for f in fichas),
+                "en_juego": sum(f["estado"] == proto.ESTADO_EN_JUEGO for f in fichas),
+                "en_meta": sum(f["estado"] == proto.ESTADO_META for f in fichas),
+            })
+        return estado
+
+    def usuarios(self, jugada):
+        """Jugadores de la jugada como User con sus fichas (vistas sobre las ranuras), para Table.mostrar_tablero"""
+        return self.tablero(jugada)[0]
+
+    def tablero(self, jugada):
+        """
+        (usuarios, ocupacion) de la jugada: los User de usuarios() y el índice
+        {casilla: [(usuario, ficha_id), ...]} que mantiene el GameManager,
+        leído de las mismas ranuras, para Table.mostrar_tablero(usuarios, ocupacion).
+        """
+        tablero, _, _, jugadores = self._recorrer(jugada)
+        ranuras = tablero.instantanea()
+        usuarios = []
+        ocupacion = {}
+        for jugador in jugadores:
+            usuario = User(jugador["nombre"], jugador["color"])
+            for i in range(proto.FICHAS_POR_JUGADOR):
+                ranura = ranura_de(jugador["color"], i)
+                _, estado, posicion, _ = decodificar(tablero.datos[ranura])
+                usuario.agregar_ficha(tkn.gameToken(jugador["color"], proto.ESTADO_BLOQUEADO, tablero, ranura))
+                if estado == proto.ESTADO_EN_JUEGO and posicion >= 0:
+                    ocupacion.setdefault(posicion, []).append((usuario, i))
+            usuarios.append(usuario)
+        tablero.restaurar(ranuras)
+        return usuarios, ocupacion
+
+    def cerrar(self):
+        self.datos.close()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+
+# ============================================
+# CLI
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivo")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--jugada", type=int, default=None, help="número de jugada (desde 0; por defecto la última)")
+    grupo.add_argument("--turno", type=int, default=None, help="primera jugada del turno T (desde 1)")
+    parser.add_argument("--json", action="store_true", help="imprimir el estado como JSON en vez del tablero")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    try:
+        repeticion = Repeticion(args.archivo)
+    except (OSError, ArchivoInvalido) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    with repeticion:
+        if not repeticion.jugadas:
+            print("La repetición no tiene jugadas")
+            return 1
+        if args.turno is not None:
+            jugada = repeticion.jugada_de_turno(args.turno)
+        else:
+            jugada = repeticion.jugadas - 1 if args.jugada is None else args.jugada
+        try:
+            estado = repeticion.estado(jugada)
+        except IndexError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+
+        if args.json:
+            print(json.dumps(estado, ensure_ascii=False, indent=2))
+            return 0
+
+        inicio = time.strftime("%Y-%m-%d %H:%M", time.localtime(repeticion.cabecera.get("inicio", 0)))
+        print(f"Sala {repeticion.cabecera.get('codigo')} ({inicio}) - jugada {jugada} de {repeticion.jugadas - 1}, "
+              f"turno {repeticion._recorrer(jugada)[1]} de {repeticion.turnos}")
+        if repeticion.fin and repeticion.fin.get("ganador"):
+            print(f"🏆 Ganador: {repeticion.fin['ganador']} ({repeticion.fin['color']})")
+        jugadores = estado["jugadores"]
+        if jugadores:
+            actual = jugadores[estado["turno_actual"] % len(jugadores)]
+            print(f"Turno de {actual['nombre']} ({actual['color']}) - dados [{estado['ultimo_dado1']}] "
+                  f"[{estado['ultimo_dado2']}]{' DOBLES' if estado['ultimo_es_doble'] else ''}")
+        Table().mostrar_tablero(*repeticion.tablero(jugada))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import asyncio
+import inspect
+import logging
+import trazas
+from game_manager import GameManager
+
+logger = logging.getLogger(__name__)
+
+# Código de sala usado cuando el cliente no indica ninguno en CONECTAR
+SALA_POR_DEFECTO = "PRINCIPAL"
+
+
+class ActorSala:
+    """
+    Tarea asyncio dueña del estado de una sala.
+    Consume una cola de comandos y los ejecuta de uno en uno hasta el final
+    (incluidos sus await), de modo que dos mensajes de la misma sala nunca
+    se intercalan y el GameManager no necesita lock.
+    """
+
+    def __init__(self, codigo):
+        self.codigo = codigo
+        self.cola = asyncio.Queue()
+        self.tarea = None
+        self.comandos = 0
+
+    def iniciar(self):
+        if self.tarea is None:
+            self.tarea = asyncio.get_running_loop().create_task(self._bucle())
+
+    async def ejecutar(self, funcion, *args):
+        """Encola funcion(*args) (corutina o función normal) y espera su resultado"""
+        if asyncio.current_task() is self.tarea:
+            # Llamada desde un comando de esta misma sala: ejecutar en línea
+            # (esperar en la cola propia sería un deadlock)
+            return await _llamar(funcion, *args)
+        if self.tarea is not None and self.tarea.done():
+            if self.tarea.cancelled():
+                # El actor fue cancelado (cierre del loop): la limpieza no debe quedarse colgada
+                return await _llamar(funcion, *args)
+            # El bucle murió por otra causa: arrancar uno nuevo en vez de perder la serialización
+            logger.error("❌ Actor de la sala %s terminado inesperadamente; reiniciando", self.codigo)
+            self.cola = asyncio.Queue()
+            self.tarea = None
+
+        self.iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        # La traza del comando (si se muestreó) sigue en la tarea del actor
+        traza = trazas.actual()
+        self.cola.put_nowait((funcion, args, futuro, traza, trazas.reloj() if traza else 0))
+        return await futuro
+
+    async def _bucle(self):
+        cola = self.cola
+        futuro = None
+        try:
+            while True:
+                funcion, args, futuro, traza, encolado = await cola.get()
+                if funcion is None:
+                    break
+                try:
+                    with trazas.reanudar(traza, encolado):
+                        resultado = await _llamar(funcion, *args)
+                except asyncio.CancelledError:
+                    # Cancelación del propio actor: terminar el bucle. Si solo se
+                    # canceló el comando, falla su futuro y el actor sigue vivo.
+                    if asyncio.current_task().cancelling():
+                        raise
+                    futuro.cancel()
+                except BaseException as e:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                    if not isinstance(e, Exception):
+                        # KeyboardInterrupt / SystemExit deben llegar al loop
+                        raise
+                else:
+                    if not futuro.done():
+                        futuro.set_result(resultado)
+                self.comandos += 1
+        finally:
+            # Si nos cancelan, nadie debe quedarse esperando un comando
+            if futuro is not None and not futuro.done():
+                futuro.cancel()
+            while not cola.empty():
+                _, _, pendiente, _, _ = cola.get_nowait()
+                if pendiente is not None and not pendiente.done():
+                    pendiente.cancel()
+            logger.debug("Actor de la sala %s detenido tras %s comandos", self.codigo, self.comandos)
+
+    def detener(self):
+        """Termina el bucle cuando se vacíe la cola de comandos pendientes"""
+        if self.tarea is not None:
+            self.cola.put_nowait((None, (), None, None, 0))
+            # Si la sala se reutiliza, el siguiente bucle arranca con cola nueva
+            self.cola = asyncio.Queue()
+            self.tarea = None
+
+
+async def _llamar(funcion, *args):
+    resultado = funcion(*args)
+    if inspect.isawaitable(resultado):
+        resultado = await resultado
+    return resultado
+
+
+class Sala:
+    """Una mesa de juego: su propio GameManager y sus conexiones"""
+
+    def __init__(self, codigo, modo_actor=False):
+        self.codigo = codigo
+        self.game_manager = GameManager(modo_actor=modo_actor)
+        # En modo actor todos los comandos de la sala pasan por su tarea
+        self.actor = ActorSala(codigo) if modo_actor else None
+        # Número de secuencia del último LOTE de eventos enviado en la sala
+        self.secuencia_lotes = 0
+        # Plazo en curso (turno, determinación o premio): (Temporizador, tipo) o None
+        self.plazo = None
+        # Grabación de la partida en curso (repeticion.Grabador) o None
+        self.repeticion = None
+
+    @property
+    def clientes(self):
+        """Sockets de los jugadores conectados a esta sala"""
+        return self.game_manager.clientes
+
+    async def ejecutar(self, funcion, *args):
+        """Ejecuta un comando sobre la sala (a través del actor si está activo)"""
+        if self.actor is None:
+            return await _llamar(funcion, *args)
+        return await self.actor.ejecutar(funcion, *args)
+
+    def cerrar(self):
+        if self.plazo is not None:
+            self.plazo[0].cancelar()
+            self.plazo = None
+        if self.actor is not None:
+            self.actor.detener()
+        if self.repeticion is not None:
+            self.repeticion.cerrar()
+        # Sin jugadores no hay partida que recuperar: fuera su bitácora
+        if self.game_manager.bitacora is not None:
+            self.game_manager.bitacora.descartar()
+
+    def esta_vacia(self):
+        return not self.game_manager.clientes
+
+    def __repr__(self):
+        return f"Sala({self.codigo}, jugadores={len(self.game_manager.clientes)})"
+
+
+class RegistroSalas:
+    """
+    Registro de salas activas dentro de un mismo proceso.
+    Cada conexión queda asociada a una sola sala tras el CONECTAR.
+    """
+
+    def __init__(self, modo_actor=False, al_crear=None):
+        self.modo_actor = modo_actor
+        self.salas = {}               # {codigo: Sala}
+        self.sala_por_socket = {}     # {websocket: Sala}
+        # Gancho opcional al_crear(sala), p. ej. para instrumentar su GameManager
+        self.al_crear = al_crear
+
+    @staticmethod
+    def normalizar_codigo(codigo):
+        """Los códigos de sala no distinguen mayúsculas ni espacios"""
+        if not codigo:
+            return SALA_POR_DEFECTO
+        codigo = str(codigo).strip().upper()
+        return codigo or SALA_POR_DEFECTO
+
+    def obtener(self, codigo):
+        """Retorna la sala si existe, sin crearla"""
+        return self.salas.get(self.normalizar_codigo(codigo))
+
+    def obtener_o_crear(self, codigo):
+        codigo = self.normalizar_codigo(codigo)
+        sala = self.salas.get(codigo)
+        if sala is None:
+            sala = Sala(codigo, self.modo_actor)
+            if self.al_crear is not None:
+                self.al_crear(sala)
+            self.salas[codigo] = sala
+            logger.info("🏠 Sala %s creada (%s salas activas)", codigo, len(self.salas))
+        return sala
+
+    def asignar(self, websocket, sala):
+        self.sala_por_socket[websocket] = sala
+
+    def sala_de(self, websocket):
+        """Sala a la que pertenece un socket (None si no ha hecho CONECTAR)"""
+        return self.sala_por_socket.get(websocket)
+
+    def liberar(self, websocket):
+        """
+        Desasocia el socket de su sala. Si la sala queda vacía se elimina.
+        Retorna la sala a la que pertenecía (o None).
+        """
+        sala = self.sala_por_socket.pop(websocket, None)
+        if sala is not None:
+            self.descartar_si_vacia(sala)
+        return sala
+
+    def descartar_si_vacia(self, sala):
+        """Elimina la sala del registro si ya no tiene jugadores"""
+        if sala.esta_vacia() and self.salas.get(sala.codigo) is sala:
+            del self.salas[sala.codigo]
+            sala.cerrar()
+            logger.info("🗑️ Sala %s eliminada (%s salas activas)", sala.codigo, len(self.salas))
+
+    def __len__(self):
+        return len(self.salas)
+
+    def __iter__(self):
+        return iter(list(self.salas.values()))
@@ -0,0 +1,226 @@
+"""
+Cola de salida por conexión.
+
+Cada cliente conectado tiene una ColaSalida acotada que vacía su propia
+tarea escritora: quien envía (un handler, un broadcast) solo encola la
+trama ya serializada y sigue, aunque el socket de ese cliente esté lento.
+
+- Orden: mientras la cola está por debajo de la marca alta se envía en
+  orden de llegada (FIFO).
+- Saturación: al llegar a la marca alta la cola queda "saturada" hasta que
+  baja de la marca baja. Saturada, se envían primero los mensajes críticos
+  para el turno (TURNO, DADOS, VICTORIA...) y se descarta la charla (INFO).
+- Snapshots: un TABLERO completo deja obsoletos los TABLERO/TABLERO_DELTA
+  que sigan en cola; se quitan y solo viaja el último.
+- Expulsión: un cliente que supera la capacidad máxima, sigue saturado
+  más de `paciencia` segundos o no completa un envío en `timeout_envio`
+  se desconecta (callback al_fallar).
+- Tramas diferidas: en lugar de la trama se puede encolar una función sin
+  argumentos que la produce; la escritora la llama justo antes del send
+  (SYNC_RESPONSE sella así su t3 en el momento real de envío).
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_CRITICA = 0
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_CHARLA = 2
+
+# Tipo de mensaje → prioridad (los que no aparecen son PRIORIDAD_NORMAL)
+PRIORIDADES = {
+    "TURNO": PRIORIDAD_CRITICA,
+    "DADOS": PRIORIDAD_CRITICA,
+    "VICTORIA": PRIORIDAD_CRITICA,
+    "PREMIO_TRES_DOBLES": PRIORIDAD_CRITICA,
+    "ERROR": PRIORIDAD_CRITICA,
+    "INFO": PRIORIDAD_CHARLA,
+    "ESPERANDO": PRIORIDAD_CHARLA,
+}
+
+# Un snapshot completo sustituye a estos tipos si siguen sin enviar
+SNAPSHOT = "TABLERO"
+SUSTITUIDOS_POR_SNAPSHOT = frozenset(("TABLERO", "TABLERO_DELTA"))
+
+# Marcas por defecto (número de tramas en cola)
+MARCA_ALTA = 64
+MARCA_BAJA = 16
+CAPACIDAD_MAXIMA = 512
+
+
+class ColaSalida:
+    """Cola acotada de tramas hacia un websocket, con su tarea escritora"""
+
+    def __init__(self, websocket, marca_alta=MARCA_ALTA, marca_baja=MARCA_BAJA, capacidad=CAPACIDAD_MAXIMA,
+                 timeout_envio=2.0, paciencia=5.0, al_fallar=None):
+        self.websocket = websocket
+        self.marca_alta = marca_alta
+        self.marca_baja = marca_baja
+        self.capacidad = capacidad
+        self.timeout_envio = timeout_envio
+        self.paciencia = paciencia
+        self.al_fallar = al_fallar    # al_fallar(websocket, motivo, expulsado)
+
+        # Un carril por prioridad; cada entrada es [orden de llegada, trama, tipo]
+        self.carriles = tuple(deque() for _ in range(PRIORIDAD_CHARLA + 1))
+        self._orden = itertools.count()
+        self._hay_datos = asyncio.Event()
+        self._vacia = asyncio.Event()
+        self._vacia.set()
+        self.tarea = None
+        self.cerrada = False
+        self.saturada_desde = None
+
+        # Métricas
+        self.profundidad = 0
+        self.profundidad_maxima = 0
+        self.enviadas = 0
+        self.tamano_enviado = 0   # caracteres (texto) o bytes (binario)
+        self.descartadas = 0
+        self.sustituidas = 0
+
+    @property
+    def saturada(self):
+        return self.saturada_desde is not None
+
+    def iniciar(self):
+        if self.tarea is None and not self.cerrada:
+            self.tarea = asyncio.get_running_loop().create_task(self._escribir())
+
+    def encolar(self, trama, tipo=None):
+        """Añade una trama serializada (o función que la produce). Retorna False si se descartó o la cola está cerrada"""
+        if self.cerrada:
+            return False
+        prioridad = PRIORIDADES.get(tipo, PRIORIDAD_NORMAL)
+
+        if self.saturada and prioridad == PRIORIDAD_CHARLA:
+            self.descartadas += 1
+            return False
+        if tipo == SNAPSHOT:
+            self._quitar_sustituidos()
+
+        self.carriles[prioridad].append([next(self._orden), trama, tipo])
+        self.profundidad += 1
+        if self.profundidad > self.profundidad_maxima:
+            self.profundidad_maxima = self.profundidad
+
+        if self.profundidad >= self.marca_alta and not self.saturada:
+            self.saturada_desde = time.monotonic()
+            logger.warning("📦 Cola de salida saturada para %s (%s tramas)",
+                           self.websocket.remote_address, self.profundidad)
+        if self.profundidad > self.capacidad:
+            self._fallar(f"cola de salida llena ({self.profundidad} tramas)", expulsado=True)
+            return False
+        if self.saturada and time.monotonic() - self.saturada_desde > self.paciencia:
+            self._fallar(f"cola saturada más de {self.paciencia}s", expulsado=True)
+            return False
+
+        self.iniciar()
+        self._vacia.clear()
+        self._hay_datos.set()
+        return True
+
+    def _quitar_sustituidos(self):
+        carril = self.carriles[PRIORIDAD_NORMAL]
+        if not carril:
+            return
+        vigentes = [entrada for entrada in carril if entrada[2] not in SUSTITUIDOS_POR_SNAPSHOT]
+        quitadas = len(carril) - len(vigentes)
+        if quitadas:
+            carril.clear()
+            carril.extend(vigentes)
+            self.profundidad -= quitadas
+            self.sustituidas += quitadas
+
+    def _siguiente(self):
+        """FIFO entre carriles; saturada, el carril de mayor prioridad primero"""
+        if self.saturada:
+            for carril in self.carriles:
+                if carril:
+                    return carril.popleft()
+        mejor = None
+        for carril in self.carriles:
+            if carril and (mejor is None or carril[0][0] < mejor[0][0]):
+                mejor = carril
+        return mejor.popleft()
+
+    async def _escribir(self):
+        try:
+            while not self.cerrada:
+                if not self.profundidad:
+                    self._hay_datos.clear()
+                    await self._hay_datos.wait()
+                    continue
+                _, trama, _ = self._siguiente()
+                self.profundidad -= 1
+                if self.saturada and self.profundidad <= self.marca_baja:
+                    self.saturada_desde = None
+
+                try:
+                    if callable(trama):
+                        trama = trama()
+                    # asyncio.timeout y no wait_for: wait_for puede tragarse la
+                    # cancelación de la tarea si el envío termina a la vez
+                    async with asyncio.timeout(self.timeout_envio):
+                        await self.websocket.send(trama)
+                except TimeoutError:
+                    self._fallar(f"envío superó {self.timeout_envio}s", expulsado=True)
+                    return
+                except websockets.exceptions.ConnectionClosed:
+                    self._fallar("conexión cerrada", expulsado=False)
+                    return
+                except Exception as e:
+                    self._fallar(f"error enviando: {e}", expulsado=False)
+                    return
+                self.enviadas += 1
+                self.tamano_enviado += len(trama)
+                if not self.profundidad:
+                    self._vacia.set()
+        except asyncio.CancelledError:
+            pass
+
+    def _fallar(self, motivo, expulsado):
+        if self.cerrada:
+            return
+        self.cerrar()
+        if expulsado:
+            logger.warning("Cliente lento %s: %s, desconectando", self.websocket.remote_address, motivo)
+        if self.al_fallar is not None:
+            self.al_fallar(self.websocket, motivo, expulsado)
+
+    def cerrar(self):
+        """Descarta lo pendiente y detiene la escritora"""
+        self.cerrada = True
+        for carril in self.carriles:
+            carril.clear()
+        self.profundidad = 0
+        if self.tarea is not None and self.tarea is not asyncio.current_task():
+            self.tarea.cancel()
+        self._hay_datos.set()
+        self._vacia.set()
+
+    async def vaciar(self, timeout=None):
+        """Espera a que se envíe todo lo encolado (cierres ordenados, benchmarks). False si vence el timeout"""
+        try:
+            await asyncio.wait_for(self._vacia.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return not self.cerrada
+
+    def estadisticas(self):
+        return {
+            "profundidad": self.profundidad,
+            "profundidad_maxima": self.profundidad_maxima,
+            "saturada": self.saturada,
+            "enviadas": self.enviadas,
+            "tamano": self.tamano_enviado,
+            "descartadas": self.descartadas,
+            "sustituidas": self.sustituidas,
+        }
@@ -1,13 +1,31 @@
 import asyncio
 import websockets
-import json
 import logging
 import inspect
 import sys
 import os
-from game_manager import GameManager
-import protocol as proto
+import functools
+import contextlib
+import random
+import json
+import signal
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from salas import RegistroSalas
+import protocol as proto
+import despacho
+import codec
+import logs
+import lotes
+import salida
+import limites
+import relojes
+import temporizador
+import metricas
+import trazas
+import bitacora
+import repeticion
 
 # Configurar path para importar DatabaseManager
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -15,35 +33,115 @@ from database.db_manager import DatabaseManager
 
 
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
+
+# Tipos de plazo de una sala (uno en curso como máximo)
+PLAZO_TURNO = "turno"
+PLAZO_DETERMINACION = "determinacion"
+PLAZO_PREMIO = "premio"
+
+def _medido(histograma, llamada):
+    """Ejecuta llamada() (en el hilo de base de datos) y observa su duración"""
+    inicio = time.perf_counter()
+    try:
+        return llamada()
+    finally:
+        histograma.observar(time.perf_counter() - inicio)
+
 def debug_callable(func):
     """Debugging helper para ver la firma de una función"""
     sig = inspect.signature(func)
-    logger.critical(f"🔍 CALLABLE DEBUG:")
-    logger.critical(f"   Nombre: {func.__name__}")
-    logger.critical(f"   Tipo: {type(func)}")
-    logger.critical(f"   Parámetros: {sig}")
-    logger.critical(f"   Es coroutine: {inspect.iscoroutinefunction(func)}")
+    logger.critical("🔍 CALLABLE DEBUG:")
+    logger.critical("   Nombre: %s", func.__name__)
+    logger.critical("   Tipo: %s", type(func))
+    logger.critical("   Parámetros: %s", sig)
+    logger.critical("   Es coroutine: %s", inspect.iscoroutinefunction(func))
     return func
 
 
 class ParchisServer:
-    def __init__(self, host="0.0.0.0", port=8001, modo_embebido=False):
-        """Constructor - Sin cambios importantes"""
+    def __init__(self, host="0.0.0.0", port=8001, modo_embebido=False, timeout_envio=2.0, modo_actor=False,
+                 intervalo_estadisticas=300, cola_marca_alta=salida.MARCA_ALTA, cola_marca_baja=salida.MARCA_BAJA,
+                 cola_capacidad=salida.CAPACIDAD_MAXIMA, cola_paciencia=5.0, limites_frecuencia=None,
+                 reuse_port=False, afinidad=None, plazo_turno=60.0, plazo_determinacion=30.0, plazo_premio=30.0,
+                 puerto_metricas=None, host_metricas="127.0.0.1", trazas_muestreo=100, trazas_capacidad=16384,
+                 directorio_bitacora=None, intervalo_fsync=0.2, espera_reconexion=300.0, directorio_repeticiones=None):
+        """
+        Constructor - modo_actor: cada sala procesa sus comandos en su propia tarea asyncio, sin RLock.
+        intervalo_estadisticas: cada cuántos segundos se registra el resumen del despacho (0 = nunca)
+        cola_*: marcas alta/baja, capacidad y paciencia (s) de la cola de salida de cada conexión
+        limites_frecuencia: {presupuesto: {"conexion"|"ip": (capacidad, ritmo/s)}} sobre limites.LIMITES_POR_DEFECTO
+        reuse_port / afinidad: trabajador del modo supervisor (ver supervisor.py)
+        plazo_*: segundos para jugar el turno, tirar en la determinación y elegir la ficha del premio (None = sin plazo)
+        puerto_metricas: puerto HTTP de /metrics en host_metricas (None = sin endpoint; en modo supervisor, + índice)
+        trazas_*: se traza 1 de cada trazas_muestreo comandos (0 = nunca) en un búfer de trazas_capacidad tramos
+        directorio_bitacora: bitácora de cada partida, con fsync cada intervalo_fsync s (None = sin bitácora);
+            al arrancar se restauran las partidas que haya y sus jugadores tienen espera_reconexion s para volver
+        directorio_repeticiones: cada partida se graba ahí como repetición (ver repeticion.py; None = no se graban)
+        """
         self.host = host
         self.port = port
-        self.game_manager = GameManager()
+        self.modo_actor = modo_actor
+        self.salas = RegistroSalas(modo_actor=modo_actor, al_crear=self._instrumentar_sala)
         self.running = False
         self.clientes_activos = set()
         self.modo_embebido = modo_embebido
         
+        # ⭐ Modo supervisor: puerto compartido con SO_REUSEPORT y salas repartidas entre trabajadores
+        self.reuse_port = reuse_port
+        self.afinidad = afinidad
+        
+        # Tiempo máximo por destinatario antes de considerarlo un cliente lento
+        self.timeout_envio = timeout_envio
+        self._tareas_limpieza = set()
+        
+        # ⭐ Plazos de todas las salas en una sola rueda de temporizadores (ver temporizador.py)
+        self.temporizadores = temporizador.RuedaTemporizadores()
+        self.plazo_turno = plazo_turno
+        self.plazo_determinacion = plazo_determinacion
+        self.plazo_premio = plazo_premio
+        self._tareas_plazos = set()
+        
+        # ⭐ Cola de salida por conexión, vaciada por su propia tarea escritora
+        self.colas_salida = {}  # {websocket: ColaSalida}
+        self.cola_marca_alta = cola_marca_alta
+        self.cola_marca_baja = cola_marca_baja
+        self.cola_capacidad = cola_capacidad
+        self.cola_paciencia = cola_paciencia
+        
+        # ⭐ Cubos de fichas por conexión e IP (auth / sync / juego), antes de validar y despachar
+        self.limitador = limites.Limitador(limites_frecuencia)
+        self._trama_limitado = proto.codificar_json(proto.mensaje_error("Demasiadas solicitudes, espera un momento"))
+        
+        # ⭐ Sellos t2/t3 de los SYNC_REQUEST y offset/RTT informado por cada cliente
+        self.relojes = relojes.RegistroRelojes()
+        
+        # ⭐ Tabla de despacho (fase, tipo) → manejador, con latencias por tipo
+        self.despachador = despacho.Despachador()
+        self._registrar_manejadores()
+        self.intervalo_estadisticas = intervalo_estadisticas
+        
         # Inicializar el gestor de base de datos
         self.db_manager = DatabaseManager()
+        # ⭐ Consultas SQLite fuera del bucle, en un único hilo (la conexión no admite uso concurrente)
+        self.ejecutor_bd = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parques-bd")
+        
+        # ⭐ Métricas para Prometheus (ver metricas.py); los contadores se llevan siempre, el endpoint es opcional
+        self.puerto_metricas = puerto_metricas
+        self.host_metricas = host_metricas
+        self._configurar_metricas()
+        
+        # ⭐ Tramos de los comandos muestreados en un búfer circular; volcar_trazas() los escribe para Chrome
+        self.trazador = trazas.Trazador(trazas_capacidad, trazas_muestreo)
+        
+        # ⭐ Bitácora por partida para recuperarse de una caída (ver bitacora.py)
+        self.bitacoras = bitacora.RegistroBitacoras(directorio_bitacora, intervalo_fsync) if directorio_bitacora else None
+        self.espera_reconexion = espera_reconexion
+        
+        # ⭐ Repeticiones de las partidas (fotogramas clave + diferencias, ver repeticion.py)
+        self.directorio_repeticiones = directorio_repeticiones
+        if directorio_repeticiones:
+            os.makedirs(directorio_repeticiones, exist_ok=True)
         
     async def iniciar(self):
         """Inicia el servidor WebSocket"""
@@ -53,34 +151,61 @@ class ParchisServer:
             logger.info("="*60)
             logger.info("SERVIDOR DE PARCHÍS WEBSOCKET INICIADO".center(60))
             logger.info("="*60)
-            logger.info(f"Escuchando en ws://{self.host}:{self.port}")
-            logger.info(f"Esperando jugadores (mín: {proto.MIN_JUGADORES}, máx: {proto.MAX_JUGADORES})")
+            logger.info("Escuchando en ws://%s:%s", self.host, self.port)
+            logger.info("Esperando jugadores (mín: %s, máx: %s)", proto.MIN_JUGADORES, proto.MAX_JUGADORES)
             logger.info("="*60)
             
             # ✅ CORRECCIÓN: Handler sin argumento 'path' para websockets 15.x
             async def handler(websocket):
-                logger.info(f"🔍 Nueva conexión desde {websocket.remote_address}")
+                logger.info("🔍 Nueva conexión desde %s", websocket.remote_address)
                 try:
                     # Llamar al método sin 'path'
                     await self.manejar_cliente(websocket)
                 except Exception as e:
-                    logger.error(f"🔍 Error en handler: {e}", exc_info=True)
+                    logger.error("🔍 Error en handler: %s", e, exc_info=True)
                     raise
             
             logger.info("🔍 Iniciando websockets.serve()")
             
-            async with websockets.serve(
-                handler,
-                self.host,
-                self.port,
-                ping_interval=20,
-                ping_timeout=10
-            ):
+            async with contextlib.AsyncExitStack() as servidores:
+                if self.bitacoras is not None:
+                    # Antes de aceptar conexiones: las partidas de la ejecución anterior vuelven a su sala
+                    self._restaurar_partidas()
+                    servidores.push_async_callback(self.bitacoras.cerrar)
+                    servidores.callback(asyncio.create_task(self.bitacoras.ejecutar()).cancel)
+                    logger.info("📒 Bitácora de partidas en %s (fsync cada %ss)",
+                                self.bitacoras.directorio, self.bitacoras.intervalo_fsync)
+                await servidores.enter_async_context(websockets.serve(
+                    handler,
+                    self.host,
+                    self.port,
+                    ping_interval=20,
+                    ping_timeout=10,
+                    reuse_port=self.reuse_port
+                ))
+                if self.afinidad is not None:
+                    # Puerto propio del trabajador: destino de las redirecciones a sus salas
+                    puerto_interno = self.afinidad.puerto_de(self.afinidad.indice)
+                    await servidores.enter_async_context(websockets.serve(
+                        handler, self.host, puerto_interno, ping_interval=20, ping_timeout=10
+                    ))
+                    logger.info("👷 Trabajador %s/%s, puerto interno %s",
+                                self.afinidad.indice, self.afinidad.total, puerto_interno)
                 logger.info("✅ Servidor WebSocket escuchando...")
+                servidores.callback(asyncio.create_task(self.temporizadores.ejecutar()).cancel)
+                if self.puerto_metricas is not None:
+                    puerto_metricas = self.puerto_metricas + (self.afinidad.indice if self.afinidad is not None else 0)
+                    await servidores.enter_async_context(await metricas.servir(
+                        self.metricas, self.host_metricas, puerto_metricas, rutas={"/trazas": self._trazas_http}))
+                    servidores.callback(asyncio.create_task(self.retraso_bucle.ejecutar()).cancel)
+                    logger.info("📈 Métricas en http://%s:%s/metrics", self.host_metricas, puerto_metricas)
+                if self.intervalo_estadisticas:
+                    asyncio.create_task(self._informar_despacho())
+                self._escuchar_senal_trazas(servidores)
                 await asyncio.Future()  # Mantener servidor corriendo
                 
         except Exception as e:
-            logger.critical(f"🔍 ERROR CRÍTICO en iniciar(): {e}", exc_info=True)
+            logger.critical("🔍 ERROR CRÍTICO en iniciar(): %s", e, exc_info=True)
             raise
         
     async def manejar_cliente(self, websocket):
@@ -88,173 +213,87 @@ class ParchisServer:
         nombre = "Desconocido"
         conectado_correctamente = False
         addr = None
+        ip = None
         
         try:
             # Obtener dirección de forma segura
             try:
-                addr = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+                ip = websocket.remote_address[0]
+                addr = f"{ip}:{websocket.remote_address[1]}"
             except Exception:
                 addr = "unknown"
             
-            logger.debug(f"Iniciando manejo de cliente {addr}")
+            logger.debug("Iniciando manejo de cliente %s", addr)
             
             # ⚡ IMPORTANTE: Agregar a clientes activos DESPUÉS del handshake
             # No aquí, para evitar conexiones fantasma
             
             async for mensaje_str in websocket:
-                try:
-                    mensaje = json.loads(mensaje_str)
-                    tipo = mensaje.get("tipo")
+                # ⭐ Instante de recepción (t2 del sync), antes de decodificar y de la cola de la sala
+                recibido = relojes.ahora()
+                # ⭐ Traza del comando (1 de cada N, ver trazas.py)
+                with self.trazador.comando() as traza:
+                    try:
+                        # Texto = JSON, binario = codec binario (según el tipo de trama)
+                        with trazas.tramo("decodificar"):
+                            mensaje = codec.decodificar(mensaje_str)
+                        tipo = mensaje.get("tipo") if isinstance(mensaje, dict) else None
+                        traza.renombrar(tipo)
+                        self.mensajes_recibidos.incrementar(tipo)
                     
-                    if not conectado_correctamente:
-                        # 🆕 PERMITIR MSG_SYNC_REQUEST antes del handshake
-                        if tipo == proto.MSG_SYNC_REQUEST:
-                            logger.debug(f"SYNC_REQUEST (pre-handshake) recibido de {addr}")
-                            
-                            t1 = mensaje.get("t1")
-                            t2 = time.time()
-                            t3 = time.time()
-                            
-                            respuesta = proto.mensaje_sync_response(t1, t2, t3)
-                            
-                            # Enviar directamente (sin usar self.enviar que verifica clientes_activos)
-                            try:
-                                mensaje_json = json.dumps(respuesta, ensure_ascii=False)
-                                await websocket.send(mensaje_json)
-                                logger.debug(f"SYNC_RESPONSE enviado (pre-handshake)")
-                            except Exception as e:
-                                logger.error(f"Error enviando SYNC_RESPONSE pre-handshake: {e}")
-                            
-                            continue  # ← Continuar esperando más mensajes
-                        
-                        # 🆕 PERMITIR MSG_SOLICITAR_COLORES antes del handshake
-                        if tipo == proto.MSG_SOLICITAR_COLORES:
-                            logger.debug(f"SOLICITAR_COLORES (pre-handshake) recibido de {addr}")
-                            
-                            colores = self.game_manager.obtener_colores_disponibles()
-                            
-                            try:
-                                respuesta = proto.mensaje_colores_disponibles(colores)
-                                mensaje_json = json.dumps(respuesta, ensure_ascii=False)
-                                await websocket.send(mensaje_json)
-                                logger.debug(f"COLORES_DISPONIBLES enviado (pre-handshake): {colores}")
-                            except Exception as e:
-                                logger.error(f"Error enviando COLORES_DISPONIBLES pre-handshake: {e}")
-                            
-                            continue  # ← Continuar esperando más mensajes
-                        
-                        # 🆕 PERMITIR mensajes de autenticación antes del handshake
-                        if tipo == proto.MSG_REGISTRAR_USUARIO:
-                            await self.procesar_registro_usuario(websocket, mensaje)
+                        # ⭐ Límite de frecuencia: lo que sobra ni se valida ni se despacha
+                        presupuesto = self.limitador.presupuesto_de(tipo)
+                        if self.limitador.permitir(websocket, ip, presupuesto) is not None:
+                            await self._rechazar_limitado(websocket, presupuesto, addr)
                             continue
-                        
-                        if tipo == proto.MSG_LOGIN_USUARIO:
-                            await self.procesar_login_usuario(websocket, mensaje)
+                        if tipo == proto.MSG_SYNC_REQUEST:
+                            self.relojes.recibido(websocket, recibido)
+                    
+                        # ⭐ Forma del mensaje validada en una pasada antes de despacharlo
+                        error = proto.validar_entrante(mensaje)
+                        if error:
+                            logger.warning("Mensaje rechazado de %s: %s", addr, error)
+                            await self.responder_error(websocket, f"Mensaje inválido: {error}")
                             continue
-                        
-                        if tipo == proto.MSG_OBTENER_ESTADISTICAS:
-                            await self.procesar_obtener_estadisticas(websocket, mensaje)
+                    
+                        if not conectado_correctamente:
+                            # Antes del CONECTAR solo hay rutas de handshake (sync, colores, auth, CONECTAR)
+                            with trazas.tramo("despachar", tipo):
+                                resultado = await self.despachador.despachar(despacho.FASE_HANDSHAKE, websocket, mensaje)
+                            if resultado is False:
+                                return  # Conexión rechazada y cerrada por el manejador
+                            if isinstance(resultado, str):
+                                nombre = resultado
+                                conectado_correctamente = True
                             continue
-                        
-                        # Si no es ninguno de los mensajes permitidos antes de conectar
-                        if tipo != proto.MSG_CONECTAR:
-                            logger.warning(f"Protocolo inválido de {addr}: {tipo}")
-                            await self.enviar(websocket, proto.mensaje_error("Protocolo inválido: se esperaba CONECTAR"))
-                            await websocket.close(code=1008, reason="Protocolo inválido")
-                            return
-                        
-                        # ============ PROCESAR MSG_CONECTAR ============
-                        nombre = mensaje.get("nombre", "").strip()
-                        color_elegido = mensaje.get("color", None)  # 🆕 Obtener color del mensaje
-                        usuario_id = mensaje.get("usuario_id", None)  # 🆕 ID de usuario de la BD
-                        
-                        if not nombre:
-                            nombre = f"Jugador_{websocket.remote_address[1]}"
-                        
-                        logger.info(f"Cliente {addr} solicita conectarse como '{nombre}' con color '{color_elegido}' (usuario_id={usuario_id})")
-                        
-                        # Agregar jugador CON el color elegido y usuario_id
-                        color, error, es_admin, es_host = self.game_manager.agregar_jugador(websocket, nombre, color_elegido, usuario_id)
-                        
-                        if error:
-                            logger.warning(f"{nombre} no pudo conectarse: {error}")
-                            await self.enviar(websocket, proto.mensaje_error(error))
-                            await websocket.close(code=1008, reason=error)
-                            return
-                        
-                        # ✅ AHORA SÍ agregamos a clientes activos
-                        self.clientes_activos.add(websocket)
-                        
-                        logger.info(f"{nombre} conectado como {color.upper()} (admin={es_admin})")
-                        
-                        # Enviar bienvenida
-                        jugador_id = self.game_manager.clientes[websocket]["id"]
-                        await self.enviar(websocket, proto.mensaje_bienvenida(color, jugador_id, nombre))
-                        
-                        # Notificar estado con lista de jugadores
-                        conectados = len(self.game_manager.jugadores)
-                        jugadores_lista = self.game_manager.obtener_info_jugadores()
-                        await self.broadcast(proto.mensaje_esperando(conectados, proto.MIN_JUGADORES, jugadores_lista))
-                        
-                        # ⭐ NUEVO: Inicio automático con 4 jugadores
-                        if conectados == proto.MAX_JUGADORES:
-                            logger.info(f"🎊 Se alcanzó el máximo de jugadores ({proto.MAX_JUGADORES}). Iniciando automáticamente...")
-                            await self.broadcast(proto.mensaje_info(
-                                f"¡Sala completa con {proto.MAX_JUGADORES} jugadores! Iniciando partida automáticamente..."
-                            ))
-                            await asyncio.sleep(1)  # Breve pausa para que los jugadores lean el mensaje
-                            await self.iniciar_determinacion()
-                        # Mensajes de admin (solo si no se inició automáticamente)
-                        elif es_admin:
-                            await self.enviar(websocket, proto.mensaje_info(
-                                "Eres el administrador. Para iniciar la partida envía MSG_LISTO. "
-                                f"Se requiere al menos {proto.MIN_JUGADORES} jugadores. "
-                                f"Con {proto.MAX_JUGADORES} jugadores se inicia automáticamente.", 
-                                es_admin=True
-                            ))
-                            await self.broadcast(proto.mensaje_info(
-                                f"{nombre} es el administrador y podrá iniciar la partida cuando esté listo."
-                            ))
-                        else:
-                            admin_sock = getattr(self.game_manager, "admin_cliente", None)
-                            if admin_sock:
-                                admin_info = self.game_manager.clientes.get(admin_sock, {})
-                                admin_nombre = admin_info.get("nombre", "Administrador")
-                                await self.enviar(websocket, proto.mensaje_info(
-                                    f"El administrador actual es: {admin_nombre}"
-                                ))
-                        
-                        conectado_correctamente = True
-                        continue
-                                        
-                    # ============ MENSAJES NORMALES ============
-                    if conectado_correctamente:
-                        logger.debug(f"Procesando mensaje de {nombre}: {mensaje}")
-                        await self.procesar_mensaje(websocket, mensaje)
                     
-                    elif tipo == proto.MSG_DEBUG_FORZAR_TRES_DOBLES:
-                        await self.procesar_debug_tres_dobles(websocket)
+                        # ============ MENSAJES NORMALES ============
+                        if logger.isEnabledFor(logging.DEBUG) and logs.muestra("MENSAJE"):
+                            logger.debug("Procesando mensaje de %s: %s", nombre, mensaje)
+                        sala = self.salas.sala_de(websocket)
+                        with trazas.tramo("despachar", tipo):
+                            await sala.ejecutar(self.procesar_mensaje, websocket, mensaje)
                 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parseando JSON de {addr}: {e} - mensaje: {mensaje_str[:100]}")
-                    await self.enviar(websocket, proto.mensaje_error("Mensaje JSON inválido"))
-                except Exception as e:
-                    logger.error(f"Error procesando mensaje de {addr}: {e}", exc_info=True)
-                    # No romper el loop, seguir escuchando
+                    except codec.TramaInvalida as e:
+                        logger.error("Error decodificando mensaje de %s: %s - mensaje: %r", addr, e, mensaje_str[:100])
+                        await self.responder_error(websocket, "Mensaje inválido")
+                    except Exception as e:
+                        logger.error("Error procesando mensaje de %s: %s", addr, e, exc_info=True)
+                        # No romper el loop, seguir escuchando
         
         except websockets.exceptions.ConnectionClosedOK:
-            logger.info(f"Cliente {addr} ({nombre}) cerró conexión normalmente")
+            logger.info("Cliente %s (%s) cerró conexión normalmente", addr, nombre)
         except websockets.exceptions.ConnectionClosedError as e:
-            logger.warning(f"Cliente {addr} ({nombre}) cerró conexión con error: {e.code} - {e.reason}")
+            logger.warning("Cliente %s (%s) cerró conexión con error: %s - %s", addr, nombre, e.code, e.reason)
         except websockets.exceptions.ConnectionClosed as e:
-            logger.info(f"Cliente {addr} ({nombre}) desconectado: {e.code} - {e.reason}")
+            logger.info("Cliente %s (%s) desconectado: %s - %s", addr, nombre, e.code, e.reason)
         except asyncio.CancelledError:
-            logger.info(f"Tarea cancelada para {addr} ({nombre})")
+            logger.info("Tarea cancelada para %s (%s)", addr, nombre)
             raise  # Re-raise para permitir limpieza apropiada
         except Exception as e:
-            logger.error(f"Error inesperado en manejar_cliente para {addr}: {e}", exc_info=True)
+            logger.error("Error inesperado en manejar_cliente para %s: %s", addr, e, exc_info=True)
         finally:
-            logger.debug(f"Limpiando cliente {nombre} ({addr})")
+            logger.debug("Limpiando cliente %s (%s)", nombre, addr)
             
             # Asegurar que se remueve de clientes activos
             self.clientes_activos.discard(websocket)
@@ -262,6 +301,28 @@ class ParchisServer:
             # Limpiar del game_manager
             await self.limpiar_cliente(websocket, nombre)
     
+    async def _rechazar_limitado(self, websocket, presupuesto, addr):
+        """Camino barato para un mensaje fuera de presupuesto: ERROR preserializado solo al primero de la racha"""
+        if not self.limitador.primer_rechazo(websocket, presupuesto):
+            return
+        if logs.muestra("LIMITE"):
+            logger.warning("⏳ %s supera el límite de frecuencia (%s)", addr, presupuesto)
+        if websocket in self.clientes_activos:
+            self._encolar(websocket, self._trama_limitado, proto.MSG_ERROR)
+            return
+        try:
+            await websocket.send(self._trama_limitado)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _en_bd(self, funcion, *args, **kwargs):
+        """Ejecuta una llamada al DatabaseManager en el hilo de base de datos"""
+        loop = asyncio.get_running_loop()
+        histograma = self.tiempos_bd.de(funcion.__name__)
+        with trazas.tramo("bd", funcion.__name__):
+            return await loop.run_in_executor(self.ejecutor_bd, _medido, histograma,
+                                              functools.partial(funcion, *args, **kwargs))
+
     async def limpiar_cliente(self, websocket, nombre):
         """Limpia los recursos de un cliente desconectado"""
         try:
@@ -269,78 +330,100 @@ class ParchisServer:
                 self.clientes_activos.discard(websocket)
             except Exception:
                 pass
+            cola = self.colas_salida.pop(websocket, None)
+            if cola is not None:
+                cola.cerrar()
+            self.relojes.olvidar(websocket)
 
-            nombre_real, color, admin_promoted = self.game_manager.eliminar_jugador(websocket)
-
-            if nombre_real:
-                logger.info(f"{nombre_real} ({color}) desconectado")
+            sala = self.salas.sala_de(websocket)
+            if sala is None:
+                # Nunca completó el CONECTAR: no pertenece a ninguna sala
                 try:
-                    msg_desc = proto.crear_mensaje(proto.MSG_JUGADOR_DESCONECTADO, nombre=nombre_real, color=color)
-                    await self.broadcast(msg_desc)
+                    await websocket.close()
                 except Exception:
-                    logger.exception("Error enviando MSG_JUGADOR_DESCONECTADO en broadcast")
+                    pass
+                return
 
-            if admin_promoted:
-                try:
-                    nuevo_sock = admin_promoted.get("socket")
-                    nuevo_nombre = admin_promoted.get("nombre", "Administrador")
-                    
-                    try:
-                        await self.enviar(nuevo_sock, proto.mensaje_info(
-                            "Has sido promovido a administrador. Para iniciar la partida envía MSG_LISTO.",
-                            es_admin=True
-                        ))
-                        logger.info(f"Notificado PRIVADAMENTE a nuevo admin: {nuevo_nombre}")
-                    except Exception:
-                        logger.exception("Error enviando mensaje privado al nuevo admin")
+            # Quitar al jugador y avisar a la mesa (en modo actor, como un comando más de la sala)
+            await sala.ejecutar(self._limpiar_en_sala, sala, websocket)
 
-                    try:
-                        await self.broadcast(proto.mensaje_info(f"El administrador actual es: {nuevo_nombre}"))
-                    except Exception:
-                        logger.exception("Error haciendo broadcast del nuevo administrador")
-                except Exception:
-                    logger.exception("Error procesando admin_promoted en limpiar_cliente")
-            
-            try:
-                naveg = len(self.game_manager.jugadores)
-                jugadores_lista = self.game_manager.obtener_info_jugadores()
-                await self.broadcast(proto.mensaje_esperando(naveg, proto.MIN_JUGADORES, jugadores_lista))
-            except Exception:
-                logger.exception("Error enviando MSG_ESPERANDO tras desconexión")
+            # Último paso: soltar el socket (elimina la sala si quedó vacía)
+            self.salas.liberar(websocket)
 
+        except Exception as e:
+            logger.error("Error limpiando cliente: %s", e)
+
+    async def _limpiar_en_sala(self, sala, websocket):
+        """Elimina al jugador del GameManager de su sala y notifica al resto"""
+        nombre_real, color, admin_promoted = sala.game_manager.eliminar_jugador(websocket)
+
+        if nombre_real:
+            logger.info("%s (%s) desconectado", nombre_real, color)
             try:
-                if (self.game_manager.juego_iniciado and
-                        not getattr(self.game_manager, 'juego_terminado', False)):
-                    self.game_manager.manejar_desconexion_en_turno(websocket)
-                    await asyncio.sleep(0.1)
-                    try:
-                        await self.notificar_turno()
-                    except Exception:
-                        logger.exception("Error notificando turno tras desconexión")
+                msg_desc = proto.crear_mensaje(proto.MSG_JUGADOR_DESCONECTADO, nombre=nombre_real, color=color)
+                await self.broadcast(sala, msg_desc)
             except Exception:
-                logger.exception("Error al manejar desconexión durante partida")
+                logger.exception("Error enviando MSG_JUGADOR_DESCONECTADO en broadcast")
 
+        if admin_promoted:
             try:
-                await websocket.close()
+                nuevo_sock = admin_promoted.get("socket")
+                nuevo_nombre = admin_promoted.get("nombre", "Administrador")
+                
+                try:
+                    await self.enviar(nuevo_sock, proto.mensaje_info(
+                        "Has sido promovido a administrador. Para iniciar la partida envía MSG_LISTO.",
+                        es_admin=True
+                    ))
+                    logger.info("Notificado PRIVADAMENTE a nuevo admin: %s", nuevo_nombre)
+                except Exception:
+                    logger.exception("Error enviando mensaje privado al nuevo admin")
+
+                try:
+                    await self.broadcast(sala, proto.mensaje_info(f"El administrador actual es: {nuevo_nombre}"))
+                except Exception:
+                    logger.exception("Error haciendo broadcast del nuevo administrador")
             except Exception:
-                pass
+                logger.exception("Error procesando admin_promoted en limpiar_cliente")
+        
+        try:
+            naveg = len(sala.game_manager.jugadores)
+            jugadores_lista = sala.game_manager.obtener_info_jugadores()
+            await self.broadcast(sala, proto.mensaje_esperando(naveg, proto.MIN_JUGADORES, jugadores_lista))
+        except Exception:
+            logger.exception("Error enviando MSG_ESPERANDO tras desconexión")
 
-        except Exception as e:
-            logger.error(f"Error limpiando cliente: {e}")
+        try:
+            if (sala.game_manager.juego_iniciado and
+                    not getattr(sala.game_manager, 'juego_terminado', False)):
+                sala.game_manager.manejar_desconexion_en_turno(websocket)
+                await self._pausa(sala, 0.1)
+                try:
+                    await self.notificar_turno(sala)
+                except Exception:
+                    logger.exception("Error notificando turno tras desconexión")
+        except Exception:
+            logger.exception("Error al manejar desconexión durante partida")
+
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
     # ========== MÉTODOS DE AUTENTICACIÓN ==========
     
     async def enviar_directo(self, websocket, mensaje):
         """Envía un mensaje directamente sin verificar clientes_activos (para auth)"""
         try:
-            mensaje_json = json.dumps(mensaje, ensure_ascii=False)
-            logger.debug(f"Enviando directo a {websocket.remote_address}: {mensaje}")
+            mensaje_json = proto.codificar_json(mensaje)
+            logger.debug("Enviando directo a %s: %s", websocket.remote_address, mensaje)
+            self.mensajes_enviados.incrementar(mensaje.get("tipo"))
             await websocket.send(mensaje_json)
-            logger.debug(f"Mensaje enviado exitosamente")
+            logger.debug("Mensaje enviado exitosamente")
         except websockets.exceptions.ConnectionClosed:
             logger.debug("No se pudo enviar: conexión cerrada")
         except Exception as e:
-            logger.error(f"Error enviando mensaje directo: {e}")
+            logger.error("Error enviando mensaje directo: %s", e)
     
     async def procesar_registro_usuario(self, websocket, mensaje):
         """Procesa el registro de un nuevo usuario"""
@@ -349,7 +432,7 @@ class ParchisServer:
             password = mensaje.get("password")
             email = mensaje.get("email")
             
-            logger.info(f"Intento de registro: usuario={username}")
+            logger.info("Intento de registro: usuario=%s", username)
             
             # Validar datos
             if not username or not password:
@@ -361,8 +444,8 @@ class ParchisServer:
                 return
             
             # Intentar registrar en la base de datos
-            exito, mensaje_resultado = self.db_manager.registrar_usuario(
-                username, password, email
+            exito, mensaje_resultado = await self._en_bd(
+                self.db_manager.registrar_usuario, username, password, email
             )
             
             # Enviar respuesta
@@ -370,12 +453,12 @@ class ParchisServer:
             await self.enviar_directo(websocket, respuesta)
             
             if exito:
-                logger.info(f"✅ Usuario registrado exitosamente: {username}")
+                logger.info("✅ Usuario registrado exitosamente: %s", username)
             else:
-                logger.warning(f"❌ Fallo en registro: {mensaje_resultado}")
+                logger.warning("❌ Fallo en registro: %s", mensaje_resultado)
                 
         except Exception as e:
-            logger.error(f"Error en procesar_registro_usuario: {e}", exc_info=True)
+            logger.error("Error en procesar_registro_usuario: %s", e, exc_info=True)
             respuesta = proto.mensaje_registro_exitoso(False, "Error interno del servidor")
             await self.enviar_directo(websocket, respuesta)
     
@@ -385,7 +468,7 @@ class ParchisServer:
             username = mensaje.get("username")
             password = mensaje.get("password")
             
-            logger.info(f"Intento de login: usuario={username}")
+            logger.info("Intento de login: usuario=%s", username)
             
             # Validar datos
             if not username or not password:
@@ -398,8 +481,8 @@ class ParchisServer:
                 return
             
             # Intentar autenticar
-            exito, mensaje_resultado, usuario_id = self.db_manager.autenticar_usuario(
-                username, password
+            exito, mensaje_resultado, usuario_id = await self._en_bd(
+                self.db_manager.autenticar_usuario, username, password
             )
             
             # Enviar respuesta
@@ -407,12 +490,12 @@ class ParchisServer:
             await self.enviar_directo(websocket, respuesta)
             
             if exito:
-                logger.info(f"✅ Login exitoso: {username} (ID: {usuario_id})")
+                logger.info("✅ Login exitoso: %s (ID: %s)", username, usuario_id)
             else:
-                logger.warning(f"❌ Fallo en login: {mensaje_resultado}")
+                logger.warning("❌ Fallo en login: %s", mensaje_resultado)
                 
         except Exception as e:
-            logger.error(f"Error en procesar_login_usuario: {e}", exc_info=True)
+            logger.error("Error en procesar_login_usuario: %s", e, exc_info=True)
             respuesta = proto.mensaje_login_exitoso(False, "Error interno del servidor", None)
             await self.enviar_directo(websocket, respuesta)
     
@@ -421,7 +504,7 @@ class ParchisServer:
         try:
             usuario_id = mensaje.get("usuario_id")
             
-            logger.info(f"Solicitud de estadísticas: usuario_id={usuario_id}")
+            logger.info("Solicitud de estadísticas: usuario_id=%s", usuario_id)
             
             # Validar datos
             if not usuario_id:
@@ -434,19 +517,19 @@ class ParchisServer:
                 return
             
             # Obtener estadísticas
-            stats = self.db_manager.obtener_estadisticas(usuario_id)
+            stats = await self._en_bd(self.db_manager.obtener_estadisticas, usuario_id)
             
             if stats:
                 respuesta = proto.mensaje_estadisticas(True, "Estadísticas obtenidas", stats)
-                logger.info(f"✅ Estadísticas enviadas para usuario ID: {usuario_id}")
+                logger.info("✅ Estadísticas enviadas para usuario ID: %s", usuario_id)
             else:
                 respuesta = proto.mensaje_estadisticas(False, "Usuario no encontrado", None)
-                logger.warning(f"❌ Usuario no encontrado: {usuario_id}")
+                logger.warning("❌ Usuario no encontrado: %s", usuario_id)
             
             await self.enviar_directo(websocket, respuesta)
                 
         except Exception as e:
-            logger.error(f"Error en procesar_obtener_estadisticas: {e}", exc_info=True)
+            logger.error("Error en procesar_obtener_estadisticas: %s", e, exc_info=True)
             respuesta = proto.mensaje_estadisticas(False, "Error interno del servidor", None)
             await self.enviar_directo(websocket, respuesta)
     
@@ -461,19 +544,24 @@ class ParchisServer:
         - Los demás jugadores reciben DERROTA
         """
         try:
-            info_ganador = self.game_manager.clientes.get(websocket_ganador)
+            sala = self.salas.sala_de(websocket_ganador)
+            if sala is None:
+                logger.warning("⚠️ El ganador no pertenece a ninguna sala")
+                return
+            
+            info_ganador = sala.game_manager.clientes.get(websocket_ganador)
             if not info_ganador:
                 logger.warning("⚠️ No se encontró info del ganador para registrar estadísticas")
                 return
             
-            jugadores_totales = len(self.game_manager.clientes)
+            jugadores_totales = len(sala.game_manager.clientes)
             
             # Registrar para cada jugador
-            for ws, info in self.game_manager.clientes.items():
+            for ws, info in sala.game_manager.clientes.items():
                 usuario_id = info.get("usuario_id")
                 
                 if not usuario_id:
-                    logger.debug(f"⏭️ Jugador {info['nombre']} no tiene usuario_id (invitado), omitiendo registro")
+                    logger.debug("⏭️ Jugador %s no tiene usuario_id (invitado), omitiendo registro", info['nombre'])
                     continue
                 
                 # Determinar resultado
@@ -487,7 +575,8 @@ class ParchisServer:
                     fichas_meta = sum(1 for f in jugador.fichas if f.estado == proto.ESTADO_META)
                 
                 # Registrar en base de datos
-                exito = self.db_manager.registrar_partida(
+                exito = await self._en_bd(
+                    self.db_manager.registrar_partida,
                     usuario_id=usuario_id,
                     resultado=resultado,
                     color=info["color"],
@@ -498,219 +587,678 @@ class ParchisServer:
                 )
                 
                 if exito:
-                    logger.info(f"✅ Estadísticas registradas para {info['nombre']}: {resultado}")
+                    logger.info("✅ Estadísticas registradas para %s: %s", info['nombre'], resultado)
                 else:
-                    logger.warning(f"❌ Error registrando estadísticas para {info['nombre']}")
+                    logger.warning("❌ Error registrando estadísticas para %s", info['nombre'])
                     
         except Exception as e:
-            logger.error(f"❌ Error en registrar_fin_partida: {e}", exc_info=True)
+            logger.error("❌ Error en registrar_fin_partida: %s", e, exc_info=True)
     
     # ========== FIN MÉTODOS DE ESTADÍSTICAS ==========
 
     async def procesar_mensaje(self, websocket, mensaje):
-        """Procesa los diferentes tipos de mensajes del cliente"""
+        """
+        Procesa un mensaje de un cliente ya conectado a través de la tabla de despacho.
+        Los eventos que provoca se agrupan en un LOTE para los clientes que lo pidieron.
+        """
+        sala = self.salas.sala_de(websocket)
+        lote, token = lotes.abrir(sala)
         try:
-            tipo = mensaje.get("tipo")
-            cliente_info = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
-            logger.debug(f"Procesando {tipo} de {cliente_info}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Procesando %s de %s", mensaje.get("tipo"), self._direccion(websocket))
+            await self.despachador.despachar(despacho.FASE_SALA, websocket, mensaje)
 
-            if tipo == proto.MSG_SYNC_REQUEST:
-                logger.debug(f"SYNC_REQUEST recibido de {cliente_info}")
-                
-                # T1: Timestamp del cliente (recibido en el mensaje)
-                t1 = mensaje.get("t1")
-                
-                # T2: Timestamp cuando el servidor recibió el mensaje
-                t2 = time.time()
-                
-                # T3: Timestamp cuando el servidor envía la respuesta
-                t3 = time.time()
-                
-                # Enviar respuesta inmediatamente
-                respuesta = proto.mensaje_sync_response(t1, t2, t3)
-                await self.enviar(websocket, respuesta)
-                
-                logger.debug(f"SYNC_RESPONSE enviado: T1={t1:.6f}, T2={t2:.6f}, T3={t3:.6f}")
-                return
+        except Exception as e:
+            logger.error("Error procesando mensaje: %s", e)
+            try:
+                await self.enviar(websocket, proto.mensaje_error("Error interno del servidor"))
+            except Exception:
+                logger.exception("Fallo al enviar mensaje de error al cliente")
+        finally:
+            await self._entregar_lote(sala, lote, token)
 
-            # 🆕 ============ NUEVO BLOQUE: Manejar solicitud de colores ============
-            if tipo == proto.MSG_SOLICITAR_COLORES:
-                logger.info(f"Solicitud de colores disponibles de {cliente_info}")
-                colores = self.game_manager.obtener_colores_disponibles()
-                await self.enviar(websocket, proto.mensaje_colores_disponibles(colores))
-                return
-            # 🆕 ============ FIN DEL NUEVO BLOQUE ============
+    async def _entregar_lote(self, sala, lote, token):
+        """Envía a cada cliente con lote sus eventos del comando como una sola trama LOTE"""
+        pendientes = lotes.cerrar(lote, token)
+        if not pendientes or sala is None:
+            return
+        sala.secuencia_lotes += 1
+        seq = sala.secuencia_lotes
+
+        inicio = time.perf_counter()
+        enviados = self.mensajes_enviados
+        codificados = {}  # {(id(evento), codec): trama}: cada evento se serializa una vez por codec
+        with trazas.tramo("lote", seq):
+            for websocket, eventos in pendientes.items():
+                if websocket not in self.clientes_activos:
+                    continue
+                codec_cliente = self._codec_de(websocket, sala)
+                tramas = []
+                for evento in eventos:
+                    clave = (id(evento), codec_cliente)
+                    trama = codificados.get(clave)
+                    if trama is None:
+                        trama = codificados[clave] = codec.codificar(evento, codec_cliente)
+                    tramas.append(trama)
+                    enviados.incrementar(evento.get("tipo"))
+                self._encolar(websocket, codec.codificar_lote(seq, tramas, codec_cliente), proto.MSG_LOTE)
+        self.tiempos_difusion.de(proto.MSG_LOTE).observar(time.perf_counter() - inicio)
+
+    async def _pausa(self, sala, segundos):
+        """
+        Pausa entre eventos de un comando, para que los clientes sin lote los
+        muestren en orden. Si todos los de la sala reciben LOTE, el orden ya lo
+        da la trama y no se espera.
+        """
+        clientes = sala.game_manager.clientes.values()
+        if clientes and all(info.get("lote") for info in clientes):
+            return
+        with trazas.tramo("pausa"):
+            await asyncio.sleep(segundos)
 
-            if tipo == proto.MSG_LISTO:
-                logger.info(f"MSG_LISTO recibido de {cliente_info}")
+    # ========== TABLA DE DESPACHO ==========
 
-                admin_sock = getattr(self.game_manager, "admin_cliente", None)
+    def _registrar_manejadores(self):
+        """Rutas (fase, tipo) → manejador(websocket, mensaje) con su middleware"""
+        d = self.despachador
+        ambas = despacho.FASES
+        handshake = (despacho.FASE_HANDSHAKE,)
 
-                if websocket != admin_sock:
-                    logger.warning(f"Intento de iniciar partida por no-admin: {cliente_info}")
-                    await self.enviar(websocket, proto.mensaje_error("Sólo el administrador puede iniciar la partida"))
-                    return
+        # (Autenticación y sync: limitados antes del despacho por self.limitador)
+        # Snapshots bajo demanda: caros de construir, un cliente no necesita más de unos pocos por segundo
+        limite_snapshot = despacho.limitar_frecuencia(10, 1.0, self.responder_error)
+        solo_admin = despacho.requiere(self._es_admin, "Sólo el administrador puede iniciar la partida",
+                                       self.responder_error)
 
-                if len(self.game_manager.jugadores) < proto.MIN_JUGADORES:
-                    await self.enviar(websocket, proto.mensaje_error(
-                        f"No hay suficientes jugadores (mínimo {proto.MIN_JUGADORES})"
-                    ))
-                    return
+        d.registrar(proto.MSG_SYNC_REQUEST, self.atender_sync_request, fases=ambas)
+        d.registrar(proto.MSG_SOLICITAR_COLORES, self.atender_solicitar_colores, fases=ambas)
+        d.registrar(proto.MSG_REGISTRAR_USUARIO, self.procesar_registro_usuario, fases=handshake)
+        d.registrar(proto.MSG_LOGIN_USUARIO, self.procesar_login_usuario, fases=handshake)
+        d.registrar(proto.MSG_OBTENER_ESTADISTICAS, self.procesar_obtener_estadisticas, fases=handshake)
+        d.registrar(proto.MSG_CONECTAR, self.atender_conectar, fases=handshake)
+        d.registrar_por_defecto(despacho.FASE_HANDSHAKE, self.atender_protocolo_invalido)
 
-                if getattr(self.game_manager, "juego_iniciado", False):
-                    await self.enviar(websocket, proto.mensaje_info("El juego ya está iniciado"))
-                    return
+        d.registrar(proto.MSG_SOLICITAR_TABLERO, self.atender_solicitar_tablero, middleware=[limite_snapshot])
+        d.registrar(proto.MSG_SOLICITAR_MOVIMIENTOS, self.atender_solicitar_movimientos, middleware=[limite_snapshot])
+        d.registrar(proto.MSG_LISTO, self.atender_listo, middleware=[solo_admin])
+        d.registrar(proto.MSG_DETERMINACION_TIRADA, self.procesar_tirada_determinacion)
+        d.registrar(proto.MSG_LANZAR_DADOS, self.atender_lanzar_dados)
+        d.registrar(proto.MSG_SACAR_CARCEL, self.atender_sacar_carcel)
+        d.registrar(proto.MSG_MOVER_FICHA, self.atender_mover_ficha)
+        d.registrar(proto.MSG_SACAR_TODAS, self.atender_sacar_todas)
+        d.registrar(proto.MSG_DEBUG_FORZAR_TRES_DOBLES, self.atender_debug_tres_dobles)
+        d.registrar(proto.MSG_ELEGIR_FICHA_PREMIO, self.procesar_elegir_ficha_premio)
+        d.registrar_por_defecto(despacho.FASE_SALA, self.atender_no_reconocido)
+
+    async def _informar_despacho(self):
+        """Registra periódicamente qué tipos de mensaje consumen más tiempo del bucle"""
+        while self.running:
+            await asyncio.sleep(self.intervalo_estadisticas)
+            if self.despachador.estadisticas:
+                logger.info("📊 Despacho por tipo de mensaje:\n" + self.despachador.resumen(limite=10))
+            colas = self.estadisticas_salida()
+            if colas:
+                profundas = sorted(colas.items(), key=lambda item: item[1]["profundidad_maxima"], reverse=True)[:5]
+                logger.info("📦 Colas de salida (%s conexiones), las más profundas: %s", len(colas),
+                            ", ".join(f"{direccion}={e['profundidad']}/{e['profundidad_maxima']} "
+                                      f"desc={e['descartadas']} sust={e['sustituidas']}" for direccion, e in profundas))
+            limitados = {presupuesto: e for presupuesto, e in self.limitador.estadisticas().items()
+                         if e["limitados_conexion"] or e["limitados_ip"]}
+            if limitados:
+                logger.info("⏳ Mensajes limitados por presupuesto: %s", limitados)
+            if self.temporizadores.pendientes:
+                logger.info("⏰ Plazos: %s", self.temporizadores.estadisticas())
+            jugadores = self.estadisticas_reloj()
+            if jugadores:
+                logger.info("⏱️ Reloj por jugador (offset/RTT en ms): %s",
+                            ", ".join(f"{jugador}={e['offset_ms']}/{e['rtt_ms']}" for jugador, e in jugadores.items()))
 
-                # ⭐ NUEVO: Iniciar fase de determinación de turnos en lugar del juego directo
-                logger.info("Administrador autorizado. Iniciando fase de determinación de turnos...")
-                await self.iniciar_determinacion()
+    # ========== MÉTRICAS ==========
+
+    def _configurar_metricas(self):
+        """Registro de /metrics: contadores e histogramas propios + indicadores leídos al exponer"""
+        m = self.metricas = metricas.Registro()
+        self.mensajes_recibidos = m.contador_por_tipo(
+            "parchis_mensajes_recibidos_total", "Mensajes recibidos por tipo (tras decodificar)")
+        self.mensajes_enviados = m.contador_por_tipo(
+            "parchis_mensajes_enviados_total", "Mensajes encolados por tipo (los eventos de un LOTE cuentan por su tipo)")
+        self.tiempos_difusion = m.histograma(
+            "parchis_difusion_segundos", "Tiempo de serializar y encolar un broadcast o un LOTE a la sala", "tipo")
+        self.espera_cerrojo = m.histograma(
+            "parchis_cerrojo_espera_segundos", "Espera para adquirir el lock de un GameManager")
+        self.retencion_cerrojo = m.histograma(
+            "parchis_cerrojo_retencion_segundos", "Tiempo que se retiene el lock de un GameManager")
+        self.tiempos_bd = m.histograma(
+            "parchis_sqlite_segundos", "Duración de las consultas SQLite (en el hilo de base de datos)", "consulta",
+            metricas.CUBETAS_LENTAS)
+        self.retraso_bucle = metricas.RetrasoBucle(m.histograma(
+            "parchis_bucle_retraso_segundos", "Retraso del bucle asyncio al despertar de un sleep",
+            limites=metricas.CUBETAS_LENTAS))
+
+        m.indicador("parchis_clientes_conectados", "Clientes que completaron el CONECTAR",
+                    lambda: len(self.clientes_activos))
+        m.indicador("parchis_salas", "Salas activas", lambda: len(self.salas))
+        m.indicador("parchis_partidas_activas", "Salas con una partida iniciada y sin terminar",
+                    lambda: sum(1 for sala in self.salas
+                                if sala.game_manager.juego_iniciado and not sala.game_manager.juego_terminado))
+        m.indicador("parchis_cola_salida_mensajes", "Mensajes pendientes en las colas de salida",
+                    lambda: sum(cola.profundidad for cola in list(self.colas_salida.values())))
+        m.indicador("parchis_plazos_pendientes", "Plazos programados en la rueda de temporizadores",
+                    lambda: self.temporizadores.pendientes)
+        m.indicador("parchis_plazos_disparados_total", "Plazos vencidos", lambda: self.temporizadores.disparados,
+                    tipo="counter")
+        m.indicador("parchis_limitados_total", "Mensajes rechazados por límite de frecuencia",
+                    lambda: [({"presupuesto": presupuesto, "ambito": ambito}, e[f"limitados_{ambito}"])
+                             for presupuesto, e in self.limitador.estadisticas().items()
+                             for ambito in ("conexion", "ip")],
+                    tipo="counter")
+        m.indicador("parchis_despacho_segundos_total", "Tiempo de bucle consumido por los manejadores, por tipo",
+                    lambda: [({"tipo": tipo}, e.total) for tipo, e in list(self.despachador.estadisticas.items())],
+                    tipo="counter")
+
+    def _instrumentar_sala(self, sala):
+        """Envuelve el lock del GameManager de cada sala nueva (métricas y trazas) y le abre su bitácora"""
+        gm = sala.game_manager
+        if self.bitacoras is not None:
+            gm.bitacora = self.bitacoras.abrir(sala.codigo)
+        if self.puerto_metricas is not None:
+            gm.lock = metricas.CerrojoMedido(gm.lock, self.espera_cerrojo, self.retencion_cerrojo)
+        if self.trazador.cada:
+            gm.lock = trazas.CerrojoTrazado(gm.lock)
+
+    # ========== TRAZAS ==========
+
+    async def volcar_trazas(self, ruta=None):
+        """Escribe el búfer de trazas como JSON de Chrome trace (fuera del bucle). Retorna la ruta"""
+        if ruta is None:
+            ruta = os.path.join(tempfile.gettempdir(), f"parques-trazas-{os.getpid()}-{int(time.time())}.json")
+        eventos = self.trazador.instantanea()
+        cantidad = await asyncio.get_running_loop().run_in_executor(None, trazas.volcar, eventos, ruta)
+        logger.info("🧵 %s tramos de traza volcados en %s", cantidad, ruta)
+        return ruta
+
+    def _trazas_http(self):
+        """Ruta /trazas del endpoint de métricas: el búfer como Chrome trace"""
+        return "application/json", json.dumps(trazas.chrome(self.trazador.instantanea())).encode("utf-8")
+
+    def _escuchar_senal_trazas(self, servidores):
+        """SIGUSR1 → volcar_trazas() (si la plataforma y el hilo lo permiten)"""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.ensure_future(self.volcar_trazas()))
+        except (RuntimeError, ValueError, NotImplementedError):
+            return  # Bucle fuera del hilo principal (modo embebido)
+        servidores.callback(loop.remove_signal_handler, signal.SIGUSR1)
+
+    # ========== REPETICIONES ==========
+
+    def _grabar_jugada(self, sala):
+        """Añade el tablero que se va a difundir a la repetición de la sala (la abre al empezar la partida)"""
+        gm = sala.game_manager
+        if sala.repeticion is None:
+            if not gm.juego_iniciado or gm.juego_terminado:
                 return
-            
-            # ⭐ NUEVO: Handler para tiradas durante la determinación
-            if tipo == proto.MSG_DETERMINACION_TIRADA:
-                logger.info(f"MSG_DETERMINACION_TIRADA recibido de {cliente_info}")
-                await self.procesar_tirada_determinacion(websocket, mensaje)
+            ruta = os.path.join(self.directorio_repeticiones,
+                                f"{bitacora.nombre_archivo(sala.codigo)}-{time.strftime('%Y%m%d-%H%M%S')}{repeticion.EXTENSION}")
+            try:
+                sala.repeticion = repeticion.Grabador(ruta, sala.codigo)
+            except OSError as e:
+                logger.error("❌ No se pudo crear la repetición %s: %s", ruta, e)
                 return
+        try:
+            sala.repeticion.anotar(gm)
+        except OSError as e:
+            logger.error("❌ Error grabando la repetición de la sala %s: %s", sala.codigo, e)
 
-            if tipo == proto.MSG_LANZAR_DADOS:
-                logger.info(f"LANZAR_DADOS recibido de {cliente_info}")
-                await self.procesar_lanzar_dados(websocket)
+    def _cerrar_repeticion(self, sala, ganador):
+        """Fin de partida: cierra la repetición con el ganador y su índice"""
+        if sala.repeticion is not None:
+            try:
+                sala.repeticion.cerrar(ganador["nombre"], ganador["color"])
+            except OSError as e:
+                logger.error("❌ Error cerrando la repetición de la sala %s: %s", sala.codigo, e)
 
-            elif tipo == proto.MSG_SACAR_CARCEL:
-                logger.info(f"SACAR_CARCEL recibido de {cliente_info}")
-                await self.procesar_sacar_carcel(websocket)
+    # ========== BITÁCORA ==========
 
-            elif tipo == proto.MSG_MOVER_FICHA:
-                ficha_id = mensaje.get("ficha_id", 0)
-                dado_elegido = mensaje.get("dado_elegido", 0)
-                logger.info(f"MOVER_FICHA recibido de {cliente_info}, ficha: {ficha_id}, dado: {dado_elegido}")
-                await self.procesar_mover_ficha(websocket, ficha_id, dado_elegido)
+    def _restaurar_partidas(self):
+        """
+        Reconstruye las salas de las bitácoras que dejó la ejecución anterior.
+        Sus jugadores quedan como bitacora.Ausente hasta que vuelven con CONECTAR
+        (mismo nombre); los que no vuelven en espera_reconexion s salen de la mesa.
+        """
+        inicio = time.perf_counter()
+        restauradas = 0
+        for ruta in self.bitacoras.existentes():
+            inicio_partida = time.perf_counter()
+            try:
+                registros, valido = bitacora.cargar(ruta)
+            except OSError as e:
+                logger.error("❌ No se pudo leer la bitácora %s: %s", ruta, e)
+                continue
+            if not registros or registros[0][0] != bitacora.CABECERA:
+                logger.warning("⚠️ Bitácora %s sin cabecera: se ignora", ruta)
+                continue
+            codigo = self.salas.normalizar_codigo(registros[0][1].get("codigo"))
+            if self.afinidad is not None and self.afinidad.trabajador_de(codigo) != self.afinidad.indice:
+                continue  # Sala de otro trabajador: la restaura él
+            if self.salas.obtener(codigo) is not None:
+                continue
 
-            elif mensaje.get("tipo") == proto.MSG_SACAR_TODAS:
-                if not self.game_manager.es_turno_de(websocket):
-                    await self.enviar(websocket, proto.mensaje_error("No es tu turno"))
-                    return
+            sala = self.salas.obtener_o_crear(codigo)
+            gm = sala.game_manager
+            _, discrepancias = bitacora.reproducir(gm, registros)
+            gm.bitacora.reanudar(valido)
+            if discrepancias:
+                logger.warning("⚠️ Sala %s: %s operaciones de la bitácora no se reprodujeron igual", codigo, discrepancias)
+            if gm.juego_terminado or not gm.clientes:
+                # Partida acabada o sin jugadores: nada que recuperar (cerrar la sala borra la bitácora)
+                for ausente in list(gm.clientes):
+                    gm.eliminar_jugador(ausente)
+                self.salas.descartar_si_vacia(sala)
+                continue
 
-                exito, resultado = self.game_manager.sacar_todas_fichas_carcel(websocket)
-                if exito:
-                    color = self.game_manager.clientes[websocket]["color"]
-                    nombre = self.game_manager.clientes[websocket]["nombre"]
-                    
-                    for ficha_id in resultado["fichas_liberadas"]:
-                        await self.broadcast(proto.mensaje_movimiento_ok(
-                            nombre=nombre,
-                            color=color,
-                            ficha_id=ficha_id,
-                            desde=-1,
-                            hasta=resultado["posicion"],
-                            accion="liberar_ficha"
-                        ))
-                    
-                    # ⭐ NUEVO: Notificar capturas si hubo
-                    if "capturas" in resultado and resultado["capturas"]:
-                        for captura in resultado["capturas"]:
-                            await self.broadcast(proto.crear_mensaje(
-                                proto.MSG_CAPTURA,
-                                capturado={
-                                    "nombre": captura["nombre"],
-                                    "color": captura["color"],
-                                    "ficha_id": captura["ficha_id"]
-                                }
-                            ))
-                            logger.info(f"🍽️ {nombre} ({color}) capturó ficha de "
-                                       f"{captura['nombre']} ({captura['color']}) al liberar todas las fichas")
-                    
-                    await self.broadcast(proto.mensaje_tablero(self.game_manager.obtener_estado_tablero()))
-                    
-                    if self.game_manager.debe_avanzar_turno_ahora():
-                        self.game_manager.avanzar_turno()
-                        await self.notificar_turno()
+            if gm.determinacion_activa:
+                self._armar_plazo(sala, PLAZO_DETERMINACION, self.plazo_determinacion)
+            elif gm.juego_iniciado:
+                if gm.premio_tres_dobles:
+                    self._armar_plazo(sala, PLAZO_PREMIO, self.plazo_premio)
                 else:
-                    await self.enviar(websocket, proto.mensaje_error(resultado))
-                    return
+                    self._armar_plazo(sala, PLAZO_TURNO, self.plazo_turno)
+            if self.espera_reconexion:
+                self.temporizadores.programar(self.espera_reconexion, self._reconexion_vencida, sala)
+            restauradas += 1
+            logger.info("♻️ Sala %s restaurada: %s registros, %s jugadores, %.2f ms",
+                        codigo, len(registros), len(gm.clientes), (time.perf_counter() - inicio_partida) * 1000)
 
-            # ⭐ NUEVO: Handler para debug de 3 dobles
-            elif tipo == proto.MSG_DEBUG_FORZAR_TRES_DOBLES:
-                await self.procesar_debug_tres_dobles(websocket)
-                return
-            
-            # ⭐ NUEVO: Handler para elegir ficha del premio
-            elif tipo == proto.MSG_ELEGIR_FICHA_PREMIO:
-                await self.procesar_elegir_ficha_premio(websocket, mensaje)
-                return
-            
-            else:
-                logger.warning(f"Mensaje no reconocido de {cliente_info}: {tipo}")
-                await self.enviar(websocket, proto.mensaje_error("Mensaje no reconocido"))
+        if restauradas:
+            total = (time.perf_counter() - inicio) * 1000
+            logger.info("♻️ %s partidas restauradas de la bitácora en %.1f ms (%.2f ms/partida)",
+                        restauradas, total, total / restauradas)
+        return restauradas
 
-        except Exception as e:
-            logger.error(f"Error procesando mensaje: {e}")
+    def _reconexion_vencida(self, sala):
+        """Callback de la rueda: los jugadores restaurados que no volvieron salen de la mesa"""
+        if self.salas.obtener(sala.codigo) is not sala:
+            return
+        tarea = asyncio.create_task(sala.ejecutar(self._expulsar_ausentes, sala))
+        self._tareas_plazos.add(tarea)
+        tarea.add_done_callback(self._tareas_plazos.discard)
+
+    async def _expulsar_ausentes(self, sala):
+        for ausente in [ws for ws in sala.game_manager.clientes if isinstance(ws, bitacora.Ausente)]:
+            logger.info("⌛ %s no volvió a la sala %s tras el reinicio", ausente.nombre, sala.codigo)
+            await self._limpiar_en_sala(sala, ausente)
+        self.salas.descartar_si_vacia(sala)
+
+    def _ausente_de(self, sala, nombre, color):
+        """Jugador restaurado de la bitácora con ese nombre (y color, si se indica) que aún no volvió"""
+        for ws, info in sala.game_manager.clientes.items():
+            if isinstance(ws, bitacora.Ausente) and info["nombre"] == nombre and color in (None, info["color"]):
+                return ws
+        return None
+
+    def _direccion(self, websocket):
+        try:
+            return f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        except Exception:
+            return "unknown"
+
+    def _es_admin(self, websocket):
+        sala = self.salas.sala_de(websocket)
+        return sala is not None and websocket == getattr(sala.game_manager, "admin_cliente", None)
+
+    async def responder_error(self, websocket, texto):
+        """ERROR al cliente, esté o no conectado a una sala todavía"""
+        if websocket in self.clientes_activos:
+            await self.enviar(websocket, proto.mensaje_error(texto))
+        else:
+            await self.enviar_directo(websocket, proto.mensaje_error(texto))
+
+    async def atender_sync_request(self, websocket, mensaje):
+        # T1: reloj del cliente al enviar; T2: recepción de la trama; T3: justo antes del send
+        t1 = mensaje.get("t1")
+        t2 = self.relojes.sondeo(websocket, mensaje)
+        
+        if websocket in self.clientes_activos:
+            # Fuera del LOTE y sellado por la escritora: el tiempo en cola cuenta como servidor, no como red
+            formato = self._codec_de(websocket)
+            self._encolar(websocket, lambda: codec.codificar(
+                proto.mensaje_sync_response(t1, t2, relojes.ahora()), formato), proto.MSG_SYNC_RESPONSE)
+        else:
+            # Antes del CONECTAR no hay cola de salida: se envía directamente
             try:
-                await self.enviar(websocket, proto.mensaje_error("Error interno del servidor"))
-            except Exception:
-                logger.exception("Fallo al enviar mensaje de error al cliente")
+                await websocket.send(proto.codificar_json(proto.mensaje_sync_response(t1, t2, relojes.ahora())))
+            except websockets.exceptions.ConnectionClosed:
+                return
+        if logger.isEnabledFor(logging.DEBUG) and logs.muestra("SYNC"):
+            logger.debug("SYNC_RESPONSE para %s: T1=%s, T2=%.6f", self._direccion(websocket), t1, t2)
+    
+    def estadisticas_reloj(self):
+        """Offset y RTT informados por cada jugador conectado: {"sala/nombre": {...}}"""
+        instante = relojes.ahora()
+        resultado = {}
+        for websocket in list(self.clientes_activos):
+            estado = self.relojes.estado(websocket)
+            sala = self.salas.sala_de(websocket)
+            info = sala.game_manager.clientes.get(websocket) if sala else None
+            if estado is not None and info is not None:
+                resultado[f"{sala.codigo}/{info['nombre']}"] = estado.estadisticas(instante)
+        return resultado
+
+    async def _redirigir(self, websocket, codigo):
+        """
+        Modo supervisor: si la sala es de otro trabajador, envía REDIRIGIR con
+        su puerto interno y retorna True (el cliente debe reconectar allí).
+        """
+        if self.afinidad is None:
+            return False
+        codigo = self.salas.normalizar_codigo(codigo)
+        destino = self.afinidad.trabajador_de(codigo)
+        if destino == self.afinidad.indice:
+            return False
+        logger.debug("↪️ %s: sala %s en el trabajador %s", self._direccion(websocket), codigo, destino)
+        await self.enviar_directo(websocket, proto.mensaje_redirigir(codigo, self.afinidad.puerto_de(destino)))
+        return True
+
+    async def atender_solicitar_colores(self, websocket, mensaje):
+        if websocket not in self.clientes_activos and await self._redirigir(websocket, mensaje.get("sala")):
+            return
+        # Ya conectado: su sala. Antes del CONECTAR: la pedida, que puede no existir (todos los colores libres)
+        sala = self.salas.sala_de(websocket) or self.salas.obtener(mensaje.get("sala"))
+        colores = sala.game_manager.obtener_colores_disponibles() if sala else list(proto.COLORES)
+        logger.debug("SOLICITAR_COLORES de %s: %s", self._direccion(websocket), colores)
+        respuesta = proto.mensaje_colores_disponibles(colores)
+        if websocket in self.clientes_activos:
+            await self.enviar(websocket, respuesta)
+        else:
+            await self.enviar_directo(websocket, respuesta)
+
+    async def atender_protocolo_invalido(self, websocket, mensaje):
+        """Cualquier otro mensaje antes del CONECTAR cierra la conexión"""
+        logger.warning("Protocolo inválido de %s: %s", self._direccion(websocket), mensaje.get('tipo'))
+        await self.enviar_directo(websocket, proto.mensaje_error("Protocolo inválido: se esperaba CONECTAR"))
+        await websocket.close(code=1008, reason="Protocolo inválido")
+        return False
+
+    async def atender_conectar(self, websocket, mensaje):
+        """
+        Une al cliente a su sala. Retorna el nombre del jugador si quedó
+        conectado o False si se rechazó (la conexión ya está cerrada).
+        """
+        nombre = mensaje.get("nombre", "").strip()
+        color_elegido = mensaje.get("color", None)  # 🆕 Obtener color del mensaje
+        usuario_id = mensaje.get("usuario_id", None)  # 🆕 ID de usuario de la BD
+        if await self._redirigir(websocket, mensaje.get("sala")):
+            await websocket.close(code=1000, reason="Redirigido")
+            return False
+        sala = self.salas.obtener_o_crear(mensaje.get("sala"))
+
+        if not nombre:
+            nombre = f"Jugador_{websocket.remote_address[1]}"
+
+        logger.info("Cliente %s solicita conectarse a la sala %s como '%s' con color '%s' (usuario_id=%s)", self._direccion(websocket), sala.codigo, nombre, color_elegido, usuario_id)
+
+        # ⭐ Jugador de una partida restaurada de la bitácora: recupera su asiento
+        ausente = self._ausente_de(sala, nombre, color_elegido) if self.bitacoras is not None else None
+        if ausente is not None:
+            await sala.ejecutar(self._reconectar, websocket, sala, ausente, mensaje)
+            return nombre
+
+        # Agregar jugador CON el color elegido y usuario_id
+        color, error, es_admin, es_host = sala.game_manager.agregar_jugador(websocket, nombre, color_elegido, usuario_id)
+
+        if error:
+            logger.warning("%s no pudo conectarse: %s", nombre, error)
+            self.salas.descartar_si_vacia(sala)
+            await self.enviar_directo(websocket, proto.mensaje_error(error))
+            await websocket.close(code=1008, reason=error)
+            return False
+
+        # ✅ AHORA SÍ agregamos a clientes activos
+        codec_cliente = self._admitir(websocket, sala, mensaje)
+
+        logger.info("%s conectado a la sala %s como %s (admin=%s)", nombre, sala.codigo, color.upper(), es_admin)
+
+        # Enviar bienvenida
+        jugador_id = sala.game_manager.clientes[websocket]["id"]
+        await self.enviar(websocket, proto.mensaje_bienvenida(color, jugador_id, nombre, sala.codigo, codec_cliente))
+
+        # Notificar estado con lista de jugadores
+        conectados = len(sala.game_manager.jugadores)
+        jugadores_lista = sala.game_manager.obtener_info_jugadores()
+        await self.broadcast(sala, proto.mensaje_esperando(conectados, proto.MIN_JUGADORES, jugadores_lista))
+
+        # ⭐ NUEVO: Inicio automático con 4 jugadores
+        if conectados == proto.MAX_JUGADORES:
+            logger.info("🎊 Se alcanzó el máximo de jugadores (%s). Iniciando automáticamente...", proto.MAX_JUGADORES)
+            await self.broadcast(sala, proto.mensaje_info(
+                f"¡Sala completa con {proto.MAX_JUGADORES} jugadores! Iniciando partida automáticamente..."
+            ))
+            await asyncio.sleep(1)  # Breve pausa para que los jugadores lean el mensaje
+            await sala.ejecutar(self.iniciar_determinacion, sala)
+        # Mensajes de admin (solo si no se inició automáticamente)
+        elif es_admin:
+            await self.enviar(websocket, proto.mensaje_info(
+                "Eres el administrador. Para iniciar la partida envía MSG_LISTO. "
+                f"Se requiere al menos {proto.MIN_JUGADORES} jugadores. "
+                f"Con {proto.MAX_JUGADORES} jugadores se inicia automáticamente.", 
+                es_admin=True
+            ))
+            await self.broadcast(sala, proto.mensaje_info(
+                f"{nombre} es el administrador y podrá iniciar la partida cuando esté listo."
+            ))
+        else:
+            admin_sock = getattr(sala.game_manager, "admin_cliente", None)
+            if admin_sock:
+                admin_info = sala.game_manager.clientes.get(admin_sock, {})
+                admin_nombre = admin_info.get("nombre", "Administrador")
+                await self.enviar(websocket, proto.mensaje_info(
+                    f"El administrador actual es: {admin_nombre}"
+                ))
+        
+        return nombre
+
+    def _admitir(self, websocket, sala, mensaje):
+        """Asocia el socket ya agregado a la sala y guarda lo que negoció en CONECTAR. Retorna su codec"""
+        self.salas.asignar(websocket, sala)
+        self.clientes_activos.add(websocket)
+        info = sala.game_manager.clientes[websocket]
+        # ⭐ Clientes que aceptan TABLERO_DELTA lo indican al conectar
+        info["delta"] = bool(mensaje.get("delta", False))
+        # ⭐ ...y los que quieren MOVIMIENTOS_LEGALES tras cada tirada
+        info["movimientos"] = bool(mensaje.get("movimientos", False))
+        # ⭐ Codec de las tramas que le enviamos (JSON si no pide uno conocido)
+        info["codec"] = mensaje.get("codec") if mensaje.get("codec") in codec.CODECS else codec.CODEC_JSON
+        # ⭐ ...y si quiere los eventos de cada comando agrupados en una trama LOTE
+        info["lote"] = bool(mensaje.get("lote", False))
+        return info["codec"]
+
+    async def _reconectar(self, websocket, sala, ausente, mensaje):
+        """CONECTAR de un jugador restaurado: ocupa su asiento y recibe el estado de la partida"""
+        gm = sala.game_manager
+        info = gm.reasignar_jugador(ausente, websocket)
+        codec_cliente = self._admitir(websocket, sala, mensaje)
+        logger.info("♻️ %s vuelve a la sala %s como %s", info["nombre"], sala.codigo, info["color"].upper())
+        await self.enviar(websocket, proto.mensaje_bienvenida(info["color"], info["id"], info["nombre"], sala.codigo, codec_cliente))
+        await self.broadcast(sala, proto.mensaje_esperando(len(gm.jugadores), proto.MIN_JUGADORES, gm.obtener_info_jugadores()))
+
+        if gm.determinacion_activa:
+            if websocket not in gm.tiradas_determinacion:
+                primero = next((i["nombre"] for i in gm.clientes.values() if i["id"] == 0), "")
+                await self.enviar(websocket, proto.mensaje_determinacion_inicio(primero))
+        elif gm.juego_iniciado:
+            await self.enviar(websocket, proto.crear_mensaje(proto.MSG_TABLERO, **gm.obtener_estado_tablero()))
+            if not gm.premio_tres_dobles:
+                await self.notificar_turno(sala)
+            elif gm.es_turno_de(websocket):
+                self._armar_plazo(sala, PLAZO_PREMIO, self.plazo_premio)
+                await self.enviar(websocket, proto.mensaje_premio_tres_dobles(
+                    info["nombre"], gm.obtener_fichas_elegibles_para_premio(websocket)))
+
+    async def atender_solicitar_tablero(self, websocket, mensaje):
+        # ⭐ Un cliente con delta detectó un hueco de versión: reenviar snapshot completo
+        # Si hay cambios aún sin difundir (p. ej. entre un await y su broadcast_tablero),
+        # avanzar antes la versión y la huella: así el snapshot lleva la versión que
+        # describe y el resto de clientes recibe ese delta en vez de perderlo.
+        sala = self.salas.sala_de(websocket)
+        gm = sala.game_manager
+        delta = gm.obtener_delta_tablero()
+        if delta is not None:
+            await self._difundir_tablero(sala, delta, excluir=websocket)
+        estado = gm.obtener_estado_tablero()
+        await self.enviar(websocket, proto.crear_mensaje(proto.MSG_TABLERO, **estado))
+
+    async def atender_solicitar_movimientos(self, websocket, mensaje):
+        await self.enviar_movimientos_legales(self.salas.sala_de(websocket), websocket, solo_suscritos=False)
+
+    async def atender_listo(self, websocket, mensaje):
+        """El administrador (comprobado por el middleware) inicia la determinación de turnos"""
+        sala = self.salas.sala_de(websocket)
+        logger.info("MSG_LISTO recibido de %s", self._direccion(websocket))
+
+        if len(sala.game_manager.jugadores) < proto.MIN_JUGADORES:
+            await self.enviar(websocket, proto.mensaje_error(
+                f"No hay suficientes jugadores (mínimo {proto.MIN_JUGADORES})"
+            ))
+            return
+
+        if getattr(sala.game_manager, "juego_iniciado", False):
+            await self.enviar(websocket, proto.mensaje_info("El juego ya está iniciado"))
+            return
+
+        # ⭐ NUEVO: Iniciar fase de determinación de turnos en lugar del juego directo
+        logger.info("Administrador autorizado. Iniciando fase de determinación de turnos...")
+        await self.iniciar_determinacion(sala)
+
+    async def atender_lanzar_dados(self, websocket, mensaje):
+        logger.debug("LANZAR_DADOS recibido de %s", websocket.remote_address)
+        await self.procesar_lanzar_dados(websocket)
+
+    async def atender_sacar_carcel(self, websocket, mensaje):
+        logger.debug("SACAR_CARCEL recibido de %s", websocket.remote_address)
+        await self.procesar_sacar_carcel(websocket)
+
+    async def atender_mover_ficha(self, websocket, mensaje):
+        ficha_id = mensaje.get("ficha_id", 0)
+        dado_elegido = mensaje.get("dado_elegido", 0)
+        logger.debug("MOVER_FICHA recibido de %s, ficha: %s, dado: %s", websocket.remote_address, ficha_id, dado_elegido)
+        await self.procesar_mover_ficha(websocket, ficha_id, dado_elegido)
+
+    async def atender_sacar_todas(self, websocket, mensaje):
+        sala = self.salas.sala_de(websocket)
+        if not sala.game_manager.es_turno_de(websocket):
+            await self.enviar(websocket, proto.mensaje_error("No es tu turno"))
+            return
+
+        with trazas.tramo("reglas", "sacar_todas"):
+            exito, resultado = sala.game_manager.sacar_todas_fichas_carcel(websocket)
+        if exito:
+            color = sala.game_manager.clientes[websocket]["color"]
+            nombre = sala.game_manager.clientes[websocket]["nombre"]
+
+            for ficha_id in resultado["fichas_liberadas"]:
+                await self.broadcast(sala, proto.mensaje_movimiento_ok(
+                    nombre=nombre,
+                    color=color,
+                    ficha_id=ficha_id,
+                    desde=-1,
+                    hasta=resultado["posicion"],
+                    accion="liberar_ficha"
+                ))
+
+            # ⭐ NUEVO: Notificar capturas si hubo
+            if "capturas" in resultado and resultado["capturas"]:
+                for captura in resultado["capturas"]:
+                    await self.broadcast(sala, proto.crear_mensaje(
+                        proto.MSG_CAPTURA,
+                        capturado={
+                            "nombre": captura["nombre"],
+                            "color": captura["color"],
+                            "ficha_id": captura["ficha_id"]
+                        }
+                    ))
+                    logger.info("🍽️ %s (%s) capturó ficha de %s (%s) al liberar todas las fichas", nombre, color, captura['nombre'], captura['color'])
+
+            await self.broadcast_tablero(sala)
+
+            if sala.game_manager.debe_avanzar_turno_ahora():
+                sala.game_manager.avanzar_turno()
+                await self.notificar_turno(sala)
+        else:
+            await self.enviar(websocket, proto.mensaje_error(resultado))
+
+    async def atender_debug_tres_dobles(self, websocket, mensaje):
+        await self.procesar_debug_tres_dobles(websocket)
+
+    async def atender_no_reconocido(self, websocket, mensaje):
+        logger.warning("Mensaje no reconocido de %s: %s", self._direccion(websocket), mensaje.get('tipo'))
+        await self.enviar(websocket, proto.mensaje_error("Mensaje no reconocido"))
 
     async def procesar_lanzar_dados(self, websocket):
         """Procesa el lanzamiento de dados"""
-        cliente_info = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
-        logger.info(f"INICIANDO procesamiento de dados para {cliente_info}")
+        cliente_info = websocket.remote_address
+        logger.debug("INICIANDO procesamiento de dados para %s", cliente_info)
+        sala = self.salas.sala_de(websocket)
     
         try:
-            es_turno = self.game_manager.es_turno_de(websocket)
+            es_turno = sala.game_manager.es_turno_de(websocket)
             if not es_turno:
                 error_msg = "No es tu turno"
-                logger.warning(f"{error_msg} para {cliente_info}")
+                logger.warning("%s para %s", error_msg, cliente_info)
                 await self.enviar(websocket, proto.mensaje_error(error_msg))
                 return
         
-            dado1, dado2, suma, es_doble = self.game_manager.lanzar_dados_safe()
-            logger.info(f"Dados generados: [{dado1}] [{dado2}] = {suma}, dobles: {es_doble}")
+            with trazas.tramo("reglas", "lanzar_dados"):
+                dado1, dado2, suma, es_doble = sala.game_manager.lanzar_dados_safe()
+            logger.info("Dados generados: [%s] [%s] = %s, dobles: %s", dado1, dado2, suma, es_doble)
         
             mensaje_dados = proto.mensaje_dados(dado1, dado2, suma, es_doble)
-            await self.broadcast(mensaje_dados)
-            logger.info(f"Dados enviados exitosamente")
+            await self.broadcast(sala, mensaje_dados)
+            logger.debug("Dados enviados exitosamente")
         
             # ⭐ CRÍTICO: Verificar PRIMERO si se activó el premio de 3 dobles
-            if self.game_manager.premio_tres_dobles:
-                logger.info(f"🏆 Premio de 3 dobles activado - solicitando elección de ficha...")
+            if sala.game_manager.premio_tres_dobles:
+                logger.info("🏆 Premio de 3 dobles activado - solicitando elección de ficha...")
                 
-                info = self.game_manager.clientes[websocket]
+                info = sala.game_manager.clientes[websocket]
                 
                 # Obtener fichas elegibles
-                fichas_elegibles = self.game_manager.obtener_fichas_elegibles_para_premio(websocket)
+                fichas_elegibles = sala.game_manager.obtener_fichas_elegibles_para_premio(websocket)
                 
                 if fichas_elegibles:
-                    # Enviar mensaje al jugador para que elija
+                    # Enviar mensaje al jugador para que elija (con plazo: si no elige, se elige por él)
+                    self._armar_plazo(sala, PLAZO_PREMIO, self.plazo_premio)
                     await self.enviar(websocket, proto.mensaje_premio_tres_dobles(info['nombre'], fichas_elegibles))
-                    logger.info(f"Mensaje de premio enviado a {info['nombre']} con {len(fichas_elegibles)} fichas elegibles")
+                    logger.info("Mensaje de premio enviado a %s con %s fichas elegibles", info['nombre'], len(fichas_elegibles))
                 else:
-                    logger.warning(f"{info['nombre']} no tiene fichas elegibles para el premio")
-                    await self.broadcast(proto.mensaje_info(
+                    logger.warning("%s no tiene fichas elegibles para el premio", info['nombre'])
+                    await self.broadcast(sala, proto.mensaje_info(
                         f"{info['nombre']} sacó 3 dobles pero no tiene fichas elegibles. Turno pasado."
                     ))
                     # Avanzar turno automáticamente
-                    self.game_manager.premio_tres_dobles = False
-                    self.game_manager.dobles_consecutivos = 0
-                    self.game_manager.ultimo_es_doble = False
-                    if self.game_manager.avanzar_turno():
-                        await self.broadcast_tablero()
-                        await self.notificar_turno()
+                    sala.game_manager.descartar_premio()
+                    if sala.game_manager.avanzar_turno():
+                        await self.broadcast_tablero(sala)
+                        await self.notificar_turno(sala)
                 
-                logger.info(f"COMPLETADO: Dados [{dado1}] [{dado2}] = {suma} (¡PREMIO DE 3 DOBLES!)")
+                logger.info("COMPLETADO: Dados [%s] [%s] = %s (¡PREMIO DE 3 DOBLES!)", dado1, dado2, suma)
                 return
             
             # Si hay dobles pero NO es premio, intentar sacar fichas de la cárcel
             if es_doble:
-                logger.info(f"Dobles detectados - liberando TODAS las fichas automáticamente...")
+                logger.info("Dobles detectados - liberando TODAS las fichas automáticamente...")
             
-                exito, resultado = self.game_manager.sacar_todas_fichas_carcel(websocket)
+                with trazas.tramo("reglas", "sacar_todas"):
+                    exito, resultado = sala.game_manager.sacar_todas_fichas_carcel(websocket)
             
                 if exito:
-                    info = self.game_manager.clientes[websocket]
+                    info = sala.game_manager.clientes[websocket]
                     fichas_liberadas = resultado.get("fichas_liberadas", [])
                 
                     for ficha_id in fichas_liberadas:
-                        await self.broadcast(proto.crear_mensaje(
+                        await self.broadcast(sala, proto.crear_mensaje(
                             proto.MSG_MOVIMIENTO_OK,
                             nombre=info["nombre"],
                             color=info["color"],
@@ -720,79 +1268,84 @@ class ParchisServer:
                             accion="liberar_ficha"
                         ))
                 
-                    logger.info(f"{len(fichas_liberadas)} fichas liberadas para {info['nombre']}")
-                    await self.broadcast_tablero()
+                    logger.info("%s fichas liberadas para %s", len(fichas_liberadas), info['nombre'])
+                    await self.broadcast_tablero(sala)
                 
-                    await self.broadcast(proto.crear_mensaje(
+                    await self.broadcast(sala, proto.crear_mensaje(
                         proto.MSG_INFO,
                         mensaje=f"¡{info['nombre']} sacó dobles! Todas las fichas liberadas. Mantiene el turno."
                     ))
                     
-                    logger.info(f"{info['nombre']} mantiene el turno - reenviando notificación")
-                    await asyncio.sleep(0.1)
-                    await self.broadcast(proto.mensaje_turno(info["nombre"], info["color"]))
+                    logger.info("%s mantiene el turno - reenviando notificación", info['nombre'])
+                    await self._pausa(sala, 0.1)
+                    await self.broadcast(sala, self._mensaje_turno(sala, info["nombre"], info["color"]))
                 
                 # ⭐ NUEVO: Verificar si puede hacer alguna acción CON DOBLES después de sacar/no tener fichas en cárcel
-                if not self.game_manager.puede_hacer_alguna_accion(websocket):
-                    info = self.game_manager.clientes[websocket]
-                    logger.info(f"{info['nombre']} sacó dobles pero no puede mover ninguna ficha - pasando turno")
+                if not sala.game_manager.puede_hacer_alguna_accion(websocket):
+                    info = sala.game_manager.clientes[websocket]
+                    logger.info("%s sacó dobles pero no puede mover ninguna ficha - pasando turno", info['nombre'])
                     
-                    await self.broadcast(proto.crear_mensaje(
+                    await self.broadcast(sala, proto.crear_mensaje(
                         proto.MSG_INFO,
                         mensaje=f"{info['nombre']} sacó dobles pero no puede hacer ninguna acción. Turno pasado."
                     ))
                     
-                    if self.game_manager.forzar_avance_turno():
+                    if sala.game_manager.forzar_avance_turno():
                         logger.info("Turno forzado - notificando al siguiente jugador")
-                        await asyncio.sleep(0.2)
-                        await self.broadcast_tablero()
-                        await asyncio.sleep(0.1)
-                        await self.notificar_turno()
+                        await self._pausa(sala, 0.2)
+                        await self.broadcast_tablero(sala)
+                        await self._pausa(sala, 0.1)
+                        await self.notificar_turno(sala)
+                else:
+                    await self.enviar_movimientos_legales(sala, websocket)
             
             else:
-                logger.info(f"Sin dobles - verificando si puede hacer acciones...")
+                logger.info("Sin dobles - verificando si puede hacer acciones...")
             
-                if self.game_manager.necesita_pasar_turno_automaticamente(websocket):
-                    info = self.game_manager.clientes[websocket]
+                if sala.game_manager.necesita_pasar_turno_automaticamente(websocket):
+                    info = sala.game_manager.clientes[websocket]
                 
-                    logger.info(f"{info['nombre']} no puede hacer ninguna acción - pasando turno automáticamente")
+                    logger.info("%s no puede hacer ninguna acción - pasando turno automáticamente", info['nombre'])
                 
-                    await self.broadcast(proto.crear_mensaje(
+                    await self.broadcast(sala, proto.crear_mensaje(
                         proto.MSG_INFO,
                         mensaje=f"{info['nombre']} no puede hacer ninguna acción. Turno pasado automáticamente."
                     ))
                 
-                    if self.game_manager.forzar_avance_turno():
+                    if sala.game_manager.forzar_avance_turno():
                         logger.info("Turno forzado - notificando al siguiente jugador")
-                        await asyncio.sleep(0.2)
-                        await self.broadcast_tablero()
-                        await asyncio.sleep(0.1)
-                        await self.notificar_turno()
+                        await self._pausa(sala, 0.2)
+                        await self.broadcast_tablero(sala)
+                        await self._pausa(sala, 0.1)
+                        await self.notificar_turno(sala)
                         logger.info("Notificación de turno enviada al siguiente jugador")
                     return
                 else:
-                    logger.info(f"Jugador puede mover fichas - esperando acción")
+                    logger.info("Jugador puede mover fichas - esperando acción")
+                    await self.enviar_movimientos_legales(sala, websocket)
         
-            logger.info(f"COMPLETADO: Dados [{dado1}] [{dado2}] = {suma} {'(DOBLES!)' if es_doble else ''}")
+            logger.info("COMPLETADO: Dados [%s] [%s] = %s %s", dado1, dado2, suma, '(DOBLES!)' if es_doble else '')
         
         except Exception as e:
-            logger.error(f"ERROR CRÍTICO en procesamiento de dados: {e}")
+            logger.error("ERROR CRÍTICO en procesamiento de dados: %s", e)
             await self.enviar(websocket, proto.mensaje_error("Error generando dados"))
 
     async def procesar_sacar_carcel(self, websocket):
         """Procesa el intento de sacar una ficha de la cárcel"""
-        exito, resultado = self.game_manager.sacar_de_carcel(websocket)
+        sala = self.salas.sala_de(websocket)
+        with trazas.tramo("reglas", "sacar_de_carcel"):
+            exito, resultado = sala.game_manager.sacar_de_carcel(websocket)
         
         if not exito:
-            logger.warning(f"Error sacando de cárcel: {resultado}")
+            logger.warning("Error sacando de cárcel: %s", resultado)
             await self.enviar(websocket, proto.mensaje_error(resultado))
             return
         
-        info = self.game_manager.clientes[websocket]
+        info = sala.game_manager.clientes[websocket]
         color = info["color"]
-        salida = self.game_manager.tablero.salidas[color]  # Usar diccionario directo
+        salida = sala.game_manager.tablero.salidas[color]  # Usar diccionario directo
         
-        await self.broadcast(proto.crear_mensaje(
+        await self.broadcast(sala, proto.crear_mensaje(
             proto.MSG_MOVIMIENTO_OK,
             nombre=info["nombre"],
             color=color,
@@ -804,7 +1357,7 @@ class ParchisServer:
         # ⭐ NUEVO: Notificar capturas si hubo
         if "capturas" in resultado and resultado["capturas"]:
             for captura in resultado["capturas"]:
-                await self.broadcast(proto.crear_mensaje(
+                await self.broadcast(sala, proto.crear_mensaje(
                     proto.MSG_CAPTURA,
                     capturado={
                         "nombre": captura["nombre"],
@@ -812,37 +1365,38 @@ class ParchisServer:
                         "ficha_id": captura["ficha_id"]
                     }
                 ))
-                logger.info(f"🍽️ {info['nombre']} ({color}) capturó ficha de "
-                           f"{captura['nombre']} ({captura['color']}) al salir de cárcel")
+                logger.info("🍽️ %s (%s) capturó ficha de %s (%s) al salir de cárcel", info['nombre'], color, captura['nombre'], captura['color'])
         
-        logger.info(f"{info['nombre']} sacó ficha de la cárcel")
-        await self.broadcast_tablero()
+        logger.info("%s sacó ficha de la cárcel", info['nombre'])
+        await self.broadcast_tablero(sala)
         
-        if self.game_manager.debe_avanzar_turno_ahora():
-            turno_avanzado = self.game_manager.avanzar_turno()
+        if sala.game_manager.debe_avanzar_turno_ahora():
+            turno_avanzado = sala.game_manager.avanzar_turno()
             if turno_avanzado:
-                await asyncio.sleep(0.1)
-                await self.notificar_turno()
+                await self._pausa(sala, 0.1)
+                await self.notificar_turno(sala)
             else:
                 logger.info("Jugador mantiene turno después de sacar de cárcel")
-                await asyncio.sleep(0.1)
-                await self.broadcast(proto.mensaje_turno(info["nombre"], info["color"]))
+                await self._pausa(sala, 0.1)
+                await self.broadcast(sala, self._mensaje_turno(sala, info["nombre"], info["color"]))
     
     async def procesar_mover_ficha(self, websocket, ficha_id, dado_elegido):
         """Procesa el movimiento de una ficha con el dado elegido"""
-        logger.debug(f"Procesando movimiento de ficha {ficha_id} con dado {dado_elegido}")
+        logger.debug("Procesando movimiento de ficha %s con dado %s", ficha_id, dado_elegido)
+        sala = self.salas.sala_de(websocket)
         
-        exito, resultado = self.game_manager.mover_ficha(websocket, ficha_id, dado_elegido)
+        with trazas.tramo("reglas", "mover_ficha"):
+            exito, resultado = sala.game_manager.mover_ficha(websocket, ficha_id, dado_elegido)
         
         if not exito:
-            logger.warning(f"Error moviendo ficha: {resultado}")
+            logger.warning("Error moviendo ficha: %s", resultado)
             await self.enviar(websocket, proto.mensaje_error(resultado))
             # ⭐ CRÍTICO: NO avanzar turno ni resetear nada si el movimiento falló
             return
         
-        info = self.game_manager.clientes[websocket]
+        info = sala.game_manager.clientes[websocket]
         
-        await self.broadcast(proto.crear_mensaje(
+        await self.broadcast(sala, proto.crear_mensaje(
             proto.MSG_MOVIMIENTO_OK,
             nombre=info["nombre"],
             color=info["color"],
@@ -854,7 +1408,7 @@ class ParchisServer:
         # ⭐ NUEVO: Notificar capturas si hubo
         if "capturas" in resultado and resultado["capturas"]:
             for captura in resultado["capturas"]:
-                await self.broadcast(proto.crear_mensaje(
+                await self.broadcast(sala, proto.crear_mensaje(
                     proto.MSG_CAPTURA,
                     capturado={
                         "nombre": captura["nombre"],
@@ -862,66 +1416,80 @@ class ParchisServer:
                         "ficha_id": captura["ficha_id"]
                     }
                 ))
-                logger.info(f"🍽️ {info['nombre']} ({info['color']}) capturó ficha de "
-                           f"{captura['nombre']} ({captura['color']})")
+                logger.info("🍽️ %s (%s) capturó ficha de %s (%s)", info['nombre'], info['color'], captura['nombre'], captura['color'])
         
-        logger.info(f"🎮 {info['nombre']} movió ficha {ficha_id}")
-        await self.broadcast_tablero()
+        logger.info("🎮 %s movió ficha %s", info['nombre'], ficha_id)
+        await self.broadcast_tablero(sala)
         
-        if self.game_manager.verificar_victoria(websocket):
-            await self.broadcast(proto.mensaje_victoria(info["nombre"], info["color"]))
-            logger.info(f"¡{info['nombre']} ({info['color']}) HA GANADO!")
+        if sala.game_manager.verificar_victoria(websocket):
+            self._cancelar_plazo(sala)
+            await self.broadcast(sala, proto.mensaje_victoria(info["nombre"], info["color"]))
+            logger.info("¡%s (%s) HA GANADO!", info['nombre'], info['color'])
+            self._cerrar_repeticion(sala, info)
             # 🆕 Registrar estadísticas de la partida
             await self.registrar_fin_partida(websocket)
-            self.game_manager.juego_terminado = True
+            sala.game_manager.terminar_juego()
             return
         
-        if self.game_manager.debe_avanzar_turno_ahora():
-            turno_avanzado = self.game_manager.avanzar_turno()
+        if sala.game_manager.debe_avanzar_turno_ahora():
+            turno_avanzado = sala.game_manager.avanzar_turno()
             if turno_avanzado:
                 logger.info("Turno avanzado después de mover ficha")
-                await asyncio.sleep(0.1)
-                await self.notificar_turno()
+                await self._pausa(sala, 0.1)
+                await self.notificar_turno(sala)
             else:
                 logger.info("Jugador mantiene turno - puede lanzar dados nuevamente")
-                await asyncio.sleep(0.1)
-                await self.broadcast(proto.mensaje_turno(info["nombre"], info["color"]))
+                await self._pausa(sala, 0.1)
+                await self.broadcast(sala, self._mensaje_turno(sala, info["nombre"], info["color"]))
+        elif len(sala.game_manager.dados_usados) == 1:
+            # Aún le queda un dado por usar
+            await self.enviar_movimientos_legales(sala, websocket)
+    
+    async def enviar_movimientos_legales(self, sala, websocket, solo_suscritos=True):
+        """Envía al jugador sus movimientos legales (si los pidió al conectar o con SOLICITAR_MOVIMIENTOS)"""
+        info = sala.game_manager.clientes.get(websocket)
+        if info is None or (solo_suscritos and not info.get("movimientos")):
+            return
+        movimientos = sala.game_manager.generar_movimientos_legales(websocket)
+        await self.enviar(websocket, proto.mensaje_movimientos_legales(movimientos))
     
     # ============================================
     # MÉTODOS DE DETERMINACIÓN DE TURNOS
     # ============================================
     
-    async def iniciar_determinacion(self):
+    async def iniciar_determinacion(self, sala):
         """Inicia la fase de determinación de turnos"""
         try:
-            exito = self.game_manager.iniciar_determinacion_turnos()
+            exito = sala.game_manager.iniciar_determinacion_turnos()
             
             if not exito:
                 logger.error("No se pudo iniciar la determinación de turnos")
-                await self.broadcast(proto.mensaje_error("No se pudo iniciar la determinación"))
+                await self.broadcast(sala, proto.mensaje_error("No se pudo iniciar la determinación"))
                 return
             
             # Determinar el primer jugador (ID 0)
             primer_jugador = None
-            for ws, info in self.game_manager.clientes.items():
+            for ws, info in sala.game_manager.clientes.items():
                 if info['id'] == 0:
                     primer_jugador = info['nombre']
                     break
             
             # Notificar a todos los jugadores que deben lanzar dados
             logger.info("📢 Enviando MSG_DETERMINACION_INICIO a todos los jugadores")
-            logger.info(f"👤 Primer jugador: {primer_jugador}")
-            await self.broadcast(proto.mensaje_determinacion_inicio(primer_jugador))
+            logger.info("👤 Primer jugador: %s", primer_jugador)
+            self._armar_plazo(sala, PLAZO_DETERMINACION, self.plazo_determinacion)
+            await self.broadcast(sala, proto.mensaje_determinacion_inicio(primer_jugador))
             
             logger.info("✅ Fase de determinación iniciada correctamente")
             
         except Exception as e:
-            logger.error(f"Error iniciando determinación: {e}", exc_info=True)
-            await self.broadcast(proto.mensaje_error("Error iniciando la fase de determinación"))
+            logger.error("Error iniciando determinación: %s", e, exc_info=True)
+            await self.broadcast(sala, proto.mensaje_error("Error iniciando la fase de determinación"))
     
     async def procesar_tirada_determinacion(self, websocket, mensaje):
         """Procesa una tirada durante la fase de determinación"""
         try:
+            sala = self.salas.sala_de(websocket)
             dado1 = mensaje.get("dado1")
             dado2 = mensaje.get("dado2")
             
@@ -939,17 +1507,18 @@ class ParchisServer:
                 await self.enviar(websocket, proto.mensaje_error("Valores de dados inválidos"))
                 return
             
-            info = self.game_manager.clientes.get(websocket)
+            info = sala.game_manager.clientes.get(websocket) if sala else None
             if not info:
                 await self.enviar(websocket, proto.mensaje_error("Cliente no válido"))
                 return
             
-            logger.info(f"🎲 Procesando tirada de {info['nombre']}: [{dado1}][{dado2}]")
+            logger.info("🎲 Procesando tirada de %s: [%s][%s]", info['nombre'], dado1, dado2)
             
             # Registrar la tirada
-            fase_completa, resultado = self.game_manager.registrar_tirada_determinacion(
-                websocket, dado1, dado2
-            )
+            with trazas.tramo("reglas", "determinacion"):
+                fase_completa, resultado = sala.game_manager.registrar_tirada_determinacion(
+                    websocket, dado1, dado2
+                )
             
             # Verificar si hubo error
             if "error" in resultado:
@@ -960,7 +1529,7 @@ class ParchisServer:
             suma = dado1 + dado2
             siguiente_nombre = resultado.get("siguiente", "")
             
-            await self.broadcast(proto.mensaje_determinacion_resultado(
+            await self.broadcast(sala, proto.mensaje_determinacion_resultado(
                 info['nombre'],
                 info['color'],
                 dado1,
@@ -972,16 +1541,17 @@ class ParchisServer:
             # Si la fase NO está completa, solo esperamos más tiradas
             if not fase_completa:
                 if "pendientes" in resultado:
-                    logger.info(f"⏳ Esperando {resultado['pendientes']} jugadores más")
+                    logger.info("⏳ Esperando %s jugadores más", resultado['pendientes'])
                 elif "empate" in resultado:
                     # Hay empate, notificar desempate
                     jugadores_empatados = resultado["jugadores"]
                     valor_empate = resultado["valor"]
                     
-                    logger.info(f"⚔️ Empate detectado: {valor_empate} puntos")
-                    logger.info(f"⚔️ Jugadores empatados: {[j['nombre'] for j in jugadores_empatados]}")
+                    logger.info("⚔️ Empate detectado: %s puntos", valor_empate)
+                    logger.info("⚔️ Jugadores empatados: %s", [j['nombre'] for j in jugadores_empatados])
                     
-                    await self.broadcast(proto.mensaje_determinacion_empate(
+                    self._armar_plazo(sala, PLAZO_DETERMINACION, self.plazo_determinacion)
+                    await self.broadcast(sala, proto.mensaje_determinacion_empate(
                         jugadores_empatados,
                         valor_empate
                     ))
@@ -992,52 +1562,52 @@ class ParchisServer:
                 ganador = resultado["ganador"]
                 orden = resultado["orden"]
                 
-                logger.info(f"🏆 GANADOR: {ganador['nombre']} ({ganador['color']})")
-                logger.info(f"📋 ORDEN: {' -> '.join([j['nombre'] for j in orden])}")
+                logger.info("🏆 GANADOR: %s (%s)", ganador['nombre'], ganador['color'])
+                logger.info("📋 ORDEN: %s", ' -> '.join([j['nombre'] for j in orden]))
                 
                 # Notificar ganador y orden
-                await self.broadcast(proto.mensaje_determinacion_ganador(
+                await self.broadcast(sala, proto.mensaje_determinacion_ganador(
                     ganador['nombre'],
                     ganador['color'],
                     orden
                 ))
                 
                 # Pequeña pausa para que los clientes procesen
-                await asyncio.sleep(1.0)
+                await self._pausa(sala, 1.0)
                 
                 # Ahora SÍ iniciar el juego normal
                 logger.info("🎮 Iniciando juego normal con orden determinado...")
-                await self.iniciar_juego()
+                await self.iniciar_juego(sala)
             
         except Exception as e:
-            logger.error(f"Error procesando tirada de determinación: {e}", exc_info=True)
+            logger.error("Error procesando tirada de determinación: %s", e, exc_info=True)
             await self.enviar(websocket, proto.mensaje_error("Error procesando tirada"))
     
     # ============================================
     # FIN MÉTODOS DE DETERMINACIÓN DE TURNOS
     # ============================================
     
-    async def iniciar_juego(self):
+    async def iniciar_juego(self, sala):
         """Inicia el juego"""
         logger.info("Iniciando juego...")
         
-        self.game_manager.iniciar_juego()
-        jugadores_info = self.game_manager.obtener_info_jugadores()
+        sala.game_manager.iniciar_juego()
+        jugadores_info = sala.game_manager.obtener_info_jugadores()
         
-        await self.broadcast(proto.crear_mensaje(
+        await self.broadcast(sala, proto.crear_mensaje(
             proto.MSG_INICIO_JUEGO,
             jugadores=jugadores_info
         ))
         
-        await self.broadcast_tablero()
-        await asyncio.sleep(0.1)
-        await self.notificar_turno()
+        await self.broadcast_tablero(sala)
+        await self._pausa(sala, 0.1)
+        await self.notificar_turno(sala)
         
         logger.info("Juego iniciado exitosamente")
     
-    async def notificar_turno(self):
+    async def notificar_turno(self, sala):
         """Notifica el turno actual a todos los clientes"""
-        jugador_actual = self.game_manager.obtener_jugador_actual_safe()
+        jugador_actual = sala.game_manager.obtener_jugador_actual_safe()
         if not jugador_actual:
             logger.warning("No se pudo obtener jugador actual")
             return
@@ -1045,7 +1615,7 @@ class ParchisServer:
         cliente_encontrado = None
         info_encontrada = None
         
-        for cliente_sock, info in self.game_manager.clientes.items():
+        for cliente_sock, info in sala.game_manager.clientes.items():
             if info["jugador"] == jugador_actual:
                 cliente_encontrado = cliente_sock
                 info_encontrada = info
@@ -1055,70 +1625,243 @@ class ParchisServer:
             logger.error("No se encontró cliente para el jugador actual")
             return
         
-        mensaje_turno = proto.mensaje_turno(info_encontrada["nombre"], info_encontrada["color"])
+        mensaje_turno = self._mensaje_turno(sala, info_encontrada["nombre"], info_encontrada["color"])
         
-        logger.info(f"NOTIFICANDO TURNO: {info_encontrada['nombre']} ({info_encontrada['color']})")
-        logger.debug(f"Mensaje turno: {mensaje_turno}")
+        logger.info("NOTIFICANDO TURNO: %s (%s)", info_encontrada['nombre'], info_encontrada['color'])
+        logger.debug("Mensaje turno: %s", mensaje_turno)
         
-        await self.broadcast(mensaje_turno)
-        logger.info(f"Notificación de turno enviada a todos los clientes")
+        await self.broadcast(sala, mensaje_turno)
+        logger.info("Notificación de turno enviada a todos los clientes")
+    
+    # ============================================
+    # PLAZOS (rueda de temporizadores)
+    # ============================================
+    
+    def _mensaje_turno(self, sala, nombre, color):
+        """TURNO con el instante límite para jugarlo; arma el plazo de turno de la sala"""
+        plazo = self._armar_plazo(sala, PLAZO_TURNO, self.plazo_turno)
+        return proto.mensaje_turno(nombre, color, plazo)
+    
+    def _armar_plazo(self, sala, tipo, segundos):
+        """Sustituye el plazo en curso de la sala. Retorna el vencimiento en el reloj del servidor (o None)"""
+        self._cancelar_plazo(sala)
+        if not segundos:
+            return None
+        sala.plazo = (self.temporizadores.programar(segundos, self._plazo_vencido, sala), tipo)
+        return relojes.ahora() + segundos
+    
+    def _cancelar_plazo(self, sala):
+        if sala.plazo is not None:
+            sala.plazo[0].cancelar()
+            sala.plazo = None
+    
+    def _plazo_vencido(self, sala):
+        """Callback de la rueda: el vencimiento se procesa como un comando más de la sala"""
+        if sala.plazo is None or sala.plazo[0].activo:
+            return
+        tarea = asyncio.create_task(sala.ejecutar(self._vencer_plazo, sala, sala.plazo[0]))
+        self._tareas_plazos.add(tarea)
+        tarea.add_done_callback(self._tareas_plazos.discard)
     
-    async def broadcast_tablero(self):
-        """Envía el estado del tablero a todos los clientes"""
+    async def _vencer_plazo(self, sala, vencido):
+        if sala.plazo is None or sala.plazo[0] is not vencido:
+            return  # Un comando de la sala lo sustituyó mientras esperaba turno en la cola
+        tipo = sala.plazo[1]
+        sala.plazo = None
+        # Sin mensaje entrante que lo abra: el vencimiento es la raíz de su propia traza
+        with self.trazador.comando("plazo", tipo):
+            lote, token = lotes.abrir(sala)
+            try:
+                if tipo == PLAZO_DETERMINACION:
+                    await self._tirar_por_ausentes(sala)
+                else:
+                    await self._pasar_turno_vencido(sala, tipo)
+            except Exception as e:
+                logger.error("Error procesando plazo vencido (%s) en la sala %s: %s", tipo, sala.codigo, e, exc_info=True)
+            finally:
+                await self._entregar_lote(sala, lote, token)
+    
+    async def _tirar_por_ausentes(self, sala):
+        """Determinación vencida: se lanza automáticamente por quienes no lo hicieron"""
+        gm = sala.game_manager
+        esperados = gm.jugadores_en_desempate or set(gm.clientes)
+        ausentes = sorted((ws for ws in esperados if ws in gm.clientes and ws not in gm.tiradas_determinacion),
+                          key=lambda ws: gm.clientes[ws]["id"])
+        for websocket in ausentes:
+            if not gm.determinacion_activa or websocket not in gm.clientes:
+                break
+            nombre = gm.clientes[websocket]["nombre"]
+            logger.info("⏰ %s no lanzó a tiempo en la determinación (sala %s)", nombre, sala.codigo)
+            await self.broadcast(sala, proto.mensaje_info(f"⏰ {nombre} no lanzó a tiempo: se lanza automáticamente."))
+            await self.procesar_tirada_determinacion(websocket, {"dado1": random.randint(1, 6),
+                                                                  "dado2": random.randint(1, 6)})
+    
+    async def _pasar_turno_vencido(self, sala, tipo):
+        """Turno vencido: se pasa con forzar_avance_turno; premio vencido: se elige la primera ficha elegible"""
+        gm = sala.game_manager
+        jugador = gm.obtener_jugador_actual_safe()
+        websocket = next((ws for ws, info in gm.clientes.items() if info["jugador"] == jugador), None)
+        if websocket is None or not gm.juego_iniciado:
+            return
+        nombre = gm.clientes[websocket]["nombre"]
+        
+        if tipo == PLAZO_PREMIO and gm.premio_tres_dobles:
+            elegibles = gm.obtener_fichas_elegibles_para_premio(websocket)
+            if elegibles:
+                logger.info("⏰ %s no eligió la ficha del premio a tiempo (sala %s)", nombre, sala.codigo)
+                await self.broadcast(sala, proto.mensaje_info(f"⏰ {nombre} no eligió a tiempo: se elige su primera ficha."))
+                await self.procesar_elegir_ficha_premio(websocket, {"ficha_id": elegibles[0]["id"]})
+                return
+        
+        logger.info("⏰ %s agotó su plazo de turno (sala %s)", nombre, sala.codigo)
+        await self.broadcast(sala, proto.mensaje_info(f"⏰ {nombre} agotó su tiempo. Turno pasado."))
+        if gm.forzar_avance_turno():
+            await self.broadcast_tablero(sala)
+            await self._pausa(sala, 0.1)
+            await self.notificar_turno(sala)
+    
+    async def broadcast_tablero(self, sala):
+        """
+        Envía el estado del tablero a todos los clientes de la sala.
+        Los clientes que negociaron "delta" reciben solo lo que cambió
+        (TABLERO_DELTA); el resto sigue recibiendo el TABLERO completo.
+        """
         try:
-            estado = self.game_manager.obtener_estado_tablero()
-            mensaje_tablero = proto.crear_mensaje(proto.MSG_TABLERO, **estado)
-            await self.broadcast(mensaje_tablero)
-            logger.debug("Estado del tablero enviado")
+            delta = sala.game_manager.obtener_delta_tablero()
+            await self._difundir_tablero(sala, delta)
         except Exception as e:
-            logger.error(f"Error enviando estado del tablero: {e}")
+            logger.error("Error enviando estado del tablero: %s", e)
+    
+    async def _difundir_tablero(self, sala, delta, excluir=None):
+        """Reparte un delta ya calculado: TABLERO_DELTA a los clientes con delta, TABLERO al resto"""
+        gm = sala.game_manager
+        if delta is not None and self.directorio_repeticiones:
+            self._grabar_jugada(sala)
+        
+        con_delta = [ws for ws, info in gm.clientes.items() if info.get("delta") and ws is not excluir]
+        sin_delta = [ws for ws, info in gm.clientes.items() if not info.get("delta") and ws is not excluir]
+        
+        if delta is not None and not delta.get("completo"):
+            if con_delta:
+                await self.broadcast(sala, proto.mensaje_tablero_delta(delta), destinatarios=con_delta)
+            destinatarios_completo = sin_delta
+        elif delta is None:
+            # Nada cambió: los clientes con delta ya tienen esta versión
+            destinatarios_completo = sin_delta
+        else:
+            destinatarios_completo = sin_delta + con_delta
+        
+        if destinatarios_completo:
+            estado = gm.obtener_estado_tablero()
+            mensaje_tablero = proto.crear_mensaje(proto.MSG_TABLERO, **estado)
+            await self.broadcast(sala, mensaje_tablero, destinatarios=destinatarios_completo)
+        logger.debug("Estado del tablero enviado (versión %s)", gm.version_tablero)
     
     async def enviar(self, websocket, mensaje):
         """Envía un mensaje a un cliente específico"""
-        try:
-            if websocket in self.clientes_activos:
-                mensaje_json = json.dumps(mensaje, ensure_ascii=False)
-                logger.debug(f"Enviando a {websocket.remote_address}: {mensaje}")
-                await websocket.send(mensaje_json)
-                logger.debug(f"Mensaje enviado exitosamente")
-            else:
-                logger.warning(f"Intento de enviar a cliente inactivo")
-        except websockets.exceptions.ConnectionClosed:
-            logger.debug("No se pudo enviar: conexión cerrada")
-            self.clientes_activos.discard(websocket)
-        except Exception as e:
-            logger.error(f"Error enviando mensaje: {e}")
-            self.clientes_activos.discard(websocket)
+        if websocket in self.clientes_activos:
+            depurar = logger.isEnabledFor(logging.DEBUG) and logs.muestra("ENVIO")
+            if depurar:
+                logger.debug("Enviando a %s: %s", websocket.remote_address, mensaje)
+            sala = self.salas.sala_de(websocket)
+            lote = lotes.actual(sala) if sala else None
+            if lote is not None and sala.game_manager.clientes.get(websocket, {}).get("lote"):
+                lote.agregar(websocket, mensaje)
+                return
+            trama = codec.codificar(mensaje, self._codec_de(websocket))
+            if self._encolar(websocket, trama, mensaje.get("tipo")) and depurar:
+                logger.debug("Mensaje encolado")
+        else:
+            logger.warning("Intento de enviar a cliente inactivo")
+    
+    def _codec_de(self, websocket, sala=None):
+        """Codec negociado por el cliente en CONECTAR (JSON por defecto)"""
+        sala = sala or self.salas.sala_de(websocket)
+        info = sala.game_manager.clientes.get(websocket) if sala else None
+        return info.get("codec", codec.CODEC_JSON) if info else codec.CODEC_JSON
+    
+    def _encolar(self, websocket, trama, tipo=None):
+        """
+        Pone un mensaje ya serializado (str = trama de texto, bytes = binaria) en la
+        cola de salida del cliente sin esperar al socket. Retorna False si se descartó.
+        """
+        cola = self.colas_salida.get(websocket)
+        if cola is None:
+            cola = self.colas_salida[websocket] = salida.ColaSalida(
+                websocket, self.cola_marca_alta, self.cola_marca_baja, self.cola_capacidad,
+                self.timeout_envio, self.cola_paciencia, al_fallar=self._fallo_salida)
+        self.mensajes_enviados.incrementar(tipo)
+        with trazas.tramo("encolar", tipo):
+            return cola.encolar(trama, tipo)
+    
+    def _fallo_salida(self, websocket, motivo, expulsado):
+        """La escritora de un cliente no pudo seguir: se desvincula (y se limpia si era lento)"""
+        self.clientes_activos.discard(websocket)
+        self.colas_salida.pop(websocket, None)
+        if expulsado:
+            self._programar_limpieza(websocket)
+        else:
+            logger.debug("No se pudo enviar a %s: %s", websocket.remote_address, motivo)
     
-    async def broadcast(self, mensaje, excluir=None):
-        """Envía un mensaje a todos los clientes conectados"""
-        logger.debug(f"BROADCAST a {len(self.game_manager.clientes)} clientes: {mensaje}")
+    def estadisticas_salida(self):
+        """Métricas de la cola de salida de cada conexión: {dirección: {...}}"""
+        return {self._direccion(ws): cola.estadisticas() for ws, cola in list(self.colas_salida.items())}
+    
+    def _programar_limpieza(self, websocket):
+        """Lanza limpiar_cliente sin bloquear a quien detectó el problema"""
+        tarea = asyncio.create_task(self.limpiar_cliente(websocket, "Desconocido"))
+        self._tareas_limpieza.add(tarea)
+        tarea.add_done_callback(self._tareas_limpieza.discard)
+    
+    async def broadcast(self, sala, mensaje, excluir=None, destinatarios=None):
+        """
+        Envía un mensaje a todos los clientes conectados a la sala
+        (o solo a `destinatarios` si se indica).
+        Se serializa una sola vez por codec y se deja en la cola de salida de
+        cada cliente, de modo que un socket lento no retrasa al resto de la mesa.
+        """
+        # ⭐ Muestreado: con DEBUG activo, solo 1 de cada N broadcasts deja rastro
+        depurar = logger.isEnabledFor(logging.DEBUG) and logs.muestra("BROADCAST")
+        if depurar:
+            logger.debug("BROADCAST sala %s a %s clientes: %s", sala.codigo, len(sala.game_manager.clientes), mensaje)
         
-        if not self.game_manager.clientes:
+        if not sala.game_manager.clientes:
             logger.warning("No hay clientes para broadcast")
             return
         
-        clientes_desconectados = []
-        enviados_exitosos = 0
-        
-        for websocket in list(self.game_manager.clientes.keys()):
-            if websocket != excluir:
-                try:
-                    await self.enviar(websocket, mensaje)
-                    enviados_exitosos += 1
-                except Exception as e:
-                    logger.error(f"Error en broadcast: {e}")
-                    clientes_desconectados.append(websocket)
+        candidatos = sala.game_manager.clientes if destinatarios is None else destinatarios
+        destinatarios = [
+            websocket for websocket in candidatos
+            if websocket != excluir and websocket in self.clientes_activos
+        ]
+        if not destinatarios:
+            return
         
-        logger.debug(f"Broadcast completado: {enviados_exitosos} enviados exitosamente")
+        inicio = time.perf_counter()
+        lote = lotes.actual(sala)
+        clientes = sala.game_manager.clientes
+        tipo = mensaje.get("tipo")
+        tramas = {}
+        encolados = 0
+        with trazas.tramo("broadcast", tipo):
+            for websocket in destinatarios:
+                if lote is not None and clientes.get(websocket, {}).get("lote"):
+                    lote.agregar(websocket, mensaje)
+                    continue
+                codec_cliente = self._codec_de(websocket, sala)
+                if codec_cliente not in tramas:
+                    tramas[codec_cliente] = codec.codificar(mensaje, codec_cliente)
+                encolados += self._encolar(websocket, tramas[codec_cliente], tipo)
+        self.tiempos_difusion.de(tipo).observar(time.perf_counter() - inicio)
         
-        for websocket in clientes_desconectados:
-            await self.limpiar_cliente(websocket, "Desconocido")
+        if depurar:
+            logger.debug("Broadcast completado: %s/%s encolados", encolados, len(destinatarios))
         
     async def procesar_elegir_ficha_premio(self, websocket, mensaje):
         """Procesa la elección de ficha para el premio de 3 dobles"""
         try:
-            info = self.game_manager.clientes.get(websocket)
+            sala = self.salas.sala_de(websocket)
+            info = sala.game_manager.clientes.get(websocket) if sala else None
             
             if not info:
                 await self.enviar(websocket, proto.mensaje_error("Cliente no válido"))
@@ -1133,73 +1876,76 @@ class ParchisServer:
                     await self.enviar(websocket, proto.mensaje_error("ID de ficha no especificado"))
                 
                 # Reenviar mensaje de premio para retry
-                fichas_elegibles = self.game_manager.obtener_fichas_elegibles_para_premio(websocket)
+                fichas_elegibles = sala.game_manager.obtener_fichas_elegibles_para_premio(websocket)
                 if fichas_elegibles:
                     await self.enviar(websocket, proto.mensaje_premio_tres_dobles(info['nombre'], fichas_elegibles))
                 return
             
-            logger.info(f"🏆 {info['nombre']} eligió la ficha {ficha_id} para enviar a META")
+            logger.info("🏆 %s eligió la ficha %s para enviar a META", info['nombre'], ficha_id)
             
             # Aplicar el premio
-            exito, resultado = self.game_manager.aplicar_premio_tres_dobles(websocket, ficha_id)
+            exito, resultado = sala.game_manager.aplicar_premio_tres_dobles(websocket, ficha_id)
             
             if not exito:
                 error_msg = resultado.get("error", "Error aplicando premio")
-                logger.warning(f"❌ Elección inválida de {info['nombre']}: {error_msg}")
+                logger.warning("❌ Elección inválida de %s: %s", info['nombre'], error_msg)
                 await self.enviar(websocket, proto.mensaje_error(error_msg))
                 
                 # ⭐ CRÍTICO: Reenviar mensaje de premio para que pueda reintentar
-                fichas_elegibles = self.game_manager.obtener_fichas_elegibles_para_premio(websocket)
+                fichas_elegibles = sala.game_manager.obtener_fichas_elegibles_para_premio(websocket)
                 if fichas_elegibles:
                     await self.enviar(websocket, proto.mensaje_premio_tres_dobles(info['nombre'], fichas_elegibles))
-                    logger.info(f"🔄 Reenviado mensaje de premio a {info['nombre']} para retry")
+                    logger.info("🔄 Reenviado mensaje de premio a %s para retry", info['nombre'])
                 return
             
             # Notificar a todos el premio aplicado
-            await self.broadcast(proto.crear_mensaje(
+            await self.broadcast(sala, proto.crear_mensaje(
                 proto.MSG_INFO,
                 mensaje=f"🏆 {info['nombre']} envió su ficha #{ficha_id + 1} directamente a META con el premio de 3 dobles!"
             ))
             
             # Actualizar tablero
-            await self.broadcast_tablero()
+            await self.broadcast_tablero(sala)
             
             # Verificar si ganó
             if resultado.get("ha_ganado"):
-                await self.broadcast(proto.mensaje_victoria(info["nombre"], info["color"]))
-                logger.info(f"🎊 ¡{info['nombre']} ha ganado con el premio de 3 dobles!")
+                self._cancelar_plazo(sala)
+                await self.broadcast(sala, proto.mensaje_victoria(info["nombre"], info["color"]))
+                logger.info("🎊 ¡%s ha ganado con el premio de 3 dobles!", info['nombre'])
+                self._cerrar_repeticion(sala, info)
                 # 🆕 Registrar estadísticas de la partida
                 await self.registrar_fin_partida(websocket)
                 return
             
             # Avanzar turno
-            if self.game_manager.avanzar_turno():
-                await self.broadcast_tablero()
-                await self.notificar_turno()
+            if sala.game_manager.avanzar_turno():
+                await self.broadcast_tablero(sala)
+                await self.notificar_turno(sala)
             
         except Exception as e:
-            logger.error(f"Error en procesar_elegir_ficha_premio: {e}", exc_info=True)
+            logger.error("Error en procesar_elegir_ficha_premio: %s", e, exc_info=True)
             await self.enviar(websocket, proto.mensaje_error("Error procesando elección de ficha"))
     
     async def procesar_debug_tres_dobles(self, websocket):
         """🔧 DEBUG: Procesa comando para forzar 3 dobles consecutivos"""
         try:
-            info = self.game_manager.clientes.get(websocket)
+            sala = self.salas.sala_de(websocket)
+            info = sala.game_manager.clientes.get(websocket) if sala else None
             
             if not info:
                 await self.enviar(websocket, proto.mensaje_error("Cliente no válido"))
                 return
             
-            exito, resultado = self.game_manager.forzar_tres_dobles_debug(websocket)
+            exito, resultado = sala.game_manager.forzar_tres_dobles_debug(websocket)
             
             if not exito:
                 await self.enviar(websocket, proto.mensaje_error(resultado))
                 return
             
-            logger.warning(f"🔧 DEBUG: {info['nombre']} forzó 3 dobles consecutivos")
+            logger.warning("🔧 DEBUG: %s forzó 3 dobles consecutivos", info['nombre'])
             
             # Notificar a todos sobre los dados
-            await self.broadcast(proto.crear_mensaje(
+            await self.broadcast(sala, proto.crear_mensaje(
                 proto.MSG_DADOS,
                 dado1=resultado['dado1'],
                 dado2=resultado['dado2'],
@@ -1209,55 +1955,88 @@ class ParchisServer:
             ))
             
             # Notificar premio
-            await self.broadcast(proto.crear_mensaje(
+            await self.broadcast(sala, proto.crear_mensaje(
                 proto.MSG_INFO,
                 mensaje=f"🏆 ¡{info['nombre'].upper()} sacó 3 dobles consecutivos! Puede enviar UNA ficha a META."
             ))
             
             # Obtener fichas elegibles
             try:
-                fichas_elegibles = self.game_manager.obtener_fichas_elegibles_para_premio(websocket)
+                fichas_elegibles = sala.game_manager.obtener_fichas_elegibles_para_premio(websocket)
                 
                 if not fichas_elegibles:
-                    await self.broadcast(proto.crear_mensaje(
+                    await self.broadcast(sala, proto.crear_mensaje(
                         proto.MSG_INFO,
                         mensaje=f"{info['nombre']} no tiene fichas elegibles para el premio (todas en cárcel o meta)."
                     ))
                     # Forzar avance de turno
-                    if self.game_manager.avanzar_turno():
-                        await self.broadcast_tablero()
-                        await self.notificar_turno()
+                    if sala.game_manager.avanzar_turno():
+                        await self.broadcast_tablero(sala)
+                        await self.notificar_turno(sala)
                     return
                 
                 # Notificar al jugador que debe elegir
+                self._armar_plazo(sala, PLAZO_PREMIO, self.plazo_premio)
                 await self.enviar(websocket, proto.crear_mensaje(
                     proto.MSG_PREMIO_TRES_DOBLES,
                     fichas_elegibles=fichas_elegibles,
                     mensaje="Elige una ficha para enviar a META"
                 ))
                 
-                logger.info(f"✅ Jugador {info['nombre']} tiene {len(fichas_elegibles)} fichas elegibles para premio")
+                logger.info("✅ Jugador %s tiene %s fichas elegibles para premio", info['nombre'], len(fichas_elegibles))
                 
             except Exception as e:
-                logger.error(f"Error obteniendo fichas elegibles: {e}", exc_info=True)
+                logger.error("Error obteniendo fichas elegibles: %s", e, exc_info=True)
                 await self.enviar(websocket, proto.mensaje_error("Error obteniendo fichas elegibles"))
                 
         except Exception as e:
-            logger.error(f"Error en procesar_debug_tres_dobles: {e}", exc_info=True)
+            logger.error("Error en procesar_debug_tres_dobles: %s", e, exc_info=True)
             await self.enviar(websocket, proto.mensaje_error("Error interno del servidor"))
     
     def detener(self):
         """Detiene el servidor"""
         logger.info("🛑 Deteniendo servidor...")
         self.running = False
+        self.ejecutor_bd.shutdown(wait=False)
         logger.info("✅ Servidor detenido")
 
 
 if __name__ == "__main__":
+    # Configurar logging: cola + hilo escritor, niveles desde PARQUES_LOG_* (ver logs.py).
+    # Solo aquí: importar server (bench, trabajadores del supervisor) no toca el logging.
+    logs.configurar()
+    
     HOST = "0.0.0.0"
     PORT = 8001
     
-    servidor = ParchisServer(HOST, PORT)
+    modo_actor = os.environ.get("PARCHIS_MODO_ACTOR") == "1"
+    
+    # ⭐ PARCHIS_METRICAS=puerto: endpoint /metrics en 127.0.0.1 (en modo supervisor, puerto + índice del trabajador)
+    puerto_metricas = os.environ.get("PARCHIS_METRICAS")
+    puerto_metricas = int(puerto_metricas) if puerto_metricas else None
+    
+    # ⭐ PARCHIS_TRAZAS=N: se traza 1 de cada N comandos (0 = nunca); kill -USR1 vuelca el búfer a un JSON de Chrome
+    trazas_muestreo = int(os.environ.get("PARCHIS_TRAZAS", "100"))
+    
+    # ⭐ PARCHIS_BITACORA=directorio: bitácora por partida; al reiniciar se restauran las partidas en curso
+    directorio_bitacora = os.environ.get("PARCHIS_BITACORA") or None
+    
+    # ⭐ PARCHIS_REPETICIONES=directorio: cada partida se graba como repetición (python repeticion.py archivo.rep)
+    directorio_repeticiones = os.environ.get("PARCHIS_REPETICIONES") or None
+    
+    # ⭐ PARCHIS_TRABAJADORES=N (N > 1): N procesos con SO_REUSEPORT bajo un supervisor
+    trabajadores = int(os.environ.get("PARCHIS_TRABAJADORES", "1"))
+    if trabajadores > 1:
+        from supervisor import Supervisor
+        Supervisor(HOST, PORT, trabajadores, modo_actor=modo_actor,
+                   opciones={"puerto_metricas": puerto_metricas, "trazas_muestreo": trazas_muestreo,
+                             "directorio_bitacora": directorio_bitacora,
+                             "directorio_repeticiones": directorio_repeticiones}).ejecutar()
+        sys.exit(0)
+    
+    servidor = ParchisServer(HOST, PORT, modo_actor=modo_actor, puerto_metricas=puerto_metricas,
+                             trazas_muestreo=trazas_muestreo, directorio_bitacora=directorio_bitacora,
+                             directorio_repeticiones=directorio_repeticiones)
     
     try:
         asyncio.run(servidor.iniciar())
@@ -1265,5 +2044,5 @@ if __name__ == "__main__":
         logger.info("Interrupción recibida...")
         servidor.detener()
     except Exception as e:
-        logger.error(f"Error fatal: {e}")
+        logger.error("Error fatal: %s", e)
         servidor.detener()
\ No newline at end of file
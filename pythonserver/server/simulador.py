@@ -0,0 +1,328 @@
+"""
+Motor de partidas sin websockets: N jugadores controlados por políticas
+(aleatoria o guionizadas) juegan partidas completas contra GameManager,
+siguiendo el mismo flujo que los handlers de server.py: determinación de
+turnos, dados, salida de la cárcel con dobles, mover_ficha, capturas y el
+premio de 3 dobles.
+
+Sirve como generador de carga y como oráculo de regresión ante cambios de
+reglas: con la misma semilla y política una partida es reproducible.
+
+Uso:
+    python simulador.py [--partidas 2000] [--jugadores 4] [--politica aleatoria]
+                        [--procesos N] [--semilla 1] [--verificar-ocupacion]
+
+--verificar-ocupacion compara el índice de ocupación incremental con las
+fichas tras cada cambio (GameManager.comprobar_ocupacion) y aborta con
+AssertionError en la primera diferencia.
+"""
+
+import argparse
+import logging
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from game_manager import GameManager
+import protocol as proto
+
+logger = logging.getLogger(__name__)
+
+# Turnos máximos antes de dar una partida por atascada
+MAX_TURNOS = 3000
+
+
+class JugadorSimulado:
+    """Ocupa el lugar del websocket como clave en GameManager.clientes"""
+
+    __slots__ = ("asiento", "remote_address")
+
+    def __init__(self, asiento):
+        self.asiento = asiento
+        self.remote_address = ("simulador", asiento)
+
+    def __repr__(self):
+        return f"JugadorSimulado({self.asiento})"
+
+
+# ============================================
+# POLÍTICAS
+# ============================================
+# Una política recibe (gm, jugador, rng) y devuelve las acciones
+# (ficha_id, dado_elegido) en el orden en que quiere intentarlas.
+
+def _acciones_posibles(gm, jugador):
+    """Movimientos legales de GameManager: por ficha, suma antes que dados sueltos"""
+    return gm.generar_movimientos_legales(jugador)
+
+
+def politica_aleatoria(gm, jugador, rng):
+    acciones = _acciones_posibles(gm, jugador)
+    rng.shuffle(acciones)
+    return acciones
+
+
+def politica_primera(gm, jugador, rng):
+    """Guionizada: siempre la primera ficha posible, suma antes que dados sueltos"""
+    return _acciones_posibles(gm, jugador)
+
+
+def politica_adelantada(gm, jugador, rng):
+    """Mueve primero la ficha más avanzada (camino a meta > tablero)"""
+    fichas = gm.clientes[jugador]["jugador"].fichas
+    salida = gm.tablero.salidas[gm.clientes[jugador]["color"]]
+
+    def progreso(accion):
+        ficha = fichas[accion[0]]
+        if ficha.estado == "CAMINO_META":
+            return 100 + ficha.posicion_meta
+        return (ficha.posicion - salida) % 68
+
+    return sorted(_acciones_posibles(gm, jugador), key=progreso, reverse=True)
+
+
+POLITICAS = {
+    "aleatoria": politica_aleatoria,
+    "primera": politica_primera,
+    "adelantada": politica_adelantada,
+}
+
+
+# ============================================
+# MOTOR
+# ============================================
+
+class Partida:
+    """Una partida completa entre `num_jugadores` políticas"""
+
+    def __init__(self, num_jugadores=4, politicas=None, semilla=None, bitacora=None, verificar_ocupacion=False):
+        """
+        bitacora: bitacora.Bitacora donde anotar la partida (ver bench/bench_bitacora.py)
+        verificar_ocupacion: comprobar el índice de ocupación tras cada cambio
+        """
+        politicas = politicas or ["aleatoria"] * num_jugadores
+        self.politicas = [POLITICAS[p] if isinstance(p, str) else p for p in politicas]
+        self.rng = random.Random(semilla)
+        self.semilla = semilla
+
+        self.gm = GameManager()
+        self.gm.bitacora = bitacora
+        self.gm.verificar_ocupacion = verificar_ocupacion or self.gm.verificar_ocupacion
+        self.jugadores = [JugadorSimulado(i) for i in range(num_jugadores)]
+        for jugador, color in zip(self.jugadores, proto.COLORES):
+            self.gm.agregar_jugador(jugador, f"Bot{jugador.asiento}", color)
+
+        self.stats = Counter()
+        self.ganador = None
+        self.max_turnos = MAX_TURNOS
+
+    def jugar(self):
+        """Juega hasta que alguien gana o se alcanza MAX_TURNOS. Retorna las estadísticas"""
+        # Los dados de GameManager usan el módulo random: fijar la semilla hace la partida reproducible
+        random.seed(self.semilla)
+        self.determinar_turnos()
+        self.gm.iniciar_juego()
+
+        while self.ganador is None and self.stats["turnos"] < self.max_turnos:
+            self.stats["turnos"] += 1
+            jugador = self._jugador_actual()
+            self.jugar_tirada(jugador)
+
+        return self.resultado()
+
+    def determinar_turnos(self):
+        gm = self.gm
+        gm.iniciar_determinacion_turnos()
+        while gm.determinacion_activa:
+            pendientes = gm.jugadores_en_desempate or set(gm.clientes)
+            for jugador in sorted(pendientes, key=lambda j: j.asiento):
+                fase_completa, _ = gm.registrar_tirada_determinacion(
+                    jugador, self.rng.randint(1, 6), self.rng.randint(1, 6))
+                self.stats["tiradas_determinacion"] += 1
+                if fase_completa or not gm.determinacion_activa:
+                    break
+
+    def _jugador_actual(self):
+        actual = self.gm.obtener_jugador_actual_safe()
+        for jugador, info in self.gm.clientes.items():
+            if info["jugador"] is actual:
+                return jugador
+        raise RuntimeError("No se encontró el jugador con el turno")
+
+    def jugar_tirada(self, jugador):
+        """Una tirada de dados y todas las acciones que permite (como procesar_lanzar_dados)"""
+        gm = self.gm
+        _, _, _, es_doble = self.tirar_dados()
+        self.stats["tiradas"] += 1
+        self.stats["dobles"] += es_doble
+
+        if gm.premio_tres_dobles:
+            self.aplicar_premio(jugador)
+            return
+
+        if es_doble:
+            exito, resultado = gm.sacar_todas_fichas_carcel(jugador)
+            if exito:
+                self.stats["salidas_carcel"] += len(resultado["fichas_liberadas"])
+                self.stats["capturas"] += len(resultado.get("capturas", []))
+            if not gm.puede_hacer_alguna_accion(jugador):
+                gm.forzar_avance_turno()
+                return
+        elif gm.necesita_pasar_turno_automaticamente(jugador):
+            self.stats["turnos_pasados"] += 1
+            gm.forzar_avance_turno()
+            return
+
+        self.mover(jugador)
+
+    def tirar_dados(self):
+        return self.gm.lanzar_dados_safe()
+
+    def elegir_ficha_premio(self, elegibles):
+        return self.rng.choice(elegibles)["id"]
+
+    def mover(self, jugador):
+        """Usa los dados de la tirada (como procesar_mover_ficha, una o dos veces)"""
+        gm = self.gm
+        politica = self.politicas[jugador.asiento]
+        while True:
+            for ficha_id, dado in politica(gm, jugador, self.rng):
+                exito, resultado = gm.mover_ficha(jugador, ficha_id, dado)
+                if exito:
+                    break
+                self.stats["intentos_fallidos"] += 1
+            else:
+                if not gm.ultimo_es_doble:
+                    # Ningún movimiento válido y sin dobles: el servidor no tiene salida; forzamos
+                    self.stats["atascos"] += 1
+                    gm.forzar_avance_turno()
+                return
+
+            self.stats["movimientos"] += 1
+            self.stats["capturas"] += len(resultado.get("capturas", []))
+
+            if gm.verificar_victoria(jugador):
+                self.ganador = jugador
+                gm.terminar_juego()
+                return
+
+            if gm.debe_avanzar_turno_ahora():
+                gm.avanzar_turno()
+                return
+            if len(gm.dados_usados) != 1:
+                # Dobles con ambos dados usados: vuelve a tirar
+                return
+
+    def aplicar_premio(self, jugador):
+        """Premio de 3 dobles, como procesar_lanzar_dados + procesar_elegir_ficha_premio"""
+        gm = self.gm
+        elegibles = gm.obtener_fichas_elegibles_para_premio(jugador)
+        if not elegibles:
+            gm.descartar_premio()
+            gm.avanzar_turno()
+            return
+
+        exito, resultado = gm.aplicar_premio_tres_dobles(jugador, self.elegir_ficha_premio(elegibles))
+        self.stats["premios"] += 1
+        if exito and resultado.get("ha_ganado"):
+            self.ganador = jugador
+            gm.terminar_juego()
+            return
+        gm.avanzar_turno()
+
+    def resultado(self):
+        stats = dict(self.stats)
+        stats["completa"] = self.ganador is not None
+        if self.ganador is not None:
+            stats["asiento_ganador"] = self.ganador.asiento
+            stats["color_ganador"] = self.gm.clientes[self.ganador]["color"]
+        return stats
+
+
+# ============================================
+# EJECUCIÓN EN LOTES
+# ============================================
+
+def _inicializar_proceso():
+    logging.disable(logging.CRITICAL)
+
+
+def simular_lote(num_partidas, num_jugadores, politicas, semilla_inicial, verificar_ocupacion=False):
+    """Juega `num_partidas` seguidas; retorna la lista de estadísticas por partida"""
+    return [
+        Partida(num_jugadores, politicas, semilla_inicial + i, verificar_ocupacion=verificar_ocupacion).jugar()
+        for i in range(num_partidas)
+    ]
+
+
+def simular(num_partidas, num_jugadores=4, politicas=None, procesos=None, semilla=1, tam_lote=50,
+            verificar_ocupacion=False):
+    """Reparte las partidas en un ProcessPoolExecutor. Retorna (estadísticas, segundos)"""
+    procesos = procesos or os.cpu_count() or 1
+    lotes = [
+        (min(tam_lote, num_partidas - inicio), num_jugadores, politicas, semilla + inicio, verificar_ocupacion)
+        for inicio in range(0, num_partidas, tam_lote)
+    ]
+
+    inicio = time.perf_counter()
+    if procesos == 1:
+        _inicializar_proceso()
+        resultados = [simular_lote(*lote) for lote in lotes]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as pool:
+            resultados = list(pool.map(simular_lote, *zip(*lotes)))
+    duracion = time.perf_counter() - inicio
+
+    return [stats for lote in resultados for stats in lote], duracion
+
+
+def resumen(estadisticas, duracion):
+    """Texto con partidas/s, movimientos/s y promedios por partida"""
+    total = Counter()
+    for stats in estadisticas:
+        total.update({k: v for k, v in stats.items() if isinstance(v, int) and not isinstance(v, bool)
+                      and k != "asiento_ganador"})
+    partidas = len(estadisticas)
+    completas = sum(1 for s in estadisticas if s["completa"])
+    por_color = Counter(s["color_ganador"] for s in estadisticas if s["completa"])
+    por_asiento = Counter(s["asiento_ganador"] for s in estadisticas if s["completa"])
+
+    lineas = [
+        f"Partidas: {partidas} ({completas} completas) en {duracion:.2f}s",
+        f"  {partidas / duracion:10.1f} partidas/s",
+        f"  {total['movimientos'] / duracion:10.1f} movimientos/s",
+        f"  {total['tiradas'] / duracion:10.1f} tiradas/s",
+        "Promedio por partida:",
+    ]
+    for clave in ("turnos", "tiradas", "movimientos", "capturas", "salidas_carcel",
+                  "premios", "turnos_pasados", "atascos", "intentos_fallidos"):
+        lineas.append(f"  {clave:18s} {total[clave] / max(partidas, 1):8.2f}")
+    lineas.append("Victorias por color:   " + ", ".join(f"{c}={por_color[c]}" for c in proto.COLORES))
+    lineas.append("Victorias por asiento: " + ", ".join(f"{a}={por_asiento[a]}" for a in sorted(por_asiento)))
+    return "\n".join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partidas", type=int, default=2000)
+    parser.add_argument("--jugadores", type=int, default=4, choices=range(proto.MIN_JUGADORES, proto.MAX_JUGADORES + 1))
+    parser.add_argument("--politica", action="append", choices=sorted(POLITICAS),
+                        help="una por asiento (se repite la última); por defecto aleatoria")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--verificar-ocupacion", action="store_true",
+                        help="comprobar el índice de ocupación tras cada cambio (más lento)")
+    args = parser.parse_args()
+
+    politicas = args.politica or ["aleatoria"]
+    politicas = (politicas + [politicas[-1]] * args.jugadores)[:args.jugadores]
+
+    estadisticas, duracion = simular(args.partidas, args.jugadores, politicas, args.procesos, args.semilla,
+                                     verificar_ocupacion=args.verificar_ocupacion)
+    print(resumen(estadisticas, duracion))
+
+
+if __name__ == "__main__":
+    main()
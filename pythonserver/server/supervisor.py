@@ -0,0 +1,211 @@
+"""
+Modo supervisor: N procesos trabajadores sirviendo el mismo puerto.
+
+Cada trabajador es un ParchisServer completo (su bucle asyncio, sus salas)
+que escucha en el puerto público con SO_REUSEPORT, así el kernel reparte
+las conexiones nuevas entre los procesos, y además en un puerto interno
+propio (puerto_interno + índice).
+
+Afinidad de sala: el código de sala decide qué trabajador la aloja
+(crc32 del código normalizado módulo N). Si un cliente pide colores o se
+conecta a una sala de otro trabajador, recibe
+
+    {"tipo": "REDIRIGIR", "sala": "ABC", "puerto": 8003}
+
+y reconecta al puerto interno del trabajador dueño (mismo host). Los
+mensajes previos al CONECTAR que no dependen de la sala (sync, login) se
+atienden en cualquier trabajador.
+
+El supervisor vuelve a lanzar los trabajadores que terminan (con espera
+creciente si caen nada más arrancar). Las partidas en curso del trabajador
+caído se pierden.
+
+Uso:
+    python server/supervisor.py --trabajadores 4 --puerto 8001
+    PARCHIS_TRABAJADORES=4 python server/server.py
+"""
+
+import argparse
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Reinicio de trabajadores: si vivió menos de VIDA_MINIMA segundos, la espera se duplica
+ESPERA_INICIAL = 0.5
+ESPERA_MAXIMA = 30.0
+VIDA_MINIMA = 10.0
+
+
+class Afinidad:
+    """Qué trabajador aloja cada sala y en qué puerto interno escucha cada uno"""
+
+    def __init__(self, indice, total, puertos):
+        self.indice = indice
+        self.total = total
+        self.puertos = list(puertos)
+
+    def trabajador_de(self, codigo):
+        """Índice del trabajador dueño de la sala (código ya normalizado)"""
+        return zlib.crc32(codigo.encode("utf-8")) % self.total
+
+    def puerto_de(self, indice):
+        return self.puertos[indice]
+
+    def __repr__(self):
+        return f"Afinidad({self.indice}/{self.total}, puertos={self.puertos})"
+
+
+def _ejecutar_trabajador(host, port, afinidad, modo_actor, opciones):
+    """Punto de entrada de cada proceso trabajador"""
+    import asyncio
+    import logs
+    from server import ParchisServer
+
+    # El apagado lo ordena el supervisor (SIGTERM); Ctrl+C llega a todo el grupo
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logs.configurar(formato=logs.FORMATO.replace("%(name)s", f"t{afinidad.indice} %(name)s"))
+
+    servidor = ParchisServer(host, port, modo_actor=modo_actor, reuse_port=True, afinidad=afinidad, **opciones)
+
+    async def principal():
+        tarea = asyncio.ensure_future(servidor.iniciar())
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, tarea.cancel)
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(principal())
+    finally:
+        servidor.detener()
+
+
+class Supervisor:
+    """Lanza, vigila y reinicia los procesos trabajadores"""
+
+    def __init__(self, host="0.0.0.0", port=8001, trabajadores=None, puerto_interno=None, modo_actor=False,
+                 opciones=None):
+        """opciones: argumentos adicionales para el ParchisServer de cada trabajador"""
+        self.host = host
+        self.port = port
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        # El trabajador i escucha además en puerto_interno + i (destino de las redirecciones)
+        self.puerto_interno = puerto_interno or port + 1
+        self.modo_actor = modo_actor
+        self.opciones = dict(opciones or {})
+        self.procesos = {}    # {índice: Process}
+        self.inicios = {}     # {índice: instante del último arranque}
+        self.esperas = {}     # {índice: espera antes del próximo reinicio}
+        self.pendientes = {}  # {índice: instante en que toca relanzarlo}
+        self.reinicios = 0
+        self.activo = False
+        # spawn y no fork: el proceso padre ya tiene hilos (listener del log)
+        self._contexto = multiprocessing.get_context("spawn")
+
+    def afinidad(self, indice):
+        puertos = [self.puerto_interno + i for i in range(self.trabajadores)]
+        return Afinidad(indice, self.trabajadores, puertos)
+
+    def _lanzar(self, indice):
+        proceso = self._contexto.Process(
+            target=_ejecutar_trabajador,
+            args=(self.host, self.port, self.afinidad(indice), self.modo_actor, self.opciones),
+            name=f"parques-t{indice}",
+        )
+        proceso.start()
+        self.procesos[indice] = proceso
+        self.inicios[indice] = time.monotonic()
+        logger.info("🚀 Trabajador %s lanzado (pid %s, puerto interno %s)",
+                    indice, proceso.pid, self.afinidad(indice).puerto_de(indice))
+
+    def _terminado(self, indice):
+        """Un trabajador salió: programa su reinicio"""
+        proceso = self.procesos.pop(indice)
+        proceso.join()
+        vivido = time.monotonic() - self.inicios[indice]
+        if vivido < VIDA_MINIMA:
+            espera = min(ESPERA_MAXIMA, self.esperas.get(indice, ESPERA_INICIAL / 2) * 2)
+        else:
+            espera = ESPERA_INICIAL
+        self.esperas[indice] = espera
+        self.pendientes[indice] = time.monotonic() + espera
+        logger.warning("💥 Trabajador %s terminó con código %s tras %.1fs; reinicio en %.1fs",
+                       indice, proceso.exitcode, vivido, espera)
+
+    def _parar(self, *_):
+        self.activo = False
+
+    def ejecutar(self):
+        """Bucle del supervisor: retorna cuando recibe SIGINT o SIGTERM"""
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("El modo supervisor necesita SO_REUSEPORT (Linux, BSD, macOS)")
+
+        self.activo = True
+        signal.signal(signal.SIGTERM, self._parar)
+        signal.signal(signal.SIGINT, self._parar)
+        logger.info("👷 Supervisor: %s trabajadores en %s:%s", self.trabajadores, self.host, self.port)
+        for indice in range(self.trabajadores):
+            self._lanzar(indice)
+
+        try:
+            while self.activo:
+                centinelas = {proceso.sentinel: indice for indice, proceso in self.procesos.items()}
+                for centinela in multiprocessing.connection.wait(list(centinelas), timeout=0.5):
+                    if self.activo:
+                        self._terminado(centinelas[centinela])
+
+                ahora = time.monotonic()
+                for indice, cuando in list(self.pendientes.items()):
+                    if self.activo and ahora >= cuando:
+                        del self.pendientes[indice]
+                        self.reinicios += 1
+                        self._lanzar(indice)
+        finally:
+            self.detener()
+
+    def detener(self, timeout=5.0):
+        """Termina los trabajadores (SIGTERM y, si no salen a tiempo, SIGKILL)"""
+        self.activo = False
+        self.pendientes.clear()
+        for proceso in self.procesos.values():
+            if proceso.is_alive():
+                proceso.terminate()
+        limite = time.monotonic() + timeout
+        for proceso in self.procesos.values():
+            proceso.join(max(0.0, limite - time.monotonic()))
+            if proceso.is_alive():
+                proceso.kill()
+                proceso.join()
+        self.procesos.clear()
+        logger.info("✅ Supervisor detenido (%s reinicios)", self.reinicios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8001)
+    parser.add_argument("--trabajadores", type=int, default=None, help="por defecto, uno por núcleo")
+    parser.add_argument("--puerto-interno", type=int, default=None, help="primer puerto interno (puerto + 1)")
+    parser.add_argument("--modo-actor", action="store_true")
+    parser.add_argument("--puerto-metricas", type=int, default=None, help="/metrics del trabajador i en este puerto + i")
+    parser.add_argument("--bitacora", default=None, help="directorio de las bitácoras de partida (compartido)")
+    parser.add_argument("--repeticiones", default=None, help="directorio donde grabar las repeticiones de partidas")
+    args = parser.parse_args()
+
+    import logs
+    logs.configurar()
+    Supervisor(args.host, args.puerto, args.trabajadores, args.puerto_interno, args.modo_actor,
+               opciones={"puerto_metricas": args.puerto_metricas, "directorio_bitacora": args.bitacora,
+                         "directorio_repeticiones": args.repeticiones}).ejecutar()
+
+
+if __name__ == "__main__":
+    main()
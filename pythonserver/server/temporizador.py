@@ -0,0 +1,158 @@
+"""
+Rueda jerárquica de temporizadores para los plazos de todas las salas.
+
+Una tarea asyncio por sala (sleep hasta el plazo) no escala a miles de
+mesas: cada una es un objeto en el heap del bucle y reprogramarla en cada
+TURNO cancela y crea tareas. La rueda usa una sola tarea para todo el
+proceso:
+
+- Nivel 0: `ranuras` casillas de `resolucion` segundos cada una.
+- Nivel k: cada casilla cubre ranuras**k tics; al dar la vuelta el nivel
+  inferior, la casilla que toca del superior se reparte hacia abajo.
+
+Programar es O(1) (cálculo de nivel y casilla + inserción en un dict) y
+cancelar también (borrado del dict de su casilla). Cada tic dispara su
+casilla del nivel 0; los vencimientos salen con la precisión de un tic.
+
+La rueda no sabe de asyncio: avanzar(ahora) se puede llamar desde
+cualquier sitio (benchmarks, simulador). ejecutar() es el conductor para
+el servidor: duerme un tic entre avances y se queda esperando si no hay
+nada programado.
+"""
+
+import asyncio
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+class Temporizador:
+    """Un plazo programado en la rueda"""
+
+    __slots__ = ("tic", "funcion", "args", "casilla", "rueda")
+
+    def __init__(self, tic, funcion, args, rueda):
+        self.tic = tic
+        self.funcion = funcion
+        self.args = args
+        self.casilla = None  # dict de la casilla donde está (None = vencido o cancelado)
+        self.rueda = rueda
+
+    @property
+    def activo(self):
+        return self.casilla is not None
+
+    def cancelar(self):
+        """O(1); no hace nada si ya venció o se canceló"""
+        if self.casilla is not None:
+            del self.casilla[self]
+            self.casilla = None
+            self.rueda.pendientes -= 1
+
+
+class RuedaTemporizadores:
+    """Rueda jerárquica de `niveles` x `ranuras` casillas (ranuras potencia de 2)"""
+
+    def __init__(self, resolucion=0.1, ranuras=64, niveles=4, reloj=None):
+        if ranuras & (ranuras - 1):
+            raise ValueError("ranuras debe ser potencia de 2")
+        self.resolucion = resolucion
+        self.ranuras = ranuras
+        self.niveles = niveles
+        self._bits = ranuras.bit_length() - 1
+        self._mascara = ranuras - 1
+        self.casillas = [[{} for _ in range(ranuras)] for _ in range(niveles)]
+        self.reloj = reloj or (lambda: asyncio.get_running_loop().time())
+        self.tic = None  # último tic procesado (en unidades de resolucion desde el origen del reloj)
+        self.pendientes = 0
+        self.disparados = 0
+        self._hay_pendientes = None
+
+    def _tic_de(self, instante):
+        return math.floor(instante / self.resolucion)
+
+    def programar(self, retraso, funcion, *args, ahora=None):
+        """Llama funcion(*args) dentro de `retraso` segundos. Retorna el Temporizador (para cancelarlo)"""
+        ahora = self.reloj() if ahora is None else ahora
+        if self.tic is None:
+            self.tic = self._tic_de(ahora)
+        # Al menos un tic en el futuro: nunca cae en una casilla ya procesada
+        tic = max(self.tic + 1, math.ceil((ahora + retraso) / self.resolucion))
+        temporizador = Temporizador(tic, funcion, args, self)
+        self._insertar(temporizador)
+        self.pendientes += 1
+        if self._hay_pendientes is not None:
+            self._hay_pendientes.set()
+        return temporizador
+
+    def _insertar(self, temporizador):
+        distancia = temporizador.tic - self.tic
+        nivel = 0
+        while nivel < self.niveles - 1 and distancia >= 1 << (self._bits * (nivel + 1)):
+            nivel += 1
+        if distancia >= 1 << (self._bits * (nivel + 1)):
+            # Más allá del alcance de la rueda: se aparca en la última casilla alcanzable y se reubica al bajar
+            indice = ((self.tic - 1) >> (self._bits * nivel)) & self._mascara
+        else:
+            indice = (temporizador.tic >> (self._bits * nivel)) & self._mascara
+        casilla = self.casillas[nivel][indice]
+        casilla[temporizador] = None
+        temporizador.casilla = casilla
+
+    def avanzar(self, ahora=None):
+        """Procesa los tics hasta `ahora` y dispara lo vencido. Retorna cuántos disparó"""
+        ahora = self.reloj() if ahora is None else ahora
+        objetivo = self._tic_de(ahora)
+        if self.tic is None or not self.pendientes:
+            # Rueda vacía: saltar directamente (nada que repartir ni disparar)
+            self.tic = objetivo if self.tic is None else max(self.tic, objetivo)
+            return 0
+
+        disparados = 0
+        while self.tic < objetivo and self.pendientes:
+            self.tic += 1
+            tic = self.tic
+            # Repartir hacia abajo de mayor a menor nivel: lo que baja de k+1 puede caer en la casilla de k de este tic
+            for nivel in range(self.niveles - 1, 0, -1):
+                if tic & ((1 << (self._bits * nivel)) - 1) == 0:
+                    casilla = self.casillas[nivel][(tic >> (self._bits * nivel)) & self._mascara]
+                    if casilla:
+                        bajados = list(casilla)
+                        casilla.clear()
+                        for temporizador in bajados:
+                            self._insertar(temporizador)
+            casilla = self.casillas[0][tic & self._mascara]
+            # De uno en uno: una función disparada puede cancelar otro temporizador de esta misma casilla
+            while casilla:
+                temporizador = next(iter(casilla))
+                del casilla[temporizador]
+                temporizador.casilla = None
+                self.pendientes -= 1
+                disparados += 1
+                try:
+                    temporizador.funcion(*temporizador.args)
+                except Exception:
+                    logger.exception("Error en temporizador %r", temporizador.funcion)
+        if self.tic < objetivo:
+            self.tic = objetivo
+        self.disparados += disparados
+        return disparados
+
+    async def ejecutar(self):
+        """Conductor asyncio: avanza la rueda cada tic mientras haya temporizadores"""
+        self._hay_pendientes = asyncio.Event()
+        try:
+            while True:
+                if not self.pendientes:
+                    self._hay_pendientes.clear()
+                    await self._hay_pendientes.wait()
+                await asyncio.sleep(self.resolucion)
+                self.avanzar()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._hay_pendientes = None
+
+    def estadisticas(self):
+        return {"pendientes": self.pendientes, "disparados": self.disparados}
@@ -0,0 +1,241 @@
+"""
+Trazas por comando: árbol de tramos en un búfer circular, volcable en
+formato Chrome trace (chrome://tracing o https://ui.perfetto.dev).
+
+Cada mensaje entrante abre un tramo raíz (Trazador.comando) y, dentro,
+cada fase abre el suyo con tramo(nombre, detalle): decodificar, despachar,
+cola de la sala, espera y retención del lock, reglas del GameManager,
+base de datos, pausas y cada trama encolada. La traza en curso viaja en
+una ContextVar, así que ningún método necesita recibirla como argumento;
+el actor de la sala la reanuda en su tarea (ver salas.ActorSala).
+
+Muestreo: solo 1 de cada `cada` comandos se traza. Para el resto, tramo()
+es una lectura de ContextVar que devuelve un contexto nulo compartido,
+de modo que puede quedarse activo en producción.
+
+El búfer es una lista preasignada de `capacidad` eventos que se
+sobrescribe en círculo: al volcar salen los más recientes (el comienzo
+puede tener trazas a medias, sin su raíz).
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import time
+
+reloj = time.perf_counter_ns
+
+_actual = contextvars.ContextVar("parques_traza", default=None)
+
+
+class _Nulo:
+    """Contexto sin efecto para lo que no se muestrea (uno compartido)"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def renombrar(self, detalle):
+        pass
+
+
+NULO = _Nulo()
+
+
+class Traza:
+    """Un comando muestreado: su id (una fila en el visor) y la pila de tramos abiertos"""
+
+    __slots__ = ("id", "trazador", "pila")
+
+    def __init__(self, id, trazador):
+        self.id = id
+        self.trazador = trazador
+        self.pila = []
+
+    def anotar(self, nombre, inicio, duracion, detalle=None):
+        """Tramo ya medido (hijo del tramo abierto actual)"""
+        padre = self.pila[-1] if self.pila else None
+        self.trazador.anotar(self.id, nombre, inicio, duracion, padre, detalle)
+
+
+class Tramo:
+    __slots__ = ("traza", "nombre", "detalle", "inicio", "padre")
+
+    def __init__(self, traza, nombre, detalle=None):
+        self.traza = traza
+        self.nombre = nombre
+        self.detalle = detalle
+
+    def __enter__(self):
+        pila = self.traza.pila
+        self.padre = pila[-1] if pila else None
+        pila.append(self.nombre)
+        self.inicio = reloj()
+        return self
+
+    def __exit__(self, *exc):
+        duracion = reloj() - self.inicio
+        self.traza.pila.pop()
+        self.traza.trazador.anotar(self.traza.id, self.nombre, self.inicio, duracion, self.padre, self.detalle)
+        return False
+
+    def renombrar(self, detalle):
+        """Fija el detalle cuando no se conocía al abrir (p. ej. el tipo, tras decodificar)"""
+        self.detalle = detalle
+
+
+class _Raiz(Tramo):
+    """Tramo raíz: además activa la traza en la ContextVar mientras dura"""
+
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _actual.set(self.traza)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        _actual.reset(self._token)
+        return False
+
+
+class _Reanudacion:
+    """Activa en otra tarea una traza ya abierta (y anota lo que esperó en cola)"""
+
+    __slots__ = ("traza", "desde", "_token")
+
+    def __init__(self, traza, desde, nombre_espera):
+        self.traza = traza
+        self.desde = desde
+        if desde:
+            traza.anotar(nombre_espera, desde, reloj() - desde)
+
+    def __enter__(self):
+        self._token = _actual.set(self.traza)
+        return self
+
+    def __exit__(self, *exc):
+        _actual.reset(self._token)
+        return False
+
+
+def actual():
+    """Traza en curso en esta tarea (None si el comando no se muestreó)"""
+    return _actual.get()
+
+
+def tramo(nombre, detalle=None):
+    """Context manager que mide un tramo de la traza en curso (nulo si no hay)"""
+    traza = _actual.get()
+    if traza is None:
+        return NULO
+    return Tramo(traza, nombre, detalle)
+
+
+def reanudar(traza, desde=0, nombre_espera="cola_sala"):
+    """Continúa `traza` en la tarea actual; `desde` (reloj()) anota la espera hasta ahora"""
+    if traza is None:
+        return NULO
+    return _Reanudacion(traza, desde, nombre_espera)
+
+
+class CerrojoTrazado:
+    """
+    Envuelve el lock del GameManager: en los comandos muestreados anota la
+    espera para adquirirlo y abre un tramo mientras se retiene (los tramos
+    de reglas quedan dentro). Solo la adquisición externa.
+    """
+
+    __slots__ = ("cerrojo", "_profundidad", "_tramo")
+
+    def __init__(self, cerrojo):
+        self.cerrojo = cerrojo
+        self._profundidad = 0
+        self._tramo = None
+
+    def __enter__(self):
+        traza = _actual.get()
+        if traza is None or self._profundidad:
+            self.cerrojo.__enter__()
+            self._profundidad += 1
+            return self
+        inicio = reloj()
+        self.cerrojo.__enter__()
+        traza.anotar("espera_cerrojo", inicio, reloj() - inicio)
+        self._profundidad += 1
+        self._tramo = Tramo(traza, "cerrojo")
+        self._tramo.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._profundidad -= 1
+        if not self._profundidad and self._tramo is not None:
+            self._tramo.__exit__(*exc)
+            self._tramo = None
+        return self.cerrojo.__exit__(*exc)
+
+
+class Trazador:
+    """Muestreo de comandos y búfer circular de tramos terminados"""
+
+    def __init__(self, capacidad=16384, cada=100):
+        self.capacidad = capacidad
+        self.cada = cada              # 1 de cada N comandos (0 = desactivado)
+        self.eventos = [None] * capacidad
+        self.escritos = 0
+        self._contador = 0
+        self._ids = itertools.count(1)
+
+    def comando(self, nombre="comando", detalle=None):
+        """Tramo raíz de un mensaje entrante (nulo si este no toca muestrearlo)"""
+        if not self.cada:
+            return NULO
+        self._contador += 1
+        if self._contador % self.cada:
+            return NULO
+        return _Raiz(Traza(next(self._ids), self), nombre, detalle)
+
+    def anotar(self, traza, nombre, inicio, duracion, padre, detalle):
+        self.eventos[self.escritos % self.capacidad] = (traza, nombre, inicio, duracion, padre, detalle)
+        self.escritos += 1
+
+    def instantanea(self):
+        """Eventos del búfer, del más antiguo al más reciente"""
+        if self.escritos <= self.capacidad:
+            return self.eventos[:self.escritos]
+        corte = self.escritos % self.capacidad
+        return self.eventos[corte:] + self.eventos[:corte]
+
+    def vaciar(self):
+        self.eventos = [None] * self.capacidad
+        self.escritos = 0
+
+
+def chrome(eventos, pid=None):
+    """Eventos de instantanea() → documento Chrome trace (eventos completos "X", una fila por comando)"""
+    pid = os.getpid() if pid is None else pid
+    salida = []
+    for traza, nombre, inicio, duracion, padre, detalle in eventos:
+        args = {"traza": traza}
+        if padre is not None:
+            args["padre"] = padre
+        if detalle is not None:
+            args["detalle"] = detalle
+        salida.append({
+            "name": nombre if detalle is None else f"{nombre} {detalle}",
+            "cat": "parques", "ph": "X", "pid": pid, "tid": traza,
+            "ts": inicio / 1000, "dur": duracion / 1000, "args": args,
+        })
+    return {"traceEvents": salida, "displayTimeUnit": "ms"}
+
+
+def volcar(eventos, ruta, pid=None):
+    """Escribe los eventos como JSON de Chrome trace; retorna cuántos escribió"""
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(chrome(eventos, pid), archivo)
+    return len(eventos)
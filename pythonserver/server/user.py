@@ -1,5 +1,10 @@
+import logging
+
 import gameFile
 
+logger = logging.getLogger(__name__)
+
+
 class User:
     def __init__(self, name, color):
         self.name = name
@@ -11,7 +16,7 @@ class User:
         if len(self.fichas) < 4:
             self.fichas.append(ficha)
         else:
-            print("✗ Ya tienes 4 fichas asignadas")
+            logger.warning("✗ %s ya tiene 4 fichas asignadas", self.name)
     
     def mostrar_fichas(self):
         """Muestra todas las fichas del jugador"""
@@ -27,7 +32,7 @@ class User:
             if ficha.estado == "BLOQUEADO":
                 ficha.desbloquear(salida)
                 return True
-        print("✗ No hay fichas bloqueadas para desbloquear")
+        logger.debug("✗ No hay fichas bloqueadas para desbloquear")
         return False
     
     def fichas_en_juego(self):